@@ -0,0 +1,3 @@
+from .synthetic import generate_ohlcv, generate_pattern_occurrences
+
+__all__ = ['generate_ohlcv', 'generate_pattern_occurrences']
@@ -0,0 +1,299 @@
+"""
+Performance benchmarks for the ML service
+
+Run the suite and store results under benchmarks/results/<commit>.json:
+
+    python -m benchmarks run --sizes 10000 100000
+
+Compare two stored runs and fail on slowdowns above the threshold:
+
+    python -m benchmarks compare benchmarks/results/<base>.json benchmarks/results/<head>.json
+"""
+import argparse
+import functools
+import json
+import logging
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from src.data.market_data import encode_market_data, decode_market_data
+from src.models import PatternBacktester, PatternDetector
+from src.models.inference import TorchBackend
+from src.models.sequence_classifier import CandleCNN
+from .synthetic import generate_ohlcv, generate_pattern_occurrences
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+
+# name -> (setup function, largest size worth running)
+BENCHMARKS: Dict[str, Any] = {}
+
+
+def benchmark(name: str, max_size: Optional[int] = None):
+    """
+    Register a benchmark
+
+    The decorated function receives the candle count, does any setup and
+    returns the zero-argument callable that is actually timed.
+    """
+    def register(setup: Callable[[int], Callable[[], Any]]):
+        BENCHMARKS[name] = (setup, max_size)
+        return setup
+    return register
+
+
+@functools.lru_cache(maxsize=None)
+def _detector() -> PatternDetector:
+    return PatternDetector()
+
+
+@functools.lru_cache(maxsize=2)
+def _ohlcv(n_candles: int, index_timestamps: bool = False):
+    return generate_ohlcv(n_candles, index_timestamps=index_timestamps)
+
+
+@benchmark('talib_detection')
+def bench_talib_detection(n_candles: int):
+    detector = _detector()
+    data = _ohlcv(n_candles)
+    return lambda: detector.detect_patterns(data, use_ml=False)
+
+
+@benchmark('recent_detection')
+def bench_recent_detection(n_candles: int):
+    # Tail-only mode: constant cost whatever the history length
+    detector = _detector()
+    data = _ohlcv(n_candles)
+    return lambda: detector.detect_patterns(data, use_ml=False, last_n=5)
+
+
+@benchmark('universe_scan')
+def bench_universe_scan(n_candles: int):
+    detector = _detector()
+    data = _ohlcv(n_candles)
+    # The same candles split into 500-bar rows, one per symbol
+    n_symbols = max(1, n_candles // 500)
+    matrices = [
+        data[column].to_numpy()[:n_symbols * 500].reshape(n_symbols, -1)
+        for column in ('open', 'high', 'low', 'close')
+    ]
+    return lambda: detector.scan_universe(*matrices)
+
+
+@benchmark('transformer_windows', max_size=1_000_000)
+def bench_transformer_windows(n_candles: int):
+    detector = _detector()
+    if detector.inference_backend is None:
+        # No trained checkpoint: time an untrained model of the same architecture
+        detector.inference_backend = TorchBackend(CandleCNN())
+    data = _ohlcv(n_candles)
+    return lambda: detector._detect_patterns_transformer(data)
+
+
+@benchmark('calculate_returns', max_size=1_000_000)
+def bench_calculate_returns(n_candles: int):
+    backtester = PatternBacktester()
+    data = _ohlcv(n_candles, index_timestamps=True)
+    occurrences = generate_pattern_occurrences(n_candles)
+    return lambda: backtester._calculate_returns(data, occurrences)
+
+
+@benchmark('pattern_statistics', max_size=1_000_000)
+def bench_pattern_statistics(n_candles: int):
+    backtester = PatternBacktester()
+    data = _ohlcv(n_candles, index_timestamps=True)
+    trades = backtester._calculate_returns(data, generate_pattern_occurrences(n_candles))
+    return lambda: backtester._calculate_pattern_statistics(trades)
+
+
+@benchmark('trade_log', max_size=1_000_000)
+def bench_trade_log(n_candles: int):
+    backtester = PatternBacktester()
+    data = _ohlcv(n_candles, index_timestamps=True)
+    occurrences = generate_pattern_occurrences(n_candles)
+    return lambda: backtester.generate_performance_report(backtester.backtest_log(data, occurrences))
+
+
+@benchmark('equity_curve', max_size=1_000_000)
+def bench_equity_curve(n_candles: int):
+    backtester = PatternBacktester()
+    data = _ohlcv(n_candles, index_timestamps=True)
+    trade_log = backtester.backtest_log(data, generate_pattern_occurrences(n_candles))
+    return lambda: backtester.equity_statistics(data, trade_log)
+
+
+@benchmark('cache_codec', max_size=1_000_000)
+def bench_cache_codec(n_candles: int):
+    data = _ohlcv(n_candles)
+    return lambda: decode_market_data(encode_market_data(data))
+
+
+def run_benchmark(name: str, n_candles: int, repeat: int = 3) -> Dict[str, Any]:
+    """
+    Time one benchmark at one size
+
+    Timing runs and the peak-memory run are separate because tracemalloc
+    slows down allocation-heavy code.
+    """
+    setup, max_size = BENCHMARKS[name]
+    result = {'benchmark': name, 'size': n_candles}
+
+    if max_size is not None and n_candles > max_size:
+        return {**result, 'skipped': f"size above limit of {max_size}"}
+
+    func = setup(n_candles)
+    if func is None:
+        return {**result, 'skipped': "not available in this environment"}
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    best = min(timings)
+    return {
+        **result,
+        'seconds': best,
+        'mean_seconds': sum(timings) / len(timings),
+        'throughput': n_candles / best if best > 0 else float('inf'),
+        'peak_memory_bytes': peak
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+
+def run_suite(
+    sizes: List[int],
+    names: Optional[List[str]] = None,
+    repeat: int = 3
+) -> Dict[str, Any]:
+    """Run the selected benchmarks at every size"""
+    results = []
+    for name in names or list(BENCHMARKS):
+        for size in sizes:
+            logger.info(f"Running {name} at {size} candles")
+            results.append(run_benchmark(name, size, repeat))
+
+    return {
+        'commit': _git_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results
+    }
+
+
+def compare_results(
+    base: Dict[str, Any],
+    head: Dict[str, Any],
+    threshold: float = 0.1
+) -> List[Dict[str, Any]]:
+    """
+    Compare two suite runs
+
+    Returns:
+        One row per benchmark/size present in both runs, with the time ratio
+        (head / base) and whether it exceeds the regression threshold
+    """
+    base_times = {
+        (r['benchmark'], r['size']): r['seconds']
+        for r in base['results'] if 'seconds' in r
+    }
+    rows = []
+    for r in head['results']:
+        key = (r['benchmark'], r['size'])
+        if 'seconds' not in r or key not in base_times:
+            continue
+        ratio = r['seconds'] / base_times[key] if base_times[key] > 0 else float('inf')
+        rows.append({
+            'benchmark': r['benchmark'],
+            'size': r['size'],
+            'base_seconds': base_times[key],
+            'head_seconds': r['seconds'],
+            'ratio': ratio,
+            'regression': ratio > 1 + threshold
+        })
+    return rows
+
+
+def _format_bytes(n_bytes: float) -> str:
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if n_bytes < 1024:
+            return f"{n_bytes:.1f} {unit}"
+        n_bytes /= 1024
+    return f"{n_bytes:.1f} TiB"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="ML service benchmarks")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="Run the benchmark suite")
+    run_parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    run_parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS))
+    run_parser.add_argument('--repeat', type=int, default=3)
+    run_parser.add_argument('--output', type=Path, help="Result file (default: results/<commit>.json)")
+
+    compare_parser = subparsers.add_parser('compare', help="Compare two result files")
+    compare_parser.add_argument('base', type=Path)
+    compare_parser.add_argument('head', type=Path)
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help="Allowed slowdown before flagging a regression")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == 'run':
+        suite = run_suite(args.sizes, args.only, args.repeat)
+        output = args.output or RESULTS_DIR / f"{suite['commit']}.json"
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(suite, indent=2))
+
+        for r in suite['results']:
+            if 'skipped' in r:
+                print(f"{r['benchmark']:<22} {r['size']:>10}  skipped ({r['skipped']})")
+            else:
+                print(
+                    f"{r['benchmark']:<22} {r['size']:>10}  {r['seconds']:.4f}s  "
+                    f"{r['throughput']:>14,.0f} candles/s  "
+                    f"peak {_format_bytes(r['peak_memory_bytes'])}"
+                )
+        print(f"Results written to {output}")
+        return 0
+
+    rows = compare_results(
+        json.loads(args.base.read_text()),
+        json.loads(args.head.read_text()),
+        args.threshold
+    )
+    for row in rows:
+        flag = "REGRESSION" if row['regression'] else ""
+        print(
+            f"{row['benchmark']:<22} {row['size']:>10}  "
+            f"{row['base_seconds']:.4f}s -> {row['head_seconds']:.4f}s  "
+            f"x{row['ratio']:.2f}  {flag}"
+        )
+    return 1 if any(row['regression'] for row in rows) else 0
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+from typing import List, Dict, Any
+
+
+def generate_ohlcv(
+    n_candles: int,
+    seed: int = 0,
+    start: str = '2020-01-01',
+    freq: str = '1min',
+    index_timestamps: bool = False
+) -> pd.DataFrame:
+    """
+    Generate a synthetic OHLCV series from a geometric random walk
+
+    Args:
+        n_candles: Number of candles
+        seed: Random seed
+        start: Timestamp of the first candle
+        freq: Candle frequency
+        index_timestamps: Use timestamps as the index (as the backtester
+            expects) instead of a 'timestamp' column
+
+    Returns:
+        DataFrame with OHLCV data where high/low bound open/close
+    """
+    rng = np.random.default_rng(seed)
+    log_returns = rng.normal(0, 0.002, n_candles)
+    close = 100 * np.exp(np.cumsum(log_returns))
+    open_ = np.empty(n_candles)
+    open_[0] = 100.0
+    open_[1:] = close[:-1]
+    spread = np.abs(rng.normal(0, 0.001, n_candles)) * close
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread * rng.uniform(0.5, 1.5, n_candles)
+    volume = rng.lognormal(13, 0.5, n_candles)
+
+    data = pd.DataFrame({
+        'timestamp': pd.date_range(start=start, periods=n_candles, freq=freq),
+        'open': open_,
+        'high': high,
+        'low': low,
+        'close': close,
+        'volume': volume
+    })
+
+    if index_timestamps:
+        data.set_index('timestamp', inplace=True)
+    return data
+
+
+def generate_pattern_occurrences(
+    n_candles: int,
+    every: int = 50,
+    seed: int = 0
+) -> List[Dict[str, Any]]:
+    """Synthetic detected patterns spread evenly across a series"""
+    rng = np.random.default_rng(seed)
+    names = ['DOJI', 'HAMMER', 'ENGULFING', 'MORNING_STAR']
+    ends = np.arange(every, n_candles, every)
+    confidences = rng.choice([0.6, 0.8, 1.0], len(ends))
+    bullish = rng.random(len(ends)) < 0.5
+
+    return [
+        {
+            'pattern_name': names[i % len(names)],
+            'confidence': float(confidences[i]),
+            'start_index': int(end) - 2,
+            'end_index': int(end),
+            'pattern_type': 'bullish' if bullish[i] else 'bearish'
+        }
+        for i, end in enumerate(ends)
+    ]
@@ -0,0 +1,4 @@
+from .driver import LoadOptions, SCENARIOS, run_load
+from .standins import KlineServer, start_fake_redis
+
+__all__ = ['LoadOptions', 'SCENARIOS', 'run_load', 'KlineServer', 'start_fake_redis']
@@ -0,0 +1,207 @@
+"""
+Closed-loop load generation against the API
+
+Each of concurrency simulated clients sends its next request as soon as
+the previous one has been answered, so the offered load adapts to the
+service and throughput at a given concurrency is what it can sustain.
+"""
+import asyncio
+import functools
+import itertools
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import aiohttp
+import numpy as np
+import orjson
+
+from benchmarks.synthetic import generate_ohlcv
+
+LATENCY_PERCENTILES = (50, 90, 95, 99)
+
+# name -> setup function returning the request coroutine function
+SCENARIOS: Dict[str, Callable[['LoadOptions'], Callable[[aiohttp.ClientSession], Awaitable[None]]]] = {}
+
+TIMEFRAME_FREQ = {'1m': '1min', '5m': '5min', '15m': '15min', '30m': '30min', '1h': '1h', '4h': '4h', '1d': '1D'}
+
+
+class LoadOptions(NamedTuple):
+    candles: int = 500  # Candles per submitted payload
+    timeframe: str = '1h'
+    symbols: Tuple[str, ...] = ('BTCUSDT', 'ETHUSDT', 'SOLUSDT', 'BNBUSDT')  # Streams for detect_symbol
+    payloads: int = 4  # Distinct payloads cycled through
+    deadline_ms: Optional[float] = None  # Latency budget sent with detect_ml requests
+    poll_interval_s: float = 0.05  # Backtest job status polling
+    job_timeout_s: float = 60.0  # Backtest jobs still unfinished after this count as failed
+
+
+class RequestError(Exception):
+    """A request answered with an error status or an unusable body"""
+
+
+def scenario(name: str):
+    """Register a scenario; the setup receives LoadOptions and returns the request function"""
+    def register(setup):
+        SCENARIOS[name] = setup
+        return setup
+    return register
+
+
+@functools.lru_cache(maxsize=8)
+def candle_payload(n_candles: int, seed: int = 0, timeframe: str = '1h') -> List[Dict[str, Any]]:
+    """Candles as submitted to the API (a geometric random walk, as in the benchmarks)"""
+    data = generate_ohlcv(n_candles, seed=seed, freq=TIMEFRAME_FREQ[timeframe])
+    data['timestamp'] = data['timestamp'].dt.strftime('%Y-%m-%dT%H:%M:%S')
+    return data.to_dict(orient='records')
+
+
+def _bodies(options: LoadOptions, **fields) -> Callable[[], bytes]:
+    """Encode the payloads once, so the client's own cost stays out of the latencies"""
+    bodies = itertools.cycle([
+        orjson.dumps({'data': candle_payload(options.candles, seed, options.timeframe),
+                      'timeframe': options.timeframe, **fields})
+        for seed in range(options.payloads)
+    ])
+    return lambda: next(bodies)
+
+
+async def _check(response: aiohttp.ClientResponse) -> bytes:
+    body = await response.read()
+    if response.status >= 400:
+        raise RequestError(f"HTTP {response.status}")
+    return body
+
+
+def _post_json(session: aiohttp.ClientSession, path: str, body: bytes):
+    return session.post(path, data=body, headers={'Content-Type': 'application/json'})
+
+
+@scenario('detect')
+def detect_scenario(options: LoadOptions):
+    """TA-Lib detection of a submitted candle history"""
+    body = _bodies(options)
+
+    async def request(session: aiohttp.ClientSession):
+        async with _post_json(session, '/detect/', body()) as response:
+            await _check(response)
+    return request
+
+
+@scenario('detect_ml')
+def detect_ml_scenario(options: LoadOptions):
+    """Detection including the sequence model, micro-batched across concurrent requests"""
+    fields = {'use_ml': True}
+    if options.deadline_ms:
+        fields['deadline_ms'] = options.deadline_ms
+    body = _bodies(options, **fields)
+
+    async def request(session: aiohttp.ClientSession):
+        async with _post_json(session, '/detect/', body()) as response:
+            await _check(response)
+    return request
+
+
+@scenario('detect_symbol')
+def detect_symbol_scenario(options: LoadOptions):
+    """Detection of a stream's latest candles, fetched upstream and cached in Redis"""
+    symbols = itertools.cycle(options.symbols)
+
+    async def request(session: aiohttp.ClientSession):
+        path = f'/detect/{next(symbols)}'
+        async with session.get(path, params={'timeframe': options.timeframe}) as response:
+            await _check(response)
+    return request
+
+
+@scenario('backtest')
+def backtest_scenario(options: LoadOptions):
+    """A backtest job from submission until it has finished (or job_timeout_s has passed)"""
+    body = _bodies(options)
+
+    async def request(session: aiohttp.ClientSession):
+        async with _post_json(session, '/backtests/', body()) as response:
+            job = orjson.loads(await _check(response))
+        give_up_at = time.monotonic() + options.job_timeout_s
+        while job['status'] not in ('completed', 'failed', 'cancelled'):
+            if time.monotonic() >= give_up_at:
+                raise RequestError("Backtest timeout")
+            await asyncio.sleep(options.poll_interval_s)
+            async with session.get(f"/backtests/{job['job_id']}") as response:
+                job = orjson.loads(await _check(response))
+        if job['status'] != 'completed':
+            raise RequestError(f"Backtest {job['status']}")
+    return request
+
+
+def summarize(latencies: List[float], errors: Counter, seconds: float) -> Dict[str, Any]:
+    """Throughput, latency percentiles (ms) and errors of one measured run"""
+    summary = {
+        'requests': len(latencies) + sum(errors.values()),
+        'errors': sum(errors.values()),
+        'error_breakdown': dict(errors),
+        'seconds': seconds,
+        'throughput_rps': len(latencies) / seconds if seconds > 0 else 0.0,
+        'latency_ms': {}
+    }
+    if latencies:
+        values = np.asarray(latencies) * 1000
+        summary['latency_ms'] = {
+            **{f'p{p}': float(np.percentile(values, p)) for p in LATENCY_PERCENTILES},
+            'mean': float(values.mean()),
+            'max': float(values.max())
+        }
+    return summary
+
+
+async def run_load(
+    base_url: str,
+    name: str,
+    concurrency: int,
+    duration_s: float,
+    options: LoadOptions = LoadOptions(),
+    warmup_s: float = 0.0,
+    timeout_s: float = 60.0
+) -> Dict[str, Any]:
+    """
+    Drive one scenario at a fixed number of concurrent clients
+
+    Requests started during the first warmup_s seconds are not counted.
+
+    Returns:
+        summarize() of the measured window, plus the scenario and concurrency
+    """
+    request = SCENARIOS[name](options)
+    latencies: List[float] = []
+    errors: Counter = Counter()
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=timeout_s)
+
+    async with aiohttp.ClientSession(base_url, connector=connector, timeout=timeout) as session:
+        started = time.monotonic()
+        measure_from = started + warmup_s
+        stop_at = measure_from + duration_s
+
+        async def client():
+            while time.monotonic() < stop_at:
+                start = time.monotonic()
+                error = None
+                try:
+                    await request(session)
+                except RequestError as e:
+                    error = str(e)
+                except asyncio.TimeoutError:
+                    error = 'timeout'
+                except (aiohttp.ClientError, ValueError) as e:
+                    error = type(e).__name__
+                if start < measure_from:
+                    continue
+                if error is None:
+                    latencies.append(time.monotonic() - start)
+                else:
+                    errors[error] += 1
+
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        seconds = time.monotonic() - measure_from
+
+    return {'scenario': name, 'concurrency': concurrency, **summarize(latencies, errors, seconds)}
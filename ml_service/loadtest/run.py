@@ -0,0 +1,228 @@
+"""
+Load tests of the ML service against local stand-ins
+
+Serve the API with 1, 2 and 4 workers (python -m src.serving) against a
+stand-in Binance and Redis, and drive every scenario at each concurrency:
+
+    python -m loadtest --workers 1 2 4 --concurrency 1 8 32 --duration 30
+
+Throttle the stand-in exchange to see how upstream limits surface:
+
+    python -m loadtest --scenarios detect_symbol --kline-latency-ms 80 --kline-rps 20
+
+Drive an already running service instead:
+
+    python -m loadtest --target http://localhost:8000 --scenarios detect backtest
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .driver import SCENARIOS, LoadOptions, run_load
+from .standins import KlineServer, start_fake_redis
+
+logger = logging.getLogger(__name__)
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def _free_port(host: str) -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+class ServiceProcess:
+    """The API served by python -m src.serving in a child process, for the duration of a with block"""
+
+    def __init__(
+        self,
+        workers: int,
+        env: Dict[str, str],
+        threads_per_worker: int = 1,
+        host: str = '127.0.0.1',
+        startup_timeout_s: float = 180.0,
+        log_path: Optional[Path] = None
+    ):
+        self.workers = workers
+        self.env = env
+        self.threads_per_worker = threads_per_worker
+        self.host = host
+        self.port = _free_port(host)
+        self.url = f'http://{host}:{self.port}'
+        self.startup_timeout_s = startup_timeout_s
+        self.log_path = log_path
+        self._process: Optional[subprocess.Popen] = None
+        self._log = None
+
+    def __enter__(self) -> 'ServiceProcess':
+        self._log = open(self.log_path, 'ab') if self.log_path else subprocess.DEVNULL
+        self._process = subprocess.Popen(
+            [sys.executable, '-m', 'src.serving', '--host', self.host, '--port', str(self.port),
+             '--workers', str(self.workers), '--threads-per-worker', str(self.threads_per_worker)],
+            cwd=SERVICE_DIR, env=self.env, stdout=self._log, stderr=subprocess.STDOUT
+        )
+        try:
+            self._wait_ready()
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        logger.info(f"Service with {self.workers} workers ready on {self.url}")
+        return self
+
+    def _wait_ready(self):
+        deadline = time.monotonic() + self.startup_timeout_s
+        while time.monotonic() < deadline:
+            if self._process.poll() is not None:
+                raise RuntimeError(f"Service exited with status {self._process.returncode} during startup")
+            try:
+                with urllib.request.urlopen(self.url + '/', timeout=1):
+                    return
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError(f"Service not ready after {self.startup_timeout_s}s")
+
+    def __exit__(self, exc_type, exc, traceback):
+        if self._process is not None and self._process.poll() is None:
+            # The serving master forwards SIGTERM to its workers
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+        if self.log_path and self._log is not None:
+            self._log.close()
+
+
+def run_matrix(
+    base_url: str,
+    scenarios: List[str],
+    concurrencies: List[int],
+    duration_s: float,
+    warmup_s: float = 0.0,
+    options: LoadOptions = LoadOptions()
+) -> List[Dict[str, Any]]:
+    """Run every scenario at every concurrency against one service"""
+    results = []
+    for name in scenarios:
+        for concurrency in concurrencies:
+            logger.info(f"Running {name} with {concurrency} concurrent clients against {base_url}")
+            results.append(asyncio.run(run_load(base_url, name, concurrency, duration_s, options, warmup_s)))
+    return results
+
+
+def _format_row(result: Dict[str, Any]) -> str:
+    workers = '-' if result['workers'] is None else result['workers']
+    latency = result['latency_ms']
+    percentiles = '  '.join(
+        f"{p} {latency[p]:>8.1f}ms" if p in latency else f"{p} {'-':>10}"
+        for p in ('p50', 'p95', 'p99')
+    )
+    errors = ', '.join(f"{reason} x{count}" for reason, count in sorted(result['error_breakdown'].items()))
+    return (
+        f"{workers:>3} {result['scenario']:<14} {result['concurrency']:>5}  "
+        f"{result['throughput_rps']:>9.1f} req/s  {percentiles}  "
+        f"errors {result['errors']}" + (f" ({errors})" if errors else "")
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the ML service against local stand-ins")
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32],
+                        help="Concurrent clients; each waits for its answer before sending again")
+    parser.add_argument('--duration', type=float, default=20.0, help="Measured seconds per run")
+    parser.add_argument('--warmup', type=float, default=2.0, help="Unmeasured seconds before each run")
+    parser.add_argument('--candles', type=int, default=LoadOptions().candles, help="Candles per payload")
+    parser.add_argument('--timeframe', default=LoadOptions().timeframe)
+    parser.add_argument('--deadline-ms', type=float, help="Latency budget sent with detect_ml requests")
+    parser.add_argument('--job-timeout', type=float, default=LoadOptions().job_timeout_s,
+                        help="Seconds before an unfinished backtest job counts as failed")
+    parser.add_argument('--target', help="Drive this running service instead of starting one")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1], help="Worker counts to compare")
+    parser.add_argument('--threads-per-worker', type=int, default=1)
+    parser.add_argument('--redis', help="HOST:PORT of a Redis to use instead of the in-memory stand-in")
+    parser.add_argument('--kline-latency-ms', type=float, default=50.0, help="Stand-in Binance response time")
+    parser.add_argument('--kline-jitter-ms', type=float, default=20.0)
+    parser.add_argument('--kline-rps', type=float, default=0.0, help="Stand-in Binance rate limit (0 = none)")
+    parser.add_argument('--service-log', type=Path, help="Append the service's output to this file")
+    parser.add_argument('--output', type=Path, help="Result file (default: results/<timestamp>.json)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    options = LoadOptions(
+        candles=args.candles, timeframe=args.timeframe,
+        deadline_ms=args.deadline_ms, job_timeout_s=args.job_timeout
+    )
+    matrix = dict(
+        scenarios=args.scenarios, concurrencies=args.concurrency,
+        duration_s=args.duration, warmup_s=args.warmup, options=options
+    )
+    results = []
+
+    if args.target:
+        results = [{'workers': None, **r} for r in run_matrix(args.target, **matrix)]
+    else:
+        klines = KlineServer(args.kline_latency_ms, args.kline_jitter_ms, args.kline_rps)
+        klines.start()
+        redis_server = None
+        data_dir = tempfile.TemporaryDirectory(prefix='loadtest-')
+        try:
+            if args.redis:
+                redis_host, redis_port = args.redis.rsplit(':', 1)
+            else:
+                redis_server, (redis_host, redis_port) = start_fake_redis()
+            env = {
+                **os.environ,
+                'REDIS_HOST': redis_host,
+                'REDIS_PORT': str(redis_port),
+                'BINANCE_API_URL': klines.url,
+                'DATA_DIR': data_dir.name,  # Backtest jobs and return statistics stay out of the real data
+                'PRECOMPUTE_PATTERNS': 'true',  # Serves GET /detect/{symbol}
+                'PERSIST_RESULTS': 'false'
+            }
+            for workers in args.workers:
+                with ServiceProcess(workers, env, args.threads_per_worker, log_path=args.service_log) as service:
+                    results.extend({'workers': workers, **r} for r in run_matrix(service.url, **matrix))
+        except RuntimeError as e:
+            logger.error(f"Load test aborted: {e}")
+            return 1
+        finally:
+            klines.stop()
+            data_dir.cleanup()
+            if redis_server is not None:
+                redis_server.shutdown()
+                redis_server.server_close()
+        logger.info(f"Stand-in Binance served {klines.requests} requests, throttled {klines.throttled}")
+
+    created_at = datetime.now(timezone.utc)
+    output = args.output or RESULTS_DIR / f"{created_at:%Y%m%dT%H%M%SZ}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        'created_at': created_at.isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'options': {**options._asdict(), 'duration_s': args.duration, 'warmup_s': args.warmup},
+        'results': results
+    }, indent=2))
+
+    print(f"{'wrk':>3} {'scenario':<14} {'conc':>5}  {'throughput':>15}")
+    for result in results:
+        print(_format_row(result))
+    print(f"Results written to {output}")
+    return 0
@@ -0,0 +1,180 @@
+"""
+Local stand-ins for the service's upstream dependencies
+
+KlineServer answers the Binance REST endpoints the market data fetcher
+uses; start_fake_redis serves an in-memory Redis over TCP so separate
+worker processes share it like the real one.
+"""
+import asyncio
+import logging
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Optional, Tuple
+
+import numpy as np
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+INTERVAL_MS = {
+    '1m': 60_000,
+    '5m': 5 * 60_000,
+    '15m': 15 * 60_000,
+    '30m': 30 * 60_000,
+    '1h': 3_600_000,
+    '4h': 4 * 3_600_000,
+    '1d': 24 * 3_600_000
+}
+MAX_LIMIT = 1000  # Klines per request, as on Binance
+
+
+def synthetic_klines(symbol: str, interval_ms: int, open_times: np.ndarray) -> list:
+    """
+    Deterministic klines for any symbol and time
+
+    Prices are a function of the candle's position only, so overlapping
+    requests (and separate workers) always see the same candles.
+
+    Returns:
+        Rows in the Binance kline layout
+    """
+    position = open_times // interval_ms + zlib.crc32(symbol.encode()) % 10_000
+
+    def noise(salt: int) -> np.ndarray:
+        return (np.sin(position * 12.9898 + salt * 78.233) * 43758.5453) % 1 - 0.5
+
+    close = 100 * np.exp(0.05 * np.sin(position / 50) + 0.01 * np.sin(position / 7) + 0.004 * noise(0))
+    open_ = close * (1 + 0.004 * noise(1))
+    high = np.maximum(open_, close) * (1 + 0.003 * np.abs(noise(2)))
+    low = np.minimum(open_, close) * (1 - 0.003 * np.abs(noise(3)))
+    volume = 1000 * (1.5 + noise(4))
+    return [
+        [t, f"{o:.8f}", f"{h:.8f}", f"{l:.8f}", f"{c:.8f}", f"{v:.8f}", t + interval_ms - 1,
+         f"{v * c:.8f}", 100, f"{v / 2:.8f}", f"{v * c / 2:.8f}", "0"]
+        for t, o, h, l, c, v in zip(open_times.tolist(), open_, high, low, close, volume)
+    ]
+
+
+class KlineServer:
+    """
+    Stand-in for the Binance REST API
+
+    Serves ping, time and klines (synthetic, deterministic candles up to the
+    current one) after latency_ms plus up to jitter_ms. Requests beyond
+    requests_per_second within any one second are answered 429 with a
+    Retry-After header, as Binance does when its request weight is exceeded.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        requests_per_second: float = 0.0,
+        seed: int = 0
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.requests_per_second = requests_per_second  # 0 = unlimited
+        self.requests = 0
+        self.throttled = 0
+        self._rng = np.random.default_rng(seed)
+        self._recent = deque()  # Times of the requests served in the last second
+        self._runner: Optional[web.AppRunner] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self.url: Optional[str] = None
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._simulate])
+        app.router.add_get('/api/v3/ping', self.ping)
+        app.router.add_get('/api/v3/time', self.server_time)
+        app.router.add_get('/api/v3/klines', self.klines)
+        return app
+
+    @web.middleware
+    async def _simulate(self, request: web.Request, handler):
+        self.requests += 1
+        delay = self.latency_ms + self.jitter_ms * self._rng.random()
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+        if self.requests_per_second > 0:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] >= 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.requests_per_second:
+                self.throttled += 1
+                retry_after = max(1, int(np.ceil(1.0 - (now - self._recent[0]))))
+                return web.json_response(
+                    {'code': -1003, 'msg': 'Too many requests.'},
+                    status=429, headers={'Retry-After': str(retry_after)}
+                )
+            self._recent.append(now)
+        return await handler(request)
+
+    async def ping(self, request: web.Request) -> web.Response:
+        return web.json_response({})
+
+    async def server_time(self, request: web.Request) -> web.Response:
+        return web.json_response({'serverTime': int(time.time() * 1000)})
+
+    async def klines(self, request: web.Request) -> web.Response:
+        query = request.query
+        interval_ms = INTERVAL_MS.get(query.get('interval', ''))
+        if interval_ms is None:
+            return web.json_response({'code': -1120, 'msg': 'Invalid interval.'}, status=400)
+        try:
+            limit = min(int(query.get('limit', 500)), MAX_LIMIT)
+            now_ms = int(time.time() * 1000)
+            end_ms = min(int(query.get('endTime', now_ms)), now_ms)
+            if 'startTime' in query:
+                first = -(-max(int(query['startTime']), 0) // interval_ms) * interval_ms
+                open_times = np.arange(first, end_ms + 1, interval_ms, dtype=np.int64)[:limit]
+            else:
+                last = end_ms // interval_ms * interval_ms
+                open_times = np.arange(last - (limit - 1) * interval_ms, last + 1, interval_ms, dtype=np.int64)
+        except ValueError:
+            return web.json_response({'code': -1100, 'msg': 'Illegal characters in parameter.'}, status=400)
+        return web.json_response(synthetic_klines(query.get('symbol', ''), interval_ms, open_times))
+
+    def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Serve from a background thread; returns the base URL"""
+        self._loop = asyncio.new_event_loop()
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        self._loop.run_until_complete(web.TCPSite(self._runner, host, port).start())
+        self.url = 'http://%s:%d' % self._runner.addresses[0][:2]
+        self._thread = threading.Thread(target=self._loop.run_forever, name='kline-standin', daemon=True)
+        self._thread.start()
+        logger.info(f"Kline stand-in serving on {self.url}")
+        return self.url
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+
+def start_fake_redis(host: str = '127.0.0.1', port: int = 0) -> Tuple[object, Tuple[str, int]]:
+    """
+    Serve an in-memory Redis over TCP from a background thread
+
+    Returns:
+        The server (call shutdown() to stop it) and its address
+    """
+    try:
+        from fakeredis import TcpFakeServer
+    except ImportError as e:
+        raise RuntimeError("The Redis stand-in needs fakeredis>=2.24 (pip install fakeredis)") from e
+
+    server = TcpFakeServer((host, port), server_type='redis')
+    threading.Thread(target=server.serve_forever, name='redis-standin', daemon=True).start()
+    address = server.server_address[:2]
+    logger.info(f"Redis stand-in serving on {address[0]}:{address[1]}")
+    return server, address
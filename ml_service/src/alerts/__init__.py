@@ -0,0 +1,5 @@
+from .engine import AlertEngine
+from .monitor import AlertMonitor
+from .sources import AlertSource, InMemoryAlertSource, MongoAlertSource
+
+__all__ = ['AlertEngine', 'AlertMonitor', 'AlertSource', 'InMemoryAlertSource', 'MongoAlertSource']
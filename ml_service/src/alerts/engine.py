@@ -0,0 +1,576 @@
+import numpy as np
+import pandas as pd
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from functools import cached_property
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+from ..config import ALERT_SETTINGS
+from ..models.indicators import MACD, RSI, Indicator, MovingAverageCross, VolumeSurge
+from ..monitoring.metrics import REGISTRY, time_stage
+from .sources import AlertSource
+
+logger = logging.getLogger(__name__)
+
+ALERTS_TRIGGERED = REGISTRY.counter(
+    'alerts_triggered',
+    'Alerts triggered by closed candles',
+    ('alert_type',)
+)
+ALERTS_EVALUATED = REGISTRY.counter(
+    'alerts_evaluated',
+    'Candidate alerts checked against closed candles'
+)
+
+# Conditions indexed by a sorted threshold, per (symbol, timeframe) stream
+THRESHOLD_KINDS = (
+    'price_above', 'price_below', 'price_crossover', 'price_change',
+    'rsi_above', 'rsi_below', 'volume_threshold', 'volume_increase'
+)
+
+ANY_PATTERN = '*'
+
+
+def _timestamp(value) -> Optional[pd.Timestamp]:
+    """Normalize epoch milliseconds, datetimes and strings to a UTC Timestamp"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return pd.Timestamp(int(value), unit='ms', tz='UTC')
+    timestamp = pd.Timestamp(value)
+    return timestamp.tz_localize('UTC') if timestamp.tzinfo is None else timestamp.tz_convert('UTC')
+
+
+def compile_conditions(alert: Dict[str, Any]) -> List[Tuple[str, Any]]:
+    """
+    Flatten an alert's conditions for its alertType into (kind, parameter) pairs
+
+    Pattern alerts compile to one ('patterns', entries) condition that holds
+    when any entry matches; for the other alert types every listed condition
+    must hold.
+    """
+    alert_type = alert.get('alertType')
+    conditions = alert.get('conditions') or {}
+    compiled = []
+
+    if alert_type == 'pattern':
+        entries = [
+            {
+                'name': (entry.get('name') or ANY_PATTERN).upper(),
+                'type': entry.get('type'),
+                'minConfidence': entry.get('minConfidence', 0.6)
+            }
+            for entry in conditions.get('patterns') or []
+        ]
+        if entries:
+            compiled.append(('patterns', entries))
+
+    elif alert_type == 'price':
+        price = conditions.get('price') or {}
+        for field, kind in (
+            ('above', 'price_above'), ('below', 'price_below'),
+            ('crossover', 'price_crossover'), ('percentageChange', 'price_change')
+        ):
+            if price.get(field) is not None:
+                value = float(price[field])
+                compiled.append((kind, abs(value) if kind == 'price_change' else value))
+
+    elif alert_type == 'indicator':
+        indicators = conditions.get('indicators') or {}
+        rsi = indicators.get('rsi') or {}
+        for field, kind in (('above', 'rsi_above'), ('below', 'rsi_below')):
+            if rsi.get(field) is not None:
+                compiled.append((kind, float(rsi[field])))
+        macd = indicators.get('macd') or {}
+        for field, kind in (('crossover', 'macd_crossover'), ('crossunder', 'macd_crossunder')):
+            if macd.get(field):
+                compiled.append((kind, True))
+        crossover = (indicators.get('movingAverages') or {}).get('crossover') or {}
+        if crossover.get('fast') and crossover.get('slow'):
+            compiled.append(('ma_crossover', (int(crossover['fast']), int(crossover['slow']))))
+
+    elif alert_type == 'volume':
+        volume = conditions.get('volume') or {}
+        for field, kind in (('threshold', 'volume_threshold'), ('percentageIncrease', 'volume_increase')):
+            if volume.get(field) is not None:
+                compiled.append((kind, float(volume[field])))
+
+    return compiled
+
+
+class _ThresholdIndex:
+    """Alerts sorted by threshold, so the ones a value satisfies are a slice"""
+
+    def __init__(self):
+        self._entries: List[Tuple[float, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, threshold: float, alert_id: str):
+        insort(self._entries, (threshold, alert_id))
+
+    def remove(self, threshold: float, alert_id: str):
+        i = bisect_left(self._entries, (threshold, alert_id))
+        if i < len(self._entries) and self._entries[i] == (threshold, alert_id):
+            del self._entries[i]
+
+    def below(self, value: float) -> List[str]:
+        """Alerts with threshold < value"""
+        end = bisect_left(self._entries, (value,))
+        return [alert_id for _, alert_id in self._entries[:end]]
+
+    def at_most(self, value: float) -> List[str]:
+        """Alerts with threshold <= value"""
+        end = bisect_right(self._entries, (value, chr(0x10FFFF)))
+        return [alert_id for _, alert_id in self._entries[:end]]
+
+    def above(self, value: float) -> List[str]:
+        """Alerts with threshold > value"""
+        start = bisect_right(self._entries, (value, chr(0x10FFFF)))
+        return [alert_id for _, alert_id in self._entries[start:]]
+
+    def between(self, low: float, high: float) -> List[str]:
+        """Alerts with low < threshold <= high"""
+        start = bisect_right(self._entries, (low, chr(0x10FFFF)))
+        end = bisect_right(self._entries, (high, chr(0x10FFFF)))
+        return [alert_id for _, alert_id in self._entries[start:end]]
+
+
+class _CandleBuffer:
+    """Most recent closed candles of a stream as contiguous OHLCV arrays"""
+
+    COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        # Twice the capacity, so the window only shifts once every `capacity` appends
+        self._data = np.empty((len(self.COLUMNS), 2 * capacity), dtype=np.float64)
+        self._start = 0
+        self._end = 0
+        self.last_timestamp: Optional[pd.Timestamp] = None
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def append(self, candle: Dict[str, Any]):
+        if self._end == self._data.shape[1]:
+            keep = self.capacity - 1
+            self._data[:, :keep] = self._data[:, self._end - keep:self._end]
+            self._start, self._end = 0, keep
+        self._data[:, self._end] = [candle[column] for column in self.COLUMNS]
+        self._end += 1
+        self._start = max(self._start, self._end - self.capacity)
+
+    def column(self, name: str) -> np.ndarray:
+        return self._data[self.COLUMNS.index(name), self._start:self._end]
+
+    def frame(self) -> pd.DataFrame:
+        return pd.DataFrame({column: self.column(column) for column in self.COLUMNS})
+
+
+class _CandleContext:
+    """
+    Values derived from a stream's latest closed candle
+
+    Indicators come from the stream's incremental state; patterns are
+    detected on first use. Either way each value is computed once and
+    shared by all alerts evaluated against the candle.
+    """
+
+    def __init__(self, buffer: _CandleBuffer, indicators: Dict[Tuple, Indicator], detector=None):
+        self.buffer = buffer
+        self.indicators = indicators
+        self.detector = detector
+        self.close_prices = buffer.column('close')
+        self.volumes = buffer.column('volume')
+        self.close = float(self.close_prices[-1])
+        self.volume = float(self.volumes[-1])
+        self._patterns: Dict[str, Tuple[int, float]] = {}
+        self._all_patterns = False
+
+    @property
+    def previous_close(self) -> Optional[float]:
+        return float(self.close_prices[-2]) if len(self.close_prices) > 1 else None
+
+    @cached_property
+    def price_change(self) -> float:
+        """Absolute close-to-close change in percent"""
+        if not self.previous_close:
+            return 0.0
+        return abs(self.close / self.previous_close - 1) * 100
+
+    @property
+    def rsi(self) -> float:
+        return self.indicators[('rsi',)].value
+
+    @property
+    def macd_cross(self) -> int:
+        """1 when MACD crossed above its signal on this candle, -1 below, else 0"""
+        return self.indicators[('macd',)].cross
+
+    def moving_average_cross(self, fast: int, slow: int) -> int:
+        """1 when SMA(fast) crossed above SMA(slow) on this candle, -1 below, else 0"""
+        return self.indicators[('ma_crossover', fast, slow)].value
+
+    @property
+    def volume_increase(self) -> float:
+        """Volume over the average of the previous candles, in percent (NaN while warming up)"""
+        return self.indicators[('volume_increase',)].value
+
+    def patterns(self, names: Iterable[str]) -> Dict[str, Tuple[int, float]]:
+        """
+        TA-Lib patterns completed on this candle
+
+        Returns:
+            Mapping of pattern name to (direction, confidence) for the
+            requested names present on the latest candle
+        """
+        if ANY_PATTERN in names:
+            wanted = set() if self._all_patterns else None
+        else:
+            wanted = set(names) - set(self._patterns)
+        if self.detector is not None and (wanted is None or wanted):
+            # Only the latest candle is read, so TA-Lib runs over its lookback alone
+            frame = self.buffer.frame()
+            signals = self.detector.detect_pattern_signals(frame, wanted, since_index=len(frame) - 1)
+            for name, signal in signals.items():
+                value = int(signal[-1]) if len(signal) else 0
+                self._patterns[name] = (int(np.sign(value)), abs(value) / 100.0)
+            self._all_patterns = self._all_patterns or wanted is None
+        return {name: hit for name, hit in self._patterns.items() if hit[1] > 0}
+
+
+class _Stream:
+    """Active alerts and candle history of one (symbol, timeframe) stream"""
+
+    def __init__(self, history_bars: int):
+        self.candles = _CandleBuffer(history_bars)
+        self.alerts: Dict[str, Tuple[Dict[str, Any], List[Tuple[str, Any]]]] = {}
+        self.thresholds = {kind: _ThresholdIndex() for kind in THRESHOLD_KINDS}
+        self.flags: Dict[str, Set[str]] = {'macd_crossover': set(), 'macd_crossunder': set()}
+        self.moving_averages: Dict[Tuple[int, int], Set[str]] = defaultdict(set)
+        self.patterns: Dict[str, Set[str]] = defaultdict(set)
+        # Incremental indicators needed by this stream's alerts, updated every candle
+        self.indicators: Dict[Tuple, Indicator] = {}
+
+    def require_indicator(self, kind: str, parameter: Any):
+        """Create the indicator a condition reads, seeded from the candle history"""
+        if kind in ('rsi_above', 'rsi_below'):
+            key, factory = ('rsi',), lambda: RSI(ALERT_SETTINGS['rsi_period'])
+        elif kind in ('macd_crossover', 'macd_crossunder'):
+            settings = ALERT_SETTINGS['macd']
+            key, factory = ('macd',), lambda: MACD(settings['fast'], settings['slow'], settings['signal'])
+        elif kind == 'ma_crossover':
+            key, factory = ('ma_crossover', *parameter), lambda: MovingAverageCross(*parameter)
+        elif kind == 'volume_increase':
+            key, factory = ('volume_increase',), lambda: VolumeSurge(ALERT_SETTINGS['volume_lookback'])
+        else:
+            return
+        if key not in self.indicators:
+            indicator = factory()
+            column = 'volume' if kind == 'volume_increase' else 'close'
+            indicator.batch(self.candles.column(column))
+            self.indicators[key] = indicator
+
+    def update_indicators(self, candle: Dict[str, Any]):
+        for key, indicator in self.indicators.items():
+            indicator.update(candle['volume' if key[0] == 'volume_increase' else 'close'])
+
+    def index(self, alert_id: str, kind: str, parameter: Any, add: bool = True):
+        """Add (or remove) an alert under its primary condition"""
+        if kind in self.thresholds:
+            index = self.thresholds[kind]
+            (index.add if add else index.remove)(parameter, alert_id)
+            return
+        if kind in self.flags:
+            bucket = self.flags[kind]
+        elif kind == 'ma_crossover':
+            bucket = self.moving_averages[parameter]
+        else:
+            for name in {entry['name'] for entry in parameter}:
+                (self.patterns[name].add if add else self.patterns[name].discard)(alert_id)
+            return
+        (bucket.add if add else bucket.discard)(alert_id)
+
+    def candidates(self, context: _CandleContext) -> Set[str]:
+        """Alerts whose primary condition holds for the candle"""
+        thresholds = self.thresholds
+        found: Set[str] = set()
+
+        if len(thresholds['price_above']):
+            found.update(thresholds['price_above'].below(context.close))
+        if len(thresholds['price_below']):
+            found.update(thresholds['price_below'].above(context.close))
+        if len(thresholds['price_crossover']) and context.previous_close is not None:
+            low, high = sorted((context.previous_close, context.close))
+            found.update(thresholds['price_crossover'].between(low, high))
+        if len(thresholds['price_change']):
+            found.update(thresholds['price_change'].at_most(context.price_change))
+        if len(thresholds['rsi_above']) and not np.isnan(context.rsi):
+            found.update(thresholds['rsi_above'].below(context.rsi))
+        if len(thresholds['rsi_below']) and not np.isnan(context.rsi):
+            found.update(thresholds['rsi_below'].above(context.rsi))
+        if len(thresholds['volume_threshold']):
+            found.update(thresholds['volume_threshold'].at_most(context.volume))
+        if len(thresholds['volume_increase']) and not np.isnan(context.volume_increase):
+            found.update(thresholds['volume_increase'].at_most(context.volume_increase))
+
+        if self.flags['macd_crossover'] and context.macd_cross == 1:
+            found.update(self.flags['macd_crossover'])
+        if self.flags['macd_crossunder'] and context.macd_cross == -1:
+            found.update(self.flags['macd_crossunder'])
+        for (fast, slow), alert_ids in self.moving_averages.items():
+            if alert_ids and context.moving_average_cross(fast, slow) == 1:
+                found.update(alert_ids)
+
+        names = [name for name, alert_ids in self.patterns.items() if alert_ids]
+        if names:
+            detected = context.patterns(names)
+            for name in detected:
+                found.update(self.patterns.get(name, ()))
+            if detected:
+                found.update(self.patterns.get(ANY_PATTERN, ()))
+
+        return found
+
+
+class AlertEngine:
+    """
+    Evaluates active alerts against closed candles
+
+    Alerts are indexed by (symbol, timeframe) and, within a stream, by their
+    first condition: thresholds in sorted lists, pattern alerts by pattern
+    name. A closed candle only touches its own stream, computes each derived
+    value (patterns, RSI, MACD, moving averages) at most once, and fully
+    checks only the alerts whose indexed condition already holds.
+    """
+
+    def __init__(
+        self,
+        detector=None,
+        source: Optional[AlertSource] = None,
+        history_bars: int = ALERT_SETTINGS['history_bars']
+    ):
+        """
+        Args:
+            detector: PatternDetector used for pattern alerts
+            source: Where active alerts are loaded from and triggers recorded
+            history_bars: Closed candles kept per stream for indicators
+        """
+        self.detector = detector
+        self.source = source
+        self.history_bars = history_bars
+        self._streams: Dict[Tuple[str, str], _Stream] = {}
+        self._alert_streams: Dict[str, Tuple[str, str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._alert_streams)
+
+    def load_alerts(self) -> int:
+        """
+        Index every active alert from the source, dropping indexed alerts it
+        no longer lists as active; returns the number indexed
+        """
+        alerts = list(self.source.active_alerts())
+        active = {str(alert['_id']) for alert in alerts}
+        for alert_id in [alert_id for alert_id in self._alert_streams if alert_id not in active]:
+            self.remove_alert(alert_id)
+        return sum(self.add_alert(alert) for alert in alerts)
+
+    def streams(self) -> List[Tuple[str, str]]:
+        """(symbol, timeframe) streams with active alerts"""
+        return [key for key, stream in self._streams.items() if stream.alerts]
+
+    def add_alert(self, alert: Dict[str, Any]) -> bool:
+        """
+        Index an alert document (Alert model fields)
+
+        Returns:
+            False if the alert is not active or has no usable conditions
+        """
+        alert_id = str(alert['_id'])
+        self.remove_alert(alert_id)
+        if alert.get('status', 'active') != 'active':
+            return False
+
+        conditions = compile_conditions(alert)
+        if not conditions:
+            logger.warning(f"Alert {alert_id} has no conditions for type {alert.get('alertType')}")
+            return False
+
+        key = (alert['symbol'], alert['timeframe'])
+        stream = self._stream(key)
+        for kind, parameter in conditions:
+            stream.require_indicator(kind, parameter)
+        stream.alerts[alert_id] = (alert, conditions)
+        stream.index(alert_id, *conditions[0])
+        self._alert_streams[alert_id] = key
+        return True
+
+    def remove_alert(self, alert_id: str):
+        key = self._alert_streams.pop(str(alert_id), None)
+        if key is None:
+            return
+        stream = self._streams[key]
+        _, conditions = stream.alerts.pop(str(alert_id))
+        stream.index(str(alert_id), *conditions[0], add=False)
+
+    def alerts_for(self, symbol: str, timeframe: str) -> List[Dict[str, Any]]:
+        stream = self._streams.get((symbol, timeframe))
+        return [alert for alert, _ in stream.alerts.values()] if stream else []
+
+    def seed(self, symbol: str, timeframe: str, candles: Iterable[Dict[str, Any]]):
+        """Append past closed candles to a stream's history without evaluating alerts on them"""
+        stream = self._stream((symbol, timeframe))
+        for candle in candles:
+            timestamp = _timestamp(candle.get('timestamp'))
+            if timestamp is not None and stream.candles.last_timestamp is not None \
+                    and timestamp <= stream.candles.last_timestamp:
+                continue
+            stream.candles.append(candle)
+            stream.candles.last_timestamp = timestamp
+            stream.update_indicators(candle)
+
+    def on_candle(self, symbol: str, timeframe: str, candle: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Evaluate the alerts subscribed to a stream against its newly closed candle
+
+        Args:
+            symbol: Trading pair symbol
+            timeframe: Candle timeframe
+            candle: Closed candle with timestamp, open, high, low, close and volume
+
+        Returns:
+            One trigger per alert that fired
+        """
+        stream = self._stream((symbol, timeframe))
+        timestamp = _timestamp(candle.get('timestamp'))
+        if timestamp is not None and stream.candles.last_timestamp is not None \
+                and timestamp <= stream.candles.last_timestamp:
+            # Replayed or out-of-order candle
+            return []
+        stream.candles.append(candle)
+        stream.candles.last_timestamp = timestamp
+        stream.update_indicators(candle)
+        if not stream.alerts:
+            return []
+
+        with time_stage('alerts'):
+            context = _CandleContext(stream.candles, stream.indicators, self.detector)
+            triggers = []
+            for alert_id in sorted(stream.candidates(context)):
+                alert, conditions = stream.alerts[alert_id]
+                ALERTS_EVALUATED.inc()
+                if self._expired(alert, timestamp):
+                    self.remove_alert(alert_id)
+                    continue
+                details = self._check(conditions, context)
+                if details is not None:
+                    triggers.append(self._trigger(alert, symbol, timeframe, timestamp, context, details))
+        return triggers
+
+    def _stream(self, key: Tuple[str, str]) -> _Stream:
+        if key not in self._streams:
+            self._streams[key] = _Stream(self.history_bars)
+        return self._streams[key]
+
+    @staticmethod
+    def _expired(alert: Dict[str, Any], timestamp: Optional[pd.Timestamp]) -> bool:
+        expires_at = _timestamp(alert.get('expiresAt'))
+        return expires_at is not None and timestamp is not None and expires_at < timestamp
+
+    @staticmethod
+    def _check(conditions: List[Tuple[str, Any]], context: _CandleContext) -> Optional[Dict[str, Any]]:
+        """Details of the match if every condition holds, else None"""
+        details: Dict[str, Any] = {}
+        for kind, parameter in conditions:
+            if kind == 'patterns':
+                names = [entry['name'] for entry in parameter]
+                detected = context.patterns(names)
+                matched = []
+                for entry in parameter:
+                    candidates = detected if entry['name'] == ANY_PATTERN else \
+                        {entry['name']: detected[entry['name']]} if entry['name'] in detected else {}
+                    for name, (direction, confidence) in candidates.items():
+                        pattern_type = _pattern_type(name, direction)
+                        if confidence >= entry['minConfidence'] and entry['type'] in (None, pattern_type):
+                            matched.append({'pattern_name': name, 'pattern_type': pattern_type, 'confidence': confidence})
+                if not matched:
+                    return None
+                details['patterns'] = matched
+            elif kind == 'price_above':
+                if not context.close > parameter:
+                    return None
+            elif kind == 'price_below':
+                if not context.close < parameter:
+                    return None
+            elif kind == 'price_crossover':
+                previous = context.previous_close
+                if previous is None or not min(previous, context.close) < parameter <= max(previous, context.close):
+                    return None
+            elif kind == 'price_change':
+                if not context.price_change >= parameter:
+                    return None
+                details['price_change'] = context.price_change
+            elif kind in ('rsi_above', 'rsi_below'):
+                rsi = context.rsi
+                if np.isnan(rsi) or not (rsi > parameter if kind == 'rsi_above' else rsi < parameter):
+                    return None
+                details['rsi'] = rsi
+            elif kind in ('macd_crossover', 'macd_crossunder'):
+                if context.macd_cross != (1 if kind == 'macd_crossover' else -1):
+                    return None
+            elif kind == 'ma_crossover':
+                if context.moving_average_cross(*parameter) != 1:
+                    return None
+            elif kind == 'volume_threshold':
+                if not context.volume >= parameter:
+                    return None
+            elif kind == 'volume_increase':
+                if np.isnan(context.volume_increase) or not context.volume_increase >= parameter:
+                    return None
+                details['volume_increase'] = context.volume_increase
+        return details
+
+    def _trigger(
+        self,
+        alert: Dict[str, Any],
+        symbol: str,
+        timeframe: str,
+        timestamp: Optional[pd.Timestamp],
+        context: _CandleContext,
+        details: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        alert_id = str(alert['_id'])
+        once = (alert.get('notification') or {}).get('frequency', 'once') == 'once'
+        alert['triggerCount'] = alert.get('triggerCount', 0) + 1
+        alert['lastTriggered'] = timestamp
+        if once:
+            alert['status'] = 'triggered'
+            self.remove_alert(alert_id)
+        if self.source is not None:
+            self.source.record_trigger(
+                alert_id,
+                timestamp.to_pydatetime() if timestamp is not None else None,
+                alert.get('status', 'active')
+            )
+        ALERTS_TRIGGERED.inc(alert_type=alert['alertType'])
+
+        return {
+            'alert_id': alert_id,
+            'symbol': symbol,
+            'timeframe': timeframe,
+            'alert_type': alert['alertType'],
+            'message': (alert.get('notification') or {}).get('message'),
+            'timestamp': timestamp,
+            'close': context.close,
+            'volume': context.volume,
+            **details
+        }
+
+
+def _pattern_type(name: str, direction: int) -> str:
+    if name in ALERT_SETTINGS['neutral_patterns']:
+        return 'neutral'
+    return 'bullish' if direction > 0 else 'bearish'
@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import fcntl
+import logging
+import os
+import time
+from ..config import ALERT_SETTINGS
+from ..data.candles import OHLCV_COLUMNS, ohlcv_column
+from ..data.market_data import TIMEFRAME_SECONDS, MarketDataFetcher
+from ..data.pattern_index import timestamps_ms
+from ..jobs.precompute import candle_boundary
+from .engine import AlertEngine
+
+logger = logging.getLogger(__name__)
+
+Stream = Tuple[str, str]
+
+
+def _utc(milliseconds: int) -> datetime:
+    return pd.Timestamp(milliseconds, unit='ms').to_pydatetime()
+
+
+class AlertMonitor:
+    """
+    Feeds the closed candles of every alerted stream to an AlertEngine
+
+    Shortly after each candle close of a timeframe with active alerts, the
+    alerted streams are fetched together and their candles newer than the
+    last one fed are passed to the engine on a worker thread. The first
+    fetch of a stream only seeds its history (indicators warm up on it) and
+    evaluates the newest candle, so past candles never fire alerts. Alerts
+    are re-read from the engine's source every reload_interval_s.
+
+    Alerts must fire once per candle, so only one process (pre-fork worker)
+    runs them: the one holding an exclusive flock on lock_path, which the
+    kernel releases if it dies. The other workers try to take it every
+    round.
+    """
+
+    def __init__(
+        self,
+        engine: AlertEngine,
+        fetcher: Optional[MarketDataFetcher] = None,
+        lock_path: Optional[Path] = None,
+        settle_delay_s: float = ALERT_SETTINGS['settle_delay_s'],
+        poll_interval_s: float = ALERT_SETTINGS['poll_interval_s'],
+        reload_interval_s: float = ALERT_SETTINGS['reload_interval_s'],
+        source: str = ALERT_SETTINGS['source'],
+        clock: Callable[[], float] = time.time
+    ):
+        self.engine = engine
+        self.fetcher = fetcher if fetcher is not None else MarketDataFetcher()
+        self.lock_path = Path(lock_path or ALERT_SETTINGS['lock_path'])
+        self.settle_delay_s = settle_delay_s
+        self.poll_interval_s = poll_interval_s
+        self.reload_interval_s = reload_interval_s
+        self.source = source
+        self.clock = clock
+        self._lock_fd: Optional[int] = None
+        self._next_reload = 0.0
+        self._last_time: Dict[Stream, int] = {}  # Open time (epoch ms) of the last candle fed
+        self._worker: Optional[asyncio.Task] = None
+        # The engine is not thread-safe; one thread runs all of its work
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='alerts')
+
+    def start(self):
+        """Start the monitoring task on the running event loop"""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def _lead(self) -> bool:
+        """Whether this process evaluates the alerts, taking the lock if it is free"""
+        if self._lock_fd is not None:
+            return True
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        self._next_reload = 0.0  # Taking over: read the alerts as they are now
+        return True
+
+    async def poll(self) -> List[Dict[str, Any]]:
+        """Feed the candles closed since the last round; returns the triggers fired"""
+        if not self._lead():
+            return []
+        loop = asyncio.get_running_loop()
+        now = self.clock()
+        if now >= self._next_reload:
+            await loop.run_in_executor(self._executor, self.engine.load_alerts)
+            self._next_reload = now + self.reload_interval_s
+
+        due: Dict[Tuple[str, int], List[str]] = {}
+        for symbol, timeframe in self.engine.streams():
+            close_time = candle_boundary(timeframe, now - self.settle_delay_s)
+            period_ms = TIMEFRAME_SECONDS[timeframe] * 1000
+            if self._last_time.get((symbol, timeframe), -1) + period_ms < close_time:
+                due.setdefault((timeframe, close_time), []).append(symbol)
+
+        triggers = []
+        for (timeframe, close_time), symbols in due.items():
+            period_ms = TIMEFRAME_SECONDS[timeframe] * 1000
+            frames = await self.fetcher.fetch_many(
+                [(symbol, timeframe) for symbol in symbols],
+                start_time=_utc(close_time - self.engine.history_bars * period_ms),
+                end_time=_utc(close_time - 1),
+                source=self.source
+            )
+            for (symbol, _), data in frames.items():
+                try:
+                    triggers += await loop.run_in_executor(self._executor, self._feed, symbol, timeframe, data)
+                except Exception as e:
+                    logger.error(f"Error evaluating alerts for {symbol} {timeframe}: {e}")
+        if triggers:
+            logger.info(f"{len(triggers)} alerts triggered")
+        return triggers
+
+    def _feed(self, symbol: str, timeframe: str, data: pd.DataFrame) -> List[Dict[str, Any]]:
+        times = timestamps_ms(data)
+        if not len(times):
+            return []
+        columns = {name: ohlcv_column(data, name) for name in OHLCV_COLUMNS}
+        last = self._last_time.get((symbol, timeframe))
+        first_new = 0 if last is None else int(np.searchsorted(times, last, side='right'))
+        candles = [
+            {'timestamp': int(times[i]), **{name: float(values[i]) for name, values in columns.items()}}
+            for i in range(first_new, len(times))
+        ]
+        if last is None or (first_new == 0 and len(candles) > 1):
+            # New stream, or one not fed for longer than the fetched history
+            self.engine.seed(symbol, timeframe, candles[:-1])
+            candles = candles[-1:]
+
+        triggers = []
+        for candle in candles:
+            triggers += self.engine.on_candle(symbol, timeframe, candle)
+        self._last_time[(symbol, timeframe)] = int(times[-1])
+        return triggers
+
+    def _next_wake(self, now: float) -> float:
+        """Seconds until the next close of an alerted timeframe has settled, capped by the poll interval"""
+        wait = self.poll_interval_s
+        for timeframe in {timeframe for _, timeframe in self.engine.streams()}:
+            period = TIMEFRAME_SECONDS[timeframe]
+            settled = ((now - self.settle_delay_s) // period + 1) * period + self.settle_delay_s
+            wait = min(wait, settled - now)
+        return wait
+
+    async def _run(self):
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.error(f"Error in alert round: {e}")
+            await asyncio.sleep(max(0.0, self._next_wake(self.clock())))
@@ -0,0 +1,74 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+import logging
+from ..config import MONGODB_URL, MONGODB_DB_NAME
+
+logger = logging.getLogger(__name__)
+
+
+class AlertSource(ABC):
+    """Where the alert engine loads active alerts from and records triggers"""
+
+    @abstractmethod
+    def active_alerts(self) -> Iterable[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def record_trigger(self, alert_id: str, triggered_at: Optional[datetime], status: str):
+        ...
+
+
+class InMemoryAlertSource(AlertSource):
+    """Alert documents held in a dict, for tests and local runs"""
+
+    def __init__(self, alerts: Iterable[Dict[str, Any]] = ()):
+        self.alerts: Dict[str, Dict[str, Any]] = {}
+        self.triggers: List[Dict[str, Any]] = []
+        for alert in alerts:
+            self.add(alert)
+
+    def add(self, alert: Dict[str, Any]):
+        self.alerts[str(alert['_id'])] = alert
+
+    def active_alerts(self) -> List[Dict[str, Any]]:
+        return [alert for alert in self.alerts.values() if alert.get('status', 'active') == 'active']
+
+    def record_trigger(self, alert_id: str, triggered_at: Optional[datetime], status: str):
+        alert = self.alerts.get(alert_id)
+        if alert is not None:
+            alert['status'] = status
+        self.triggers.append({'alert_id': alert_id, 'triggered_at': triggered_at, 'status': status})
+
+
+class MongoAlertSource(AlertSource):
+    """Alerts stored by the backend's Alert model"""
+
+    def __init__(self, url: str = MONGODB_URL, database: str = MONGODB_DB_NAME, collection: str = 'alerts'):
+        from pymongo import MongoClient
+
+        self.collection = MongoClient(url)[database][collection]
+
+    def active_alerts(self) -> Iterable[Dict[str, Any]]:
+        return self.collection.find({
+            'status': 'active',
+            '$or': [
+                {'expiresAt': {'$exists': False}},
+                {'expiresAt': {'$gt': datetime.utcnow()}}
+            ]
+        })
+
+    def record_trigger(self, alert_id: str, triggered_at: Optional[datetime], status: str):
+        from bson import ObjectId
+
+        try:
+            # Mirrors Alert.trigger() in the backend
+            self.collection.update_one(
+                {'_id': ObjectId(alert_id) if ObjectId.is_valid(alert_id) else alert_id},
+                {
+                    '$inc': {'triggerCount': 1},
+                    '$set': {'lastTriggered': triggered_at or datetime.utcnow(), 'status': status}
+                }
+            )
+        except Exception as e:
+            logger.error(f"Error recording trigger for alert {alert_id}: {e}")
@@ -8,7 +8,7 @@ load_dotenv()
 # Base paths
 BASE_DIR = Path(__file__).resolve().parent.parent
 MODELS_DIR = BASE_DIR / "models"
-DATA_DIR = BASE_DIR / "data"
+DATA_DIR = Path(os.getenv("DATA_DIR", BASE_DIR / "data"))
 
 # Ensure directories exist
 MODELS_DIR.mkdir(exist_ok=True)
@@ -28,8 +28,22 @@ REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 REDIS_DB = int(os.getenv("REDIS_DB", 0))
 
+# Binance REST API (point at a local stand-in to load test without the exchange)
+BINANCE_API_URL = os.getenv("BINANCE_API_URL", "https://api.binance.com")
+
 # Model settings
 MODEL_CONFIG = {
+    "model_type": os.getenv("PATTERN_MODEL_TYPE", "cnn"),  # cnn or transformer
+    "sequence": {
+        "checkpoint": MODELS_DIR / "candle_cnn.pt",
+        "window_size": 10,
+        "channels": 32,
+        "kernel_size": 3,
+        # Labelling of training windows from forward returns
+        "horizon": 5,  # Candles after the window used for the label
+        "move_threshold": 0.01,  # Forward/trend return counted as a move
+        "flat_threshold": 0.002  # Forward return counted as indecision
+    },
     "transformer": {
         "model_name": "bert-base-uncased",  # Default model, can be changed
         "num_labels": len([
@@ -40,9 +54,38 @@ MODEL_CONFIG = {
             "INDECISION"
         ]),
         "max_length": 128
+    },
+    "inference": {
+        # torch, quantized (int8 Linear layers only; convolutions stay fp32) or onnx
+        "backend": os.getenv("INFERENCE_BACKEND", "torch"),
+        "intra_op_threads": int(os.getenv("INFERENCE_THREADS", 0)),  # 0 = library default
+        "batch_size": 256,  # Windows per forward pass
+        "onnx_path": MODELS_DIR / "pattern_model.onnx",
+        "max_drift": 0.05,  # Max probability difference allowed vs fp32
+        "min_agreement": 0.98,  # Min fraction of identical labels vs fp32
+        "micro_batch_max_windows": 4096,  # Windows per shared forward pass
+        "micro_batch_max_wait_ms": 2.0,  # Time to wait for concurrent requests
+        # Deadline-aware detection: model windows inferred within a caller's budget
+        "initial_window_cost_s": 0.0001,  # Per-window cost assumed before any timing
+        "window_cost_smoothing": 0.3,  # Weight of the latest call in the cost estimate
+        "deadline_safety_factor": 0.8  # Fraction of the remaining time spent on inference
     }
 }
 
+# Pre-fork serving settings (python -m src.serving)
+SERVING_SETTINGS = {
+    "host": os.getenv("SERVING_HOST", "0.0.0.0"),
+    "port": int(os.getenv("SERVING_PORT", 8000)),
+    "workers": int(os.getenv("SERVING_WORKERS", 0)),  # 0 = one per available core
+    "threads_per_worker": int(os.getenv("SERVING_THREADS_PER_WORKER", 1)),  # torch intra-op threads
+    "pin_cores": os.getenv("SERVING_PIN_CORES", "True").lower() == "true",
+    "state_directory": DATA_DIR / "serving",  # Metrics and profiles shared by the workers
+    "metrics_interval_s": 1.0,  # How often each worker publishes its metrics
+    "quick_exit_s": 10.0,  # A worker exiting sooner than this after its start failed quickly
+    "restart_backoff_s": 0.5,  # Delay before restarting after a quick failure, doubled for each
+    "max_restart_backoff_s": 30.0
+}
+
 # Pattern detection settings
 PATTERN_SETTINGS = {
     "min_pattern_length": 1,
@@ -55,13 +98,86 @@ PATTERN_SETTINGS = {
 MARKET_DATA = {
     "default_timeframe": "1h",
     "available_timeframes": ["1m", "5m", "15m", "30m", "1h", "4h", "1d"],
-    "max_lookback_periods": 500
+    "max_lookback_periods": 500,
+    "candle_dtype": "float32"  # Price/volume dtype of CandleSeries from fetch_candles
+}
+
+# Bulk historical downloads (python -m src.data.backfill)
+BACKFILL_SETTINGS = {
+    "base_url": BINANCE_API_URL,
+    "directory": DATA_DIR / "backfill",
+    "page_size": 1000,  # Klines per request (the Binance maximum)
+    "concurrency": int(os.getenv("BACKFILL_CONCURRENCY", 8)),  # Requests in flight
+    "requests_per_second": float(os.getenv("BACKFILL_REQUESTS_PER_SECOND", 10)),
+    "flush_bars": 100_000,  # Candles buffered per stream before a part file is written
+    "max_retries": 5,
+    "retry_backoff_s": 0.5,  # Doubled after every failed attempt
+    "timeout_s": 30
 }
 
 # Cache settings
 CACHE_SETTINGS = {
     "pattern_cache_ttl": 3600,  # 1 hour
-    "market_data_cache_ttl": 300  # 5 minutes
+    "market_data_cache_ttl": 300,  # 5 minutes
+    "redis_max_connections": int(os.getenv("REDIS_MAX_CONNECTIONS", 32)),  # Per process
+    "redis_pool_timeout": 5,  # Seconds to wait for a free pooled connection
+    "upstream_concurrency": 16  # Cache misses fetched upstream at once by fetch_many
+}
+
+# Background detection for the most requested streams right after each candle close
+PRECOMPUTE_SETTINGS = {
+    "enabled": os.getenv("PRECOMPUTE_PATTERNS", "false").lower() == "true",
+    "hot_set_size": int(os.getenv("PRECOMPUTE_HOT_SET_SIZE", 50)),  # Streams precomputed per close
+    "min_popularity": 2.0,  # Decayed request count before a stream is precomputed
+    "popularity_half_life_s": 3600,
+    "max_tracked": 10000,  # Streams tracked before the least popular are forgotten
+    "settle_delay_s": 2.0,  # Wait after a close so the exchange has finalized the candle
+    "poll_interval_s": 30.0,  # Longest sleep, so newly hot streams are picked up
+    "retry_backoff_s": 5.0,  # First wait before a failed stream is retried, doubling per failure
+    "max_retry_backoff_s": 300.0,
+    "lookback_bars": MARKET_DATA["max_lookback_periods"],
+    "source": "binance",
+    "use_ml": False
+}
+
+# Request profiling settings
+PROFILING_SETTINGS = {
+    "sample_rate": float(os.getenv("PROFILING_SAMPLE_RATE", 0.0)),  # Fraction of requests profiled
+    "latency_threshold_ms": float(os.getenv("PROFILING_LATENCY_THRESHOLD_MS", 1000)),
+    "max_profiles": int(os.getenv("PROFILING_MAX_PROFILES", 20)),
+    # A profiled request runs alone; it waits this long for the requests in flight to finish
+    "drain_timeout_ms": float(os.getenv("PROFILING_DRAIN_TIMEOUT_MS", 1000)),
+    "header": "X-Profile"  # Send "X-Profile: 1" to profile a single request
+}
+
+# Pattern occurrence index settings
+PATTERN_INDEX_SETTINGS = {
+    "directory": DATA_DIR / "pattern_index",
+    "context_bars": 32  # Bars of history re-read when appending new candles
+}
+
+# Materialized forward-return statistics of pattern occurrences
+FORWARD_RETURN_SETTINGS = {
+    "directory": DATA_DIR / "forward_returns",
+    "horizons": [1, 3, 5, 10, 20],  # Bars after the pattern's last candle
+    "relative_accuracy": 0.01,  # Quantile sketch error relative to the value
+    "quantiles": [0.05, 0.25, 0.5, 0.75, 0.95],
+    "context_bars": 32  # Bars of history re-read when appending new candles
+}
+
+# Alert evaluation settings
+ALERT_SETTINGS = {
+    "enabled": os.getenv("EVALUATE_ALERTS", "false").lower() == "true",
+    "history_bars": 256,  # Closed candles kept per (symbol, timeframe) stream
+    "settle_delay_s": 2.0,  # Wait after a close so the exchange has finalized the candle
+    "poll_interval_s": 30.0,  # Longest sleep, so new alert streams are picked up
+    "reload_interval_s": 60.0,  # How often alerts are re-read from the source
+    "lock_path": DATA_DIR / "alerts.lock",  # Held by the one process evaluating alerts
+    "source": "binance",
+    "rsi_period": 14,
+    "macd": {"fast": 12, "slow": 26, "signal": 9},
+    "volume_lookback": 20,  # Candles averaged for volume percentageIncrease
+    "neutral_patterns": ["DOJI", "SPINNING_TOP"]  # Reported as 'neutral' whatever their sign
 }
 
 # Backtesting settings
@@ -69,5 +185,23 @@ BACKTEST_SETTINGS = {
     "default_period": "1y",
     "available_periods": ["1m", "3m", "6m", "1y", "2y", "5y"],
     "min_trades": 30,
-    "transaction_costs": 0.001  # 0.1% per trade
-} 
\ No newline at end of file
+    "transaction_costs": 0.001,  # 0.1% per trade
+    "position_size": 0.1,  # Fraction of starting equity per trade in the equity curve
+    # Asynchronous backtest jobs
+    "job_workers": int(os.getenv("BACKTEST_JOB_WORKERS", 2)),
+    "job_chunk_size": 500,  # Pattern occurrences between progress updates and checkpoints
+    "job_directory": DATA_DIR / "backtest_jobs",
+    "job_retention_hours": 24,  # Finished jobs are pruned after this long
+    "page_size": 100,  # Default trades per results page
+    "max_page_size": 1000
+}
+
+# Write-behind persistence of detected patterns and backtests to MongoDB
+RESULT_SINK_SETTINGS = {
+    "enabled": os.getenv("PERSIST_RESULTS", "False").lower() == "true",
+    "batch_size": 500,  # Documents per bulk write
+    "max_buffered": 50_000,  # Writers wait once this many documents are queued
+    "flush_interval_ms": 200,  # Longest a document waits for its batch to fill
+    "max_retries": 5,
+    "retry_backoff_ms": 100  # Doubled after every failed attempt
+}
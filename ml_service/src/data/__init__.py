@@ -1,3 +1,10 @@
+from .candles import CandleSeries
 from .market_data import MarketDataFetcher
+from .pattern_index import PatternIndex
+from .backfill import Backfiller, CandleStore
+from .forward_returns import ForwardReturnTable, ReturnSketch
 
-__all__ = ['MarketDataFetcher'] 
\ No newline at end of file
+__all__ = [
+    'CandleSeries', 'MarketDataFetcher', 'PatternIndex', 'Backfiller', 'CandleStore',
+    'ForwardReturnTable', 'ReturnSketch'
+]
\ No newline at end of file
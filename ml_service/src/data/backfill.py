@@ -0,0 +1,399 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import aiohttp
+import orjson
+from ..config import BACKFILL_SETTINGS
+from ..monitoring.metrics import REGISTRY
+from .candles import OHLCV_COLUMNS, CandleSeries
+from .market_data import TIMEFRAME_SECONDS
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_PAGES = REGISTRY.counter(
+    'backfill_pages',
+    'Backfill kline pages by result (fetched, skipped or failed)',
+    ['result']
+)
+BACKFILL_RETRIES = REGISTRY.counter(
+    'backfill_retries',
+    'Kline requests retried after throttling or a server error'
+)
+
+# Throttled (429), banned for exceeding limits (418) or worth retrying (5xx)
+_RETRY_STATUSES = {418, 429}
+
+Stream = Tuple[str, str]
+
+
+class BackfillError(Exception):
+    """A kline page could not be fetched"""
+
+
+class PageTask(NamedTuple):
+    """Up to one request's worth of klines: open times start_ms..end_ms inclusive"""
+    symbol: str
+    timeframe: str
+    start_ms: int
+    end_ms: int
+
+    @property
+    def stream(self) -> Stream:
+        return self.symbol, self.timeframe
+
+    @property
+    def key(self) -> str:
+        return f"{self.symbol}\t{self.timeframe}\t{self.start_ms}\t{self.end_ms}"
+
+
+def plan_pages(symbol: str, timeframe: str, start_ms: int, end_ms: int, page_size: int) -> List[PageTask]:
+    """
+    Split the candles opening in [start_ms, end_ms) into page tasks
+
+    Pages sit on a fixed grid of page_size candles from the epoch, clipped
+    to the range, so runs over overlapping ranges share most page keys and
+    a resumed run skips whatever an earlier one completed.
+    """
+    period = TIMEFRAME_SECONDS[timeframe] * 1000
+    span = period * page_size
+    first = -(-start_ms // period) * period
+    last = (end_ms - 1) // period * period
+    pages = []
+    page_start = first // span * span
+    while max(page_start, first) <= last:
+        pages.append(PageTask(symbol, timeframe, max(page_start, first), min(page_start + span - period, last)))
+        page_start += span
+    return pages
+
+
+def parse_klines(rows: List[list]) -> CandleSeries:
+    """CandleSeries from Binance kline rows ([open time, open, high, low, close, volume, ...])"""
+    timestamps = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    values = np.array([row[1:6] for row in rows], dtype=np.float64).reshape(len(rows), 5)
+    return CandleSeries(timestamps, *values.T)
+
+
+def _concat(parts: List[CandleSeries]) -> CandleSeries:
+    """Parts merged in time order; for a duplicate open time the last part's candle wins"""
+    timestamps = np.concatenate([part.timestamps for part in parts])
+    # np.unique keeps first occurrences, so search the reversed concatenation
+    unique, from_end = np.unique(timestamps[::-1], return_index=True)
+    last = len(timestamps) - 1 - from_end
+    return CandleSeries(
+        unique,
+        *(np.concatenate([part[name] for part in parts])[last] for name in OHLCV_COLUMNS)
+    )
+
+
+def closed_end_ms(timeframe: str, end_ms: int, now_ms: Optional[int] = None) -> int:
+    """end_ms, moved back so the range excludes the candle still forming at now_ms"""
+    period = TIMEFRAME_SECONDS[timeframe] * 1000
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    return min(end_ms, now_ms // period * period)
+
+
+class RateLimiter:
+    """Spaces request starts at least 1 / requests_per_second seconds apart"""
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1 / requests_per_second if requests_per_second > 0 else 0.0
+        self._next_slot = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        delay = self._next_slot - now
+        self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float):
+        """Hold back every request for seconds (after the server asks to back off)"""
+        self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+
+class BackfillCheckpoint:
+    """
+    Append-only file of completed page keys
+
+    Keys are appended (and fsynced) only after the candles of their pages
+    are on disk, so every recorded page can be skipped on resume.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def completed(self) -> Set[str]:
+        if not self.path.exists():
+            return set()
+        with open(self.path) as f:
+            # A torn final line from a crash has fewer fields and matches no page
+            return {line.rstrip('\n') for line in f if line.endswith('\n')}
+
+    def record(self, keys: List[str]):
+        if not keys:
+            return
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.writelines(key + '\n' for key in keys)
+                f.flush()
+                os.fsync(f.fileno())
+
+
+class CandleStore:
+    """
+    Backfilled candles as .npz part files, one directory per stream
+
+    Each part holds a run of candles written in one go; load() merges the
+    parts of a stream and compact() rewrites them as a single part.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+
+    def _stream_dir(self, symbol: str, timeframe: str) -> Path:
+        return self.directory / f"{symbol}_{timeframe}"
+
+    def parts(self, symbol: str, timeframe: str) -> List[Path]:
+        return sorted(self._stream_dir(symbol, timeframe).glob('*.npz'))
+
+    def write(self, symbol: str, timeframe: str, candles: CandleSeries) -> Optional[Path]:
+        """Write candles as a new part atomically (nothing for an empty series)"""
+        if len(candles) == 0:
+            return None
+        stream_dir = self._stream_dir(symbol, timeframe)
+        stream_dir.mkdir(parents=True, exist_ok=True)
+        path = stream_dir / f"{candles.timestamps[0]}_{candles.timestamps[-1]}.npz"
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, timestamps=candles.timestamps, **{name: candles[name] for name in OHLCV_COLUMNS})
+        os.replace(tmp_path, path)
+        return path
+
+    def _read(self, path: Path) -> CandleSeries:
+        with np.load(path) as stored:
+            return CandleSeries(stored['timestamps'], *(stored[name] for name in OHLCV_COLUMNS))
+
+    def load(self, symbol: str, timeframe: str) -> CandleSeries:
+        """Every stored candle of a stream in time order (from the last part holding it)"""
+        parts = [self._read(path) for path in self.parts(symbol, timeframe)]
+        if not parts:
+            return parse_klines([])
+        return _concat(parts)
+
+    def compact(self, symbol: str, timeframe: str) -> int:
+        """Merge a stream's parts into one, returning the number of candles"""
+        paths = self.parts(symbol, timeframe)
+        candles = self.load(symbol, timeframe)
+        if len(paths) > 1:
+            # The merged part is in place before the old ones go; overlaps dedupe on load
+            merged = self.write(symbol, timeframe, candles)
+            for path in paths:
+                if path != merged:
+                    path.unlink()
+        return len(candles)
+
+
+class Backfiller:
+    """
+    Resumable, parallel download of kline history
+
+    (symbol, timeframe, range) requests are split into page tasks that a
+    fixed pool of workers fetch from the Binance klines endpoint, at most
+    `concurrency` at a time and no faster than requests_per_second.
+    Throttling and server errors are retried with exponential backoff (and
+    a Retry-After pauses every worker). Pages are buffered per stream and
+    written in bulk every flush_bars candles, then recorded in the
+    checkpoint so an interrupted run resumes where it stopped.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Path] = None,
+        base_url: str = BACKFILL_SETTINGS['base_url'],
+        page_size: int = BACKFILL_SETTINGS['page_size'],
+        concurrency: int = BACKFILL_SETTINGS['concurrency'],
+        requests_per_second: float = BACKFILL_SETTINGS['requests_per_second'],
+        flush_bars: int = BACKFILL_SETTINGS['flush_bars'],
+        max_retries: int = BACKFILL_SETTINGS['max_retries'],
+        retry_backoff_s: float = BACKFILL_SETTINGS['retry_backoff_s'],
+        timeout_s: float = BACKFILL_SETTINGS['timeout_s']
+    ):
+        directory = Path(directory or BACKFILL_SETTINGS['directory'])
+        self.store = CandleStore(directory)
+        self.checkpoint = BackfillCheckpoint(directory / 'completed_pages.tsv')
+        self.url = base_url.rstrip('/') + '/api/v3/klines'
+        self.page_size = page_size
+        self.concurrency = max(1, concurrency)
+        self.limiter = RateLimiter(requests_per_second)
+        self.flush_bars = flush_bars
+        self.max_retries = max_retries
+        self.retry_backoff_s = retry_backoff_s
+        self.timeout_s = timeout_s
+
+        self._buffers: Dict[Stream, List[Tuple[PageTask, CandleSeries]]] = {}
+        self._buffered_bars: Dict[Stream, int] = {}
+
+    async def _fetch_page(self, session: aiohttp.ClientSession, task: PageTask) -> CandleSeries:
+        params = {
+            'symbol': task.symbol,
+            'interval': task.timeframe,
+            'startTime': task.start_ms,
+            'endTime': task.end_ms,
+            'limit': self.page_size
+        }
+        backoff = self.retry_backoff_s
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.wait()
+            retry_after = 0.0
+            try:
+                async with session.get(self.url, params=params) as response:
+                    if response.status == 200:
+                        return parse_klines(orjson.loads(await response.read()))
+                    error = f"HTTP {response.status}: {(await response.text())[:200]}"
+                    if response.status < 500 and response.status not in _RETRY_STATUSES:
+                        raise BackfillError(f"{task.symbol} {task.timeframe}: {error}")
+                    retry_after = float(response.headers.get('Retry-After') or 0)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                error = repr(e)
+
+            if attempt == self.max_retries:
+                raise BackfillError(f"{task.symbol} {task.timeframe} page {task.start_ms}: {error}")
+            BACKFILL_RETRIES.inc()
+            if retry_after:
+                self.limiter.pause(retry_after)
+            logger.warning(f"Retrying {task.symbol} {task.timeframe} page {task.start_ms} ({error})")
+            await asyncio.sleep(max(backoff, retry_after))
+            backoff *= 2
+
+    def _write(self, stream: Stream, pages: List[Tuple[PageTask, CandleSeries]]):
+        """Write buffered pages as one part, then mark them complete"""
+        parts = [candles for _, candles in pages if len(candles)]
+        if parts:
+            self.store.write(*stream, _concat(parts))
+        self.checkpoint.record([task.key for task, _ in pages])
+
+    async def _flush(self, stream: Stream):
+        pages = self._buffers.pop(stream, [])
+        self._buffered_bars.pop(stream, None)
+        if pages:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, stream, pages)
+
+    async def _worker(self, session: aiohttp.ClientSession, tasks: Iterator[PageTask], summary: Dict[str, int], failed: Set[Stream]):
+        # Workers share one iterator, so pending pages are never materialized as coroutines
+        for task in tasks:
+            try:
+                candles = await self._fetch_page(session, task)
+            except BackfillError as e:
+                logger.error(f"Backfill page failed: {e}")
+                BACKFILL_PAGES.inc(result='failed')
+                summary['failed'] += 1
+                failed.add(task.stream)
+                continue
+
+            BACKFILL_PAGES.inc(result='fetched')
+            summary['fetched'] += 1
+            summary['candles'] += len(candles)
+            self._buffers.setdefault(task.stream, []).append((task, candles))
+            self._buffered_bars[task.stream] = self._buffered_bars.get(task.stream, 0) + len(candles)
+            if self._buffered_bars[task.stream] >= self.flush_bars:
+                await self._flush(task.stream)
+
+    async def run(self, streams: Iterable[Stream], start_ms: int, end_ms: int) -> Dict[str, int]:
+        """
+        Download every closed candle of the streams opening in [start_ms, end_ms)
+
+        Returns:
+            Counts of pages planned, skipped (completed by an earlier run),
+            fetched and failed, and of candles fetched
+        """
+        streams = list(dict.fromkeys(streams))
+        completed = self.checkpoint.completed()
+        summary = {'pages': 0, 'skipped': 0, 'fetched': 0, 'failed': 0, 'candles': 0}
+        pending = []
+        for symbol, timeframe in streams:
+            # A page holding the forming candle would be checkpointed as complete with it
+            stream_end_ms = closed_end_ms(timeframe, end_ms)
+            for task in plan_pages(symbol, timeframe, start_ms, stream_end_ms, self.page_size):
+                summary['pages'] += 1
+                if task.key in completed:
+                    summary['skipped'] += 1
+                else:
+                    pending.append(task)
+        BACKFILL_PAGES.inc(summary['skipped'], result='skipped')
+        logger.info(
+            f"Backfilling {len(pending)} of {summary['pages']} pages for {len(streams)} streams "
+            f"with {self.concurrency} workers"
+        )
+
+        failed: Set[Stream] = set()
+        tasks = iter(pending)
+        timeout = aiohttp.ClientTimeout(total=self.timeout_s)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            workers = [
+                asyncio.create_task(self._worker(session, tasks, summary, failed))
+                for _ in range(min(self.concurrency, len(pending)))
+            ]
+            try:
+                await asyncio.gather(*workers)
+            except BaseException:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                raise
+            finally:
+                # Pages fetched before an interruption are kept
+                for stream in list(self._buffers):
+                    await self._flush(stream)
+
+        loop = asyncio.get_running_loop()
+        for stream in streams:
+            if stream not in failed:
+                await loop.run_in_executor(None, self.store.compact, *stream)
+        return summary
+
+
+def _to_ms(value: str) -> int:
+    return pd.Timestamp(value, tz='UTC').value // 1_000_000
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Download kline history into local storage, resuming interrupted runs")
+    parser.add_argument('--symbols', nargs='+', required=True)
+    parser.add_argument('--timeframes', nargs='+', default=['1h'], choices=sorted(TIMEFRAME_SECONDS))
+    parser.add_argument('--start', required=True, help="First open time (UTC date or timestamp)")
+    parser.add_argument('--end', default=None, help="End of the range, exclusive (default: now; the forming candle is never fetched)")
+    parser.add_argument('--directory', type=Path, default=BACKFILL_SETTINGS['directory'])
+    parser.add_argument('--base-url', default=BACKFILL_SETTINGS['base_url'])
+    parser.add_argument('--concurrency', type=int, default=BACKFILL_SETTINGS['concurrency'])
+    parser.add_argument('--requests-per-second', type=float, default=BACKFILL_SETTINGS['requests_per_second'])
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    end_ms = _to_ms(args.end) if args.end else int(time.time() * 1000)
+    backfiller = Backfiller(
+        args.directory,
+        base_url=args.base_url,
+        concurrency=args.concurrency,
+        requests_per_second=args.requests_per_second
+    )
+    streams = [(symbol.upper(), timeframe) for symbol in args.symbols for timeframe in args.timeframes]
+    summary = asyncio.run(backfiller.run(streams, _to_ms(args.start), end_ms))
+    logger.info(
+        f"Backfill finished: {summary['fetched']} pages fetched ({summary['candles']} candles), "
+        f"{summary['skipped']} already complete, {summary['failed']} failed"
+    )
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+from typing import Iterable, Optional, Union
+
+OHLCV_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+
+def _read_only(values: np.ndarray) -> np.ndarray:
+    # A view, so arrays passed in by the caller stay writeable
+    values = values.view()
+    values.flags.writeable = False
+    return values
+
+
+class CandleSeries:
+    """
+    Compact columnar OHLCV container
+
+    Holds one contiguous array per column plus the bar open times as int64
+    epoch milliseconds. Prices and volumes are float64 by default or float32
+    to halve memory; consumers needing float64 (TA-Lib) upcast per call.
+    Every array is read-only, so columns and slices are shared views and
+    never need defensive copies.
+    """
+
+    __slots__ = ('timestamps',) + OHLCV_COLUMNS
+
+    def __init__(
+        self,
+        timestamps: np.ndarray,
+        open: np.ndarray,
+        high: np.ndarray,
+        low: np.ndarray,
+        close: np.ndarray,
+        volume: np.ndarray,
+        dtype=np.float64
+    ):
+        dtype = np.dtype(dtype)
+        if dtype not in (np.float32, np.float64):
+            raise ValueError(f"Unsupported candle dtype: {dtype}")
+
+        timestamps = np.asarray(timestamps)
+        if np.issubdtype(timestamps.dtype, np.datetime64):
+            timestamps = timestamps.astype('datetime64[ms]').astype(np.int64)
+        object.__setattr__(self, 'timestamps', _read_only(
+            np.ascontiguousarray(timestamps, dtype=np.int64)
+        ))
+        for name, values in zip(OHLCV_COLUMNS, (open, high, low, close, volume)):
+            values = np.ascontiguousarray(values, dtype=dtype)
+            if len(values) != len(self.timestamps):
+                raise ValueError(f"Column '{name}' has {len(values)} values for {len(self.timestamps)} timestamps")
+            object.__setattr__(self, name, _read_only(values))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CandleSeries is immutable")
+
+    @classmethod
+    def _from_views(cls, timestamps: np.ndarray, columns: Iterable[np.ndarray]) -> 'CandleSeries':
+        series = object.__new__(cls)
+        object.__setattr__(series, 'timestamps', timestamps)
+        for name, values in zip(OHLCV_COLUMNS, columns):
+            object.__setattr__(series, name, values)
+        return series
+
+    @classmethod
+    def from_dataframe(cls, ohlcv_data: pd.DataFrame, dtype=np.float64) -> 'CandleSeries':
+        """Build from an OHLCV DataFrame (times from 'timestamp' or the index)"""
+        from .pattern_index import timestamps_ms
+
+        return cls(
+            timestamps_ms(ohlcv_data),
+            *(ohlcv_data[name].to_numpy(dtype=dtype) for name in OHLCV_COLUMNS),
+            dtype=dtype
+        )
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Copy into a DataFrame with a datetime 'timestamp' column"""
+        return pd.DataFrame({
+            'timestamp': pd.to_datetime(self.timestamps, unit='ms'),
+            **{name: getattr(self, name) for name in OHLCV_COLUMNS}
+        })
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.close.dtype
+
+    @property
+    def columns(self):
+        return list(OHLCV_COLUMNS)
+
+    @property
+    def nbytes(self) -> int:
+        return self.timestamps.nbytes + sum(getattr(self, name).nbytes for name in OHLCV_COLUMNS)
+
+    def astype(self, dtype) -> 'CandleSeries':
+        """This series with prices and volumes in dtype (self if unchanged)"""
+        if np.dtype(dtype) == self.dtype:
+            return self
+        return CandleSeries(self.timestamps, *(getattr(self, name) for name in OHLCV_COLUMNS), dtype=dtype)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __getitem__(self, key: Union[str, slice]):
+        """A column by name, or a view of a contiguous range of bars"""
+        if isinstance(key, str):
+            if key == 'timestamp':
+                return self.timestamps
+            if key not in OHLCV_COLUMNS:
+                raise KeyError(key)
+            return getattr(self, key)
+        if isinstance(key, slice) and key.step in (None, 1):
+            return self._from_views(
+                self.timestamps[key],
+                (getattr(self, name)[key] for name in OHLCV_COLUMNS)
+            )
+        raise TypeError(f"CandleSeries indices must be column names or contiguous slices, not {key!r}")
+
+    def __repr__(self) -> str:
+        return f"CandleSeries(len={len(self)}, dtype={self.dtype})"
+
+
+# Consumers accept OHLCV either as a DataFrame or as a CandleSeries
+OHLCVData = Union[pd.DataFrame, CandleSeries]
+
+
+def ohlcv_column(ohlcv_data: OHLCVData, name: str, dtype=np.float64) -> np.ndarray:
+    """One OHLCV column of a DataFrame or CandleSeries as an array of dtype"""
+    if isinstance(ohlcv_data, CandleSeries):
+        return np.asarray(ohlcv_data[name], dtype=dtype)
+    return ohlcv_data[name].to_numpy(dtype=dtype)
+
+
+def slice_bars(ohlcv_data: OHLCVData, start: int, stop: Optional[int] = None):
+    """Bars start..stop-1 by position (a view for a CandleSeries)"""
+    if isinstance(ohlcv_data, CandleSeries):
+        return ohlcv_data[start:stop]
+    return ohlcv_data.iloc[start:stop]
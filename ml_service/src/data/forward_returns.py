@@ -0,0 +1,487 @@
+import numpy as np
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import fcntl
+import logging
+import math
+import os
+import re
+import threading
+import orjson
+from ..config import FORWARD_RETURN_SETTINGS
+from .backfill import CandleStore
+from .candles import OHLCVData, ohlcv_column, slice_bars
+from .market_data import TIMEFRAME_SECONDS
+from .pattern_index import timestamps_ms
+
+logger = logging.getLogger(__name__)
+
+# Symbols name files, so nothing but exchange-style tickers is accepted
+_SYMBOL = re.compile(r'[A-Z0-9]+')
+
+
+def _check_timeframe(timeframe: str):
+    if timeframe not in TIMEFRAME_SECONDS:
+        raise ValueError(f"Unsupported timeframe: {timeframe}")
+
+# Returns smaller than this in magnitude are counted as zero by the sketch
+_MIN_MAGNITUDE = 1e-12
+
+SketchKey = Tuple[str, str, int]  # (pattern, direction, horizon)
+
+
+class ReturnSketch:
+    """
+    Mergeable summary of a return distribution
+
+    Count, mean and variance are kept as (count, mean, M2) and combined
+    with Chan's parallel update. Quantiles come from a DDSketch-style
+    store of logarithmic buckets, one set per sign, so any quantile is
+    within relative_accuracy of the true value. Merging two sketches gives
+    the sketch of their combined samples, so per-symbol sketches aggregate
+    across symbols without revisiting a single occurrence.
+    """
+
+    def __init__(self, relative_accuracy: float = FORWARD_RETURN_SETTINGS['relative_accuracy']):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.positive = 0
+        self.zeros = 0
+        self.positive_buckets: Dict[int, int] = {}
+        self.negative_buckets: Dict[int, int] = {}
+
+    def _combine(self, count: int, mean: float, m2: float):
+        total = self.count + count
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+
+    def add(self, values: np.ndarray):
+        """Add a batch of returns (non-finite values are ignored)"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+        mean = values.mean()
+        self._combine(len(values), float(mean), float(np.sum((values - mean) ** 2)))
+        self.positive += int(np.count_nonzero(values > 0))
+
+        nonzero = np.abs(values) > _MIN_MAGNITUDE
+        self.zeros += int(len(values) - np.count_nonzero(nonzero))
+        values = values[nonzero]
+        indices = np.ceil(np.log(np.abs(values)) / self._log_gamma).astype(np.int64)
+        for buckets, selected in (
+            (self.positive_buckets, indices[values > 0]),
+            (self.negative_buckets, indices[values < 0])
+        ):
+            keys, counts = np.unique(selected, return_counts=True)
+            for key, count in zip(keys.tolist(), counts.tolist()):
+                buckets[key] = buckets.get(key, 0) + count
+
+    def merge(self, other: 'ReturnSketch') -> 'ReturnSketch':
+        """Fold another sketch into this one (returns self)"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        if other.count == 0:
+            return self
+        self._combine(other.count, other.mean, other.m2)
+        self.positive += other.positive
+        self.zeros += other.zeros
+        for buckets, others in (
+            (self.positive_buckets, other.positive_buckets),
+            (self.negative_buckets, other.negative_buckets)
+        ):
+            for key, count in others.items():
+                buckets[key] = buckets.get(key, 0) + count
+        return self
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / self.count if self.count else 0.0
+
+    def _bucket_value(self, index: int) -> float:
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def quantile(self, q: float) -> float:
+        """Approximate q-quantile (the lower of two neighbours, as np.quantile method='lower')"""
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        # Ascending order: large negative magnitudes first, then zeros, then positives
+        for index in sorted(self.negative_buckets, reverse=True):
+            seen += self.negative_buckets[index]
+            if seen > rank:
+                return -self._bucket_value(index)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.positive_buckets):
+            seen += self.positive_buckets[index]
+            if seen > rank:
+                return self._bucket_value(index)
+        return self._bucket_value(max(self.positive_buckets)) if self.positive_buckets else 0.0
+
+    def summary(self, quantiles: Iterable[float] = FORWARD_RETURN_SETTINGS['quantiles']) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'variance': self.variance,
+            'std': math.sqrt(self.variance),
+            'positive_rate': self.positive / self.count if self.count else 0.0,
+            'quantiles': {f"p{round(q * 100)}": self.quantile(q) for q in quantiles}
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'count': self.count,
+            'mean': self.mean,
+            'm2': self.m2,
+            'positive': self.positive,
+            'zeros': self.zeros,
+            'positive_buckets': [list(self.positive_buckets), list(self.positive_buckets.values())],
+            'negative_buckets': [list(self.negative_buckets), list(self.negative_buckets.values())]
+        }
+
+    @classmethod
+    def from_dict(cls, stored: Dict[str, Any]) -> 'ReturnSketch':
+        sketch = cls(stored['relative_accuracy'])
+        sketch.count = stored['count']
+        sketch.mean = stored['mean']
+        sketch.m2 = stored['m2']
+        sketch.positive = stored['positive']
+        sketch.zeros = stored['zeros']
+        sketch.positive_buckets = dict(zip(*stored['positive_buckets']))
+        sketch.negative_buckets = dict(zip(*stored['negative_buckets']))
+        return sketch
+
+
+class ForwardReturnTable:
+    """
+    Materialized forward-return distributions of TA-Lib patterns
+
+    Holds a ReturnSketch per (symbol, timeframe, pattern, direction,
+    horizon) of the close-to-close price return from a pattern's last
+    candle to the candle `horizon` bars later (not signed by direction,
+    so a bearish pattern that worked has negative returns). update() only
+    detects patterns on candles newer than the last one seen, as
+    PatternIndex does, and resolves earlier occurrences whose horizons
+    have now elapsed from a short tail of closes kept per stream, so
+    questions like "how did HAMMER on ETHUSDT 4h perform" are answered
+    from the sketches without running a backtest.
+
+    Several processes (pre-fork workers) may share a directory: a stream
+    is re-read whenever its file has been replaced since it was loaded,
+    and update() reads, extends and writes it under an exclusive lock.
+    """
+
+    def __init__(
+        self,
+        detector,
+        directory: Optional[Path] = None,
+        horizons: Iterable[int] = FORWARD_RETURN_SETTINGS['horizons'],
+        relative_accuracy: float = FORWARD_RETURN_SETTINGS['relative_accuracy']
+    ):
+        self.detector = detector
+        self.directory = Path(directory or FORWARD_RETURN_SETTINGS['directory'])
+        self.horizons = sorted(set(horizons))
+        self.relative_accuracy = relative_accuracy
+        self.context_bars = FORWARD_RETURN_SETTINGS['context_bars']
+        self.pattern_names = list(detector.talib_patterns.keys())
+        self._pattern_ids = {name: i for i, name in enumerate(self.pattern_names)}
+        self._entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._versions: Dict[Tuple[str, str], Optional[Tuple[int, int, int]]] = {}  # File each entry was read from
+        self._lock = threading.RLock()
+
+    def _path(self, symbol: str, timeframe: str) -> Path:
+        """
+        Raises:
+            ValueError: Malformed symbol or unknown timeframe
+        """
+        if not _SYMBOL.fullmatch(symbol):
+            raise ValueError(f"Invalid symbol: {symbol!r}")
+        _check_timeframe(timeframe)
+        return self.directory / f"{symbol}_{timeframe}.json"
+
+    def _empty_entry(self, symbol: str, timeframe: str) -> Dict[str, Any]:
+        return {
+            'symbol': symbol,
+            'timeframe': timeframe,
+            'bars': 0,  # Candles seen so far; pending occurrences count bars from the first
+            'last_time': None,
+            'tail_closes': np.empty(0),  # Closes of the last max(horizons) + 1 bars
+            'pending_bar': np.empty(0, dtype=np.int64),
+            'pending_pattern': np.empty(0, dtype=np.int32),
+            'pending_sign': np.empty(0, dtype=np.int8),
+            'sketches': {}
+        }
+
+    def _read(self, path: Path) -> Optional[Dict[str, Any]]:
+        """A stored stream, or None if it is unreadable or was computed with other settings"""
+        try:
+            return self._parse(path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring malformed forward returns in {path}: {e!r}")
+            return None
+
+    def _parse(self, path: Path) -> Optional[Dict[str, Any]]:
+        with open(path, 'rb') as f:
+            stored = orjson.loads(f.read())
+        if stored['horizons'] != self.horizons or stored['relative_accuracy'] != self.relative_accuracy:
+            logger.warning(f"Ignoring forward returns in {path} computed with other settings")
+            return None
+
+        # Pending occurrences name their pattern, whose id may have changed since
+        ids = np.array([self._pattern_ids.get(name, -1) for name in stored['pending_pattern']], dtype=np.int32)
+        keep = ids >= 0
+        return {
+            'symbol': stored['symbol'],
+            'timeframe': stored['timeframe'],
+            'bars': stored['bars'],
+            'last_time': stored['last_time'],
+            'tail_closes': np.array(stored['tail_closes'], dtype=np.float64),
+            'pending_bar': np.array(stored['pending_bar'], dtype=np.int64)[keep],
+            'pending_pattern': ids[keep],
+            'pending_sign': np.array(stored['pending_sign'], dtype=np.int8)[keep],
+            'sketches': {
+                (pattern, direction, horizon): ReturnSketch.from_dict(sketch)
+                for pattern, direction, horizon, sketch in stored['sketches']
+            }
+        }
+
+    @staticmethod
+    def _version(path: Path) -> Optional[Tuple[int, int, int]]:
+        """Identifies a file's content: it is replaced (a new inode) on every save"""
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _load(self, symbol: str, timeframe: str) -> Dict[str, Any]:
+        """
+        A stream's entry, re-read if another process has saved it since
+
+        Streams without a (readable) file get a fresh empty entry that is
+        not cached, so lookups of unknown symbols do not accumulate.
+        """
+        key = (symbol, timeframe)
+        path = self._path(symbol, timeframe)
+        version = self._version(path)
+        with self._lock:
+            if key in self._entries and self._versions[key] == version:
+                return self._entries[key]
+            entry = self._read(path) if version is not None else None
+            if entry is None:
+                self._entries.pop(key, None)
+                self._versions.pop(key, None)
+                return self._empty_entry(symbol, timeframe)
+            self._entries[key] = entry
+            self._versions[key] = version
+            return entry
+
+    def _load_all(self, timeframe: str) -> List[Dict[str, Any]]:
+        """Every stored stream of a timeframe, for aggregates across symbols"""
+        _check_timeframe(timeframe)
+        entries = []
+        for path in sorted(self.directory.glob(f'*_{timeframe}.json')):
+            symbol = path.name[:-len(f'_{timeframe}.json')]
+            if not _SYMBOL.fullmatch(symbol):
+                continue
+            entry = self._load(symbol, timeframe)
+            if entry['timeframe'] == timeframe and entry['bars']:
+                entries.append(entry)
+        return entries
+
+    def _stream_lock(self, symbol: str, timeframe: str):
+        """Exclusive lock on a stream across processes, released when the file is closed"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self._path(symbol, timeframe).with_suffix('.lock'), 'a')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def _save(self, entry: Dict[str, Any]):
+        """Write a stream atomically so readers never see a partial file"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(entry['symbol'], entry['timeframe'])
+        tmp_path = path.with_suffix('.tmp')
+        payload = {
+            'symbol': entry['symbol'],
+            'timeframe': entry['timeframe'],
+            'horizons': self.horizons,
+            'relative_accuracy': self.relative_accuracy,
+            'bars': entry['bars'],
+            'last_time': entry['last_time'],
+            'tail_closes': entry['tail_closes'],
+            'pending_bar': entry['pending_bar'],
+            'pending_pattern': [self.pattern_names[i] for i in entry['pending_pattern'].tolist()],
+            'pending_sign': entry['pending_sign'],
+            'sketches': [[*key, sketch.to_dict()] for key, sketch in entry['sketches'].items()]
+        }
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY))
+        os.replace(tmp_path, path)
+        key = (entry['symbol'], entry['timeframe'])
+        self._entries[key] = entry
+        self._versions[key] = self._version(path)
+
+    def update(self, symbol: str, timeframe: str, ohlcv_data: OHLCVData) -> int:
+        """
+        Add the forward returns that candles newer than the last seen one settle
+
+        Args:
+            symbol: Trading pair or stock symbol
+            timeframe: Candlestick timeframe
+            ohlcv_data: Closed candles ending with the newest ones; may
+                overlap the candles already seen
+
+        Returns:
+            Number of (occurrence, horizon) returns added
+        """
+        times = timestamps_ms(ohlcv_data)
+        closes = ohlcv_column(ohlcv_data, 'close')
+        max_horizon = self.horizons[-1]
+
+        with self._lock, self._stream_lock(symbol, timeframe):
+            entry = self._load(symbol, timeframe)
+            first_new = 0
+            if entry['last_time'] is not None:
+                first_new = int(np.searchsorted(times, entry['last_time'], side='right'))
+            if first_new >= len(times):
+                return 0
+
+            # New occurrences, numbered by bars since the stream's first candle
+            context_start = max(0, first_new - self.context_bars)
+            signals = self.detector.detect_pattern_signals(slice_bars(ohlcv_data, context_start))
+            offset = first_new - context_start
+            seen_bars = entry['bars']
+            new_bars, new_ids, new_signs = [entry['pending_bar']], [entry['pending_pattern']], [entry['pending_sign']]
+            for name, values in signals.items():
+                if name not in self._pattern_ids:
+                    continue
+                hits = np.flatnonzero(values[offset:])
+                new_bars.append(seen_bars + hits)
+                new_ids.append(np.full(len(hits), self._pattern_ids[name], dtype=np.int32))
+                new_signs.append(np.sign(values[offset:][hits]).astype(np.int8))
+            pending_bar = np.concatenate(new_bars)
+            pending_pattern = np.concatenate(new_ids)
+            pending_sign = np.concatenate(new_signs)
+
+            # Every pending occurrence's own close is within the tail
+            tail = np.concatenate((entry['tail_closes'], closes[first_new:]))
+            total_bars = seen_bars + len(times) - first_new
+            tail_start = total_bars - len(tail)
+
+            added = 0
+            for horizon in self.horizons:
+                exit_bar = pending_bar + horizon
+                ready = (exit_bar >= seen_bars) & (exit_bar < total_bars)
+                if not ready.any():
+                    continue
+                returns = tail[exit_bar[ready] - tail_start] / tail[pending_bar[ready] - tail_start] - 1
+                groups = pending_pattern[ready] * 2 + (pending_sign[ready] > 0)
+                for group in np.unique(groups).tolist():
+                    key = (self.pattern_names[group // 2], 'bullish' if group % 2 else 'bearish', horizon)
+                    sketch = entry['sketches'].get(key)
+                    if sketch is None:
+                        sketch = entry['sketches'][key] = ReturnSketch(self.relative_accuracy)
+                    sketch.add(returns[groups == group])
+                added += int(np.count_nonzero(ready))
+
+            unresolved = pending_bar + max_horizon >= total_bars
+            entry.update({
+                'bars': total_bars,
+                'last_time': int(times[-1]),
+                'tail_closes': tail[-(max_horizon + 1):],
+                'pending_bar': pending_bar[unresolved],
+                'pending_pattern': pending_pattern[unresolved],
+                'pending_sign': pending_sign[unresolved]
+            })
+            self._save(entry)
+
+        return added
+
+    def build_from_store(self, store: CandleStore, symbol: str, timeframe: str) -> int:
+        """
+        Add the forward returns of a stream's backfilled history
+
+        The table only extends forward from the last candle it has seen, so
+        history older than that is skipped: build from the store before live
+        updates start for the stream.
+
+        Returns:
+            Number of (occurrence, horizon) returns added
+        """
+        candles = store.load(symbol, timeframe)
+        if not len(candles):
+            return 0
+        return self.update(symbol, timeframe, candles)
+
+    def sketches(
+        self,
+        pattern: str,
+        timeframe: str,
+        symbols: Optional[Iterable[str]] = None,
+        direction: Optional[str] = None,
+        horizon: Optional[int] = None
+    ) -> Dict[Tuple[str, int], ReturnSketch]:
+        """
+        Sketches of a pattern per (direction, horizon), merged across symbols
+
+        Args:
+            pattern: Pattern name
+            timeframe: Candlestick timeframe
+            symbols: Symbols to include (every stored symbol if None)
+            direction: 'bullish' or 'bearish' (both if None)
+            horizon: Bars ahead (every horizon if None)
+
+        Returns:
+            Mapping of (direction, horizon) to a sketch; a single symbol's
+            sketches are returned as stored rather than copied
+        """
+        if direction not in (None, 'bullish', 'bearish'):
+            raise ValueError(f"Unsupported direction: {direction}")
+        if symbols is None:
+            entries = self._load_all(timeframe)
+        else:
+            entries = [self._load(symbol, timeframe) for symbol in symbols]
+
+        matches: Dict[Tuple[str, int], List[ReturnSketch]] = {}
+        for entry in entries:
+            for (name, side, bars), sketch in entry['sketches'].items():
+                if name == pattern and direction in (None, side) and horizon in (None, bars):
+                    matches.setdefault((side, bars), []).append(sketch)
+
+        merged = {}
+        for key, found in sorted(matches.items()):
+            if len(found) == 1:
+                merged[key] = found[0]
+            else:
+                merged[key] = ReturnSketch(self.relative_accuracy)
+                for sketch in found:
+                    merged[key].merge(sketch)
+        return merged
+
+    def statistics(
+        self,
+        pattern: str,
+        timeframe: str,
+        symbols: Optional[Iterable[str]] = None,
+        direction: Optional[str] = None,
+        horizon: Optional[int] = None
+    ) -> Dict[str, Dict[int, Dict[str, Any]]]:
+        """Forward-return summaries of a pattern as {direction: {horizon: summary}}"""
+        stats: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        for (side, bars), sketch in self.sketches(pattern, timeframe, symbols, direction, horizon).items():
+            stats.setdefault(side, {})[bars] = sketch.summary()
+        return stats
+
+    def seen_bars(self, symbol: str, timeframe: str) -> int:
+        """Number of candles the table has processed for a stream"""
+        return self._load(symbol, timeframe)['bars']
@@ -3,47 +3,130 @@ from binance.client import Client
 import pandas as pd
 from datetime import datetime, timedelta
 import logging
-from typing import List, Optional, Dict, Any
+from typing import Iterable, List, Optional, Dict, Any, Tuple
+import asyncio
+import functools
 import redis
 import json
-from ..config import MARKET_DATA, CACHE_SETTINGS
+import time
+from ..config import BINANCE_API_URL, MARKET_DATA, CACHE_SETTINGS, REDIS_HOST, REDIS_PORT, REDIS_DB
+from .candles import CandleSeries, OHLCVData
+from ..monitoring.metrics import CACHE_REQUESTS, UPSTREAM_FETCH_LATENCY
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Candle length of each supported timeframe
+TIMEFRAME_SECONDS = {
+    '1m': 60,
+    '5m': 5 * 60,
+    '15m': 15 * 60,
+    '30m': 30 * 60,
+    '1h': 3600,
+    '4h': 4 * 3600,
+    '1d': 24 * 3600
+}
+
+def encode_market_data(data: OHLCVData) -> str:
+    """Serialize OHLCV data for the cache"""
+    if isinstance(data, CandleSeries):
+        data = data.to_dataframe()
+    return data.to_json(orient='records')
+
+def decode_market_data(payload) -> pd.DataFrame:
+    """Deserialize OHLCV data written by encode_market_data"""
+    return pd.DataFrame(json.loads(payload))
+
+@functools.lru_cache(maxsize=None)
+def create_redis_client(
+    host: str = REDIS_HOST,
+    port: int = REDIS_PORT,
+    db: int = REDIS_DB,
+    max_connections: int = CACHE_SETTINGS['redis_max_connections']
+) -> redis.Redis:
+    """
+    Redis client over a bounded connection pool shared per address
+
+    Callers beyond max_connections wait for a free connection (up to
+    redis_pool_timeout seconds) instead of opening more.
+    """
+    pool = redis.BlockingConnectionPool(
+        host=host,
+        port=port,
+        db=db,
+        max_connections=max_connections,
+        timeout=CACHE_SETTINGS['redis_pool_timeout']
+    )
+    return redis.Redis(connection_pool=pool)
+
+class _BinanceClient(Client):
+    """Binance client against BINANCE_API_URL"""
+    API_URL = BINANCE_API_URL.rstrip('/') + '/api'
+
 class MarketDataFetcher:
-    def __init__(self, redis_client: redis.Redis):
-        self.redis_client = redis_client
+    def __init__(self, redis_client: Optional[redis.Redis] = None):
+        self.redis_client = redis_client if redis_client is not None else create_redis_client()
         self.binance_client = None
         self._initialize_clients()
 
     def _initialize_clients(self):
         """Initialize API clients with credentials if available"""
         try:
-            self.binance_client = Client()  # Add API keys if needed
+            self.binance_client = _BinanceClient()  # Add API keys if needed
         except Exception as e:
             logger.warning(f"Failed to initialize Binance client: {e}")
 
-    def _get_cached_data(self, symbol: str, timeframe: str, start_time: datetime) -> Optional[pd.DataFrame]:
-        """Attempt to get cached market data"""
-        cache_key = f"market_data:{symbol}:{timeframe}:{start_time.timestamp()}"
-        cached_data = self.redis_client.get(cache_key)
-        
+    @staticmethod
+    def _cache_key(symbol: str, timeframe: str, start_time: datetime) -> str:
+        return f"market_data:{symbol}:{timeframe}:{start_time.timestamp()}"
+
+    @staticmethod
+    def _decode_cached(cached_data) -> Optional[pd.DataFrame]:
         if cached_data:
             try:
-                data_dict = json.loads(cached_data)
-                return pd.DataFrame(data_dict)
+                return decode_market_data(cached_data)
             except Exception as e:
                 logger.error(f"Error deserializing cached data: {e}")
-        
         return None
 
-    def _cache_data(self, symbol: str, timeframe: str, start_time: datetime, data: pd.DataFrame):
+    def _get_cached_data(self, symbol: str, timeframe: str, start_time: datetime) -> Optional[pd.DataFrame]:
+        """Attempt to get cached market data"""
+        cache_key = self._cache_key(symbol, timeframe, start_time)
+        return self._decode_cached(self.redis_client.get(cache_key))
+
+    def _get_cached_many(self, keys: List[str]) -> List[Optional[pd.DataFrame]]:
+        """Read many cache entries with a single MGET (all misses if Redis fails)"""
+        if not keys:
+            return []
+        try:
+            payloads = self.redis_client.mget(keys)
+        except redis.RedisError as e:
+            logger.error(f"Error reading cached data: {e}")
+            return [None] * len(keys)
+        return [self._decode_cached(payload) for payload in payloads]
+
+    def _cache_many(self, entries: Dict[str, OHLCVData]):
+        """Write many cache entries with one pipelined round of SETEX commands"""
+        if not entries:
+            return
+        try:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for cache_key, data in entries.items():
+                pipeline.setex(
+                    cache_key,
+                    CACHE_SETTINGS['market_data_cache_ttl'],
+                    encode_market_data(data)
+                )
+            pipeline.execute()
+        except Exception as e:
+            logger.error(f"Error caching data: {e}")
+
+    def _cache_data(self, symbol: str, timeframe: str, start_time: datetime, data: OHLCVData):
         """Cache market data"""
-        cache_key = f"market_data:{symbol}:{timeframe}:{start_time.timestamp()}"
+        cache_key = self._cache_key(symbol, timeframe, start_time)
         try:
-            data_json = data.to_json(orient='records')
+            data_json = encode_market_data(data)
             self.redis_client.setex(
                 cache_key,
                 CACHE_SETTINGS['market_data_cache_ttl'],
@@ -81,15 +164,12 @@ class MarketDataFetcher:
         # Check cache first
         cached_data = self._get_cached_data(symbol, timeframe, start_time)
         if cached_data is not None:
+            CACHE_REQUESTS.inc(cache='market_data', result='hit')
             return cached_data
+        CACHE_REQUESTS.inc(cache='market_data', result='miss')
 
         try:
-            if source.lower() == 'binance':
-                data = self._fetch_binance_data(symbol, timeframe, start_time, end_time)
-            elif source.lower() == 'yahoo':
-                data = self._fetch_yahoo_data(symbol, timeframe, start_time, end_time)
-            else:
-                raise ValueError(f"Unsupported data source: {source}")
+            data = self._fetch_upstream(symbol, timeframe, start_time, end_time, source)
 
             # Cache the fetched data
             self._cache_data(symbol, timeframe, start_time, data)
@@ -100,6 +180,124 @@ class MarketDataFetcher:
             logger.error(f"Error fetching market data: {e}")
             raise
 
+    def _fetch_upstream(
+        self,
+        symbol: str,
+        timeframe: str,
+        start_time: datetime,
+        end_time: datetime,
+        source: str
+    ) -> pd.DataFrame:
+        """Fetch from the data source, bypassing the cache"""
+        fetch_start = time.perf_counter()
+        if source.lower() == 'binance':
+            data = self._fetch_binance_data(symbol, timeframe, start_time, end_time)
+        elif source.lower() == 'yahoo':
+            data = self._fetch_yahoo_data(symbol, timeframe, start_time, end_time)
+        else:
+            raise ValueError(f"Unsupported data source: {source}")
+        UPSTREAM_FETCH_LATENCY.observe(
+            time.perf_counter() - fetch_start,
+            source=source.lower()
+        )
+        return data
+
+    async def fetch_many(
+        self,
+        pairs: Iterable[Tuple[str, str]],
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        source: str = 'binance',
+        max_concurrency: int = CACHE_SETTINGS['upstream_concurrency']
+    ) -> Dict[Tuple[str, str], pd.DataFrame]:
+        """
+        Fetch many series at once, e.g. to warm the cache for a universe
+        
+        All cache entries are read with one MGET, only the misses are
+        fetched upstream (max_concurrency at a time, on worker threads), and
+        the fetched series are written back in a single pipeline. Series
+        that fail upstream are logged and left out of the result.
+        
+        Args:
+            pairs: (symbol, timeframe) pairs to fetch
+            start_time: Start time for historical data
+            end_time: End time for historical data
+            source: Data source ('binance', 'yahoo')
+            max_concurrency: Upstream fetches in flight at once
+            
+        Returns:
+            Mapping of (symbol, timeframe) to a DataFrame with OHLCV data
+        """
+        if not start_time:
+            start_time = datetime.now() - timedelta(days=30)
+        if not end_time:
+            end_time = datetime.now()
+
+        pairs = list(dict.fromkeys(pairs))
+        keys = [self._cache_key(symbol, timeframe, start_time) for symbol, timeframe in pairs]
+        results = {}
+        misses = []
+        for pair, key, cached_data in zip(pairs, keys, self._get_cached_many(keys)):
+            if cached_data is not None:
+                results[pair] = cached_data
+            else:
+                misses.append((pair, key))
+        CACHE_REQUESTS.inc(len(results), cache='market_data', result='hit')
+        CACHE_REQUESTS.inc(len(misses), cache='market_data', result='miss')
+
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def fetch(symbol: str, timeframe: str) -> pd.DataFrame:
+            async with semaphore:
+                return await loop.run_in_executor(
+                    None, self._fetch_upstream, symbol, timeframe, start_time, end_time, source
+                )
+
+        fetched = await asyncio.gather(
+            *(fetch(symbol, timeframe) for (symbol, timeframe), _ in misses),
+            return_exceptions=True
+        )
+        entries = {}
+        for (pair, key), data in zip(misses, fetched):
+            if isinstance(data, BaseException):
+                logger.error(f"Error fetching market data for {pair[0]} {pair[1]}: {data}")
+                continue
+            results[pair] = data
+            entries[key] = data
+        self._cache_many(entries)
+
+        return {pair: results[pair] for pair in pairs if pair in results}
+
+    async def fetch_candles(
+        self,
+        symbol: str,
+        timeframe: str = MARKET_DATA['default_timeframe'],
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        source: str = 'binance',
+        dtype: str = MARKET_DATA['candle_dtype']
+    ) -> CandleSeries:
+        """
+        Fetch market data as a compact CandleSeries
+        
+        Same source and cache as fetch_data; the DataFrame is only held
+        until its columns are packed into dtype arrays.
+        
+        Args:
+            symbol: Trading pair or stock symbol
+            timeframe: Candlestick timeframe
+            start_time: Start time for historical data
+            end_time: End time for historical data
+            source: Data source ('binance', 'yahoo')
+            dtype: Price and volume dtype ('float32' or 'float64')
+            
+        Returns:
+            CandleSeries with OHLCV data
+        """
+        data = await self.fetch_data(symbol, timeframe, start_time, end_time, source)
+        return CandleSeries.from_dataframe(data, dtype=dtype)
+
     def _fetch_binance_data(
         self,
         symbol: str,
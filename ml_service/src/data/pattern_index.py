@@ -0,0 +1,306 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Dict, Any, Tuple
+import fcntl
+import logging
+import os
+import threading
+from ..config import PATTERN_INDEX_SETTINGS
+from .candles import CandleSeries, slice_bars
+
+logger = logging.getLogger(__name__)
+
+_EMPTY_INT32 = np.empty(0, dtype=np.int32)
+
+
+def timestamps_ms(ohlcv_data: pd.DataFrame) -> np.ndarray:
+    """Bar open times as int64 epoch milliseconds (from 'timestamp' or the index)"""
+    if isinstance(ohlcv_data, CandleSeries):
+        return ohlcv_data.timestamps
+    if 'timestamp' in ohlcv_data.columns:
+        if pd.api.types.is_integer_dtype(ohlcv_data['timestamp']):
+            # Already epoch milliseconds, e.g. frames read back from the cache
+            return ohlcv_data['timestamp'].to_numpy(dtype=np.int64)
+        times = pd.to_datetime(ohlcv_data['timestamp']).values
+    else:
+        times = pd.to_datetime(ohlcv_data.index).values
+    return times.astype('datetime64[ms]').astype(np.int64)
+
+
+def _to_ms(value: datetime) -> int:
+    return int(pd.Timestamp(value).value // 1_000_000)
+
+
+class PatternIndex:
+    """
+    Persistent per symbol/timeframe index of TA-Lib pattern occurrences
+
+    Each index stores compact int32 arrays of (bar index, pattern id, signed
+    strength) plus the int64 open time of every indexed bar, so that "where
+    did X occur" queries never re-run detection over the full history.
+
+    Several processes (pre-fork workers) may share a directory: an index is
+    re-read whenever its file has been replaced since it was loaded, and
+    update() reads, extends and writes it under an exclusive lock.
+    """
+
+    def __init__(self, detector, directory: Optional[Path] = None):
+        self.detector = detector
+        self.directory = Path(directory or PATTERN_INDEX_SETTINGS['directory'])
+        self.context_bars = PATTERN_INDEX_SETTINGS['context_bars']
+        self.pattern_names = list(detector.talib_patterns.keys())
+        self.pattern_lengths = np.array(
+            [detector.talib_patterns[name][1] for name in self.pattern_names],
+            dtype=np.int32
+        )
+        self._pattern_ids = {name: i for i, name in enumerate(self.pattern_names)}
+        self._entries: Dict[str, Dict[str, np.ndarray]] = {}
+        self._versions: Dict[str, Optional[Tuple[int, int, int]]] = {}  # File each entry was read from
+        self._lock = threading.RLock()
+
+    def _key(self, symbol: str, timeframe: str) -> str:
+        return f"{symbol}_{timeframe}"
+
+    def _path(self, symbol: str, timeframe: str) -> Path:
+        return self.directory / f"{self._key(symbol, timeframe)}.npz"
+
+    def _empty_entry(self) -> Dict[str, np.ndarray]:
+        return {
+            'timestamps': np.empty(0, dtype=np.int64),
+            'bar_index': _EMPTY_INT32,
+            'pattern_id': _EMPTY_INT32,
+            'strength': _EMPTY_INT32
+        }
+
+    @staticmethod
+    def _version(path: Path) -> Optional[Tuple[int, int, int]]:
+        """Identifies a file's content: it is replaced (a new inode) on every save"""
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _load(self, symbol: str, timeframe: str) -> Dict[str, np.ndarray]:
+        """Load an index from memory or disk, remapping stored pattern ids"""
+        with self._lock:
+            return self._load_locked(symbol, timeframe)
+
+    def _load_locked(self, symbol: str, timeframe: str) -> Dict[str, np.ndarray]:
+        key = self._key(symbol, timeframe)
+        path = self._path(symbol, timeframe)
+        version = self._version(path)
+        if key in self._entries and self._versions[key] == version:
+            return self._entries[key]
+
+        if version is None:
+            entry = self._empty_entry()
+        else:
+            with np.load(path) as stored:
+                entry = {name: stored[name] for name in (
+                    'timestamps', 'bar_index', 'pattern_id', 'strength'
+                )}
+                stored_names = [str(name) for name in stored['pattern_names']]
+
+            # Pattern ids are positions in the detector's pattern list, which
+            # may have changed since the index was written
+            if stored_names != self.pattern_names:
+                remap = np.array(
+                    [self._pattern_ids.get(name, -1) for name in stored_names],
+                    dtype=np.int32
+                )
+                ids = remap[entry['pattern_id']]
+                keep = ids >= 0
+                entry['bar_index'] = entry['bar_index'][keep]
+                entry['pattern_id'] = ids[keep]
+                entry['strength'] = entry['strength'][keep]
+
+        self._entries[key] = entry
+        self._versions[key] = version
+        return entry
+
+    def _stream_lock(self, symbol: str, timeframe: str):
+        """Exclusive lock on an index across processes, released when the file is closed"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.directory / f"{self._key(symbol, timeframe)}.lock", 'a')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def _save(self, symbol: str, timeframe: str, entry: Dict[str, np.ndarray]):
+        """Write an index atomically so readers never see a partial file"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(symbol, timeframe)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, pattern_names=np.array(self.pattern_names), **entry)
+        os.replace(tmp_path, path)
+        key = self._key(symbol, timeframe)
+        self._entries[key] = entry
+        self._versions[key] = self._version(path)
+
+    def update(self, symbol: str, timeframe: str, ohlcv_data: pd.DataFrame) -> int:
+        """
+        Index candles newer than the last indexed bar
+
+        Only the new bars (plus enough preceding context for multi-candle
+        patterns) are run through TA-Lib, so appending a candle is cheap.
+
+        Args:
+            symbol: Trading pair or stock symbol
+            timeframe: Candlestick timeframe
+            ohlcv_data: OHLCV data ending with the newest candles; once the
+                index has bars it must repeat the last context_bars of them
+                (fewer if fewer are indexed), so patterns ending on the
+                first new bars see their earlier candles
+
+        Returns:
+            Number of new pattern occurrences added
+
+        Raises:
+            ValueError: ohlcv_data starts too late to continue the index
+        """
+        times = timestamps_ms(ohlcv_data)
+
+        with self._lock, self._stream_lock(symbol, timeframe):
+            entry = self._load(symbol, timeframe)
+            indexed = entry['timestamps']
+            first_new = 0
+            if len(indexed):
+                first_new = int(np.searchsorted(times, indexed[-1], side='right'))
+            if first_new >= len(times):
+                return 0
+            context = min(self.context_bars, len(indexed))
+            if context and (first_new < context or times[first_new - 1] != indexed[-1]):
+                raise ValueError(
+                    f"Candles for {symbol} {timeframe} must include the {context} bars "
+                    f"up to the last indexed one"
+                )
+
+            context_start = max(0, first_new - self.context_bars)
+            signals = self.detector.detect_pattern_signals(
+                slice_bars(ohlcv_data, context_start)
+            )
+
+            base = len(indexed) - (first_new - context_start)
+            offset = first_new - context_start
+            new_bars, new_ids, new_strengths = [], [], []
+            for name, values in signals.items():
+                if name not in self._pattern_ids:
+                    continue
+                hits = np.flatnonzero(values[offset:]) + offset
+                new_bars.append(base + hits)
+                new_ids.append(np.full(len(hits), self._pattern_ids[name]))
+                new_strengths.append(values[hits])
+
+            bars = np.concatenate(new_bars) if new_bars else _EMPTY_INT32
+            ids = np.concatenate(new_ids) if new_ids else _EMPTY_INT32
+            strengths = np.concatenate(new_strengths) if new_strengths else _EMPTY_INT32
+            order = np.lexsort((ids, bars))
+
+            entry = {
+                'timestamps': np.concatenate((indexed, times[first_new:])),
+                'bar_index': np.concatenate(
+                    (entry['bar_index'], bars[order].astype(np.int32))
+                ),
+                'pattern_id': np.concatenate(
+                    (entry['pattern_id'], ids[order].astype(np.int32))
+                ),
+                'strength': np.concatenate(
+                    (entry['strength'], strengths[order].astype(np.int32))
+                )
+            }
+            self._save(symbol, timeframe, entry)
+
+        return len(order)
+
+    def query(
+        self,
+        symbol: str,
+        timeframe: str,
+        patterns: Optional[List[str]] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        direction: Optional[str] = None,
+        min_strength: int = 0
+    ) -> Dict[str, np.ndarray]:
+        """
+        Look up indexed pattern occurrences
+
+        Args:
+            symbol: Trading pair or stock symbol
+            timeframe: Candlestick timeframe
+            patterns: Pattern names to include (all if None)
+            start_time: Earliest bar time to include
+            end_time: Latest bar time to include
+            direction: 'bullish' or 'bearish' (both if None)
+            min_strength: Minimum absolute TA-Lib strength
+
+        Returns:
+            Dictionary of parallel arrays: bar_index, pattern_id, strength
+            and timestamp (epoch milliseconds)
+        """
+        entry = self._load(symbol, timeframe)
+        bars = entry['bar_index']
+        timestamps = entry['timestamps'][bars]
+        mask = np.abs(entry['strength']) >= max(min_strength, 1)
+
+        if patterns is not None:
+            ids = [self._pattern_ids[name] for name in patterns if name in self._pattern_ids]
+            mask &= np.isin(entry['pattern_id'], ids)
+        if start_time is not None:
+            mask &= timestamps >= _to_ms(start_time)
+        if end_time is not None:
+            mask &= timestamps <= _to_ms(end_time)
+        if direction == 'bullish':
+            mask &= entry['strength'] > 0
+        elif direction == 'bearish':
+            mask &= entry['strength'] < 0
+        elif direction is not None:
+            raise ValueError(f"Unsupported direction: {direction}")
+
+        return {
+            'bar_index': bars[mask],
+            'pattern_id': entry['pattern_id'][mask],
+            'strength': entry['strength'][mask],
+            'timestamp': timestamps[mask]
+        }
+
+    def to_occurrences(
+        self,
+        hits: Dict[str, np.ndarray],
+        end_indices: Optional[np.ndarray] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Convert query results to the pattern dicts produced by PatternDetector
+
+        Args:
+            hits: Result of query
+            end_indices: Bar positions to report instead of the indexed bar
+                index, e.g. positions within a different OHLCV frame
+
+        Returns:
+            List of detected patterns with their properties
+        """
+        if end_indices is None:
+            end_indices = hits['bar_index']
+        lengths = self.pattern_lengths[hits['pattern_id']]
+
+        return [
+            {
+                'pattern_name': self.pattern_names[pattern_id],
+                'confidence': abs(int(strength)) / 100.0,
+                'start_index': max(0, int(end) - int(length) + 1),
+                'end_index': int(end),
+                'pattern_type': 'bullish' if strength > 0 else 'bearish',
+                'detection_method': 'talib'
+            }
+            for pattern_id, strength, end, length in zip(
+                hits['pattern_id'], hits['strength'], end_indices, lengths
+            )
+        ]
+
+    def indexed_bars(self, symbol: str, timeframe: str) -> int:
+        """Number of bars covered by the index"""
+        return len(self._load(symbol, timeframe)['timestamps'])
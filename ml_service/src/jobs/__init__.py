@@ -0,0 +1,8 @@
+from .backtests import BacktestJobManager
+from .checkpoints import BacktestCheckpoint
+from .precompute import DetectionCache, PopularityTracker, PrecomputeScheduler, RedisPopularityTracker
+
+__all__ = [
+    'BacktestCheckpoint', 'BacktestJobManager', 'DetectionCache', 'PopularityTracker', 'PrecomputeScheduler',
+    'RedisPopularityTracker'
+]
\ No newline at end of file
@@ -0,0 +1,428 @@
+import numpy as np
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from ..config import BACKTEST_SETTINGS
+from ..data.candles import CandleSeries, OHLCVData
+from ..models.backtester import PatternBacktester
+from ..monitoring.metrics import REGISTRY
+from ..persistence import ResultWriter
+from .checkpoints import BacktestCheckpoint
+
+logger = logging.getLogger(__name__)
+
+BACKTEST_JOBS = REGISTRY.counter(
+    'backtest_jobs',
+    'Backtest jobs by outcome',
+    ['status']
+)
+
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+
+
+def _plain(value):
+    """numpy scalars inside nested results as JSON-encodable Python values"""
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class _Job:
+    """In-memory view of a job; its trades stay on disk and pages are read from the checkpoint"""
+
+    def __init__(self, checkpoint: BacktestCheckpoint, spec: Dict[str, Any], progress: Dict[str, Any]):
+        self.job_id = checkpoint.job_id
+        self.checkpoint = checkpoint
+        self.spec = spec
+        self.status = progress['status']
+        self.processed = progress['processed']
+        self.total = progress.get('total')
+        self.bars_processed = progress.get('bars_processed', 0)
+        self.stats = progress.get('stats')
+        self.error = progress.get('error')
+        self.trade_count = progress.get('trades', 0)
+        self.cancel_requested = threading.Event()
+        self.future: Optional[Future] = None
+
+    def progress(self) -> Dict[str, Any]:
+        return {
+            'status': self.status,
+            'processed': self.processed,
+            'total': self.total,
+            'bars_processed': self.bars_processed,
+            'trades': self.trade_count,
+            'stats': self.stats,
+            'error': self.error
+        }
+
+
+class BacktestJobManager:
+    """
+    Runs pattern backtests as background jobs on a worker pool
+
+    submit() stores the job's candles and parameters and returns a job id
+    at once. A worker detects the patterns, then backtests the occurrences
+    in chronological chunks; after every chunk it records progress and
+    checkpoints the new trades, and it stops early when the job is
+    cancelled or the manager shuts down. Jobs left unfinished by a crash or
+    shutdown continue from their last checkpoint on resume().
+
+    With a result writer, completed jobs that name a symbol are queued on
+    it as Backtest documents; the writer runs on loop, the event loop the
+    manager was created for.
+
+    Managers in several processes (pre-fork workers) may share a directory:
+    each job runs only in the process holding its checkpoint's claim, and
+    the others serve its status and trades from the checkpoint, re-read on
+    every call.
+    """
+
+    def __init__(
+        self,
+        detector,
+        backtester: Optional[PatternBacktester] = None,
+        directory: Optional[Path] = None,
+        workers: int = BACKTEST_SETTINGS['job_workers'],
+        chunk_size: int = BACKTEST_SETTINGS['job_chunk_size'],
+        result_writer: Optional[ResultWriter] = None,
+        loop: Optional[asyncio.AbstractEventLoop] = None
+    ):
+        self.detector = detector
+        self.backtester = backtester or PatternBacktester()
+        self.directory = Path(directory or BACKTEST_SETTINGS['job_directory'])
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.result_writer = result_writer
+        self.loop = loop
+        self._jobs: Dict[str, _Job] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        """Start the worker pool"""
+        with self._lock:
+            if self._executor is None:
+                self._stopping.clear()
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='backtest-job')
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stop the worker pool
+
+        Running jobs stop at their next chunk boundary and queued jobs are
+        not started; both stay checkpointed for resume().
+        """
+        self._stopping.set()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            if job.future is not None and job.future.cancelled():
+                # Never started, so the claim is free for the next resume()
+                job.checkpoint.release()
+
+    def submit(
+        self,
+        data: OHLCVData,
+        symbol: Optional[str] = None,
+        timeframe: Optional[str] = None,
+        patterns: Optional[List[str]] = None,
+        holding_period: int = 5,
+        stop_loss: float = -0.02,
+        take_profit: float = 0.04
+    ) -> str:
+        """
+        Queue a backtest of the patterns detected in data
+
+        Args:
+            data: OHLCV DataFrame or CandleSeries
+            symbol: Trading pair or stock symbol, for reference
+            timeframe: Candlestick timeframe, for reference
+            patterns: Pattern names to backtest (all if None)
+            holding_period: Number of candles to hold the position
+            stop_loss: Stop loss percentage
+            take_profit: Take profit percentage
+
+        Returns:
+            Job id
+        """
+        self.prune()
+        candles = data if isinstance(data, CandleSeries) else CandleSeries.from_dataframe(data)
+        spec = {
+            'symbol': symbol,
+            'timeframe': timeframe,
+            'patterns': patterns,
+            'holding_period': holding_period,
+            'stop_loss': stop_loss,
+            'take_profit': take_profit,
+            'submitted_at': time.time()
+        }
+        checkpoint = BacktestCheckpoint.create(self.directory / uuid.uuid4().hex, spec, candles)
+        checkpoint.claim()
+        return self._enqueue(checkpoint, candles)
+
+    def resume(self) -> List[str]:
+        """
+        Re-queue checkpointed jobs that never finished; returns their ids
+
+        Jobs claimed by another live process (running, or resumed by another
+        worker) are left to it.
+        """
+        resumed = []
+        if not self.directory.exists():
+            return resumed
+        for path in sorted(self.directory.iterdir()):
+            checkpoint = BacktestCheckpoint(path)
+            progress = checkpoint.load_progress()
+            if progress is None or progress['status'] in FINISHED_STATUSES:
+                continue
+            with self._lock:
+                known = checkpoint.job_id in self._jobs
+            if known or not checkpoint.claim():
+                continue
+            if checkpoint.load_progress()['status'] in FINISHED_STATUSES:
+                # Finished by its previous owner between the two reads
+                checkpoint.release()
+                continue
+            resumed.append(self._enqueue(checkpoint))
+        if resumed:
+            logger.info(f"Resuming {len(resumed)} backtest jobs")
+        return resumed
+
+    def status(self, job_id: str) -> Dict[str, Any]:
+        """
+        Job status and progress, plus statistics once completed
+
+        Raises:
+            KeyError: Unknown job id
+        """
+        job = self._get(job_id)
+        with self._lock:
+            return {
+                'job_id': job.job_id,
+                'status': job.status,
+                'symbol': job.spec['symbol'],
+                'timeframe': job.spec['timeframe'],
+                'progress': {
+                    'occurrences_processed': job.processed,
+                    'occurrences_total': job.total,
+                    'bars_processed': job.bars_processed,
+                    'trades': job.trade_count
+                },
+                'stats': job.stats,
+                'error': job.error
+            }
+
+    def trades(
+        self,
+        job_id: str,
+        offset: int = 0,
+        limit: int = BACKTEST_SETTINGS['page_size']
+    ) -> Dict[str, Any]:
+        """
+        One page of the trades computed so far, read from the checkpoint
+
+        Raises:
+            KeyError: Unknown job id
+        """
+        job = self._get(job_id)
+        with self._lock:
+            status, total = job.status, job.trade_count
+        return {
+            'job_id': job.job_id,
+            'status': status,
+            'total': total,
+            'offset': offset,
+            'trades': job.checkpoint.load_trades(total, offset, limit)
+        }
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued or running job
+
+        Returns:
+            False if the job had already finished
+
+        Raises:
+            KeyError: Unknown job id
+        """
+        job = self._get(job_id)
+        with self._lock:
+            if job.status in FINISHED_STATUSES:
+                return False
+            job.cancel_requested.set()
+        if job.future is None:
+            # Run by another process, which stops at its next chunk boundary
+            job.checkpoint.request_cancel()
+        elif job.future.cancel():
+            # Never started, so no worker will record the cancellation
+            self._finish(job, 'cancelled')
+        return True
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Block until the job stops running and return its status"""
+        job = self._get(job_id)
+        if job.future is not None:
+            try:
+                job.future.result(timeout)
+            except Exception:
+                pass
+        return self.status(job_id)
+
+    def prune(self, max_age_hours: float = BACKTEST_SETTINGS['job_retention_hours']):
+        """Delete finished jobs not updated for max_age_hours"""
+        if not self.directory.exists():
+            return
+        cutoff = time.time() - max_age_hours * 3600
+        for path in self.directory.iterdir():
+            checkpoint = BacktestCheckpoint(path)
+            progress = checkpoint.load_progress()
+            if progress is None or progress['status'] not in FINISHED_STATUSES:
+                continue
+            if checkpoint.modified_at() < cutoff:
+                with self._lock:
+                    self._jobs.pop(checkpoint.job_id, None)
+                checkpoint.delete()
+
+    def _get(self, job_id: str) -> _Job:
+        """
+        A job as this process runs it, or else a fresh view of its checkpoint
+
+        Jobs run by other processes (or before a restart) are not cached, as
+        their checkpoint changes under us.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+
+        if not job_id.isalnum():
+            raise KeyError(job_id)
+        checkpoint = BacktestCheckpoint(self.directory / job_id)
+        progress = checkpoint.load_progress()
+        if progress is None:
+            raise KeyError(job_id)
+        return _Job(checkpoint, checkpoint.spec, progress)
+
+    def _enqueue(self, checkpoint: BacktestCheckpoint, candles: Optional[CandleSeries] = None) -> str:
+        self.start()
+        job = _Job(checkpoint, checkpoint.spec, checkpoint.load_progress())
+        with self._lock:
+            self._jobs[job.job_id] = job
+            job.future = self._executor.submit(self._run, job, candles)
+        return job.job_id
+
+    def _occurrences(self, candles: CandleSeries, spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Detected patterns in chronological order, so progress tracks the bars"""
+        patterns = self.detector.detect_patterns(candles, use_ml=False)
+        if spec['patterns']:
+            wanted = set(spec['patterns'])
+            patterns = [p for p in patterns if p['pattern_name'] in wanted]
+        return sorted(patterns, key=lambda p: p['end_index'])
+
+    def _save(self, job: _Job):
+        with self._lock:
+            progress = job.progress()
+        job.checkpoint.save_progress(progress)
+
+    def _finish(self, job: _Job, status: str, error: Optional[str] = None):
+        with self._lock:
+            job.status = status
+            job.error = error
+        self._save(job)
+        job.checkpoint.release()
+        BACKTEST_JOBS.inc(status=status)
+
+    def _persist(self, job: _Job, results: Dict[str, Any], candles: CandleSeries):
+        """Queue a completed job's results on the result writer, without waiting for room"""
+        spec = job.spec
+        if self.result_writer is None or self.loop is None or not spec['symbol']:
+            return
+
+        def logged(future):
+            if not future.cancelled() and future.exception() is not None:
+                logger.error(f"Error persisting backtest job {job.job_id}: {future.exception()}")
+
+        try:
+            asyncio.run_coroutine_threadsafe(
+                self.result_writer.write_backtest(
+                    spec['symbol'], spec['timeframe'], results, candles, name=f"Backtest job {job.job_id}"
+                ),
+                self.loop
+            ).add_done_callback(logged)
+        except RuntimeError as e:
+            # The event loop has closed (shutting down)
+            logger.error(f"Error persisting backtest job {job.job_id}: {e}")
+
+    def _cancelled(self, job: _Job) -> bool:
+        return job.cancel_requested.is_set() or job.checkpoint.cancel_requested()
+
+    def _run(self, job: _Job, candles: Optional[CandleSeries]):
+        checkpoint = job.checkpoint
+        try:
+            if self._cancelled(job):
+                self._finish(job, 'cancelled')
+                return
+            candles = candles if candles is not None else checkpoint.load_candles()
+            occurrences = self._occurrences(candles, job.spec)
+
+            # Pick up after the last checkpointed chunk
+            progress = checkpoint.load_progress()
+            checkpoint.truncate_trades(progress['trades'])
+            with self._lock:
+                job.status = 'running'
+                job.trade_count = progress['trades']
+                job.total = len(occurrences)
+            self._save(job)
+
+            spec = job.spec
+            for processed, chunk in self.backtester.iter_returns(
+                candles,
+                occurrences,
+                spec['holding_period'],
+                spec['stop_loss'],
+                spec['take_profit'],
+                start=progress['processed'],
+                chunk_size=self.chunk_size
+            ):
+                checkpoint.append_trades(chunk)
+                with self._lock:
+                    job.trade_count += len(chunk)
+                    job.processed = processed
+                    job.bars_processed = occurrences[processed - 1]['end_index'] + 1
+                self._save(job)
+
+                if self._cancelled(job):
+                    self._finish(job, 'cancelled')
+                    return
+                if self._stopping.is_set():
+                    # Left as running on disk, so resume() picks it up
+                    checkpoint.release()
+                    return
+
+            results = self.backtester.summarize_trades(checkpoint.load_trades(job.trade_count))
+            with self._lock:
+                job.processed = len(occurrences)
+                job.bars_processed = len(candles)
+                job.stats = _plain({
+                    key: results[key] for key in ('overall_stats', 'pattern_stats', 'confidence_stats')
+                })
+            self._persist(job, results, candles)
+            self._finish(job, 'completed')
+
+        except Exception as e:
+            logger.error(f"Backtest job {job.job_id} failed: {e}")
+            self._finish(job, 'failed', str(e))
@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import fcntl
+import json
+import os
+import shutil
+from ..data.candles import OHLCV_COLUMNS, CandleSeries
+
+_TIME_FIELDS = ('entry_time', 'exit_time')
+_OFFSET = np.dtype('<u8')
+
+
+def _encode_trade(trade: Dict[str, Any]) -> Dict[str, Any]:
+    encoded = {}
+    for key, value in trade.items():
+        if key in _TIME_FIELDS and isinstance(value, pd.Timestamp):
+            value = {'ms': value.value // 1_000_000}
+        elif isinstance(value, np.generic):
+            value = value.item()
+        encoded[key] = value
+    return encoded
+
+
+def _decode_trade(encoded: Dict[str, Any]) -> Dict[str, Any]:
+    trade = dict(encoded)
+    for key in _TIME_FIELDS:
+        if isinstance(trade.get(key), dict):
+            trade[key] = pd.Timestamp(trade[key]['ms'], unit='ms')
+    return trade
+
+
+def _write_json(path: Path, payload: Dict[str, Any]):
+    # Written to a temporary file and renamed so a crash never leaves half a file
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+def _write_offsets(path: Path, offsets: np.ndarray):
+    tmp_path = path.with_suffix('.tmp')
+    offsets.astype(_OFFSET).tofile(tmp_path)
+    os.replace(tmp_path, path)
+
+
+class BacktestCheckpoint:
+    """
+    On-disk state of one backtest job
+
+    spec.json holds the job parameters, candles.npz its input candles,
+    trades.jsonl the trades computed so far (appended chunk by chunk) and
+    progress.json the status plus how many occurrences and trades are
+    complete. Progress is written after the trades it counts, so trades
+    appended by a chunk that crashed before its progress update are ignored.
+    trades.idx holds the byte offset where each trade's line ends (uint64),
+    so a page of trades is read without parsing the lines before it.
+
+    The process running a job holds an exclusive flock on claim.lock, which
+    the kernel releases if it dies, so each job runs in one process even
+    when several workers resume checkpoints. A cancel file asks whichever
+    process holds the claim to stop.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.job_id = self.directory.name
+        self._claim_fd: Optional[int] = None
+
+    @classmethod
+    def create(cls, directory: Path, spec: Dict[str, Any], candles: CandleSeries) -> 'BacktestCheckpoint':
+        checkpoint = cls(directory)
+        checkpoint.directory.mkdir(parents=True, exist_ok=True)
+        with open(checkpoint.directory / 'candles.npz', 'wb') as f:
+            np.savez(f, timestamps=candles.timestamps, **{name: candles[name] for name in OHLCV_COLUMNS})
+        _write_json(checkpoint.directory / 'spec.json', spec)
+        checkpoint.save_progress({'status': 'queued', 'processed': 0, 'trades': 0})
+        return checkpoint
+
+    @property
+    def spec(self) -> Dict[str, Any]:
+        with open(self.directory / 'spec.json') as f:
+            return json.load(f)
+
+    def load_candles(self) -> CandleSeries:
+        with np.load(self.directory / 'candles.npz') as stored:
+            return CandleSeries(stored['timestamps'], *(stored[name] for name in OHLCV_COLUMNS))
+
+    def save_progress(self, progress: Dict[str, Any]):
+        _write_json(self.directory / 'progress.json', progress)
+
+    def load_progress(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.directory / 'progress.json') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def append_trades(self, trades: List[Dict[str, Any]]):
+        lines = [(json.dumps(_encode_trade(trade)) + '\n').encode() for trade in trades]
+        with open(self.directory / 'trades.jsonl', 'ab') as f:
+            start = f.tell()
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        ends = start + np.cumsum([len(line) for line in lines], dtype=_OFFSET)
+        with open(self.directory / 'trades.idx', 'ab') as f:
+            f.write(ends.astype(_OFFSET).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load_trades(self, count: int, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Trades [offset, offset + limit) of the first count (the ones covered
+        by the saved progress), all of them by default
+        """
+        stop = count if limit is None else min(count, offset + limit)
+        if offset >= stop:
+            return []
+        ends = self._trade_ends(stop)
+        stop = len(ends)
+        if offset >= stop:
+            return []
+        start = int(ends[offset - 1]) if offset else 0
+        with open(self.directory / 'trades.jsonl', 'rb') as f:
+            f.seek(start)
+            lines = f.read(int(ends[stop - 1]) - start).splitlines()
+        return [_decode_trade(json.loads(line)) for line in lines]
+
+    def _trade_ends(self, count: int) -> np.ndarray:
+        """
+        Line end offsets of the first count trades (fewer if trades.jsonl is
+        shorter), scanning trades.jsonl when the index falls short
+
+        Only truncate_trades() writes a rebuilt index: the process running
+        the job may be appending to both files meanwhile.
+        """
+        index_path = self.directory / 'trades.idx'
+        ends = np.fromfile(index_path, dtype=_OFFSET, count=count) if index_path.exists() else np.empty(0, _OFFSET)
+        if len(ends) < count and (self.directory / 'trades.jsonl').exists():
+            # Written before the index existed, or by a chunk interrupted between the two files
+            with open(self.directory / 'trades.jsonl', 'rb') as f:
+                ends = np.cumsum([len(line) for line in f], dtype=_OFFSET)[:count]
+        return ends
+
+    def truncate_trades(self, count: int):
+        """Drop trades beyond count, left by a chunk that never recorded its progress"""
+        path = self.directory / 'trades.jsonl'
+        if not path.exists():
+            return
+        ends = self._trade_ends(count) if count else np.empty(0, _OFFSET)
+        with open(path, 'rb+') as f:
+            f.truncate(int(ends[-1]) if len(ends) else 0)
+        _write_offsets(self.directory / 'trades.idx', ends)
+
+    def claim(self) -> bool:
+        """Take the exclusive right to run the job; False if another process holds it"""
+        if self._claim_fd is not None:
+            return True
+        try:
+            fd = os.open(self.directory / 'claim.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError:
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._claim_fd = fd
+        return True
+
+    def release(self):
+        if self._claim_fd is not None:
+            os.close(self._claim_fd)
+            self._claim_fd = None
+
+    def request_cancel(self):
+        (self.directory / 'cancel').touch()
+
+    def cancel_requested(self) -> bool:
+        return (self.directory / 'cancel').exists()
+
+    def modified_at(self) -> float:
+        return (self.directory / 'progress.json').stat().st_mtime
+
+    def delete(self):
+        self.release()
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,511 @@
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import heapq
+import logging
+import threading
+import time
+import orjson
+import redis
+from ..config import PRECOMPUTE_SETTINGS
+from ..data.market_data import TIMEFRAME_SECONDS, MarketDataFetcher, create_redis_client
+from ..data.forward_returns import ForwardReturnTable
+from ..data.pattern_index import PatternIndex, timestamps_ms
+from ..monitoring.metrics import CACHE_REQUESTS, REGISTRY
+from ..monitoring.profiling import profiled
+
+logger = logging.getLogger(__name__)
+
+PRECOMPUTED_DETECTIONS = REGISTRY.counter(
+    'precomputed_detections',
+    'Detections run by the precompute scheduler or on a cache miss',
+    ['trigger']
+)
+PRECOMPUTE_HOT_STREAMS = REGISTRY.gauge(
+    'precompute_hot_streams',
+    'Streams in the precompute hot set',
+    multiprocess_mode='max'  # Every worker ranks the same shared popularity
+)
+
+Stream = Tuple[str, str]
+
+
+def candle_boundary(timeframe: str, now: float) -> int:
+    """Close time (epoch ms) of the last closed candle, which is the forming candle's open"""
+    period = TIMEFRAME_SECONDS[timeframe]
+    return int(now // period * period * 1000)
+
+
+def _utc(milliseconds: int) -> datetime:
+    return pd.Timestamp(milliseconds, unit='ms').to_pydatetime()
+
+
+class PopularityTracker:
+    """
+    Exponentially decayed request counts per (symbol, timeframe)
+
+    A request adds 1 to its stream's score and scores halve every
+    half_life_s, so the hot set follows what dashboards ask for now.
+    """
+
+    def __init__(
+        self,
+        half_life_s: float = PRECOMPUTE_SETTINGS['popularity_half_life_s'],
+        max_tracked: int = PRECOMPUTE_SETTINGS['max_tracked'],
+        clock: Callable[[], float] = time.time
+    ):
+        self.half_life_s = half_life_s
+        self.max_tracked = max_tracked
+        self.clock = clock
+        self._scores: Dict[Stream, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def _decayed(self, score: float, updated_at: float, now: float) -> float:
+        return score * 0.5 ** ((now - updated_at) / self.half_life_s)
+
+    def record(self, symbol: str, timeframe: str, count: float = 1.0):
+        now = self.clock()
+        with self._lock:
+            score, updated_at = self._scores.get((symbol, timeframe), (0.0, now))
+            self._scores[(symbol, timeframe)] = (self._decayed(score, updated_at, now) + count, now)
+            if len(self._scores) > self.max_tracked:
+                self._forget(now)
+
+    def _forget(self, now: float):
+        # Drop the least popular half in one go rather than one stream per request
+        ranked = sorted(self._scores, key=lambda stream: self._decayed(*self._scores[stream], now))
+        for stream in ranked[:len(ranked) // 2]:
+            del self._scores[stream]
+
+    def score(self, symbol: str, timeframe: str) -> float:
+        with self._lock:
+            entry = self._scores.get((symbol, timeframe))
+        return self._decayed(*entry, self.clock()) if entry else 0.0
+
+    def hot(
+        self,
+        limit: int = PRECOMPUTE_SETTINGS['hot_set_size'],
+        min_score: float = PRECOMPUTE_SETTINGS['min_popularity']
+    ) -> List[Stream]:
+        """The most popular streams, most popular first"""
+        now = self.clock()
+        with self._lock:
+            scores = [(self._decayed(*entry, now), stream) for stream, entry in self._scores.items()]
+        return [stream for score, stream in heapq.nlargest(limit, scores) if score >= min_score]
+
+
+class RedisPopularityTracker(PopularityTracker):
+    """
+    PopularityTracker kept in Redis, so every worker ranks the requests of all
+
+    A request adds count * 2 ** (t / half_life_s) to its stream in a sorted
+    set, t being the time since the set's epoch began; ranking by the stored
+    value is ranking by decayed score, and ZINCRBY makes each request one
+    atomic update. Every EPOCH_HALF_LIVES half-lives a new set starts (so
+    the stored values stay small), and the previous one is still read: by
+    the time a set is no longer read its entries have decayed to at most
+    2 ** -EPOCH_HALF_LIVES of their weight.
+    """
+
+    EPOCH_HALF_LIVES = 32
+
+    def __init__(
+        self,
+        redis_client: Optional[redis.Redis] = None,
+        half_life_s: float = PRECOMPUTE_SETTINGS['popularity_half_life_s'],
+        max_tracked: int = PRECOMPUTE_SETTINGS['max_tracked'],
+        clock: Callable[[], float] = time.time,
+        key_prefix: str = 'popularity'
+    ):
+        super().__init__(half_life_s, max_tracked, clock)
+        self.redis_client = redis_client if redis_client is not None else create_redis_client()
+        self.key_prefix = key_prefix
+        self.epoch_s = half_life_s * self.EPOCH_HALF_LIVES
+
+    def __len__(self) -> int:
+        return len(self._scores_at(self.clock()))
+
+    def _epoch(self, now: float) -> int:
+        return int(now // self.epoch_s)
+
+    def _key(self, epoch: int) -> str:
+        return f"{self.key_prefix}:{epoch}"
+
+    def _growth(self, epoch: int, now: float) -> float:
+        """Factor between an epoch's stored values and the scores they stand for at now"""
+        return 2 ** ((now - epoch * self.epoch_s) / self.half_life_s)
+
+    def record(self, symbol: str, timeframe: str, count: float = 1.0):
+        now = self.clock()
+        epoch = self._epoch(now)
+        key = self._key(epoch)
+        try:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            pipeline.zincrby(key, count * self._growth(epoch, now), f"{symbol}:{timeframe}")
+            pipeline.expire(key, int(2 * self.epoch_s) + 1)
+            pipeline.zcard(key)
+            *_, tracked = pipeline.execute()
+            if tracked > self.max_tracked:
+                # Drop the least popular half in one go rather than one stream per request
+                self.redis_client.zremrangebyrank(key, 0, tracked // 2 - 1)
+        except redis.RedisError as e:
+            logger.error(f"Error recording a request for {symbol} {timeframe}: {e}")
+
+    def _scores_at(self, now: float) -> Dict[Stream, float]:
+        epoch = self._epoch(now)
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for past in (epoch, epoch - 1):
+            pipeline.zrange(self._key(past), 0, -1, withscores=True)
+        scores: Dict[Stream, float] = {}
+        for past, entries in zip((epoch, epoch - 1), pipeline.execute()):
+            growth = self._growth(past, now)
+            for member, value in entries:
+                symbol, timeframe = (member.decode() if isinstance(member, bytes) else member).rsplit(':', 1)
+                scores[(symbol, timeframe)] = scores.get((symbol, timeframe), 0.0) + value / growth
+        return scores
+
+    def score(self, symbol: str, timeframe: str) -> float:
+        now = self.clock()
+        epoch = self._epoch(now)
+        try:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for past in (epoch, epoch - 1):
+                pipeline.zscore(self._key(past), f"{symbol}:{timeframe}")
+            values = pipeline.execute()
+        except redis.RedisError as e:
+            logger.error(f"Error reading the popularity of {symbol} {timeframe}: {e}")
+            return 0.0
+        return sum(
+            value / self._growth(past, now)
+            for past, value in zip((epoch, epoch - 1), values) if value is not None
+        )
+
+    def hot(
+        self,
+        limit: int = PRECOMPUTE_SETTINGS['hot_set_size'],
+        min_score: float = PRECOMPUTE_SETTINGS['min_popularity']
+    ) -> List[Stream]:
+        try:
+            scores = self._scores_at(self.clock())
+        except redis.RedisError as e:
+            logger.error(f"Error reading stream popularity: {e}")
+            return []
+        ranked = heapq.nlargest(limit, ((score, stream) for stream, score in scores.items()))
+        return [stream for score, stream in ranked if score >= min_score]
+
+
+class DetectionCache:
+    """
+    Latest detection per stream in Redis, shared by all workers
+
+    Entries expire one candle after the next close, so a stream that stops
+    being refreshed falls out on its own.
+    """
+
+    def __init__(self, redis_client: Optional[redis.Redis] = None):
+        self.redis_client = redis_client if redis_client is not None else create_redis_client()
+
+    @staticmethod
+    def _key(symbol: str, timeframe: str) -> str:
+        return f"patterns:{symbol}:{timeframe}"
+
+    def get(self, symbol: str, timeframe: str) -> Optional[Dict[str, Any]]:
+        try:
+            payload = self.redis_client.get(self._key(symbol, timeframe))
+            return orjson.loads(payload) if payload else None
+        except (redis.RedisError, orjson.JSONDecodeError) as e:
+            logger.error(f"Error reading cached patterns for {symbol} {timeframe}: {e}")
+            return None
+
+    def set(self, entry: Dict[str, Any]):
+        try:
+            self.redis_client.set(
+                self._key(entry['symbol'], entry['timeframe']),
+                orjson.dumps(entry, option=orjson.OPT_SERIALIZE_NUMPY),
+                ex=2 * TIMEFRAME_SECONDS[entry['timeframe']]
+            )
+        except redis.RedisError as e:
+            logger.error(f"Error caching patterns for {entry['symbol']} {entry['timeframe']}: {e}")
+
+    def claim(self, symbol: str, timeframe: str, close_time: int) -> bool:
+        """True for the first worker to claim a stream's close, so only it precomputes"""
+        try:
+            return bool(self.redis_client.set(
+                f"{self._key(symbol, timeframe)}:claim:{close_time}",
+                1,
+                nx=True,
+                ex=TIMEFRAME_SECONDS[timeframe]
+            ))
+        except redis.RedisError as e:
+            logger.error(f"Error claiming {symbol} {timeframe}: {e}")
+            return True
+
+    def release(self, symbol: str, timeframe: str, close_time: int):
+        """Give up a claimed close, so the stream can be claimed again for a retry"""
+        try:
+            self.redis_client.delete(f"{self._key(symbol, timeframe)}:claim:{close_time}")
+        except redis.RedisError as e:
+            logger.error(f"Error releasing {symbol} {timeframe}: {e}")
+
+
+class PrecomputeScheduler:
+    """
+    Detects patterns for the hot streams right after each candle close
+
+    Requests are counted per stream by a PopularityTracker (by default a
+    RedisPopularityTracker, so the workers rank streams by the requests of
+    all of them, on the cache's Redis). Shortly after
+    every candle close the most popular streams of that timeframe are
+    fetched together (one cache round trip, concurrent upstream calls),
+    detected on a worker thread and published to the DetectionCache, so
+    dashboards arriving at the top of the hour read a finished result.
+    A request that misses the cache computes the stream itself, and
+    concurrent misses for the same stream share that computation. With a
+    ForwardReturnTable and/or a PatternIndex, every computed stream also
+    feeds its closed candles to them. A stream away from the hot set for
+    longer than lookback_bars can no longer extend its index (the candles
+    no longer reach the last indexed bar), which is logged. A stream whose
+    fetch or detection fails gives up its claim and is retried after a
+    backoff that doubles per failure, until its close is refreshed or the
+    next one comes.
+    """
+
+    def __init__(
+        self,
+        detector,
+        fetcher: Optional[MarketDataFetcher] = None,
+        cache: Optional[DetectionCache] = None,
+        tracker: Optional[PopularityTracker] = None,
+        hot_set_size: int = PRECOMPUTE_SETTINGS['hot_set_size'],
+        min_popularity: float = PRECOMPUTE_SETTINGS['min_popularity'],
+        lookback_bars: int = PRECOMPUTE_SETTINGS['lookback_bars'],
+        settle_delay_s: float = PRECOMPUTE_SETTINGS['settle_delay_s'],
+        poll_interval_s: float = PRECOMPUTE_SETTINGS['poll_interval_s'],
+        retry_backoff_s: float = PRECOMPUTE_SETTINGS['retry_backoff_s'],
+        max_retry_backoff_s: float = PRECOMPUTE_SETTINGS['max_retry_backoff_s'],
+        source: str = PRECOMPUTE_SETTINGS['source'],
+        use_ml: bool = PRECOMPUTE_SETTINGS['use_ml'],
+        return_table: Optional[ForwardReturnTable] = None,
+        pattern_index: Optional[PatternIndex] = None,
+        clock: Callable[[], float] = time.time
+    ):
+        self.detector = detector
+        self.fetcher = fetcher if fetcher is not None else MarketDataFetcher()
+        self.cache = cache if cache is not None else DetectionCache()
+        self.tracker = tracker if tracker is not None else RedisPopularityTracker(
+            self.cache.redis_client, clock=clock
+        )
+        self.hot_set_size = hot_set_size
+        self.min_popularity = min_popularity
+        self.lookback_bars = lookback_bars
+        self.settle_delay_s = settle_delay_s
+        self.poll_interval_s = poll_interval_s
+        self.retry_backoff_s = retry_backoff_s
+        self.max_retry_backoff_s = max_retry_backoff_s
+        self.source = source
+        self.use_ml = use_ml
+        self.return_table = return_table
+        self.pattern_index = pattern_index
+        self.clock = clock
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight: Dict[Tuple[str, str, int], asyncio.Future] = {}
+        self._refreshed: Dict[Stream, int] = {}
+        self._retries: Dict[Stream, Tuple[int, int, float]] = {}  # Failed close, failures and when to retry
+        # Detection is CPU-bound; one thread keeps it off the event loop and the fetch pool
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='precompute')
+
+    def start(self):
+        """Start the scheduling task on the running event loop"""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def record(self, symbol: str, timeframe: str):
+        """Count a request for a stream"""
+        self.tracker.record(symbol, timeframe)
+
+    async def detect(self, symbol: str, timeframe: str) -> Tuple[Dict[str, Any], bool]:
+        """
+        Patterns of a stream up to its last closed candle
+
+        Returns:
+            The cache entry and whether it was a cache hit
+        """
+        self.record(symbol, timeframe)
+        close_time = self._close_time(timeframe, self.clock())
+        entry = self.cache.get(symbol, timeframe)
+        if entry is not None and entry['close_time'] >= close_time:
+            CACHE_REQUESTS.inc(cache='patterns', result='hit')
+            return entry, True
+        CACHE_REQUESTS.inc(cache='patterns', result='miss')
+        return await self._compute(symbol, timeframe, close_time, 'miss'), False
+
+    async def refresh(self) -> int:
+        """Precompute the hot streams whose candle closed since their last refresh"""
+        now = self.clock()
+        hot = self.tracker.hot(self.hot_set_size, self.min_popularity)
+        PRECOMPUTE_HOT_STREAMS.set(len(hot))
+        self._refreshed = {stream: self._refreshed[stream] for stream in hot if stream in self._refreshed}
+        self._retries = {stream: self._retries[stream] for stream in hot if stream in self._retries}
+
+        due: Dict[Tuple[str, int], List[str]] = {}
+        for symbol, timeframe in hot:
+            close_time = self._close_time(timeframe, now)
+            if self._refreshed.get((symbol, timeframe), -1) >= close_time:
+                continue
+            failed_close, _, retry_at = self._retries.get((symbol, timeframe), (-1, 0, 0.0))
+            if failed_close == close_time and now < retry_at:
+                continue
+            if self.cache.claim(symbol, timeframe, close_time):
+                due.setdefault((timeframe, close_time), []).append(symbol)
+            else:
+                # Another worker has the close
+                self._refreshed[(symbol, timeframe)] = close_time
+
+        refreshed = 0
+        for (timeframe, close_time), symbols in due.items():
+            try:
+                frames = await self._fetch([(symbol, timeframe) for symbol in symbols], close_time)
+            except Exception as e:
+                logger.error(f"Error fetching {timeframe} candles to precompute: {e}")
+                frames = {}
+            fetched = [symbol for symbol in symbols if (symbol, timeframe) in frames]
+            results = await asyncio.gather(
+                *(
+                    self._compute(symbol, timeframe, close_time, 'schedule', frames[(symbol, timeframe)])
+                    for symbol in fetched
+                ),
+                return_exceptions=True
+            )
+            errors = dict(zip(fetched, results))
+            for symbol in symbols:
+                result = errors.get(symbol, LookupError("No market data"))
+                if isinstance(result, BaseException):
+                    logger.error(f"Error precomputing patterns for {symbol} {timeframe}: {result}")
+                    self._retry_later((symbol, timeframe), close_time, now)
+                else:
+                    self._refreshed[(symbol, timeframe)] = close_time
+                    self._retries.pop((symbol, timeframe), None)
+                    refreshed += 1
+        return refreshed
+
+    def _retry_later(self, stream: Stream, close_time: int, now: float):
+        """Release a failed stream's claim and back off before the next attempt"""
+        failed_close, failures, _ = self._retries.get(stream, (-1, 0, 0.0))
+        failures = failures + 1 if failed_close == close_time else 1
+        backoff = min(self.retry_backoff_s * 2 ** (failures - 1), self.max_retry_backoff_s)
+        self._retries[stream] = (close_time, failures, now + backoff)
+        self.cache.release(*stream, close_time)
+
+    def _close_time(self, timeframe: str, now: float) -> int:
+        # A close only counts once it has settled, until then the previous result is current
+        return candle_boundary(timeframe, now - self.settle_delay_s)
+
+    def _next_wake(self, now: float) -> float:
+        """Seconds until the next close of a hot timeframe has settled or a retry is due, capped by the poll interval"""
+        wait = self.poll_interval_s
+        for timeframe in {timeframe for _, timeframe in self.tracker.hot(self.hot_set_size, self.min_popularity)}:
+            period = TIMEFRAME_SECONDS[timeframe]
+            settled = ((now - self.settle_delay_s) // period + 1) * period + self.settle_delay_s
+            wait = min(wait, settled - now)
+        for _, _, retry_at in self._retries.values():
+            wait = min(wait, max(0.0, retry_at - now))
+        return wait
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._next_wake(self.clock()))
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Error in precompute round: {e}")
+
+    async def _fetch(self, streams: List[Stream], close_time: int) -> Dict[Stream, pd.DataFrame]:
+        # Closed candles only; the aligned window also shares the market data cache across workers
+        period_ms = TIMEFRAME_SECONDS[streams[0][1]] * 1000
+        return await self.fetcher.fetch_many(
+            streams,
+            start_time=_utc(close_time - self.lookback_bars * period_ms),
+            end_time=_utc(close_time - 1),
+            source=self.source
+        )
+
+    def _compute(
+        self,
+        symbol: str,
+        timeframe: str,
+        close_time: int,
+        trigger: str,
+        data: Optional[pd.DataFrame] = None
+    ) -> asyncio.Future:
+        """Fetch (unless given data), detect and publish one stream; shared by concurrent callers"""
+        key = (symbol, timeframe, close_time)
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._detect(symbol, timeframe, close_time, trigger, data))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return asyncio.shield(future)
+
+    async def _detect(
+        self,
+        symbol: str,
+        timeframe: str,
+        close_time: int,
+        trigger: str,
+        data: Optional[pd.DataFrame]
+    ) -> Dict[str, Any]:
+        if data is None:
+            frames = await self._fetch([(symbol, timeframe)], close_time)
+            if (symbol, timeframe) not in frames:
+                raise LookupError(f"No market data for {symbol} {timeframe}")
+            data = frames[(symbol, timeframe)]
+
+        # A miss is computed for a request, so it belongs in that request's profile
+        detect = profiled(self.detector.detect_patterns) if trigger == 'miss' else self.detector.detect_patterns
+        patterns = await asyncio.get_running_loop().run_in_executor(
+            self._executor, detect, data, self.use_ml
+        )
+        times = timestamps_ms(data)
+        entry = {
+            'symbol': symbol,
+            'timeframe': timeframe,
+            'close_time': close_time,
+            'computed_at': int(self.clock() * 1000),
+            'candles': len(data),
+            'patterns': [
+                {
+                    **pattern,
+                    'start_time': int(times[pattern['start_index']]),
+                    'end_time': int(times[pattern['end_index']])
+                }
+                for pattern in patterns
+            ]
+        }
+        self.cache.set(entry)
+        PRECOMPUTED_DETECTIONS.inc(trigger=trigger)
+
+        # The freshly settled candles resolve pending forward returns and extend the index
+        for table, description in ((self.return_table, 'forward returns'), (self.pattern_index, 'pattern index')):
+            if table is None:
+                continue
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    self._executor, table.update, symbol, timeframe, data
+                )
+            except Exception as e:
+                logger.error(f"Error updating {description} for {symbol} {timeframe}: {e}")
+        return entry
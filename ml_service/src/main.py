@@ -1,13 +1,31 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import List, Optional
+from typing import Iterator, List, NamedTuple, Optional, Tuple
 import numpy as np
 import pandas as pd
 import talib
 import torch
+import asyncio
+import json
+import orjson
+import time
 from transformers import AutoModelForSequenceClassification, AutoTokenizer
+from .models import PatternDetector
+from .models.pattern_detector import NO_PATTERN_LABEL, talib_tail_lookback, tail_start
+from .alerts import AlertEngine, AlertMonitor, MongoAlertSource
+from .config import ALERT_SETTINGS, BACKTEST_SETTINGS, MARKET_DATA, PRECOMPUTE_SETTINGS, RESULT_SINK_SETTINGS
+from .data import ForwardReturnTable, PatternIndex
+from .data.market_data import TIMEFRAME_SECONDS
+from .jobs import BacktestJobManager, PrecomputeScheduler
+from .models.batching import MicroBatcher
+from .persistence import MongoResultStore, ResultWriter
+from .monitoring.metrics import REGISTRY, REQUEST_LATENCY, REQUESTS_IN_FLIGHT, time_stage
+from .monitoring.profiling import (
+    RequestProfiler, annotate_request, profile_to_pstats, profile_to_text
+)
 
 app = FastAPI(
     title="Candlestick Pattern Detection API",
@@ -24,6 +42,55 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+profiler = RequestProfiler()
+
+@app.middleware("http")
+async def profile_slow_requests(request: Request, call_next):
+    reason = profiler.should_profile(request.headers)
+    capture = None
+    if reason:
+        # Run alone, so other requests' work stays out of this profile
+        capture = await profiler.start_exclusive(reason, {
+            'method': request.method,
+            'path': request.url.path,
+            'query': dict(request.query_params),
+            'content_length': request.headers.get('content-length')
+        })
+    if capture is None:
+        async with profiler.admitted():
+            return await call_next(request)
+
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        profile_id = profiler.finish(capture, (time.perf_counter() - start) * 1000, status)
+        if profile_id and status < 500:
+            response.headers['X-Profile-Id'] = profile_id
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    REQUESTS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+        # Label by route template rather than raw URL to bound cardinality
+        route = request.scope.get('route')
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            path=getattr(route, 'path', 'unmatched'),
+            status=status
+        )
+
 # Pydantic models for request/response
 class CandlestickData(BaseModel):
     timestamp: datetime
@@ -38,12 +105,26 @@ class PatternResponse(BaseModel):
     confidence: float
     start_index: int
     end_index: int
-    pattern_type: str  # 'bullish' or 'bearish'
+    pattern_type: str  # 'bullish', 'bearish' or a sequence model label
 
 class DetectionRequest(BaseModel):
     data: List[CandlestickData]
     timeframe: str
     patterns_to_detect: Optional[List[str]] = None
+    use_ml: bool = False  # Also run the sequence model, micro-batched across requests
+    symbol: Optional[str] = None  # Persist the detected patterns under this symbol
+    since_index: Optional[int] = Field(None, ge=0)  # Only patterns ending at or after this candle
+    last_n: Optional[int] = Field(None, ge=0)  # Only patterns ending in the last n candles
+    deadline_ms: Optional[float] = Field(None, gt=0)  # Latency budget; model windows are cut to meet it
+
+class BacktestJobRequest(BaseModel):
+    data: List[CandlestickData]
+    timeframe: str
+    symbol: Optional[str] = None
+    patterns: Optional[List[str]] = None  # Backtest only these patterns
+    holding_period: int = 5
+    stop_loss: float = -0.02
+    take_profit: float = 0.04
 
 # Initialize TA-Lib patterns
 TALIB_PATTERNS = {
@@ -55,7 +136,6 @@ TALIB_PATTERNS = {
     # Double Candlestick Patterns
     'ENGULFING': talib.CDLENGULFING,
     'HARAMI': talib.CDLHARAMI,
-    'TWEEZER_TOP': talib.CDLTWEEZERBOT,
     
     # Triple Candlestick Patterns
     'MORNING_STAR': talib.CDLMORNINGSTAR,
@@ -64,66 +144,410 @@ TALIB_PATTERNS = {
     'THREE_BLACK_CROWS': talib.CDL3BLACKCROWS
 }
 
-# Load transformer model (placeholder - implement actual model loading)
-def load_transformer_model():
-    # TODO: Implement model loading
-    pass
+# Shared across requests so concurrent ML inference is batched together
+detector: Optional[PatternDetector] = None
+batcher: Optional[MicroBatcher] = None
+result_writer: Optional[ResultWriter] = None
+backtest_jobs: Optional[BacktestJobManager] = None
+precompute: Optional[PrecomputeScheduler] = None
+return_stats: Optional[ForwardReturnTable] = None
+pattern_index: Optional[PatternIndex] = None
+alert_monitor: Optional[AlertMonitor] = None
+
+def load_transformer_model() -> PatternDetector:
+    # A no-op in pre-fork workers, which inherit the master's detector
+    global detector
+    if detector is None:
+        detector = PatternDetector()
+    return detector
 
 @app.on_event("startup")
 async def startup_event():
     # Initialize models and connections
+    global batcher, result_writer, backtest_jobs, precompute, return_stats, pattern_index, alert_monitor
     load_transformer_model()
+    if batcher is None and detector is not None and detector.inference_backend is not None:
+        batcher = MicroBatcher(detector.inference_backend)
+    if batcher is not None:
+        batcher.start()
+    if result_writer is None and RESULT_SINK_SETTINGS['enabled']:
+        result_writer = ResultWriter(MongoResultStore())
+    if result_writer is not None:
+        result_writer.start()
+    if backtest_jobs is None and detector is not None:
+        backtest_jobs = BacktestJobManager(
+            detector, result_writer=result_writer, loop=asyncio.get_running_loop()
+        )
+    if backtest_jobs is not None:
+        backtest_jobs.start()
+        # Runs in every pre-fork worker; each unfinished job is claimed by one of them
+        backtest_jobs.resume()
+    if return_stats is None and detector is not None:
+        return_stats = ForwardReturnTable(detector)
+    if pattern_index is None and detector is not None:
+        pattern_index = PatternIndex(detector)
+    if precompute is None and detector is not None and PRECOMPUTE_SETTINGS['enabled']:
+        precompute = PrecomputeScheduler(detector, return_table=return_stats, pattern_index=pattern_index)
+    if precompute is not None:
+        precompute.start()
+    if alert_monitor is None and detector is not None and ALERT_SETTINGS['enabled']:
+        alert_monitor = AlertMonitor(AlertEngine(detector, MongoAlertSource()))
+    if alert_monitor is not None:
+        # Started in every pre-fork worker; one of them at a time evaluates the alerts
+        alert_monitor.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if batcher is not None:
+        await batcher.stop()
+    if result_writer is not None:
+        await result_writer.stop()
+    if backtest_jobs is not None:
+        # Unfinished jobs stay checkpointed and resume on the next startup
+        backtest_jobs.shutdown(wait=False)
+    if precompute is not None:
+        await precompute.stop()
+    if alert_monitor is not None:
+        await alert_monitor.stop()
 
 @app.get("/")
 async def root():
     return {"message": "Candlestick Pattern Detection API"}
 
+class PatternHits(NamedTuple):
+    """Occurrences of one pattern, as parallel arrays"""
+    pattern_name: str
+    end_index: np.ndarray
+    confidence: np.ndarray
+    direction: np.ndarray  # 1 bullish, -1 bearish, 0 neutral
+    span: int = 3  # Candles covered, ending at end_index
+    pattern_type: Optional[str] = None  # Fixed type; derived from direction if None
+
+NDJSON_CHUNK_SIZE = 1000  # Patterns per streamed chunk
+
+# Sequence model labels with a direction; the others are reported as neutral
+ML_DIRECTIONS = {'BULLISH_REVERSAL': 1, 'BEARISH_REVERSAL': -1}
+
+def _selected_patterns(patterns_to_detect: Optional[List[str]]):
+    return [
+        (pattern_name, pattern_func) for pattern_name, pattern_func in TALIB_PATTERNS.items()
+        if not patterns_to_detect or pattern_name in patterns_to_detect
+    ]
+
+def _tail_context(patterns_to_detect: Optional[List[str]], use_ml: bool) -> int:
+    """Candles before a tail that its detection reads"""
+    context = max((talib_tail_lookback(func) for _, func in _selected_patterns(patterns_to_detect)), default=0)
+    if use_ml and detector is not None:
+        context = max(context, detector.window_size)
+    return context
+
+def _detect_talib_hits(
+    df: pd.DataFrame,
+    patterns_to_detect: Optional[List[str]],
+    since_index: int = 0
+) -> List[PatternHits]:
+    open_data = df['open'].values
+    high_data = df['high'].values
+    low_data = df['low'].values
+    close_data = df['close'].values
+    
+    hits = []
+    for pattern_name, pattern_func in _selected_patterns(patterns_to_detect):
+        # Only the candles from since_index on and their lookback
+        start = max(0, since_index - talib_tail_lookback(pattern_func)) if since_index else 0
+            
+        # Get pattern recognition integers (-100 to 100)
+        pattern_result = pattern_func(
+            open_data[start:], high_data[start:], low_data[start:], close_data[start:]
+        )[since_index - start:]
+        indices = np.flatnonzero(pattern_result)
+        values = pattern_result[indices]
+        hits.append(PatternHits(
+            pattern_name, indices + since_index, np.abs(values) / 100.0, np.sign(values).astype(np.int8)
+        ))
+        
+    return hits
+
+async def _detect_ml_hits(
+    df: pd.DataFrame,
+    since_index: int = 0,
+    deadline: Optional[float] = None
+) -> Tuple[List[PatternHits], int]:
+    """
+    Sequence model hits (windows ending at or after since_index), one entry per predicted label
+
+    Returns:
+        The hits and the number of windows skipped to meet the deadline
+    """
+    windows, first, skipped = detector._deadline_windows(df, since_index, deadline, batcher.max_wait)
+    if len(windows) == 0:
+        return [], skipped
+    start = time.perf_counter()
+    probabilities = await batcher.predict_proba(windows)
+    detector.window_cost.observe(time.perf_counter() - start, len(windows))
+    starts, predictions, confidences = detector._classify_windows(probabilities)
+    starts = starts + first
+
+    hits = []
+    for label in np.unique(predictions).tolist():
+        if label == NO_PATTERN_LABEL:
+            continue
+        pattern_type = detector._get_pattern_type(label)
+        mask = predictions == label
+        hits.append(PatternHits(
+            f"AI_PATTERN_{pattern_type}",
+            starts[mask] + detector.window_size - 1,
+            confidences[mask],
+            np.full(int(mask.sum()), ML_DIRECTIONS.get(pattern_type, 0), dtype=np.int8),
+            span=detector.window_size,
+            pattern_type=pattern_type.lower()
+        ))
+    return hits, skipped
+
+def _pattern_records(hits: PatternHits, start: int = 0, stop: Optional[int] = None) -> List[dict]:
+    return [
+        {
+            'pattern_name': hits.pattern_name,
+            'confidence': confidence,
+            'start_index': max(0, i - hits.span + 1),
+            'end_index': i,
+            'pattern_type': hits.pattern_type or ('bullish' if direction > 0 else 'bearish')
+        }
+        for i, confidence, direction in zip(
+            hits.end_index[start:stop].tolist(),
+            hits.confidence[start:stop].tolist(),
+            hits.direction[start:stop].tolist()
+        )
+    ]
+
+def _ndjson_chunks(hits: List[PatternHits]) -> Iterator[bytes]:
+    """Encode patterns as newline-delimited JSON, a bounded chunk at a time"""
+    for pattern_hits in hits:
+        for offset in range(0, len(pattern_hits.end_index), NDJSON_CHUNK_SIZE):
+            records = _pattern_records(pattern_hits, offset, offset + NDJSON_CHUNK_SIZE)
+            yield b''.join(orjson.dumps(record) + b'\n' for record in records)
+
+def _columnar_payload(hits: List[PatternHits]) -> dict:
+    """Patterns as parallel arrays, with pattern names dictionary-encoded"""
+    def column(field: str, dtype) -> np.ndarray:
+        arrays = [getattr(h, field) for h in hits]
+        return np.concatenate(arrays) if arrays else np.empty(0, dtype=dtype)
+    
+    end_index = column('end_index', np.int64)
+    spans = np.repeat([h.span for h in hits], [len(h.end_index) for h in hits]).astype(np.int64)
+    pattern_ids = np.repeat(
+        np.arange(len(hits), dtype=np.int32),
+        [len(h.end_index) for h in hits]
+    )
+    
+    return {
+        'pattern_names': [h.pattern_name for h in hits],
+        'pattern_id': pattern_ids,
+        'start_index': np.maximum(end_index - spans + 1, 0),
+        'end_index': end_index,
+        'confidence': column('confidence', np.float64),
+        'direction': column('direction', np.int8)  # 1 bullish, -1 bearish, 0 neutral
+    }
+
 @app.post("/detect/", response_model=List[PatternResponse])
-async def detect_patterns(request: DetectionRequest):
+async def detect_patterns(
+    request: DetectionRequest,
+    response_format: str = Query('json', alias='format', pattern='^(json|ndjson|columnar)$')
+):
+    """
+    Detect candlestick patterns
+
+    format=json returns a list of patterns, format=ndjson streams one pattern
+    per line, and format=columnar returns parallel arrays (pattern_id indexes
+    pattern_names; direction is 1 for bullish, -1 for bearish and 0 for
+    neutral). use_ml adds sequence model patterns, with forward passes shared
+    across concurrent requests. With a symbol, the patterns are also queued
+    for persistence when the result writer is enabled. since_index and/or
+    last_n restrict detection to patterns ending in the last candles; only
+    those candles and the lookback they need are detected on, so the cost
+    does not grow with the submitted history. deadline_ms bounds the time
+    spent: TA-Lib patterns are always returned, but only as many model
+    windows (most recent first) as recent timings say fit are inferred, and
+    the X-Partial-Results and X-Skipped-Windows headers report any cut.
+    """
+    deadline = time.monotonic() + request.deadline_ms / 1000 if request.deadline_ms else None
     try:
-        # Convert input data to DataFrame
-        df = pd.DataFrame([data.dict() for data in request.data])
+        annotate_request(
+            timeframe=request.timeframe,
+            candles=len(request.data),
+            patterns_to_detect=request.patterns_to_detect,
+            format=response_format
+        )
+        since = tail_start(len(request.data), request.since_index, request.last_n)
+        persist = bool(request.symbol and result_writer is not None)
         
-        # Initialize results list
-        patterns = []
+        # Without persistence (which needs every candle's time), only the tail is parsed
+        offset = 0
+        if since is not None and not persist:
+            offset = max(0, since - _tail_context(request.patterns_to_detect, request.use_ml))
+        since = 0 if since is None else since - offset
         
-        # Convert OHLCV data to numpy arrays
-        open_data = df['open'].values
-        high_data = df['high'].values
-        low_data = df['low'].values
-        close_data = df['close'].values
-        volume_data = df['volume'].values
+        if request.symbol and precompute is not None:
+            # Popular streams get precomputed after each close for GET /detect/{symbol}
+            precompute.record(request.symbol, request.timeframe)
         
-        # Apply TA-Lib pattern detection
-        for pattern_name, pattern_func in TALIB_PATTERNS.items():
-            if request.patterns_to_detect and pattern_name not in request.patterns_to_detect:
-                continue
-                
-            # Get pattern recognition integers (-100 to 100)
-            pattern_result = pattern_func(open_data, high_data, low_data, close_data)
-            
-            # Process the results
-            for i, value in enumerate(pattern_result):
-                if value != 0:  # Pattern detected
-                    confidence = abs(value) / 100.0
-                    pattern_type = 'bullish' if value > 0 else 'bearish'
-                    
-                    patterns.append(PatternResponse(
-                        pattern_name=pattern_name,
-                        confidence=confidence,
-                        start_index=max(0, i-2),  # Consider up to 3 candles before
-                        end_index=i,
-                        pattern_type=pattern_type
-                    ))
+        headers = {}
+        with time_stage('parse'):
+            # Convert input data to DataFrame
+            df = pd.DataFrame([data.dict() for data in request.data[offset:]])
+        
+        with time_stage('talib'):
+            # Apply TA-Lib pattern detection
+            hits = _detect_talib_hits(df, request.patterns_to_detect, since)
+        
+        if request.use_ml:
+            if batcher is None:
+                raise HTTPException(status_code=503, detail="ML pattern detection is not available")
+            with time_stage('transformer'):
+                ml_hits, skipped = await _detect_ml_hits(df, since, deadline)
+            hits.extend(ml_hits)
+            if skipped:
+                headers = {'X-Partial-Results': 'true', 'X-Skipped-Windows': str(skipped)}
+        
+        if offset:
+            # Report positions in the submitted candles
+            hits = [pattern_hits._replace(end_index=pattern_hits.end_index + offset) for pattern_hits in hits]
         
-        # TODO: Add transformer-based pattern detection
-        # This will be implemented in a separate function
+        if persist:
+            with time_stage('persist'):
+                # Queued for a background bulk write; only waits when the buffer is full
+                await result_writer.write_patterns(request.symbol, request.timeframe, [
+                    {**record, 'detection_method': 'transformer' if pattern_hits.pattern_type else 'talib'}
+                    for pattern_hits in hits
+                    for record in _pattern_records(pattern_hits)
+                ], df)
         
-        return patterns
+        if response_format == 'ndjson':
+            # Encoded lazily while sending, so memory stays flat in result size
+            return StreamingResponse(_ndjson_chunks(hits), media_type="application/x-ndjson", headers=headers)
         
+        with time_stage('serialize'):
+            if response_format == 'columnar':
+                return ORJSONResponse(_columnar_payload(hits), headers=headers)
+            return ORJSONResponse([
+                record
+                for pattern_hits in hits
+                for record in _pattern_records(pattern_hits)
+            ], headers=headers)
+        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/detect/{symbol}")
+async def detect_symbol_patterns(
+    symbol: str,
+    timeframe: str = Query(MARKET_DATA['default_timeframe'])
+):
+    """
+    Patterns of a symbol up to its last closed candle
+
+    Served from the precomputed result cache when the stream is popular;
+    otherwise detected on demand, once for all concurrent requests. The
+    X-Cache header says which.
+    """
+    if precompute is None:
+        raise HTTPException(status_code=503, detail="Pattern precomputation is not enabled")
+    if timeframe not in TIMEFRAME_SECONDS:
+        raise HTTPException(status_code=422, detail=f"Unsupported timeframe: {timeframe}")
+    try:
+        entry, hit = await precompute.detect(symbol, timeframe)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Market data unavailable: {e}")
+    return ORJSONResponse(entry, headers={'X-Cache': 'hit' if hit else 'miss'})
+
+def _backtest_job_manager() -> BacktestJobManager:
+    if backtest_jobs is None:
+        raise HTTPException(status_code=503, detail="Backtest jobs are not available")
+    return backtest_jobs
+
+@app.post("/backtests/", status_code=202)
+async def submit_backtest(request: BacktestJobRequest):
+    """
+    Queue a backtest of the patterns detected in the candles
+
+    Returns the job id at once; poll GET /backtests/{job_id} for progress
+    and page through GET /backtests/{job_id}/trades for the trades.
+    """
+    jobs = _backtest_job_manager()
+    df = pd.DataFrame([data.dict() for data in request.data])
+    job_id = jobs.submit(
+        df,
+        symbol=request.symbol,
+        timeframe=request.timeframe,
+        patterns=request.patterns,
+        holding_period=request.holding_period,
+        stop_loss=request.stop_loss,
+        take_profit=request.take_profit
+    )
+    return jobs.status(job_id)
+
+@app.get("/backtests/{job_id}")
+async def get_backtest(job_id: str):
+    try:
+        return _backtest_job_manager().status(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Backtest job not found")
+
+@app.get("/backtests/{job_id}/trades")
+async def get_backtest_trades(
+    job_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(BACKTEST_SETTINGS['page_size'], ge=1, le=BACKTEST_SETTINGS['max_page_size'])
+):
+    try:
+        return _backtest_job_manager().trades(job_id, offset, limit)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Backtest job not found")
+
+@app.delete("/backtests/{job_id}")
+async def cancel_backtest(job_id: str):
+    jobs = _backtest_job_manager()
+    try:
+        jobs.cancel(job_id)
+        return jobs.status(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Backtest job not found")
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(
+        REGISTRY.render(),
+        media_type="text/plain; version=0.0.4"
+    )
+
+@app.get("/admin/profiles/")
+async def list_profiles():
+    return profiler.store.list()
+
+@app.get("/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str, sort_by: str = 'cumulative', limit: int = 50):
+    profile = profiler.store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    summary = {key: value for key, value in profile.items() if key != 'stats'}
+    return {**summary, 'report': profile_to_text(profile, sort_by, limit)}
+
+@app.get("/admin/profiles/{profile_id}/download")
+async def download_profile(profile_id: str):
+    profile = profiler.store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(
+        profile_to_pstats(profile),
+        media_type="application/octet-stream",
+        headers={
+            'Content-Disposition': f'attachment; filename="{profile_id}.prof"',
+            'X-Profile-Params': json.dumps(profile['params'], default=str)
+        }
+    )
+
 @app.get("/patterns/")
 async def list_available_patterns():
     return {
@@ -131,6 +555,38 @@ async def list_available_patterns():
         "ai_patterns": []  # TODO: Add AI-based patterns
     }
 
+@app.get("/patterns/{pattern_name}/returns")
+async def pattern_forward_returns(
+    pattern_name: str,
+    timeframe: str = Query(MARKET_DATA['default_timeframe']),
+    symbols: Optional[List[str]] = Query(None),
+    direction: Optional[str] = Query(None, pattern='^(bullish|bearish)$'),
+    horizon: Optional[int] = Query(None, ge=1)
+):
+    """
+    Historical forward-return distribution of a pattern
+
+    Read from the materialized forward-return table, merged across the
+    given symbols (every symbol in the table if none are given).
+    """
+    if return_stats is None:
+        raise HTTPException(status_code=503, detail="Forward-return statistics are not available")
+    if pattern_name not in return_stats.pattern_names:
+        raise HTTPException(status_code=404, detail=f"Unknown pattern: {pattern_name}")
+    try:
+        stats = return_stats.statistics(pattern_name, timeframe, symbols, direction, horizon)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return ORJSONResponse({
+        'pattern_name': pattern_name,
+        'timeframe': timeframe,
+        'symbols': symbols,
+        'statistics': {
+            side: {str(bars): summary for bars, summary in by_horizon.items()}
+            for side, by_horizon in stats.items()
+        }
+    })
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
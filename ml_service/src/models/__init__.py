@@ -1,4 +1,5 @@
 from .pattern_detector import PatternDetector
 from .backtester import PatternBacktester
+from .trade_log import TradeLog
 
-__all__ = ['PatternDetector', 'PatternBacktester'] 
\ No newline at end of file
+__all__ = ['PatternDetector', 'PatternBacktester', 'TradeLog'] 
\ No newline at end of file
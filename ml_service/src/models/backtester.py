@@ -1,9 +1,14 @@
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Union
 from datetime import datetime, timedelta
 import logging
-from ..config import BACKTEST_SETTINGS
+from ..config import BACKTEST_SETTINGS, PATTERN_SETTINGS
+from ..data.candles import CandleSeries, OHLCVData, ohlcv_column
+from ..data.pattern_index import PatternIndex, timestamps_ms
+from ..monitoring.metrics import time_stage
+from .equity import EquityCurve, bars_per_year, equity_statistics, mark_to_market
+from .trade_log import CONFIDENCE_BRACKETS, TradeLog, trade_statistics
 
 logger = logging.getLogger(__name__)
 
@@ -12,9 +17,16 @@ class PatternBacktester:
         self.transaction_cost = BACKTEST_SETTINGS['transaction_costs']
         self.min_trades = BACKTEST_SETTINGS['min_trades']
 
+    @staticmethod
+    def _bar_times(data: OHLCVData):
+        """Labels reported as trade entry/exit times (the frame index, or open times)"""
+        if isinstance(data, CandleSeries):
+            return pd.to_datetime(data.timestamps, unit='ms')
+        return data.index
+
     def _calculate_returns(
         self,
-        data: pd.DataFrame,
+        data: OHLCVData,
         pattern_occurrences: List[Dict[str, Any]],
         holding_period: int = 5,
         stop_loss: float = -0.02,
@@ -24,7 +36,7 @@ class PatternBacktester:
         Calculate returns for each pattern occurrence
         
         Args:
-            data: OHLCV data
+            data: OHLCV DataFrame or CandleSeries
             pattern_occurrences: List of detected patterns
             holding_period: Number of candles to hold the position
             stop_loss: Stop loss percentage
@@ -33,75 +45,98 @@ class PatternBacktester:
         Returns:
             List of trade results
         """
-        trade_results = []
+        if not pattern_occurrences:
+            return []
+        return self._simulate_trades(
+            data,
+            pattern_occurrences,
+            holding_period,
+            stop_loss,
+            take_profit
+        ).rows()
+
+    def _simulate_trades(
+        self,
+        data: OHLCVData,
+        pattern_occurrences: List[Dict[str, Any]],
+        holding_period: int,
+        stop_loss: float,
+        take_profit: float
+    ) -> TradeLog:
+        """
+        Simulate one trade per pattern occurrence, all trades at once
         
-        for pattern in pattern_occurrences:
-            entry_idx = pattern['end_index'] + 1
-            if entry_idx >= len(data) - 1:
-                continue
-                
-            entry_price = data['open'].iloc[entry_idx]
-            pattern_type = pattern['pattern_type']
-            is_long = pattern_type == 'bullish'
-            
-            # Track position
-            position_active = True
-            exit_idx = entry_idx
-            exit_price = entry_price
-            exit_reason = 'holding_period'
-            
-            # Simulate trading
-            for i in range(entry_idx + 1, min(entry_idx + holding_period + 1, len(data))):
-                current_price = data['close'].iloc[i]
-                returns = (current_price - entry_price) / entry_price
-                
-                if is_long:
-                    if returns <= stop_loss:
-                        exit_price = entry_price * (1 + stop_loss)
-                        exit_idx = i
-                        exit_reason = 'stop_loss'
-                        break
-                    elif returns >= take_profit:
-                        exit_price = entry_price * (1 + take_profit)
-                        exit_idx = i
-                        exit_reason = 'take_profit'
-                        break
-                else:  # Short position
-                    if returns >= -stop_loss:
-                        exit_price = entry_price * (1 - stop_loss)
-                        exit_idx = i
-                        exit_reason = 'stop_loss'
-                        break
-                    elif returns <= -take_profit:
-                        exit_price = entry_price * (1 - take_profit)
-                        exit_idx = i
-                        exit_reason = 'take_profit'
-                        break
-                        
-                exit_price = current_price
-                
-            # Calculate trade metrics
-            trade_return = (exit_price - entry_price) / entry_price
-            if not is_long:
-                trade_return = -trade_return
-                
-            # Account for transaction costs
-            trade_return -= self.transaction_cost * 2
-            
-            trade_results.append({
-                'pattern_name': pattern['pattern_name'],
-                'pattern_type': pattern_type,
-                'confidence': pattern['confidence'],
-                'entry_time': data.index[entry_idx],
-                'exit_time': data.index[exit_idx],
-                'entry_price': entry_price,
-                'exit_price': exit_price,
-                'return': trade_return,
-                'exit_reason': exit_reason,
-                'holding_duration': exit_idx - entry_idx
-            })
-            
-        return trade_results
+        Each trade enters at the open after the pattern and is checked
+        against stop loss and take profit on the following closes, as a
+        (trades x holding_period) matrix; the first bar that hits either
+        exits the trade, otherwise it exits on the last close of the
+        holding period.
+        """
+        n_bars = len(data)
+        end_index = np.fromiter(
+            (pattern['end_index'] for pattern in pattern_occurrences),
+            dtype=np.int64,
+            count=len(pattern_occurrences)
+        )
+        kept = np.flatnonzero(end_index + 1 < n_bars - 1)
+        if len(kept) == 0:
+            return TradeLog.empty()
+        occurrences = [pattern_occurrences[i] for i in kept]
+        pattern_types = [pattern['pattern_type'] for pattern in occurrences]
+        is_long = np.array([pattern_type == 'bullish' for pattern_type in pattern_types])
+        
+        opens = ohlcv_column(data, 'open')
+        closes = ohlcv_column(data, 'close')
+        entry_index = end_index[kept] + 1
+        entry_price = opens[entry_index]
+        
+        # Price moves over the holding period, masked past the last bar
+        offsets = np.arange(1, max(holding_period, 1) + 1)
+        bars = entry_index[:, None] + offsets
+        in_window = (bars < n_bars) & (offsets <= holding_period)
+        moves = (closes[np.minimum(bars, n_bars - 1)] - entry_price[:, None]) / entry_price[:, None]
+        long_rows = is_long[:, None]
+        stop_hits = np.where(long_rows, moves <= stop_loss, moves >= -stop_loss) & in_window
+        profit_hits = np.where(long_rows, moves >= take_profit, moves <= -take_profit) & in_window
+        
+        rows = np.arange(len(entry_index))
+        first_hit = (stop_hits | profit_hits).argmax(axis=1)
+        stopped = stop_hits[rows, first_hit]
+        took_profit = ~stopped & profit_hits[rows, first_hit]
+        
+        # Held to the end: exit on the last close of the holding period
+        last_bar = np.minimum(entry_index + max(holding_period, 0), n_bars - 1)
+        exit_index = np.where(stopped | took_profit, entry_index + first_hit + 1, last_bar)
+        exit_price = closes[last_bar] if holding_period > 0 else entry_price
+        exit_price = np.where(
+            stopped,
+            entry_price * np.where(is_long, 1 + stop_loss, 1 - stop_loss),
+            exit_price
+        )
+        exit_price = np.where(
+            took_profit,
+            entry_price * np.where(is_long, 1 + take_profit, 1 - take_profit),
+            exit_price
+        )
+        exit_reason_id = np.where(stopped, 1, np.where(took_profit, 2, 0))
+        
+        # Calculate trade metrics, net of transaction costs
+        trade_return = (exit_price - entry_price) / entry_price
+        trade_return = np.where(is_long, trade_return, -trade_return)
+        trade_return -= self.transaction_cost * 2
+        
+        return TradeLog.from_bars(
+            self._bar_times(data),
+            [pattern['pattern_name'] for pattern in occurrences],
+            pattern_types,
+            confidence=np.array([pattern['confidence'] for pattern in occurrences], dtype=np.float64),
+            entry_index=entry_index,
+            exit_index=exit_index,
+            entry_price=entry_price,
+            exit_price=exit_price,
+            **{'return': trade_return},
+            exit_reason_id=exit_reason_id
+        )
 
     def _calculate_pattern_statistics(
         self,
@@ -113,32 +148,14 @@ class PatternBacktester:
         if not trade_results:
             return {}
             
-        returns = [t['return'] for t in trade_results]
-        
-        stats = {
-            'total_trades': len(trade_results),
-            'winning_trades': sum(1 for r in returns if r > 0),
-            'losing_trades': sum(1 for r in returns if r <= 0),
-            'win_rate': sum(1 for r in returns if r > 0) / len(returns),
-            'avg_return': np.mean(returns),
-            'std_return': np.std(returns),
-            'max_return': max(returns),
-            'min_return': min(returns),
-            'sharpe_ratio': np.mean(returns) / np.std(returns) if np.std(returns) > 0 else 0,
-            'avg_holding_duration': np.mean([t['holding_duration'] for t in trade_results])
-        }
-        
-        # Calculate drawdown
-        cumulative_returns = np.cumprod(1 + np.array(returns))
-        running_max = np.maximum.accumulate(cumulative_returns)
-        drawdowns = (cumulative_returns - running_max) / running_max
-        stats['max_drawdown'] = np.min(drawdowns)
-        
-        return stats
+        return trade_statistics(
+            np.array([t['return'] for t in trade_results], dtype=np.float64),
+            np.array([t['holding_duration'] for t in trade_results])
+        )
 
     def backtest_pattern(
         self,
-        data: pd.DataFrame,
+        data: OHLCVData,
         pattern_occurrences: List[Dict[str, Any]],
         holding_period: int = 5,
         stop_loss: float = -0.02,
@@ -148,7 +165,7 @@ class PatternBacktester:
         Backtest pattern performance
         
         Args:
-            data: OHLCV data
+            data: OHLCV DataFrame or CandleSeries
             pattern_occurrences: List of detected patterns
             holding_period: Number of candles to hold the position
             stop_loss: Stop loss percentage
@@ -159,20 +176,154 @@ class PatternBacktester:
         """
         try:
             # Calculate trade results
-            trade_results = self._calculate_returns(
+            with time_stage('backtest_returns'):
+                trade_log = self._simulate_trades(
+                    data,
+                    pattern_occurrences,
+                    holding_period,
+                    stop_loss,
+                    take_profit
+                ) if pattern_occurrences else TradeLog.empty()
+                trade_results = trade_log.rows()
+            
+            results = self.summarize_trades(trade_results)
+            with time_stage('backtest_equity'):
+                results['equity_stats'] = self.equity_statistics(data, trade_log)
+            return results
+            
+        except Exception as e:
+            logger.error(f"Error in backtesting: {e}")
+            return {}
+
+    def backtest_log(
+        self,
+        data: OHLCVData,
+        pattern_occurrences: List[Dict[str, Any]],
+        holding_period: int = 5,
+        stop_loss: float = -0.02,
+        take_profit: float = 0.04
+    ) -> TradeLog:
+        """
+        Backtest pattern performance into a columnar trade log
+        
+        Same trades as backtest_pattern's trade_results without building a
+        dict per trade; pass the log to generate_performance_report, or read
+        its statistics and pages of trades as needed.
+        
+        Args:
+            data: OHLCV DataFrame or CandleSeries
+            pattern_occurrences: List of detected patterns
+            holding_period: Number of candles to hold the position
+            stop_loss: Stop loss percentage
+            take_profit: Take profit percentage
+            
+        Returns:
+            TradeLog of the trades
+        """
+        try:
+            if not pattern_occurrences:
+                return TradeLog.empty()
+            with time_stage('backtest_returns'):
+                return self._simulate_trades(
+                    data,
+                    pattern_occurrences,
+                    holding_period,
+                    stop_loss,
+                    take_profit
+                )
+                
+        except Exception as e:
+            logger.error(f"Error in backtesting: {e}")
+            return TradeLog.empty()
+
+    def equity_curve(
+        self,
+        data: OHLCVData,
+        trade_log: TradeLog,
+        position_size: float = BACKTEST_SETTINGS['position_size']
+    ) -> EquityCurve:
+        """
+        Mark-to-market equity, drawdown and exposure at every bar
+        
+        Args:
+            data: OHLCV data the trades were simulated on
+            trade_log: Trades from backtest_log
+            position_size: Fraction of starting equity committed per trade
+            
+        Returns:
+            EquityCurve over the bars of data
+        """
+        return mark_to_market(trade_log, data, position_size, self.transaction_cost)
+
+    def equity_statistics(
+        self,
+        data: OHLCVData,
+        trade_log: TradeLog,
+        position_size: float = BACKTEST_SETTINGS['position_size']
+    ) -> Dict[str, Any]:
+        """
+        Bar-level risk statistics: drawdown with open positions marked to
+        market, exposure and an annualized, time-weighted Sharpe ratio
+        """
+        curve = self.equity_curve(data, trade_log, position_size)
+        return equity_statistics(curve, bars_per_year(self._bar_times(data)))
+
+    def iter_returns(
+        self,
+        data: OHLCVData,
+        pattern_occurrences: List[Dict[str, Any]],
+        holding_period: int = 5,
+        stop_loss: float = -0.02,
+        take_profit: float = 0.04,
+        start: int = 0,
+        chunk_size: int = BACKTEST_SETTINGS['job_chunk_size']
+    ) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+        """
+        Calculate returns a chunk of occurrences at a time
+        
+        Concatenating the chunks gives the same trades as _calculate_returns,
+        so a long backtest can report progress, stop between chunks and
+        resume from any chunk boundary.
+        
+        Args:
+            data: OHLCV DataFrame or CandleSeries
+            pattern_occurrences: List of detected patterns
+            holding_period: Number of candles to hold the position
+            stop_loss: Stop loss percentage
+            take_profit: Take profit percentage
+            start: Number of occurrences already processed
+            chunk_size: Occurrences per chunk
+            
+        Yields:
+            Occurrences processed so far and the trades of the chunk
+        """
+        for offset in range(start, len(pattern_occurrences), chunk_size):
+            stop = min(offset + chunk_size, len(pattern_occurrences))
+            yield stop, self._calculate_returns(
                 data,
-                pattern_occurrences,
+                pattern_occurrences[offset:stop],
                 holding_period,
                 stop_loss,
                 take_profit
             )
+
+    def summarize_trades(self, trade_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Overall, per-pattern and per-confidence statistics of a backtest
+        
+        Args:
+            trade_results: Trades from _calculate_returns or iter_returns
             
-            if len(trade_results) < self.min_trades:
-                logger.warning(
-                    f"Insufficient trades ({len(trade_results)}) "
-                    f"for reliable statistics. Minimum required: {self.min_trades}"
-                )
-                
+        Returns:
+            Dictionary with backtest results
+        """
+        if len(trade_results) < self.min_trades:
+            logger.warning(
+                f"Insufficient trades ({len(trade_results)}) "
+                f"for reliable statistics. Minimum required: {self.min_trades}"
+            )
+            
+        with time_stage('backtest_stats'):
             # Calculate overall statistics
             overall_stats = self._calculate_pattern_statistics(trade_results)
             
@@ -183,10 +334,9 @@ class PatternBacktester:
                 pattern_stats[pattern] = self._calculate_pattern_statistics(pattern_trades)
                 
             # Calculate statistics by confidence level
-            confidence_brackets = [(0.6, 0.7), (0.7, 0.8), (0.8, 0.9), (0.9, 1.0)]
             confidence_stats = {}
             
-            for low, high in confidence_brackets:
+            for low, high in CONFIDENCE_BRACKETS:
                 bracket_trades = [
                     t for t in trade_results
                     if low <= t['confidence'] < high
@@ -194,35 +344,107 @@ class PatternBacktester:
                 if bracket_trades:
                     confidence_stats[f"{low:.1f}-{high:.1f}"] = \
                         self._calculate_pattern_statistics(bracket_trades)
+        
+        return {
+            'overall_stats': overall_stats,
+            'pattern_stats': pattern_stats,
+            'confidence_stats': confidence_stats,
+            'trade_results': trade_results
+        }
+
+    def backtest_index(
+        self,
+        data: OHLCVData,
+        pattern_index: PatternIndex,
+        symbol: str,
+        timeframe: str,
+        patterns: Optional[List[str]] = None,
+        direction: Optional[str] = None,
+        holding_period: int = 5,
+        stop_loss: float = -0.02,
+        take_profit: float = 0.04
+    ) -> Dict[str, Any]:
+        """
+        Backtest pattern occurrences read from a PatternIndex
+
+        Occurrences are aligned to data by bar time, so data may cover any
+        part of the indexed history and no detection is re-run.
+        
+        Args:
+            data: OHLCV DataFrame or CandleSeries
+            pattern_index: Index holding the pattern occurrences
+            symbol: Trading pair or stock symbol
+            timeframe: Candlestick timeframe
+            patterns: Pattern names to backtest (all if None)
+            direction: 'bullish' or 'bearish' (both if None)
+            holding_period: Number of candles to hold the position
+            stop_loss: Stop loss percentage
+            take_profit: Take profit percentage
             
-            return {
-                'overall_stats': overall_stats,
-                'pattern_stats': pattern_stats,
-                'confidence_stats': confidence_stats,
-                'trade_results': trade_results
-            }
-            
-        except Exception as e:
-            logger.error(f"Error in backtesting: {e}")
-            return {}
+        Returns:
+            Dictionary with backtest results
+        """
+        data_times = timestamps_ms(data)
+        if len(data_times) == 0:
+            return self.backtest_pattern(data, [], holding_period, stop_loss, take_profit)
+
+        hits = pattern_index.query(
+            symbol,
+            timeframe,
+            patterns=patterns,
+            start_time=pd.Timestamp(int(data_times[0]), unit='ms'),
+            end_time=pd.Timestamp(int(data_times[-1]), unit='ms'),
+            direction=direction,
+            min_strength=int(PATTERN_SETTINGS['confidence_threshold'] * 100)
+        )
+
+        positions = np.searchsorted(data_times, hits['timestamp'])
+        positions = np.minimum(positions, len(data_times) - 1)
+        aligned = data_times[positions] == hits['timestamp']
+        hits = {key: values[aligned] for key, values in hits.items()}
+        
+        occurrences = pattern_index.to_occurrences(hits, end_indices=positions[aligned])
+        
+        return self.backtest_pattern(
+            data,
+            occurrences,
+            holding_period,
+            stop_loss,
+            take_profit
+        )
 
     def generate_performance_report(
         self,
-        backtest_results: Dict[str, Any]
+        backtest_results: Union[Dict[str, Any], TradeLog],
+        data: Optional[OHLCVData] = None
     ) -> str:
         """
         Generate a human-readable performance report
         
         Args:
-            backtest_results: Results from backtest_pattern
+            backtest_results: Results from backtest_pattern, or a TradeLog
+                from backtest_log
+            data: OHLCV data a TradeLog was simulated on, to report
+                mark-to-market risk
             
         Returns:
             Formatted performance report
         """
-        if not backtest_results:
+        if isinstance(backtest_results, TradeLog):
+            if not len(backtest_results):
+                return "No backtest results available."
+            # Computed from the columns now, and only for the patterns reported
+            overall_stats = backtest_results.statistics()
+            pattern_stats = backtest_results.pattern_statistics(self.min_trades)
+            confidence_stats = backtest_results.confidence_statistics()
+            equity_stats = self.equity_statistics(data, backtest_results) if data is not None else {}
+        elif not backtest_results:
             return "No backtest results available."
-            
-        overall_stats = backtest_results['overall_stats']
+        else:
+            overall_stats = backtest_results['overall_stats']
+            pattern_stats = backtest_results['pattern_stats']
+            confidence_stats = backtest_results['confidence_stats']
+            equity_stats = backtest_results.get('equity_stats', {})
         
         report = [
             "Pattern Performance Report",
@@ -232,12 +454,26 @@ class PatternBacktester:
             f"Win Rate: {overall_stats['win_rate']:.2%}",
             f"Average Return: {overall_stats['avg_return']:.2%}",
             f"Sharpe Ratio: {overall_stats['sharpe_ratio']:.2f}",
-            f"Maximum Drawdown: {overall_stats['max_drawdown']:.2%}\n",
+            f"Maximum Drawdown: {overall_stats['max_drawdown']:.2%}\n"
+        ]
+        
+        if equity_stats:
+            report.extend([
+                "Mark-to-Market Risk:",
+                f"Total Return: {equity_stats['total_return']:.2%}",
+                f"Maximum Drawdown: {equity_stats['max_drawdown']:.2%} "
+                f"({equity_stats['max_drawdown_duration']} bars)",
+                f"Time in Market: {equity_stats['time_in_market']:.2%}",
+                f"Average Exposure: {equity_stats['avg_exposure']:.2f}x",
+                f"Sharpe Ratio (time-weighted): {equity_stats['sharpe_ratio']:.2f}\n"
+            ])
+        
+        report.extend([
             "Performance by Pattern:",
             "----------------------"
-        ]
+        ])
         
-        for pattern, stats in backtest_results['pattern_stats'].items():
+        for pattern, stats in pattern_stats.items():
             if stats['total_trades'] >= self.min_trades:
                 report.extend([
                     f"\n{pattern}:",
@@ -251,7 +487,7 @@ class PatternBacktester:
             "------------------------------"
         ])
         
-        for bracket, stats in backtest_results['confidence_stats'].items():
+        for bracket, stats in confidence_stats.items():
             report.extend([
                 f"\nConfidence {bracket}:",
                 f"Trades: {stats['total_trades']}",
@@ -0,0 +1,165 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+import asyncio
+import logging
+import time
+from ..config import MODEL_CONFIG
+from ..monitoring.metrics import REGISTRY
+from ..monitoring.profiling import profiled
+from .inference import InferenceBackend
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_CONFIG = MODEL_CONFIG['inference']
+
+MICRO_BATCH_SIZE = REGISTRY.histogram(
+    'inference_micro_batch_windows',
+    'Windows per shared forward pass',
+    buckets=(1, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+)
+MICRO_BATCH_REQUESTS = REGISTRY.histogram(
+    'inference_micro_batch_requests',
+    'Requests merged into each shared forward pass',
+    buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+MICRO_BATCH_QUEUE = REGISTRY.gauge(
+    'inference_micro_batch_queue_depth',
+    'Requests waiting for a shared forward pass'
+)
+
+
+class MicroBatcher:
+    """
+    Shares model forward passes across concurrent requests
+
+    Requests submit their feature windows and await the result. A single
+    background task collects pending submissions until max_windows is
+    reached or max_wait_ms has passed since the first one, runs one batched
+    forward pass on a dedicated inference thread, and scatters the
+    probabilities back to each waiting request. Batches form within one
+    process: each pre-fork worker has its own batcher, which merges only
+    the requests that worker accepted.
+    """
+
+    def __init__(
+        self,
+        backend: InferenceBackend,
+        max_windows: int = INFERENCE_CONFIG['micro_batch_max_windows'],
+        max_wait_ms: float = INFERENCE_CONFIG['micro_batch_max_wait_ms']
+    ):
+        self.backend = backend
+        self.max_windows = max_windows
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._worker: Optional[asyncio.Task] = None
+        # Submissions taken off the queue and not yet answered
+        self._pending: List[Tuple[np.ndarray, asyncio.Future]] = []
+        # One inference thread: batches run back to back and never compete for cores
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='micro-batch')
+
+    def start(self):
+        """Start the batching task on the running event loop"""
+        if self._worker is None or self._worker.done():
+            loop = asyncio.get_running_loop()
+            # Keep the queue on a restart so requests already queued are served
+            if self._queue is None or self._loop is not loop:
+                self._queue = asyncio.Queue()
+                self._loop = loop
+            self._worker = loop.create_task(self._run())
+
+    async def stop(self):
+        """Stop batching; requests still queued are failed"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Micro-batcher stopped"))
+        MICRO_BATCH_QUEUE.set(0)
+
+    async def predict_proba(self, windows: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            windows: Array of shape (n_windows, window_size, n_features)
+
+        Returns:
+            Class probabilities of shape (n_windows, n_labels)
+        """
+        if len(windows) == 0:
+            return self.backend.predict_proba(windows)
+
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        MICRO_BATCH_QUEUE.inc()
+        await self._queue.put((windows, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[np.ndarray, asyncio.Future]]:
+        """Wait for one submission, then gather more into self._pending until full or timed out"""
+        self._pending = pending = [await self._queue.get()]
+        total = len(pending[0][0])
+        deadline = time.monotonic() + self.max_wait
+
+        while total < self.max_windows:
+            if not self._queue.empty():
+                item = self._queue.get_nowait()
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            pending.append(item)
+            total += len(item[0])
+
+        MICRO_BATCH_QUEUE.dec(len(pending))
+        return pending
+
+    async def _run(self):
+        try:
+            await self._serve()
+        finally:
+            # Stopped mid-batch: fail the requests taken off the queue so they don't hang
+            for _, future in self._pending:
+                if not future.done():
+                    future.set_exception(RuntimeError("Micro-batcher stopped"))
+            self._pending = []
+
+    async def _serve(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._pending = []
+            pending = await self._collect()
+            # Requests cancelled while queued no longer need results
+            pending = [(windows, future) for windows, future in pending if not future.done()]
+            if not pending:
+                continue
+
+            sizes = [len(windows) for windows, _ in pending]
+            try:
+                batch = np.concatenate([windows for windows, _ in pending])
+                probabilities = await loop.run_in_executor(
+                    self._executor, profiled(self.backend.predict_proba), batch
+                )
+            except Exception as e:
+                logger.error(f"Error in micro-batched inference: {e}")
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            MICRO_BATCH_SIZE.observe(len(batch))
+            MICRO_BATCH_REQUESTS.observe(len(pending))
+
+            for (_, future), result in zip(pending, np.split(probabilities, np.cumsum(sizes)[:-1])):
+                if not future.done():
+                    future.set_result(result)
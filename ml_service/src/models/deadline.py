@@ -0,0 +1,82 @@
+import threading
+import time
+from typing import Optional, Tuple
+from ..config import MODEL_CONFIG
+from ..monitoring.metrics import REGISTRY
+
+INFERENCE_CONFIG = MODEL_CONFIG['inference']
+
+DEGRADED_DETECTIONS = REGISTRY.counter(
+    'detections_degraded',
+    'Detections that skipped model windows to meet their deadline'
+)
+SKIPPED_WINDOWS = REGISTRY.counter(
+    'detection_skipped_windows',
+    'Model windows left uninferred to meet detection deadlines'
+)
+
+
+class StageCost:
+    """
+    Running estimate of a stage's cost per unit of work
+
+    An exponentially weighted mean of the seconds per unit of recent calls,
+    so the estimate follows load (a busy CPU, a contended micro-batcher)
+    within a few calls.
+    """
+
+    def __init__(
+        self,
+        initial_unit_cost: float = INFERENCE_CONFIG['initial_window_cost_s'],
+        smoothing: float = INFERENCE_CONFIG['window_cost_smoothing']
+    ):
+        if initial_unit_cost <= 0 or not 0 < smoothing <= 1:
+            raise ValueError("initial_unit_cost must be positive and smoothing in (0, 1]")
+        self.unit_cost = initial_unit_cost
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, units: int):
+        """Fold in the duration of a call that processed units of work"""
+        if units <= 0:
+            return
+        with self._lock:
+            self.unit_cost += self.smoothing * (max(seconds, 0.0) / units - self.unit_cost)
+
+    def units_within(self, budget_s: float) -> int:
+        """Units of work expected to complete within budget_s seconds"""
+        if budget_s <= 0:
+            return 0
+        return int(budget_s / self.unit_cost)
+
+
+def windows_within_deadline(
+    cost: StageCost,
+    n_windows: int,
+    deadline: Optional[float],
+    overhead_s: float = 0.0,
+    safety_factor: float = INFERENCE_CONFIG['deadline_safety_factor']
+) -> Tuple[int, int]:
+    """
+    Split the model windows into those that fit before a deadline and the rest
+
+    The newest window is inferred whenever any time remains, so the estimate
+    keeps being refreshed even under sustained overload.
+
+    Args:
+        cost: Per-window cost estimate
+        n_windows: Windows to infer
+        deadline: time.monotonic() value to finish by, or None for no limit
+        overhead_s: Fixed cost of a call, e.g. the micro-batcher's wait
+
+    Returns:
+        Windows to infer (the most recent ones) and windows skipped
+    """
+    if deadline is None or n_windows == 0:
+        return n_windows, 0
+    budget = (deadline - time.monotonic()) * safety_factor - overhead_s
+    fit = min(n_windows, max(1, cost.units_within(budget)) if budget > 0 else 0)
+    if fit < n_windows:
+        DEGRADED_DETECTIONS.inc()
+        SKIPPED_WINDOWS.inc(n_windows - fit)
+    return fit, n_windows - fit
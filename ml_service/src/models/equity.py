@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, NamedTuple, Optional
+from ..data.candles import OHLCVData, ohlcv_column
+from .trade_log import TradeLog
+
+SECONDS_PER_YEAR = 365 * 24 * 3600  # Markets quoted around the clock
+
+
+class EquityCurve(NamedTuple):
+    """Portfolio state at each bar close, starting from equity 1.0"""
+    equity: np.ndarray  # float64 equity marked to market on the close
+    drawdown: np.ndarray  # float64 fraction below the running peak (<= 0)
+    exposure: np.ndarray  # float64 gross open notional / equity
+    open_positions: np.ndarray  # int32 trades open at the close
+
+
+def bars_per_year(bar_times) -> Optional[float]:
+    """Annualization factor from the median bar spacing (None without bar times)"""
+    if not isinstance(bar_times, pd.DatetimeIndex) or len(bar_times) < 2:
+        return None
+    spacing = np.median(np.diff(bar_times.asi8)) / 1e9
+    return SECONDS_PER_YEAR / spacing if spacing > 0 else None
+
+
+def mark_to_market(
+    trade_log: TradeLog,
+    data: OHLCVData,
+    position_size: float,
+    transaction_cost: float
+) -> EquityCurve:
+    """
+    Bar-by-bar equity of trading every trade in the log at once
+
+    Each trade commits position_size of the starting equity at its entry
+    price. Position changes are scattered onto the bars with np.add.at and
+    accumulated once, so open positions are marked on every close in
+    O(bars + trades). A trade's first bar is marked from its entry price
+    and its last bar to its exit price, so summed over its bars the P&L is
+    position_size times the trade's return.
+    """
+    closes = ohlcv_column(data, 'close')
+    n_bars = len(closes)
+    entry_index = trade_log.columns['entry_index']
+    exit_index = trade_log.columns['exit_index']
+    entry_price = trade_log.columns['entry_price']
+    exit_price = trade_log.columns['exit_price']
+    units = trade_log.directions * position_size / entry_price
+    cost = position_size * transaction_cost
+
+    # Positions are open at the closes from entry up to (not including) exit
+    def held(values: np.ndarray, dtype) -> np.ndarray:
+        deltas = np.zeros(n_bars + 1, dtype=dtype)
+        np.add.at(deltas, entry_index, values)
+        np.add.at(deltas, exit_index, -values)
+        return np.cumsum(deltas[:-1])
+
+    open_positions = held(np.ones(len(entry_index), dtype=np.int32), np.int32)
+    open_units = held(units, np.float64)
+    gross_units = held(np.abs(units), np.float64)
+
+    pnl = np.zeros(n_bars)
+    carried = open_positions[:-1] > 0
+    pnl[1:][carried] = open_units[:-1][carried] * np.diff(closes)[carried]
+    np.add.at(pnl, entry_index, units * (closes[entry_index] - entry_price) - cost)
+    np.add.at(pnl, exit_index, units * (exit_price - closes[exit_index]) - cost)
+
+    equity = 1.0 + np.cumsum(pnl)
+    peak = np.maximum(np.maximum.accumulate(equity), 1.0)
+    drawdown = equity / peak - 1
+    exposure = np.zeros(n_bars)
+    np.divide(gross_units * closes, equity, out=exposure, where=(open_positions > 0) & (equity > 0))
+
+    return EquityCurve(equity, drawdown, exposure, open_positions)
+
+
+def equity_statistics(curve: EquityCurve, periods_per_year: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Risk statistics of an equity curve
+
+    The Sharpe ratio and volatility come from bar-to-bar equity returns, so
+    they weight time rather than trades; with periods_per_year they are
+    annualized.
+    """
+    equity = curve.equity
+    if len(equity) == 0:
+        return {}
+
+    previous = np.concatenate(([1.0], equity[:-1]))
+    bar_returns = np.zeros(len(equity))
+    np.divide(equity - previous, previous, out=bar_returns, where=previous > 0)
+    scale = np.sqrt(periods_per_year) if periods_per_year else 1.0
+    std_return = np.std(bar_returns)
+
+    # Longest stretch of bars spent below a previous peak
+    bars = np.arange(len(equity))
+    last_peak = np.maximum.accumulate(np.where(curve.drawdown < 0, -1, bars))
+
+    return {
+        'total_return': equity[-1] - 1,
+        'max_drawdown': curve.drawdown.min(),
+        'max_drawdown_duration': int((bars - last_peak).max()),
+        'avg_exposure': curve.exposure.mean(),
+        'max_exposure': curve.exposure.max(),
+        'time_in_market': np.mean(curve.open_positions > 0),
+        'volatility': std_return * scale,
+        'sharpe_ratio': np.mean(bar_returns) / std_return * scale if std_return > 0 else 0
+    }
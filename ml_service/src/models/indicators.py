@@ -0,0 +1,342 @@
+import numpy as np
+import talib
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Tuple
+
+# TA-Lib treats |x| below this as zero (TA_IS_ZERO)
+_TA_EPSILON = 1e-8
+
+
+def _cross(previous: float, current: float) -> int:
+    """1 when a difference turned positive, -1 when it turned negative, else 0"""
+    if np.isnan(previous) or np.isnan(current):
+        return 0
+    if previous <= 0 < current:
+        return 1
+    if previous >= 0 > current:
+        return -1
+    return 0
+
+
+def _as_float64(values) -> np.ndarray:
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
+class Indicator(ABC):
+    """
+    Technical indicator with O(1) state per stream
+
+    update() consumes one new value and returns the indicator for it (NaN
+    while warming up). batch() recomputes from scratch over a whole series,
+    returning every output and leaving the state as if update() had been
+    called for each value, so incremental updates can continue after a
+    backfill. Both follow the floating-point operation order of the TA-Lib
+    0.4 C library the service is built with (see the Dockerfile), so they
+    match it exactly; other builds (0.6+ rewrote RSI, and compilers may
+    contract multiply-adds into FMAs) agree to within 1e-9 relative.
+    """
+
+    @abstractmethod
+    def reset(self):
+        ...
+
+    @abstractmethod
+    def update(self, value: float):
+        ...
+
+    def batch(self, values: np.ndarray) -> np.ndarray:
+        self.reset()
+        return np.array([self.update(value) for value in _as_float64(values)])
+
+
+class SMA(Indicator):
+    """Simple moving average, as TA-Lib's running period total"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.reset()
+
+    def reset(self):
+        self._window = deque()
+        self._total = 0.0
+        self.value = np.nan
+
+    def update(self, value: float) -> float:
+        value = float(value)
+        self._window.append(value)
+        if len(self._window) < self.period:
+            self._total += value
+            return np.nan
+        total = self._total + value
+        self.value = total / self.period
+        self._total = total - self._window.popleft()
+        return self.value
+
+    def batch(self, values: np.ndarray) -> np.ndarray:
+        """
+        Vectorized: TA-Lib adds the new value then subtracts the oldest, so the
+        running total is a sequential cumulative sum over interleaved terms
+        """
+        values = _as_float64(values)
+        self.reset()
+        period = self.period
+        if len(values) < period:
+            for value in values:
+                self.update(value)
+            return np.full(len(values), np.nan)
+
+        n_outputs = len(values) - period + 1
+        terms = np.empty(period - 1 + 2 * n_outputs)
+        terms[:period - 1] = values[:period - 1]
+        terms[period - 1::2] = values[period - 1:]
+        terms[period::2] = -values[:n_outputs]
+        totals = np.cumsum(terms)
+
+        output = np.full(len(values), np.nan)
+        output[period - 1:] = totals[period - 1::2] / period
+        self._window = deque(values[len(values) - period + 1:].tolist())
+        self._total = float(totals[-1])
+        self.value = float(output[-1])
+        return output
+
+
+class EMA(Indicator):
+    """Exponential moving average seeded with the SMA of the first period values"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.k = 2.0 / (period + 1)
+        self.reset()
+
+    def reset(self):
+        self._count = 0
+        self._seed_total = 0.0
+        self.value = np.nan
+
+    def update(self, value: float) -> float:
+        value = float(value)
+        if self._count < self.period:
+            self._count += 1
+            self._seed_total += value
+            if self._count == self.period:
+                self.value = self._seed_total / self.period
+            return self.value
+        self.value = (value - self.value) * self.k + self.value
+        return self.value
+
+    def batch(self, values: np.ndarray) -> np.ndarray:
+        values = _as_float64(values)
+        if len(values) < self.period:
+            return super().batch(values)
+        self.reset()
+        output = talib.EMA(values, self.period)
+        self._count = self.period
+        self.value = float(output[-1])
+        return output
+
+
+class RSI(Indicator):
+    """Wilder's relative strength index"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.reset()
+
+    def reset(self):
+        self._previous = None
+        self._count = 0
+        self._gain = 0.0
+        self._loss = 0.0
+        self.value = np.nan
+
+    @staticmethod
+    def _smooth(gain: float, loss: float, change: float, period: int) -> Tuple[float, float]:
+        """Wilder smoothing of the average gain and loss with one more change"""
+        if change < 0:
+            return gain * (period - 1) / period, (loss * (period - 1) - change) / period
+        return (gain * (period - 1) + change) / period, loss * (period - 1) / period
+
+    def update(self, value: float) -> float:
+        value = float(value)
+        if self._previous is None:
+            self._previous = value
+            return np.nan
+        change = value - self._previous
+        self._previous = value
+
+        if self._count < self.period:
+            # Simple average of the first period changes
+            self._count += 1
+            if change < 0:
+                self._loss -= change
+            else:
+                self._gain += change
+            if self._count < self.period:
+                return np.nan
+            self._gain, self._loss = self._gain / self.period, self._loss / self.period
+        else:
+            self._gain, self._loss = self._smooth(self._gain, self._loss, change, self.period)
+
+        total = self._gain + self._loss
+        self.value = 0.0 if -_TA_EPSILON < total < _TA_EPSILON else 100.0 * (self._gain / total)
+        return self.value
+
+    def batch(self, values: np.ndarray) -> np.ndarray:
+        """
+        Outputs come from TA-Lib; the smoothed gain and loss it does not
+        expose are rebuilt with one pass over the changes
+        """
+        values = _as_float64(values)
+        if len(values) <= self.period:
+            return super().batch(values)
+        self.reset()
+        output = talib.RSI(values, self.period)
+
+        period = self.period
+        for value in values[:period + 1].tolist():
+            self.update(value)
+        smooth = self._smooth
+        gain, loss = self._gain, self._loss
+        for change in np.diff(values[period:]).tolist():
+            gain, loss = smooth(gain, loss, change, period)
+
+        self._previous = float(values[-1])
+        self._gain, self._loss = gain, loss
+        self.value = float(output[-1])
+        return output
+
+
+class MACD(Indicator):
+    """
+    Moving average convergence/divergence
+
+    As in TA-Lib, the fast EMA is seeded over the slow-fast ... slow-1 values
+    so both EMAs start at the same candle, and all three outputs are NaN
+    until the signal line is ready. `cross` is 1 on the candle MACD crosses
+    above its signal line, -1 below, else 0.
+    """
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        if slow < fast:
+            fast, slow = slow, fast
+        self.fast_period, self.slow_period, self.signal_period = fast, slow, signal
+        self.reset()
+
+    def reset(self):
+        self._fast = EMA(self.fast_period)
+        self._slow = EMA(self.slow_period)
+        self._signal = EMA(self.signal_period)
+        self._count = 0
+        self.value: Tuple[float, float, float] = (np.nan, np.nan, np.nan)
+        self.cross = 0
+
+    def update(self, value: float) -> Tuple[float, float, float]:
+        self._count += 1
+        slow = self._slow.update(value)
+        fast = self._fast.update(value) if self._count > self.slow_period - self.fast_period else np.nan
+        if np.isnan(slow):
+            return self.value
+
+        line = fast - slow
+        signal = self._signal.update(line)
+        if np.isnan(signal):
+            return self.value
+        previous_histogram = self.value[2]
+        self.value = (line, signal, line - signal)
+        self.cross = _cross(previous_histogram, self.value[2])
+        return self.value
+
+    def batch(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        values = _as_float64(values)
+        self.reset()
+        self._count = len(values)
+        offset = self.slow_period - self.fast_period
+
+        slow = self._slow.batch(values)
+        fast = np.full(len(values), np.nan)
+        fast[offset:] = self._fast.batch(values[offset:])
+        line = fast - slow
+
+        signal = np.full(len(values), np.nan)
+        start = self.slow_period - 1
+        if len(values) > start:
+            signal[start:] = self._signal.batch(line[start:])
+        # Like TA-Lib, no MACD output before the signal line exists
+        line[np.isnan(signal)] = np.nan
+        histogram = line - signal
+
+        if len(values) and not np.isnan(histogram[-1]):
+            self.value = (float(line[-1]), float(signal[-1]), float(histogram[-1]))
+            self.cross = _cross(histogram[-2], histogram[-1]) if len(values) > 1 else 0
+        return line, signal, histogram
+
+
+class MovingAverageCross(Indicator):
+    """1 on the candle SMA(fast) crosses above SMA(slow), -1 below, else 0"""
+
+    def __init__(self, fast: int, slow: int):
+        self.fast_period, self.slow_period = fast, slow
+        self.reset()
+
+    def reset(self):
+        self._fast = SMA(self.fast_period)
+        self._slow = SMA(self.slow_period)
+        self._difference = np.nan
+        self.value = 0
+
+    def update(self, value: float) -> int:
+        difference = self._fast.update(value) - self._slow.update(value)
+        self.value = _cross(self._difference, difference)
+        self._difference = difference
+        return self.value
+
+    def batch(self, values: np.ndarray) -> np.ndarray:
+        values = _as_float64(values)
+        self.reset()
+        difference = self._fast.batch(values) - self._slow.batch(values)
+        previous = np.concatenate(([np.nan], difference[:-1]))
+        with np.errstate(invalid='ignore'):
+            crosses = np.where(
+                (previous <= 0) & (difference > 0), 1,
+                np.where((previous >= 0) & (difference < 0), -1, 0)
+            ).astype(np.int8)
+        if len(values):
+            self._difference = float(difference[-1])
+            self.value = int(crosses[-1])
+        return crosses
+
+
+class VolumeSurge(Indicator):
+    """Volume over the SMA of the previous period volumes, in percent"""
+
+    def __init__(self, period: int = 20):
+        self.period = period
+        self.reset()
+
+    def reset(self):
+        self._average = SMA(self.period)
+        self._previous_average = np.nan
+        self.value = np.nan
+
+    @staticmethod
+    def _increase(volume, average):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(average > 0, (volume / average - 1) * 100, np.where(np.isnan(average), np.nan, 0.0))
+
+    def update(self, value: float) -> float:
+        self.value = float(self._increase(float(value), self._previous_average))
+        self._previous_average = self._average.update(value)
+        return self.value
+
+    def batch(self, values: np.ndarray) -> np.ndarray:
+        values = _as_float64(values)
+        self.reset()
+        averages = self._average.batch(values)
+        previous = np.concatenate(([np.nan], averages[:-1]))
+        output = self._increase(values, previous)
+        if len(values):
+            self._previous_average = float(averages[-1])
+            self.value = float(output[-1])
+        return output
+
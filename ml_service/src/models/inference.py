@@ -0,0 +1,270 @@
+import numpy as np
+import torch
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Optional
+import inspect
+import logging
+import os
+import tempfile
+from ..config import MODEL_CONFIG
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_CONFIG = MODEL_CONFIG['inference']
+
+
+class _LogitsOnly(torch.nn.Module):
+    """Unwrap models returning an output object (e.g. transformers) to plain logits"""
+
+    def __init__(self, model: torch.nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, features: torch.Tensor) -> torch.Tensor:
+        outputs = self.model(features)
+        return getattr(outputs, 'logits', outputs)
+
+
+class InferenceBackend(ABC):
+    """
+    Runs a pattern classifier over batches of feature windows
+
+    Subclasses implement _logits; predict_proba handles batching and softmax.
+    """
+
+    name = 'base'
+
+    def __init__(self, batch_size: int = INFERENCE_CONFIG['batch_size']):
+        self.batch_size = batch_size
+
+    @abstractmethod
+    def _logits(self, windows: np.ndarray) -> np.ndarray:
+        ...
+
+    def after_fork(self, intra_op_threads: int):
+        """Re-tune threading in a forked worker process"""
+        pass
+
+    def predict_proba(self, windows: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            windows: float32 array of shape (n_windows, window_size, n_features)
+
+        Returns:
+            Class probabilities of shape (n_windows, n_labels)
+        """
+        # Windows may be a strided view; only one batch is materialized at a time
+        outputs = [
+            self._logits(np.ascontiguousarray(
+                windows[start:start + self.batch_size], dtype=np.float32
+            ))
+            for start in range(0, len(windows), self.batch_size)
+        ]
+        logits = np.concatenate(outputs) if outputs else np.empty((0, 0), dtype=np.float32)
+        logits = logits - logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+
+class TorchBackend(InferenceBackend):
+    """Plain fp32 PyTorch inference"""
+
+    name = 'torch'
+
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        intra_op_threads: int = INFERENCE_CONFIG['intra_op_threads'],
+        batch_size: int = INFERENCE_CONFIG['batch_size']
+    ):
+        super().__init__(batch_size)
+        self.model = _LogitsOnly(model).eval()
+        if intra_op_threads > 0:
+            torch.set_num_threads(intra_op_threads)
+
+    @torch.no_grad()
+    def _logits(self, windows: np.ndarray) -> np.ndarray:
+        return self.model(torch.from_numpy(windows)).float().numpy()
+
+    def after_fork(self, intra_op_threads: int):
+        if intra_op_threads > 0:
+            torch.set_num_threads(intra_op_threads)
+
+
+class QuantizedTorchBackend(TorchBackend):
+    """
+    PyTorch inference with Linear layers dynamically quantized to int8
+
+    Dynamic quantization covers Linear layers only: the transformer's
+    projections are quantized, but CandleCNN keeps its Conv1d stack in fp32
+    and only its classification head runs in int8, so expect little speedup
+    for the CNN. Convolutions would need static quantization with calibration.
+    """
+
+    name = 'quantized'
+
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        intra_op_threads: int = INFERENCE_CONFIG['intra_op_threads'],
+        batch_size: int = INFERENCE_CONFIG['batch_size']
+    ):
+        quantized = torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+        super().__init__(quantized, intra_op_threads, batch_size)
+
+
+class OnnxBackend(InferenceBackend):
+    """ONNX Runtime inference on a model exported from PyTorch"""
+
+    name = 'onnx'
+
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        window_shape: tuple,
+        onnx_path: Path = INFERENCE_CONFIG['onnx_path'],
+        intra_op_threads: int = INFERENCE_CONFIG['intra_op_threads'],
+        batch_size: int = INFERENCE_CONFIG['batch_size']
+    ):
+        super().__init__(batch_size)
+        self.onnx_path = Path(onnx_path)
+        export_onnx(model, window_shape, self.onnx_path)
+        self._create_session(intra_op_threads)
+
+    def _create_session(self, intra_op_threads: int):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads > 0:
+            options.intra_op_num_threads = intra_op_threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            str(self.onnx_path), options, providers=['CPUExecutionProvider']
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def _logits(self, windows: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: windows})[0]
+
+    def after_fork(self, intra_op_threads: int):
+        # ONNX Runtime thread pools do not survive fork; the session is
+        # rebuilt in each worker (the weights are reloaded from onnx_path)
+        self._create_session(intra_op_threads)
+
+
+def export_onnx(model: torch.nn.Module, window_shape: tuple, onnx_path: Path) -> Path:
+    """
+    Export a classifier to ONNX with a dynamic batch dimension
+
+    The export is written beside onnx_path and moved into place, so other
+    processes loading the path never see a partly written file.
+    """
+    onnx_path = Path(onnx_path)
+    onnx_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=onnx_path.name + '.', suffix='.tmp', dir=onnx_path.parent)
+    os.close(fd)
+
+    export_kwargs = {}
+    if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+        # The TorchScript exporter handles dynamic axes without onnxscript
+        export_kwargs['dynamo'] = False
+
+    wrapped = _LogitsOnly(model).eval()
+    try:
+        with torch.no_grad():
+            torch.onnx.export(
+                wrapped,
+                (torch.zeros((1, *window_shape), dtype=torch.float32),),
+                tmp_name,
+                input_names=['features'],
+                output_names=['logits'],
+                dynamic_axes={'features': {0: 'batch'}, 'logits': {0: 'batch'}},
+                opset_version=17,
+                **export_kwargs
+            )
+        os.replace(tmp_name, onnx_path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    return onnx_path
+
+
+def check_accuracy_drift(
+    reference: InferenceBackend,
+    candidate: InferenceBackend,
+    windows: np.ndarray
+) -> Dict[str, float]:
+    """
+    Compare a candidate backend's predictions against a reference (fp32) backend
+
+    Returns:
+        Maximum and mean absolute probability difference, and the fraction of
+        windows where both backends predict the same label
+    """
+    expected = reference.predict_proba(windows)
+    actual = candidate.predict_proba(windows)
+    difference = np.abs(expected - actual)
+
+    return {
+        'max_abs_diff': float(difference.max()) if difference.size else 0.0,
+        'mean_abs_diff': float(difference.mean()) if difference.size else 0.0,
+        'label_agreement': float(
+            np.mean(expected.argmax(axis=1) == actual.argmax(axis=1))
+        ) if len(expected) else 1.0
+    }
+
+
+def create_backend(
+    model: torch.nn.Module,
+    window_shape: tuple,
+    backend: Optional[str] = None,
+    verify_windows: Optional[np.ndarray] = None
+) -> InferenceBackend:
+    """
+    Build the configured inference backend for a model
+
+    When verify_windows is given, an optimized backend is checked against
+    the fp32 model and rejected (falling back to fp32) if its predictions
+    drift beyond MODEL_CONFIG['inference'] limits.
+
+    Args:
+        model: PyTorch classifier taking (batch, *window_shape) features
+        window_shape: (window_size, n_features)
+        backend: 'torch', 'quantized' or 'onnx' (config default if None)
+        verify_windows: Sample windows for the accuracy-drift check
+
+    Returns:
+        Inference backend
+    """
+    backend = backend or INFERENCE_CONFIG['backend']
+    if backend not in ('torch', 'quantized', 'onnx'):
+        raise ValueError(f"Unsupported inference backend: {backend}")
+
+    reference = TorchBackend(model)
+    if backend == 'torch':
+        return reference
+
+    try:
+        if backend == 'quantized':
+            candidate = QuantizedTorchBackend(model)
+        else:
+            candidate = OnnxBackend(model, window_shape)
+    except Exception as e:
+        logger.error(f"Error creating {backend} inference backend, using fp32: {e}")
+        return reference
+
+    if verify_windows is not None:
+        drift = check_accuracy_drift(reference, candidate, verify_windows)
+        logger.info(f"{backend} backend drift vs fp32: {drift}")
+        if (
+            drift['max_abs_diff'] > INFERENCE_CONFIG['max_drift']
+            or drift['label_agreement'] < INFERENCE_CONFIG['min_agreement']
+        ):
+            logger.warning(f"{backend} backend exceeds drift limits, using fp32")
+            return reference
+
+    return candidate
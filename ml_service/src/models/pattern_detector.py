@@ -1,35 +1,190 @@
 import numpy as np
 import pandas as pd
 import talib
+from talib import abstract
 import torch
 from transformers import AutoModelForSequenceClassification, AutoTokenizer
-from typing import List, Dict, Any, Tuple
+from functools import lru_cache
+from typing import List, Dict, Any, Iterable, NamedTuple, Optional, Tuple
 import logging
+import time
 from ..config import MODEL_CONFIG, PATTERN_SETTINGS
+from ..data.candles import OHLCVData, ohlcv_column, slice_bars
+from ..monitoring.metrics import time_stage
+from .deadline import StageCost, windows_within_deadline
+from .inference import create_backend
+from .sequence_classifier import PATTERN_LABELS, N_FEATURES, load_classifier, prepare_features
 
 logger = logging.getLogger(__name__)
 
+# Model label of windows without a pattern; never reported as a hit
+NO_PATTERN_LABEL = PATTERN_LABELS.index("NO_PATTERN")
+
+class _RangeStats:
+    """
+    Precomputed prefix sums and sparse tables over an OHLCV frame so that
+    per-range sums, means, maxima and minima can be answered in O(1)
+    """
+
+    def __init__(self, ohlcv_data: OHLCVData, max_span: int = 1):
+        self.length = len(ohlcv_data)
+        self.close = ohlcv_column(ohlcv_data, 'close')
+        self.volume = ohlcv_column(ohlcv_data, 'volume')
+        self.close_sum = np.concatenate(([0.0], np.cumsum(self.close)))
+        self.volume_sum = np.concatenate(([0.0], np.cumsum(self.volume)))
+        self.volume_mean = np.nanmean(self.volume)
+
+        # Only build as many sparse-table levels as the widest range needs
+        levels = max(1, int(max_span).bit_length())
+        self.high_max = self._build_sparse_table(
+            ohlcv_column(ohlcv_data, 'high'), np.maximum, levels
+        )
+        self.low_min = self._build_sparse_table(
+            ohlcv_column(ohlcv_data, 'low'), np.minimum, levels
+        )
+
+    @staticmethod
+    def _build_sparse_table(values: np.ndarray, op, levels: int) -> np.ndarray:
+        """Row k holds op over values[i:i + 2**k] (NaN where out of range)"""
+        table = np.full((levels, len(values)), np.nan)
+        table[0] = values
+        for k in range(1, levels):
+            half = 1 << (k - 1)
+            width = len(values) - (1 << k) + 1
+            if width <= 0:
+                break
+            table[k, :width] = op(table[k - 1, :width], table[k - 1, half:half + width])
+        return table
+
+    @staticmethod
+    def _query(table: np.ndarray, op, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        spans = ends - starts + 1
+        levels = np.log2(spans).astype(np.int64)
+        return op(table[levels, starts], table[levels, ends - (1 << levels) + 1])
+
+    def range_max_high(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        return self._query(self.high_max, np.maximum, starts, ends)
+
+    def range_min_low(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        return self._query(self.low_min, np.minimum, starts, ends)
+
+    def range_mean_close(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        return (self.close_sum[ends + 1] - self.close_sum[starts]) / (ends - starts + 1)
+
+    def range_mean_volume(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        return (self.volume_sum[ends + 1] - self.volume_sum[starts]) / (ends - starts + 1)
+
+class UniverseHits(NamedTuple):
+    """
+    Sparse (symbol, bar, pattern) hit matrix from PatternDetector.scan_universe
+
+    Parallel int32 coordinate arrays sorted by symbol, bar and pattern;
+    pattern_id indexes pattern_names and shape is (symbols, bars).
+    """
+    symbol: np.ndarray
+    bar_index: np.ndarray
+    pattern_id: np.ndarray
+    strength: np.ndarray
+    pattern_names: List[str]
+    shape: Tuple[int, int]
+
+    def __len__(self) -> int:
+        return len(self.strength)
+
+
+@lru_cache(maxsize=None)
+def _talib_lookback(function_name: str) -> int:
+    """Leading bars a TA-Lib function needs before its first output"""
+    return abstract.Function(function_name).lookback
+
+
+# Default averaging period of TA-Lib's candle settings (BodyLong, ShadowVeryShort, ...)
+TALIB_AVERAGE_PERIOD = 10
+
+
+def talib_tail_lookback(pattern_func, length: int = 1) -> int:
+    """
+    Bars before a candle that decide whether a pattern ends on it
+
+    The pattern's other candles plus TA-Lib's averaging period; TA-Lib's
+    own lookback covers functions that average up to a bar further back.
+    """
+    return max(length - 1 + TALIB_AVERAGE_PERIOD, _talib_lookback(pattern_func.__name__))
+
+
+def tail_start(n_bars: int, since_index: Optional[int] = None, last_n: Optional[int] = None) -> Optional[int]:
+    """
+    First candle of a tail-only detection (None to detect over every candle)
+
+    With both limits the later start wins.
+    """
+    if since_index is None and last_n is None:
+        return None
+    if (since_index is not None and since_index < 0) or (last_n is not None and last_n < 0):
+        raise ValueError("since_index and last_n must not be negative")
+    start = since_index or 0
+    if last_n is not None:
+        start = max(start, n_bars - last_n)
+    return min(start, n_bars)
+
+
+class DetectedPatterns(list):
+    """
+    Detected patterns, flagged partial when model windows were skipped to meet a deadline
+    """
+
+    def __init__(self, patterns: Iterable[Dict[str, Any]] = (), skipped_windows: int = 0):
+        super().__init__(patterns)
+        self.skipped_windows = skipped_windows
+
+    @property
+    def partial(self) -> bool:
+        return self.skipped_windows > 0
+
+
 class PatternDetector:
     def __init__(self):
         self.model = None
         self.tokenizer = None
+        self.inference_backend = None
+        self.window_size = MODEL_CONFIG['sequence']['window_size']  # Candles per model window
+        self.n_features = N_FEATURES  # Features per candle from _prepare_data_for_transformer
+        self.window_cost = StageCost()  # Recent model inference seconds per window
         self._initialize_model()
         self._initialize_talib_patterns()
 
     def _initialize_model(self):
-        """Initialize the transformer model for pattern detection"""
+        """Initialize the sequence model (compact CNN or transformer) for pattern detection"""
         try:
-            model_name = MODEL_CONFIG['transformer']['model_name']
-            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-            self.model = AutoModelForSequenceClassification.from_pretrained(
-                model_name,
-                num_labels=MODEL_CONFIG['transformer']['num_labels']
-            )
+            if MODEL_CONFIG['model_type'] == 'cnn':
+                checkpoint = MODEL_CONFIG['sequence']['checkpoint']
+                if not checkpoint.exists():
+                    logger.warning(
+                        f"No trained pattern classifier at {checkpoint}; ML detection disabled. "
+                        "Train one with python -m src.models.sequence_classifier"
+                    )
+                    return
+                self.model, self.window_size = load_classifier(checkpoint)
+            else:
+                model_name = MODEL_CONFIG['transformer']['model_name']
+                self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+                self.model = AutoModelForSequenceClassification.from_pretrained(
+                    model_name,
+                    num_labels=MODEL_CONFIG['transformer']['num_labels']
+                )
             self.model.eval()
+            self.inference_backend = create_backend(
+                self.model,
+                (self.window_size, self.n_features),
+                verify_windows=np.random.default_rng(0).uniform(
+                    -0.05, 0.05, (256, self.window_size, self.n_features)
+                ).astype(np.float32)
+            )
         except Exception as e:
-            logger.error(f"Error initializing transformer model: {e}")
+            logger.error(f"Error initializing pattern model: {e}")
             self.model = None
             self.tokenizer = None
+            self.inference_backend = None
 
     def _initialize_talib_patterns(self):
         """Initialize TA-Lib pattern detection functions"""
@@ -62,49 +217,169 @@ class PatternDetector:
             'LADDER_BOTTOM': (talib.CDLLADDERBOTTOM, 5)
         }
 
-    def _prepare_data_for_transformer(self, ohlcv_data: pd.DataFrame) -> torch.Tensor:
+    def _prepare_data_for_transformer(self, ohlcv_data: OHLCVData) -> torch.Tensor:
         """
         Convert OHLCV data to a format suitable for the transformer model
         """
-        # Calculate returns and normalize data
-        data = ohlcv_data.copy()
-        for col in ['open', 'high', 'low', 'close']:
-            data[f'{col}_return'] = data[col].pct_change()
-        data['volume_change'] = data['volume'].pct_change()
-        
-        # Create feature matrix
-        features = data[[
-            'open_return', 'high_return', 'low_return',
-            'close_return', 'volume_change'
-        ]].fillna(0).values
-        
-        # Scale features to [-1, 1] range
-        features = np.clip(features, -1, 1)
-        
-        # Convert to tensor
-        return torch.tensor(features, dtype=torch.float32)
+        return torch.from_numpy(prepare_features(ohlcv_data))
+
+    def detect_pattern_signals(
+        self,
+        ohlcv_data: OHLCVData,
+        patterns: Optional[Iterable[str]] = None,
+        since_index: int = 0
+    ) -> Dict[str, np.ndarray]:
+        """
+        Run every TA-Lib pattern function and return its raw output
+
+        With since_index, each function only runs over the candles from
+        since_index on plus its tail lookback, so the cost does not grow
+        with the history before them.
+
+        Args:
+            ohlcv_data: OHLCV DataFrame or CandleSeries
+            patterns: Only run these patterns (all if None)
+            since_index: First candle to report
+
+        Returns:
+            Mapping of pattern name to the TA-Lib integer array (-100 to 100
+            per bar from since_index on, 0 where the pattern is absent)
+        """
+        signals = {}
+        wanted = None if patterns is None else set(patterns)
+        selected = [
+            (pattern_name, pattern_func, length)
+            for pattern_name, (pattern_func, length) in self.talib_patterns.items()
+            if wanted is None or pattern_name in wanted
+        ]
+        if not selected:
+            return signals
+
+        # Columns are read once, over the widest lookback any selected pattern needs
+        window_start = 0
+        if since_index > 0:
+            widest = max(talib_tail_lookback(pattern_func, length) for _, pattern_func, length in selected)
+            window_start = max(0, since_index - widest)
+        window = slice_bars(ohlcv_data, window_start) if window_start else ohlcv_data
+        try:
+            prices = [ohlcv_column(window, name) for name in ('open', 'high', 'low', 'close')]
+        except Exception as e:
+            logger.error(f"Error reading OHLC columns: {e}")
+            return signals
+
+        for pattern_name, pattern_func, length in selected:
+            start = 0
+            if since_index > 0:
+                start = max(window_start, since_index - talib_tail_lookback(pattern_func, length)) - window_start
+            try:
+                signals[pattern_name] = pattern_func(
+                    *(values[start:] for values in prices)
+                )[since_index - window_start - start:]
+            except Exception as e:
+                logger.error(f"Error detecting {pattern_name}: {e}")
+                
+        return signals
+
+    def scan_universe(
+        self,
+        open_prices: np.ndarray,
+        high_prices: np.ndarray,
+        low_prices: np.ndarray,
+        close_prices: np.ndarray,
+        patterns: Optional[Iterable[str]] = None,
+        min_strength: int = 1
+    ) -> UniverseHits:
+        """
+        Run the TA-Lib patterns over a whole universe of symbols at once
+
+        Takes aligned (symbols x bars) OHLC matrices. Instead of one call per
+        symbol, each pattern function runs once over the clean rows laid end
+        to end (a free view of a C-contiguous matrix), and each row's first
+        lookback bars, which would see the previous symbol, are dropped.
+        Rows containing NaNs (e.g. symbols listed mid-window) run on their
+        own so a gap cannot leak into other symbols' results.
+
+        Args:
+            open_prices: Open prices, one row per symbol
+            high_prices: High prices, aligned with open_prices
+            low_prices: Low prices, aligned with open_prices
+            close_prices: Close prices, aligned with open_prices
+            patterns: Only run these patterns (all if None)
+            min_strength: Minimum absolute TA-Lib output to keep
+
+        Returns:
+            UniverseHits with one entry per hit
+        """
+        matrices = [
+            np.ascontiguousarray(prices, dtype=np.float64)
+            for prices in (open_prices, high_prices, low_prices, close_prices)
+        ]
+        shape = matrices[0].shape
+        if len(shape) != 2 or any(prices.shape != shape for prices in matrices):
+            raise ValueError("OHLC matrices must be 2-D with the same (symbols, bars) shape")
+        n_symbols, n_bars = shape
+        min_strength = max(1, min_strength)
+
+        has_nan = np.zeros(n_symbols, dtype=bool)
+        for prices in matrices:
+            has_nan |= np.isnan(prices).any(axis=1)
+        clean = np.flatnonzero(~has_nan)
+        ragged = np.flatnonzero(has_nan)
+        flat = [
+            (prices if len(ragged) == 0 else prices[clean]).ravel()
+            for prices in matrices
+        ]
+
+        wanted = None if patterns is None else set(patterns)
+        pattern_names = [name for name in self.talib_patterns if wanted is None or name in wanted]
+        symbols, bars, ids, strengths = [], [], [], []
+
+        def collect(rows: np.ndarray, signal: np.ndarray, pattern_id: int):
+            row_hits, bar_hits = np.nonzero(np.abs(signal) >= min_strength)
+            symbols.append(rows[row_hits])
+            bars.append(bar_hits)
+            ids.append(np.full(len(bar_hits), pattern_id))
+            strengths.append(signal[row_hits, bar_hits])
+
+        with time_stage('universe_scan'):
+            for pattern_id, pattern_name in enumerate(pattern_names):
+                pattern_func = self.talib_patterns[pattern_name][0]
+                try:
+                    if len(clean) and n_bars:
+                        signal = pattern_func(*flat).reshape(len(clean), n_bars)
+                        signal[:, :_talib_lookback(pattern_func.__name__)] = 0
+                        collect(clean, signal, pattern_id)
+                    for row in ragged:
+                        signal = pattern_func(*(prices[row] for prices in matrices))
+                        collect(np.array([row]), signal[np.newaxis], pattern_id)
+                except Exception as e:
+                    logger.error(f"Error detecting {pattern_name}: {e}")
+
+        def joined(parts: List[np.ndarray]) -> np.ndarray:
+            return np.concatenate(parts).astype(np.int32) if parts else np.empty(0, dtype=np.int32)
+
+        symbol, bar_index, pattern_id, strength = map(joined, (symbols, bars, ids, strengths))
+        order = np.lexsort((pattern_id, bar_index, symbol))
+        return UniverseHits(
+            symbol[order], bar_index[order], pattern_id[order], strength[order],
+            pattern_names, (n_symbols, n_bars)
+        )
 
     def _detect_patterns_talib(
         self,
-        ohlcv_data: pd.DataFrame
+        ohlcv_data: OHLCVData,
+        since_index: int = 0
     ) -> List[Dict[str, Any]]:
         """
-        Detect patterns using TA-Lib functions
+        Detect patterns using TA-Lib functions (ending at or after since_index)
         """
         patterns = []
         
-        for pattern_name, (pattern_func, length) in self.talib_patterns.items():
+        for pattern_name, pattern_result in self.detect_pattern_signals(ohlcv_data, since_index=since_index).items():
+            length = self.talib_patterns[pattern_name][1]
             try:
-                # Get pattern recognition integers (-100 to 100)
-                pattern_result = pattern_func(
-                    ohlcv_data['open'].values,
-                    ohlcv_data['high'].values,
-                    ohlcv_data['low'].values,
-                    ohlcv_data['close'].values
-                )
-                
                 # Process the results
-                for i, value in enumerate(pattern_result):
+                for i, value in enumerate(pattern_result, start=since_index):
                     if abs(value) >= PATTERN_SETTINGS['confidence_threshold'] * 100:
                         confidence = abs(value) / 100.0
                         pattern_type = 'bullish' if value > 0 else 'bearish'
@@ -123,82 +398,210 @@ class PatternDetector:
                 
         return patterns
 
+    def _first_window(self, since_index: int) -> int:
+        """First candle of the first model window ending at or after since_index"""
+        return max(0, since_index - self.window_size + 1)
+
+    def _window_count(self, n_candles: int, since_index: int = 0) -> int:
+        """Number of model windows ending at or after since_index"""
+        return max(0, n_candles - self._first_window(since_index) - self.window_size + 1)
+
+    def _transformer_windows(self, ohlcv_data: OHLCVData, since_index: int = 0) -> np.ndarray:
+        """
+        Sliding model windows as a strided view
+
+        With since_index, only the windows ending at or after it, prepared
+        from the candles they cover (and the one before, for returns).
+
+        Returns:
+            Array of shape (n_windows, window_size, n_features), window i
+            covering candles first + i .. first + i + window_size - 1 where
+            first is _first_window(since_index)
+        """
+        first = self._first_window(since_index)
+        context = max(0, first - 1)
+        features = self._prepare_data_for_transformer(
+            slice_bars(ohlcv_data, context) if context else ohlcv_data
+        ).numpy()[first - context:]
+        if len(features) < self.window_size:
+            return np.empty((0, self.window_size, self.n_features), dtype=np.float32)
+        return np.lib.stride_tricks.sliding_window_view(
+            features, self.window_size, axis=0
+        ).transpose(0, 2, 1)
+
+    def _deadline_windows(
+        self,
+        ohlcv_data: OHLCVData,
+        since_index: int = 0,
+        deadline: Optional[float] = None,
+        overhead_s: float = 0.0
+    ) -> Tuple[np.ndarray, int, int]:
+        """
+        The most recent model windows ending at or after since_index that fit before deadline
+
+        Returns:
+            Windows, the first candle of the first window and the number of
+            (oldest) windows skipped
+        """
+        windows = self._transformer_windows(ohlcv_data, since_index)
+        _, skipped = windows_within_deadline(self.window_cost, len(windows), deadline, overhead_s)
+        return windows[skipped:], self._first_window(since_index) + skipped, skipped
+
+    def _classify_windows(
+        self,
+        probabilities: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Pick each window's predicted class and keep confident predictions
+
+        Returns:
+            Window indices, predicted labels and confidences above the
+            confidence threshold
+        """
+        if len(probabilities) == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0)
+        predictions = probabilities.argmax(axis=1)
+        confidences = probabilities[np.arange(len(predictions)), predictions]
+        keep = np.flatnonzero(confidences >= PATTERN_SETTINGS['confidence_threshold'])
+        return keep, predictions[keep], confidences[keep]
+
+    def _patterns_from_probabilities(self, probabilities: np.ndarray, first: int = 0) -> List[Dict[str, Any]]:
+        patterns = []
+        for i, prediction, confidence in zip(*self._classify_windows(probabilities)):
+            if prediction == NO_PATTERN_LABEL:
+                continue
+            i += first
+            pattern_type = self._get_pattern_type(int(prediction))
+            patterns.append({
+                'pattern_name': f"AI_PATTERN_{pattern_type}",
+                'confidence': float(confidence),
+                'start_index': int(i),
+                'end_index': int(i) + self.window_size - 1,
+                'pattern_type': pattern_type.lower(),
+                'detection_method': 'transformer'
+            })
+        return patterns
+
     @torch.no_grad()
     def _detect_patterns_transformer(
         self,
-        ohlcv_data: pd.DataFrame
-    ) -> List[Dict[str, Any]]:
+        ohlcv_data: OHLCVData,
+        since_index: int = 0,
+        deadline: Optional[float] = None
+    ) -> DetectedPatterns:
         """
-        Detect patterns using the transformer model
+        Detect patterns using the transformer model (windows ending at or after since_index)
+
+        With a deadline, only the most recent windows expected to be inferred
+        in time are; the rest are counted in skipped_windows, as are all of
+        them if inference fails.
         """
-        if self.model is None or self.tokenizer is None:
-            return []
+        if self.inference_backend is None:
+            return DetectedPatterns()
             
-        patterns = []
-        window_size = 10  # Look at 10 candles at a time
-        
         try:
-            # Prepare data
-            features = self._prepare_data_for_transformer(ohlcv_data)
-            
-            # Slide window over the data
-            for i in range(len(features) - window_size + 1):
-                window = features[i:i + window_size]
-                
-                # Get model predictions
-                outputs = self.model(window.unsqueeze(0))
-                probabilities = torch.softmax(outputs.logits, dim=1)
-                prediction = torch.argmax(probabilities, dim=1).item()
-                confidence = probabilities[0][prediction].item()
-                
-                if confidence >= PATTERN_SETTINGS['confidence_threshold']:
-                    pattern_type = self._get_pattern_type(prediction)
-                    if pattern_type:
-                        patterns.append({
-                            'pattern_name': f"AI_PATTERN_{pattern_type}",
-                            'confidence': confidence,
-                            'start_index': i,
-                            'end_index': i + window_size - 1,
-                            'pattern_type': pattern_type.lower(),
-                            'detection_method': 'transformer'
-                        })
-                        
+            # Get model predictions in batches
+            windows, first, skipped = self._deadline_windows(ohlcv_data, since_index, deadline)
+            if len(windows) == 0:
+                return DetectedPatterns(skipped_windows=skipped)
+            start = time.perf_counter()
+            probabilities = self.inference_backend.predict_proba(windows)
+            self.window_cost.observe(time.perf_counter() - start, len(windows))
+            return DetectedPatterns(self._patterns_from_probabilities(probabilities, first), skipped)
         except Exception as e:
             logger.error(f"Error in transformer pattern detection: {e}")
-            
-        return patterns
+            return DetectedPatterns(skipped_windows=self._window_count(len(ohlcv_data), since_index))
 
     def _get_pattern_type(self, prediction: int) -> str:
         """Map model prediction to pattern type"""
-        pattern_types = [
-            "NO_PATTERN",
-            "BULLISH_REVERSAL",
-            "BEARISH_REVERSAL",
-            "CONTINUATION",
-            "INDECISION"
-        ]
-        return pattern_types[prediction] if prediction < len(pattern_types) else "UNKNOWN"
+        return PATTERN_LABELS[prediction] if prediction < len(PATTERN_LABELS) else "UNKNOWN"
 
     def detect_patterns(
         self,
-        ohlcv_data: pd.DataFrame,
-        use_ml: bool = True
-    ) -> List[Dict[str, Any]]:
+        ohlcv_data: OHLCVData,
+        use_ml: bool = True,
+        since_index: Optional[int] = None,
+        last_n: Optional[int] = None,
+        deadline: Optional[float] = None
+    ) -> DetectedPatterns:
         """
         Detect patterns using both TA-Lib and transformer model
         
         Args:
-            ohlcv_data: DataFrame with OHLCV data
+            ohlcv_data: OHLCV DataFrame or CandleSeries
             use_ml: Whether to use the transformer model
+            since_index: Only detect patterns ending at or after this candle
+            last_n: Only detect patterns ending in the last last_n candles
+            deadline: time.monotonic() value to return by; TA-Lib patterns are
+                always detected, model windows only as many (most recent
+                first) as recent timings say fit
             
         Returns:
-            List of detected patterns with their properties
+            List of detected patterns with their properties, partial if
+            model windows were skipped; in tail-only mode the work is
+            constant in the length of the history
         """
-        patterns = self._detect_patterns_talib(ohlcv_data)
+        since_index = tail_start(len(ohlcv_data), since_index, last_n) or 0
+        with time_stage('talib'):
+            patterns = DetectedPatterns(self._detect_patterns_talib(ohlcv_data, since_index))
         
-        if use_ml and self.model is not None:
-            ml_patterns = self._detect_patterns_transformer(ohlcv_data)
+        if use_ml and self.inference_backend is not None:
+            with time_stage('transformer'):
+                ml_patterns = self._detect_patterns_transformer(ohlcv_data, since_index, deadline)
             patterns.extend(ml_patterns)
+            patterns.skipped_windows = ml_patterns.skipped_windows
+            
+        # Sort patterns by confidence
+        patterns.sort(key=lambda x: x['confidence'], reverse=True)
+        
+        return patterns
+
+    async def detect_patterns_async(
+        self,
+        ohlcv_data: OHLCVData,
+        batcher,
+        use_ml: bool = True,
+        since_index: Optional[int] = None,
+        last_n: Optional[int] = None,
+        deadline: Optional[float] = None
+    ) -> DetectedPatterns:
+        """
+        Detect patterns, sharing ML forward passes with concurrent callers
+        
+        Same results as detect_patterns, but the model windows are submitted
+        to a MicroBatcher so concurrent requests are inferred together.
+        
+        Args:
+            ohlcv_data: OHLCV DataFrame or CandleSeries
+            batcher: MicroBatcher wrapping this detector's inference backend
+            use_ml: Whether to use the transformer model
+            since_index: Only detect patterns ending at or after this candle
+            last_n: Only detect patterns ending in the last last_n candles
+            deadline: time.monotonic() value to return by, as for detect_patterns
+            
+        Returns:
+            List of detected patterns with their properties, partial if
+            model windows were skipped
+        """
+        since_index = tail_start(len(ohlcv_data), since_index, last_n) or 0
+        with time_stage('talib'):
+            patterns = DetectedPatterns(self._detect_patterns_talib(ohlcv_data, since_index))
+        
+        if use_ml and batcher is not None:
+            with time_stage('transformer'):
+                try:
+                    windows, first, patterns.skipped_windows = self._deadline_windows(
+                        ohlcv_data, since_index, deadline, batcher.max_wait
+                    )
+                    if len(windows):
+                        start = time.perf_counter()
+                        probabilities = await batcher.predict_proba(windows)
+                        self.window_cost.observe(time.perf_counter() - start, len(windows))
+                        patterns.extend(self._patterns_from_probabilities(probabilities, first))
+                except Exception as e:
+                    logger.error(f"Error in transformer pattern detection: {e}")
+                    patterns.skipped_windows = self._window_count(len(ohlcv_data), since_index)
             
         # Sort patterns by confidence
         patterns.sort(key=lambda x: x['confidence'], reverse=True)
@@ -208,7 +611,7 @@ class PatternDetector:
     def analyze_pattern(
         self,
         pattern: Dict[str, Any],
-        ohlcv_data: pd.DataFrame
+        ohlcv_data: OHLCVData
     ) -> Dict[str, Any]:
         """
         Analyze a detected pattern for additional insights
@@ -222,20 +625,76 @@ class PatternDetector:
         """
         start_idx = pattern['start_index']
         end_idx = pattern['end_index']
-        pattern_data = ohlcv_data.iloc[start_idx:end_idx + 1]
+        pattern_data = slice_bars(ohlcv_data, start_idx, end_idx + 1)
+        close = ohlcv_column(pattern_data, 'close')
+        volume = ohlcv_column(pattern_data, 'volume')
         
         analysis = {
-            'price_change': (
-                pattern_data['close'].iloc[-1] - pattern_data['close'].iloc[0]
-            ) / pattern_data['close'].iloc[0],
-            'volume_change': (
-                pattern_data['volume'].iloc[-1] - pattern_data['volume'].iloc[0]
-            ) / pattern_data['volume'].iloc[0],
+            'price_change': (close[-1] - close[0]) / close[0],
+            'volume_change': (volume[-1] - volume[0]) / volume[0],
             'pattern_duration': len(pattern_data),
             'price_range': (
-                pattern_data['high'].max() - pattern_data['low'].min()
-            ) / pattern_data['close'].mean(),
-            'volume_intensity': pattern_data['volume'].mean() / ohlcv_data['volume'].mean()
+                np.nanmax(ohlcv_column(pattern_data, 'high')) - np.nanmin(ohlcv_column(pattern_data, 'low'))
+            ) / np.nanmean(close),
+            'volume_intensity': np.nanmean(volume) / np.nanmean(ohlcv_column(ohlcv_data, 'volume'))
         }
         
-        return {**pattern, 'analysis': analysis} 
\ No newline at end of file
+        return {**pattern, 'analysis': analysis} 
+
+    def analyze_patterns(
+        self,
+        patterns: List[Dict[str, Any]],
+        ohlcv_data: OHLCVData
+    ) -> List[Dict[str, Any]]:
+        """
+        Analyze many detected patterns at once
+
+        Produces the same analysis as analyze_pattern, but precomputes prefix
+        sums and range max/min tables once so each pattern costs O(1)
+        instead of a slice of the full series.
+
+        Args:
+            patterns: Detected patterns
+            ohlcv_data: OHLCV data
+
+        Returns:
+            List of patterns with their analysis attached
+        """
+        if not patterns:
+            return []
+
+        last_idx = len(ohlcv_data) - 1
+        starts = np.array([p['start_index'] for p in patterns], dtype=np.int64)
+        ends = np.minimum(
+            np.array([p['end_index'] for p in patterns], dtype=np.int64),
+            last_idx
+        )
+        if last_idx < 0 or np.any(starts < 0) or np.any(starts > ends):
+            raise ValueError("Pattern indices are outside the OHLCV data")
+
+        stats = _RangeStats(ohlcv_data, max_span=int((ends - starts).max()) + 1)
+
+        start_close = stats.close[starts]
+        start_volume = stats.volume[starts]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            price_change = (stats.close[ends] - start_close) / start_close
+            volume_change = (stats.volume[ends] - start_volume) / start_volume
+            price_range = (
+                stats.range_max_high(starts, ends) - stats.range_min_low(starts, ends)
+            ) / stats.range_mean_close(starts, ends)
+            volume_intensity = stats.range_mean_volume(starts, ends) / stats.volume_mean
+        duration = ends - starts + 1
+
+        return [
+            {
+                **pattern,
+                'analysis': {
+                    'price_change': float(price_change[i]),
+                    'volume_change': float(volume_change[i]),
+                    'pattern_duration': int(duration[i]),
+                    'price_range': float(price_range[i]),
+                    'volume_intensity': float(volume_intensity[i])
+                }
+            }
+            for i, pattern in enumerate(patterns)
+        ]
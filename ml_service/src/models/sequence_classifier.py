@@ -0,0 +1,279 @@
+import numpy as np
+import pandas as pd
+import torch
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+import argparse
+import logging
+from ..config import MODEL_CONFIG
+from ..data.candles import OHLCVData, ohlcv_column
+
+logger = logging.getLogger(__name__)
+
+SEQUENCE_CONFIG = MODEL_CONFIG['sequence']
+
+# Output classes, in the order used by PatternDetector._get_pattern_type
+PATTERN_LABELS = [
+    "NO_PATTERN",
+    "BULLISH_REVERSAL",
+    "BEARISH_REVERSAL",
+    "CONTINUATION",
+    "INDECISION"
+]
+
+N_FEATURES = 5
+
+
+def prepare_features(ohlcv_data: OHLCVData) -> np.ndarray:
+    """
+    Per-candle features: open/high/low/close returns and volume change,
+    clipped to [-1, 1]
+
+    Works column by column on float64 arrays, so neither the frame nor a
+    CandleSeries is copied as a whole.
+
+    Returns:
+        float32 array of shape (n_candles, 5)
+    """
+    features = np.zeros((len(ohlcv_data), N_FEATURES))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i, col in enumerate(['open', 'high', 'low', 'close', 'volume']):
+            values = ohlcv_column(ohlcv_data, col)
+            features[1:, i] = values[1:] / values[:-1] - 1
+    features[np.isnan(features)] = 0
+
+    # Scale features to [-1, 1] range
+    return np.clip(features, -1, 1).astype(np.float32)
+
+
+class CandleCNN(torch.nn.Module):
+    """
+    Compact 1D-CNN over windows of candle features
+
+    Two small convolutions over the time axis, global average pooling and a
+    linear head; a few thousand parameters instead of BERT's 110M.
+    """
+
+    def __init__(
+        self,
+        n_features: int = N_FEATURES,
+        channels: int = SEQUENCE_CONFIG['channels'],
+        kernel_size: int = SEQUENCE_CONFIG['kernel_size'],
+        num_labels: int = len(PATTERN_LABELS)
+    ):
+        super().__init__()
+        self.hparams = {
+            'n_features': n_features,
+            'channels': channels,
+            'kernel_size': kernel_size,
+            'num_labels': num_labels
+        }
+        padding = kernel_size // 2
+        self.conv = torch.nn.Sequential(
+            torch.nn.Conv1d(n_features, channels, kernel_size, padding=padding),
+            torch.nn.ReLU(),
+            torch.nn.Conv1d(channels, channels, kernel_size, padding=padding),
+            torch.nn.ReLU()
+        )
+        self.head = torch.nn.Linear(channels, num_labels)
+
+    def forward(self, features: torch.Tensor) -> torch.Tensor:
+        # (batch, window, features) -> (batch, features, window) for Conv1d
+        hidden = self.conv(features.transpose(1, 2))
+        return self.head(hidden.mean(dim=2))
+
+
+def label_windows(
+    close: np.ndarray,
+    window_size: int = SEQUENCE_CONFIG['window_size'],
+    horizon: int = SEQUENCE_CONFIG['horizon'],
+    move_threshold: float = SEQUENCE_CONFIG['move_threshold'],
+    flat_threshold: float = SEQUENCE_CONFIG['flat_threshold']
+) -> np.ndarray:
+    """
+    Label every window that has `horizon` candles after it
+
+    The trend over the window and the forward return after it decide the
+    class: a move against the trend is a reversal, a move with it is a
+    continuation, a near-zero forward return is indecision.
+
+    Returns:
+        int64 labels (indices into PATTERN_LABELS) for windows starting at
+        0 .. len(close) - window_size - horizon
+    """
+    n_windows = len(close) - window_size - horizon + 1
+    if n_windows <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    starts = np.arange(n_windows)
+    ends = starts + window_size - 1
+    trend = close[ends] / close[starts] - 1
+    forward = close[ends + horizon] / close[ends] - 1
+
+    return np.select(
+        [
+            np.abs(forward) < flat_threshold,
+            (trend <= -move_threshold) & (forward >= move_threshold),
+            (trend >= move_threshold) & (forward <= -move_threshold),
+            (np.abs(trend) >= move_threshold) & (np.abs(forward) >= move_threshold)
+                & (np.sign(trend) == np.sign(forward))
+        ],
+        [
+            PATTERN_LABELS.index("INDECISION"),
+            PATTERN_LABELS.index("BULLISH_REVERSAL"),
+            PATTERN_LABELS.index("BEARISH_REVERSAL"),
+            PATTERN_LABELS.index("CONTINUATION")
+        ],
+        default=PATTERN_LABELS.index("NO_PATTERN")
+    ).astype(np.int64)
+
+
+def build_training_set(
+    ohlcv_frames: List[pd.DataFrame],
+    window_size: int = SEQUENCE_CONFIG['window_size'],
+    horizon: int = SEQUENCE_CONFIG['horizon']
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Build labelled feature windows from one or more OHLCV series
+
+    Returns:
+        Windows of shape (n, window_size, 5) and their labels
+    """
+    all_windows, all_labels = [], []
+    for ohlcv_data in ohlcv_frames:
+        labels = label_windows(ohlcv_data['close'].to_numpy(dtype=np.float64), window_size, horizon)
+        if not len(labels):
+            continue
+        features = prepare_features(ohlcv_data)
+        windows = np.lib.stride_tricks.sliding_window_view(
+            features, window_size, axis=0
+        ).transpose(0, 2, 1)[:len(labels)]
+        all_windows.append(np.ascontiguousarray(windows))
+        all_labels.append(labels)
+
+    if not all_windows:
+        return (
+            np.empty((0, window_size, N_FEATURES), dtype=np.float32),
+            np.empty(0, dtype=np.int64)
+        )
+    return np.concatenate(all_windows), np.concatenate(all_labels)
+
+
+def train_classifier(
+    windows: np.ndarray,
+    labels: np.ndarray,
+    epochs: int = 10,
+    batch_size: int = 256,
+    learning_rate: float = 1e-3,
+    seed: int = 0,
+    model: Optional[CandleCNN] = None
+) -> Tuple[CandleCNN, Dict[str, List[float]]]:
+    """
+    Train a CandleCNN with class-balanced cross-entropy
+
+    Returns:
+        The trained model (in eval mode) and per-epoch loss/accuracy
+    """
+    torch.manual_seed(seed)
+    model = model or CandleCNN(n_features=windows.shape[2])
+    num_labels = model.hparams['num_labels']
+
+    # Inverse-frequency class weights so rare reversals are not ignored
+    counts = np.bincount(labels, minlength=num_labels).astype(np.float64)
+    weights = np.where(counts > 0, counts.sum() / np.maximum(counts, 1) / num_labels, 0.0)
+    loss_fn = torch.nn.CrossEntropyLoss(weight=torch.tensor(weights, dtype=torch.float32))
+    optimizer = torch.optim.Adam(model.parameters(), lr=learning_rate)
+
+    inputs = torch.from_numpy(np.ascontiguousarray(windows, dtype=np.float32))
+    targets = torch.from_numpy(labels.astype(np.int64))
+    generator = torch.Generator().manual_seed(seed)
+    history = {'loss': [], 'accuracy': []}
+
+    model.train()
+    for epoch in range(epochs):
+        order = torch.randperm(len(inputs), generator=generator)
+        total_loss, correct = 0.0, 0
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            logits = model(inputs[batch])
+            loss = loss_fn(logits, targets[batch])
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * len(batch)
+            correct += (logits.argmax(dim=1) == targets[batch]).sum().item()
+        history['loss'].append(total_loss / max(len(order), 1))
+        history['accuracy'].append(correct / max(len(order), 1))
+        logger.info(
+            f"Epoch {epoch + 1}/{epochs}: loss={history['loss'][-1]:.4f} "
+            f"accuracy={history['accuracy'][-1]:.3f}"
+        )
+
+    model.eval()
+    return model, history
+
+
+def save_classifier(
+    model: CandleCNN,
+    path: Path = SEQUENCE_CONFIG['checkpoint'],
+    window_size: int = SEQUENCE_CONFIG['window_size']
+) -> Path:
+    """Save weights together with the hyperparameters needed to rebuild the model"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    torch.save({
+        'hparams': model.hparams,
+        'window_size': window_size,
+        'labels': PATTERN_LABELS,
+        'state_dict': model.state_dict()
+    }, path)
+    return path
+
+
+def load_classifier(path: Path = SEQUENCE_CONFIG['checkpoint']) -> Tuple[CandleCNN, int]:
+    """
+    Load a checkpoint written by save_classifier
+
+    Returns:
+        The model in eval mode and its window size
+    """
+    checkpoint = torch.load(path, map_location='cpu', weights_only=True)
+    if checkpoint['labels'] != PATTERN_LABELS:
+        raise ValueError(f"Checkpoint labels {checkpoint['labels']} do not match {PATTERN_LABELS}")
+    model = CandleCNN(**checkpoint['hparams'])
+    model.load_state_dict(checkpoint['state_dict'])
+    model.eval()
+    return model, checkpoint['window_size']
+
+
+def main(argv: Optional[List[str]] = None):
+    """Train a CandleCNN from OHLCV CSV files and save (and optionally export) it"""
+    from .inference import export_onnx
+
+    parser = argparse.ArgumentParser(description="Train the compact candle pattern classifier")
+    parser.add_argument('csv_files', nargs='+', type=Path,
+                        help="CSV files with open, high, low, close and volume columns")
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--learning-rate', type=float, default=1e-3)
+    parser.add_argument('--output', type=Path, default=SEQUENCE_CONFIG['checkpoint'])
+    parser.add_argument('--onnx', type=Path, help="Also export the trained model to ONNX")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    frames = [pd.read_csv(path) for path in args.csv_files]
+    windows, labels = build_training_set(frames)
+    logger.info(f"Training on {len(windows)} windows, label counts {np.bincount(labels, minlength=len(PATTERN_LABELS))}")
+
+    model, _ = train_classifier(
+        windows, labels, args.epochs, args.batch_size, args.learning_rate
+    )
+    logger.info(f"Saved model to {save_classifier(model, args.output)}")
+
+    if args.onnx:
+        window_shape = (SEQUENCE_CONFIG['window_size'], windows.shape[2])
+        logger.info(f"Exported ONNX model to {export_onnx(model, window_shape, args.onnx)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# exit_reason_id indexes this tuple
+EXIT_REASONS = ('holding_period', 'stop_loss', 'take_profit')
+
+CONFIDENCE_BRACKETS = [(0.6, 0.7), (0.7, 0.8), (0.8, 0.9), (0.9, 1.0)]
+
+_COLUMN_DTYPES = {
+    'pattern_id': np.int32,
+    'type_id': np.int16,
+    'confidence': np.float64,
+    'entry_index': np.int64,
+    'exit_index': np.int64,
+    'entry_price': np.float64,
+    'exit_price': np.float64,
+    'return': np.float64,
+    'exit_reason_id': np.int8
+}
+_TIME_COLUMNS = ('entry_time', 'exit_time')
+
+
+def encode_labels(values: Sequence[str]) -> Tuple[List[str], np.ndarray]:
+    """Dictionary-encode values: (distinct values in first-seen order, int32 codes)"""
+    codes_by_value: Dict[str, int] = {}
+    codes = np.fromiter(
+        (codes_by_value.setdefault(value, len(codes_by_value)) for value in values),
+        dtype=np.int32,
+        count=len(values)
+    )
+    return list(codes_by_value), codes
+
+
+def trade_statistics(returns: np.ndarray, holding_durations: np.ndarray) -> Dict[str, Any]:
+    """Performance statistics of a sequence of trade returns"""
+    if len(returns) == 0:
+        return {}
+
+    winning_trades = int(np.count_nonzero(returns > 0))
+    std_return = np.std(returns)
+    stats = {
+        'total_trades': len(returns),
+        'winning_trades': winning_trades,
+        'losing_trades': int(np.count_nonzero(returns <= 0)),
+        'win_rate': winning_trades / len(returns),
+        'avg_return': np.mean(returns),
+        'std_return': std_return,
+        'max_return': returns.max(),
+        'min_return': returns.min(),
+        'sharpe_ratio': np.mean(returns) / std_return if std_return > 0 else 0,
+        'avg_holding_duration': np.mean(holding_durations)
+    }
+
+    # Calculate drawdown
+    cumulative_returns = np.cumprod(1 + returns)
+    running_max = np.maximum.accumulate(cumulative_returns)
+    drawdowns = (cumulative_returns - running_max) / running_max
+    stats['max_drawdown'] = np.min(drawdowns)
+
+    return stats
+
+
+class TradeLog:
+    """
+    Columnar table of backtest trades
+
+    One array per field, with pattern names and types dictionary-encoded
+    and entry/exit times kept as int64 nanoseconds (or the raw bar labels
+    when the data is not time-indexed). A million trades take tens of
+    megabytes instead of a million dicts, pickle as a handful of buffers
+    and save to a single .npz. Statistics are computed from the columns
+    when asked for, and rows() decodes only the page being read.
+    """
+
+    def __init__(
+        self,
+        columns: Dict[str, np.ndarray],
+        pattern_names: List[str],
+        pattern_types: List[str],
+        time_zone: Optional[str] = None,
+        datetimes: bool = True
+    ):
+        self.columns = {
+            name: np.asarray(columns[name], dtype=dtype) for name, dtype in _COLUMN_DTYPES.items()
+        }
+        for name in _TIME_COLUMNS:
+            self.columns[name] = np.asarray(columns[name])
+        self.pattern_names = list(pattern_names)
+        self.pattern_types = list(pattern_types)
+        self.time_zone = time_zone
+        self.datetimes = datetimes
+
+    @classmethod
+    def empty(cls) -> 'TradeLog':
+        columns = {name: np.empty(0, dtype=dtype) for name, dtype in _COLUMN_DTYPES.items()}
+        columns.update({name: np.empty(0, dtype=np.int64) for name in _TIME_COLUMNS})
+        return cls(columns, [], [])
+
+    @classmethod
+    def from_bars(
+        cls,
+        bar_times,
+        pattern_names: Sequence[str],
+        pattern_types: Sequence[str],
+        **columns: np.ndarray
+    ) -> 'TradeLog':
+        """
+        Build a log from per-trade columns and the bar labels they index
+
+        entry_time and exit_time are taken from bar_times at entry_index
+        and exit_index; pattern names and types are encoded here.
+        """
+        names, pattern_id = encode_labels(pattern_names)
+        types, type_id = encode_labels(pattern_types)
+        time_zone = None
+        datetimes = isinstance(bar_times, pd.DatetimeIndex)
+        if datetimes:
+            time_zone = str(bar_times.tz) if bar_times.tz is not None else None
+            labels = bar_times.asi8
+        else:
+            labels = np.asarray(bar_times)
+        return cls(
+            {
+                **columns,
+                'pattern_id': pattern_id,
+                'type_id': type_id,
+                'entry_time': labels[columns['entry_index']],
+                'exit_time': labels[columns['exit_index']]
+            },
+            names,
+            types,
+            time_zone,
+            datetimes
+        )
+
+    def __len__(self) -> int:
+        return len(self.columns['return'])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(values.nbytes for values in self.columns.values())
+
+    @property
+    def returns(self) -> np.ndarray:
+        return self.columns['return']
+
+    @property
+    def directions(self) -> np.ndarray:
+        """+1 for long (bullish) trades, -1 for short ones"""
+        is_long = np.array([pattern_type == 'bullish' for pattern_type in self.pattern_types], dtype=bool)
+        return np.where(is_long[self.columns['type_id']], 1, -1).astype(np.int8)
+
+    @property
+    def holding_durations(self) -> np.ndarray:
+        return self.columns['exit_index'] - self.columns['entry_index']
+
+    def _times(self, values: np.ndarray):
+        if not self.datetimes:
+            return values.tolist()
+        times = pd.DatetimeIndex(values.astype('datetime64[ns]'))
+        if self.time_zone is not None:
+            times = times.tz_localize('UTC').tz_convert(self.time_zone)
+        return times
+
+    def rows(self, start: int = 0, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Trades start:stop as dicts, in the form _calculate_returns returned them"""
+        part = {name: values[start:stop] for name, values in self.columns.items()}
+        entry_times = self._times(part['entry_time'])
+        exit_times = self._times(part['exit_time'])
+        return [
+            {
+                'pattern_name': self.pattern_names[pattern_id],
+                'pattern_type': self.pattern_types[type_id],
+                'confidence': confidence,
+                'entry_time': entry_time,
+                'exit_time': exit_time,
+                'entry_price': entry_price,
+                'exit_price': exit_price,
+                'return': trade_return,
+                'exit_reason': EXIT_REASONS[exit_reason_id],
+                'holding_duration': exit_index - entry_index
+            }
+            for (
+                pattern_id, type_id, confidence, entry_time, exit_time, entry_price,
+                exit_price, trade_return, exit_reason_id, entry_index, exit_index
+            ) in zip(
+                part['pattern_id'].tolist(),
+                part['type_id'].tolist(),
+                part['confidence'].tolist(),
+                entry_times,
+                exit_times,
+                part['entry_price'].tolist(),
+                part['exit_price'].tolist(),
+                part['return'].tolist(),
+                part['exit_reason_id'].tolist(),
+                part['entry_index'].tolist(),
+                part['exit_index'].tolist()
+            )
+        ]
+
+    def page(self, offset: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """One page of trades as dicts"""
+        return self.rows(offset, offset + limit)
+
+    def statistics(self, mask: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """Statistics of all trades, or of the trades selected by a boolean mask"""
+        if mask is None:
+            return trade_statistics(self.returns, self.holding_durations)
+        return trade_statistics(self.returns[mask], self.holding_durations[mask])
+
+    def pattern_counts(self) -> Dict[str, int]:
+        counts = np.bincount(self.columns['pattern_id'], minlength=len(self.pattern_names))
+        return {name: int(count) for name, count in zip(self.pattern_names, counts) if count}
+
+    def pattern_statistics(self, min_trades: int = 0) -> Dict[str, Dict[str, Any]]:
+        """Statistics per pattern, skipping patterns with fewer than min_trades trades"""
+        pattern_ids = self.columns['pattern_id']
+        return {
+            name: self.statistics(pattern_ids == self.pattern_names.index(name))
+            for name, count in self.pattern_counts().items()
+            if count >= min_trades
+        }
+
+    def confidence_statistics(self) -> Dict[str, Dict[str, Any]]:
+        """Statistics per confidence bracket"""
+        confidence = self.columns['confidence']
+        stats = {}
+        for low, high in CONFIDENCE_BRACKETS:
+            mask = (confidence >= low) & (confidence < high)
+            if mask.any():
+                stats[f"{low:.1f}-{high:.1f}"] = self.statistics(mask)
+        return stats
+
+    def save(self, path: Path):
+        """Write the log to an .npz file"""
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                pattern_names=np.array(self.pattern_names, dtype=str),
+                pattern_types=np.array(self.pattern_types, dtype=str),
+                time_zone=np.array(self.time_zone or '', dtype=str),
+                datetimes=np.array(self.datetimes),
+                **self.columns
+            )
+
+    @classmethod
+    def load(cls, path: Path) -> 'TradeLog':
+        with np.load(path) as stored:
+            return cls(
+                {name: stored[name] for name in (*_COLUMN_DTYPES, *_TIME_COLUMNS)},
+                stored['pattern_names'].tolist(),
+                stored['pattern_types'].tolist(),
+                str(stored['time_zone']) or None,
+                bool(stored['datetimes'])
+            )
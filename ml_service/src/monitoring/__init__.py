@@ -0,0 +1,7 @@
+from .metrics import MetricsRegistry, Counter, Gauge, Histogram, REGISTRY, time_stage
+from .profiling import ProfileStore, RequestProfiler, annotate_request
+
+__all__ = [
+    'MetricsRegistry', 'Counter', 'Gauge', 'Histogram', 'REGISTRY', 'time_stage',
+    'ProfileStore', 'RequestProfiler', 'annotate_request'
+]
@@ -0,0 +1,434 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        )
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class _Metric(ABC):
+    """Base class for a labelled metric family"""
+
+    type_name = ''
+    # Whether an exited process's values still count when processes are merged
+    outlives_process = True
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @property
+    def family_name(self) -> str:
+        """Name the HELP and TYPE lines describe, which the samples must share"""
+        return self.name
+
+    def _state(self) -> Dict[Tuple[str, ...], Any]:
+        """Copy of the current value per label set"""
+        with self._lock:
+            return dict(self._values)
+
+    def _merge(self, states: List[Dict[Tuple[str, ...], Any]]) -> Dict[Tuple[str, ...], Any]:
+        """One state from the states of several processes"""
+        merged: Dict[Tuple[str, ...], Any] = {}
+        for state in states:
+            for key, value in state.items():
+                merged[key] = merged.get(key, 0.0) + value
+        return merged
+
+    def _encode(self, state: Dict[Tuple[str, ...], Any]) -> list:
+        return [[list(key), value] for key, value in state.items()]
+
+    def _decode(self, encoded: list) -> Dict[Tuple[str, ...], Any]:
+        return {tuple(key): value for key, value in encoded}
+
+    @abstractmethod
+    def _samples(self, state: Dict[Tuple[str, ...], Any]) -> List[str]:
+        ...
+
+    def render(self, state: Optional[Dict[Tuple[str, ...], Any]] = None) -> List[str]:
+        return [
+            f"# HELP {self.family_name} {self.documentation}",
+            f"# TYPE {self.family_name} {self.type_name}",
+            *self._samples(self._state() if state is None else state)
+        ]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    type_name = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._label_values(labels), 0.0)
+
+    @property
+    def family_name(self) -> str:
+        return f"{self.name}_total"
+
+    def _samples(self, state: Dict[Tuple[str, ...], float]) -> List[str]:
+        return [
+            f"{self.family_name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in state.items()
+        ]
+
+
+class Gauge(_Metric):
+    """
+    Value that can go up and down, e.g. queue depth
+
+    Across processes the live processes' values are summed (queue depths,
+    requests in flight) or, with multiprocess_mode='max', the largest is
+    reported (values every process computes alike).
+    """
+
+    type_name = 'gauge'
+    outlives_process = False
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        multiprocess_mode: str = 'sum'
+    ):
+        super().__init__(name, documentation, labelnames)
+        if multiprocess_mode not in ('sum', 'max'):
+            raise ValueError(f"Unknown multiprocess_mode: {multiprocess_mode}")
+        self.multiprocess_mode = multiprocess_mode
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._label_values(labels), 0.0)
+
+    def _merge(self, states: List[Dict[Tuple[str, ...], float]]) -> Dict[Tuple[str, ...], float]:
+        if self.multiprocess_mode == 'sum':
+            return super()._merge(states)
+        merged: Dict[Tuple[str, ...], float] = {}
+        for state in states:
+            for key, value in state.items():
+                merged[key] = max(merged.get(key, value), value)
+        return merged
+
+    def _samples(self, state: Dict[Tuple[str, ...], float]) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in state.items()
+        ]
+
+
+class Histogram(_Metric):
+    """
+    Bucketed distribution of observed values
+
+    Observations only bisect a fixed bucket list and bump two counters under
+    a lock, so it is cheap enough to leave on for every request.
+    """
+
+    type_name = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._label_values(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        return sum(self._counts.get(self._label_values(labels), ()))
+
+    def sum(self, **labels) -> float:
+        return self._sums.get(self._label_values(labels), 0.0)
+
+    def _state(self) -> Dict[Tuple[str, ...], Tuple[List[int], float]]:
+        with self._lock:
+            return {key: (list(counts), self._sums[key]) for key, counts in self._counts.items()}
+
+    def _merge(
+        self,
+        states: List[Dict[Tuple[str, ...], Tuple[List[int], float]]]
+    ) -> Dict[Tuple[str, ...], Tuple[List[int], float]]:
+        merged: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+        for state in states:
+            for key, (counts, total) in state.items():
+                if key in merged:
+                    merged_counts, merged_total = merged[key]
+                    counts = [a + b for a, b in zip(merged_counts, counts)]
+                    total += merged_total
+                merged[key] = (counts, total)
+        return merged
+
+    def _encode(self, state: Dict[Tuple[str, ...], Tuple[List[int], float]]) -> list:
+        return [[list(key), counts, total] for key, (counts, total) in state.items()]
+
+    def _decode(self, encoded: list) -> Dict[Tuple[str, ...], Tuple[List[int], float]]:
+        return {tuple(key): (counts, total) for key, counts, total in encoded}
+
+    def _samples(self, state: Dict[Tuple[str, ...], Tuple[List[int], float]]) -> List[str]:
+        lines = []
+        for key, (counts, total) in state.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(
+                    self.labelnames, key, f'le="{_format_value(bound)}"'
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Collection of metrics rendered in the Prometheus text format
+
+    Processes serving the same API (pre-fork workers) aggregate through
+    share(): each writes its values to a shared directory and render()
+    merges them, so a scrape answered by any worker reports all of them.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self.directory: Optional[Path] = None
+        self._stop_sharing = threading.Event()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        multiprocess_mode: str = 'sum'
+    ) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, multiprocess_mode))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def share(self, directory: Path, interval_s: float = 1.0):
+        """
+        Aggregate with the other processes sharing directory
+
+        This process publishes its values to directory/<pid>.json every
+        interval_s (and on publish()), and render() merges the latest file of
+        every other process with its own live values. Counters and
+        histograms of processes that have exited keep counting towards the
+        totals; their gauges are dropped.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._stop_sharing.clear()
+        threading.Thread(
+            target=self._publish_every, args=(interval_s,), name='metrics-publisher', daemon=True
+        ).start()
+
+    def unshare(self):
+        """Stop publishing; render() reports this process only again"""
+        self._stop_sharing.set()
+        self.directory = None
+
+    def _publish_every(self, interval_s: float):
+        while not self._stop_sharing.wait(interval_s):
+            try:
+                self.publish()
+            except OSError as e:
+                logger.error(f"Error publishing metrics: {e}")
+
+    def publish(self):
+        """Write this process's values for the other processes to merge"""
+        directory = self.directory
+        if directory is None:
+            return
+        with self._lock:
+            metrics = list(self._metrics.values())
+        snapshot = {metric.name: metric._encode(metric._state()) for metric in metrics}
+        path = directory / f"{os.getpid()}.json"
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(snapshot))
+        os.replace(tmp_path, path)
+
+    def _other_processes(self) -> List[Tuple[Dict[str, list], bool]]:
+        """Latest snapshot of every other sharing process, and whether it is alive"""
+        snapshots = []
+        for path in self.directory.glob('*.json'):
+            pid = int(path.stem)
+            if pid == os.getpid():
+                continue
+            try:
+                snapshots.append((json.loads(path.read_text()), _process_alive(pid)))
+            except (OSError, ValueError) as e:
+                logger.error(f"Error reading metrics of process {pid}: {e}")
+        return snapshots
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        others = self._other_processes() if self.directory is not None else []
+        lines = []
+        for metric in metrics:
+            state = metric._state()
+            if others:
+                state = metric._merge([state] + [
+                    metric._decode(snapshot[metric.name])
+                    for snapshot, alive in others
+                    if metric.name in snapshot and (alive or metric.outlives_process)
+                ])
+            lines.extend(metric.render(state))
+        return "\n".join(lines) + "\n"
+
+
+# Default registry and the service's metrics
+REGISTRY = MetricsRegistry()
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    'http_request_duration_seconds',
+    'HTTP request latency',
+    ('method', 'path', 'status')
+)
+REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    'http_requests_in_flight',
+    'Requests currently being processed (queue depth)'
+)
+STAGE_DURATION = REGISTRY.histogram(
+    'stage_duration_seconds',
+    'Time spent in each processing stage',
+    ('stage',)
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    'cache_requests',
+    'Cache lookups by cache and result (hit or miss)',
+    ('cache', 'result')
+)
+UPSTREAM_FETCH_LATENCY = REGISTRY.histogram(
+    'upstream_fetch_duration_seconds',
+    'Latency of market data fetches from upstream sources',
+    ('source',),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+
+@contextmanager
+def time_stage(stage: str) -> Iterator[None]:
+    """Record the duration of a processing stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - start, stage=stage)
@@ -0,0 +1,332 @@
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+import asyncio
+import cProfile
+import functools
+import io
+import json
+import marshal
+import os
+import pstats
+import random
+import re
+import threading
+import uuid
+from ..config import PROFILING_SETTINGS
+
+_current_params: ContextVar[Optional[Dict[str, Any]]] = ContextVar(
+    'profiled_request_params', default=None
+)
+
+
+# Capture of the request running alone under profiling, if any
+_exclusive_capture: Optional[Dict[str, Any]] = None
+
+
+def annotate_request(**params):
+    """
+    Attach parameters to the profile of the current request, if one is
+    being captured (no-op otherwise)
+    """
+    current = _current_params.get()
+    if current is not None:
+        current.update(params)
+
+
+class ProfileStore:
+    """
+    Bounded store keeping the most recent request profiles
+
+    Profiles are held in memory, or with a directory on disk (the summary
+    as JSON beside the stats in the .prof format), so every pre-fork worker
+    serves the profiles captured by all of them.
+    """
+
+    def __init__(
+        self,
+        max_profiles: int = PROFILING_SETTINGS['max_profiles'],
+        directory: Optional[Path] = None
+    ):
+        self.max_profiles = max_profiles
+        self.directory = Path(directory) if directory is not None else None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self._profiles: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile: Dict[str, Any]) -> str:
+        if self.directory is not None:
+            self._write(profile)
+            return profile['id']
+        with self._lock:
+            self._profiles[profile['id']] = profile
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+        return profile['id']
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        if self.directory is not None:
+            return self._read(profile_id)
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Profile summaries, newest first"""
+        if self.directory is not None:
+            summaries = []
+            for path in self._summary_paths():
+                try:
+                    summaries.append(json.loads(path.read_text()))
+                except (OSError, ValueError):
+                    pass  # Trimmed by another worker meanwhile
+            return summaries
+        with self._lock:
+            profiles = list(self._profiles.values())
+        return [
+            {key: value for key, value in profile.items() if key != 'stats'}
+            for profile in reversed(profiles)
+        ]
+
+    def clear(self):
+        if self.directory is not None:
+            for path in self._summary_paths():
+                self._remove(path.stem)
+        with self._lock:
+            self._profiles.clear()
+
+    def _summary_paths(self) -> List[Path]:
+        """Summary files, newest first"""
+        stamped = []
+        for path in self.directory.glob('*.json'):
+            try:
+                stamped.append((path.stat().st_mtime_ns, path.name, path))
+            except FileNotFoundError:
+                pass
+        return [path for _, _, path in sorted(stamped, reverse=True)]
+
+    def _write(self, profile: Dict[str, Any]):
+        summary = {key: value for key, value in profile.items() if key != 'stats'}
+        # Stats first: a summary is only listed once its stats are complete
+        _write_atomic(self.directory / f"{profile['id']}.prof", marshal.dumps(profile['stats']))
+        _write_atomic(self.directory / f"{profile['id']}.json", json.dumps(summary, default=str).encode())
+        for path in self._summary_paths()[self.max_profiles:]:
+            self._remove(path.stem)
+
+    def _read(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        if not re.fullmatch(r'[\w-]+', profile_id):
+            return None
+        try:
+            summary = json.loads((self.directory / f"{profile_id}.json").read_text())
+            stats = marshal.loads((self.directory / f"{profile_id}.prof").read_bytes())
+        except (OSError, ValueError, EOFError):
+            return None
+        return {**summary, 'stats': stats}
+
+    def _remove(self, profile_id: str):
+        for suffix in ('.json', '.prof'):
+            try:
+                (self.directory / f"{profile_id}{suffix}").unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def profiled(fn: Callable) -> Callable:
+    """
+    fn wrapped for an executor thread serving requests
+
+    cProfile only sees the thread it was enabled on, so while a request runs
+    alone under profiling (see RequestProfiler.start_exclusive) the call is
+    profiled on its own thread and added to that request's profile.
+    """
+    @functools.wraps(fn)
+    def call(*args, **kwargs):
+        capture = _exclusive_capture
+        if capture is None:
+            return fn(*args, **kwargs)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+            capture['thread_profilers'].append(profiler)
+    return call
+
+
+class RequestProfiler:
+    """
+    Decides which requests to profile and captures their cProfile stats
+
+    A request is profiled when it carries the profiling header or is picked
+    by the global sample rate. Sampled profiles are only kept if the request
+    exceeded the latency threshold; header-requested profiles are always
+    kept. cProfile can only run once per process at a time, so a request
+    arriving while another is being profiled is not profiled.
+
+    cProfile records everything on the event loop thread, so the API
+    profiles a request exclusively (start_exclusive): it waits for the
+    requests in flight to finish and holds new ones in admitted() until it
+    is done. Executor work wrapped with profiled() (micro-batched inference,
+    on-demand precompute detection) is added to its profile. Background
+    tasks (precompute rounds, backtest job threads, the result writer) are
+    not held, so their steps on the event loop may still appear, and their
+    thread work does not.
+    """
+
+    def __init__(
+        self,
+        store: Optional[ProfileStore] = None,
+        sample_rate: float = PROFILING_SETTINGS['sample_rate'],
+        latency_threshold_ms: float = PROFILING_SETTINGS['latency_threshold_ms'],
+        header: str = PROFILING_SETTINGS['header'],
+        drain_timeout_ms: float = PROFILING_SETTINGS['drain_timeout_ms']
+    ):
+        self.store = store or ProfileStore()
+        self.sample_rate = sample_rate
+        self.latency_threshold_ms = latency_threshold_ms
+        self.header = header.lower()
+        self.drain_timeout_ms = drain_timeout_ms
+        self._active = threading.Lock()
+        # Exclusive profiling on the event loop
+        self._in_flight = 0
+        self._exclusive = False
+        self._drained: Optional[asyncio.Event] = None
+        self._resumed: Optional[asyncio.Event] = None
+
+    def should_profile(self, headers) -> Optional[str]:
+        """Return why a request should be profiled, or None"""
+        if headers.get(self.header, '').lower() in ('1', 'true', 'yes'):
+            return 'header'
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return 'sampled'
+        return None
+
+    def start(self, reason: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Start profiling; returns a capture handle or None if busy"""
+        if not self._active.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        request_params = dict(params)
+        token = _current_params.set(request_params)
+        try:
+            profiler.enable()
+        except Exception:
+            # Another profiler (e.g. a debugger) already owns the hook
+            _current_params.reset(token)
+            self._active.release()
+            return None
+        return {
+            'reason': reason,
+            'profiler': profiler,
+            'thread_profilers': [],
+            'params': request_params,
+            'token': token,
+            'started_at': datetime.now(timezone.utc)
+        }
+
+    async def start_exclusive(self, reason: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        start() once the other requests in flight have finished, running alone until finish()
+
+        Returns None (the request is not profiled) when another request is
+        being profiled or the others take longer than drain_timeout_ms.
+        """
+        global _exclusive_capture
+        if self._exclusive:
+            return None
+        self._exclusive = True
+        self._drained = asyncio.Event()
+        self._resumed = asyncio.Event()
+        capture = None
+        try:
+            if self._in_flight:
+                await asyncio.wait_for(self._drained.wait(), self.drain_timeout_ms / 1000)
+            capture = self.start(reason, params)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            if capture is None:
+                self._end_exclusive()
+        if capture is not None:
+            capture['exclusive'] = True
+            _exclusive_capture = capture
+        return capture
+
+    def _end_exclusive(self):
+        global _exclusive_capture
+        _exclusive_capture = None
+        self._exclusive = False
+        self._resumed.set()
+
+    @asynccontextmanager
+    async def admitted(self) -> AsyncIterator[None]:
+        """Hold a request while a profiled request runs alone, and count it as in flight"""
+        while self._exclusive:
+            await self._resumed.wait()
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            if self._exclusive and not self._in_flight:
+                self._drained.set()
+
+    def finish(self, capture: Dict[str, Any], elapsed_ms: float, status: int) -> Optional[str]:
+        """Stop profiling and keep the profile if it qualifies"""
+        profiler = capture['profiler']
+        try:
+            profiler.disable()
+        finally:
+            _current_params.reset(capture['token'])
+            self._active.release()
+            if capture.get('exclusive'):
+                self._end_exclusive()
+
+        if capture['reason'] == 'sampled' and elapsed_ms < self.latency_threshold_ms:
+            return None
+
+        stats = pstats.Stats(profiler)
+        for thread_profiler in capture['thread_profilers']:
+            stats.add(thread_profiler)
+        return self.store.add({
+            'id': uuid.uuid4().hex,
+            'reason': capture['reason'],
+            'started_at': capture['started_at'].isoformat(),
+            'elapsed_ms': elapsed_ms,
+            'status': status,
+            'params': capture['params'],
+            'stats': stats.stats
+        })
+
+
+def profile_to_text(profile: Dict[str, Any], sort_by: str = 'cumulative', limit: int = 50) -> str:
+    """Render stored profile stats as a pstats table"""
+    stream = io.StringIO()
+    stats = pstats.Stats(_StatsHolder(profile['stats']), stream=stream)
+    stats.sort_stats(sort_by).print_stats(limit)
+    return stream.getvalue()
+
+
+def profile_to_pstats(profile: Dict[str, Any]) -> bytes:
+    """Serialize stored profile stats in the binary .prof format read by pstats/snakeviz"""
+    return marshal.dumps(profile['stats'])
+
+
+class _StatsHolder:
+    """Adapter letting pstats.Stats load already collected stats"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
@@ -0,0 +1,4 @@
+from .stores import InMemoryResultStore, MongoResultStore, ResultStore
+from .writer import ResultWriter
+
+__all__ = ['InMemoryResultStore', 'MongoResultStore', 'ResultStore', 'ResultWriter']
\ No newline at end of file
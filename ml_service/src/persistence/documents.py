@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from ..data.candles import OHLCVData
+from ..data.pattern_index import timestamps_ms
+
+PATTERNS_COLLECTION = 'patterns'
+BACKTESTS_COLLECTION = 'backtests'
+
+# A pattern is stored once per (stream, pattern, end bar, method) however often it is detected
+PATTERN_KEY_FIELDS = ('symbol', 'timeframe', 'patternName', 'endTime', 'detectionMethod')
+
+# PatternBacktester exit reasons as the Backtest model's exit types
+EXIT_TYPES = {'stop_loss': 'sl', 'take_profit': 'tp', 'holding_period': 'market'}
+
+
+def _time(milliseconds: int) -> datetime:
+    return pd.Timestamp(int(milliseconds), unit='ms').to_pydatetime()
+
+
+def _plain(value):
+    """numpy and pandas scalars as BSON-encodable Python values"""
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _pattern_type(pattern_type: str) -> str:
+    # Sequence model labels such as 'bullish_reversal' map onto the schema's enum
+    for direction in ('bullish', 'bearish'):
+        if direction in pattern_type:
+            return direction
+    return 'neutral'
+
+
+def pattern_documents(
+    symbol: str,
+    timeframe: str,
+    patterns: List[Dict[str, Any]],
+    ohlcv_data: OHLCVData,
+    created_at: Optional[datetime] = None
+) -> List[Dict[str, Any]]:
+    """Detected patterns as documents of the backend's Pattern model"""
+    times = timestamps_ms(ohlcv_data)
+    created_at = created_at or datetime.utcnow()
+    return [
+        {
+            'symbol': symbol,
+            'timeframe': timeframe,
+            'patternName': pattern['pattern_name'],
+            'patternType': _pattern_type(pattern['pattern_type']),
+            'confidence': float(pattern['confidence']),
+            'startIndex': int(pattern['start_index']),
+            'endIndex': int(pattern['end_index']),
+            'startTime': _time(times[pattern['start_index']]),
+            'endTime': _time(times[pattern['end_index']]),
+            'detectionMethod': pattern.get('detection_method', 'talib'),
+            'status': 'active',
+            'createdAt': created_at
+        }
+        for pattern in patterns
+    ]
+
+
+def backtest_document(
+    symbol: str,
+    timeframe: str,
+    results: Dict[str, Any],
+    ohlcv_data: OHLCVData,
+    name: Optional[str] = None,
+    created_at: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """PatternBacktester results as a document of the backend's Backtest model"""
+    times = timestamps_ms(ohlcv_data)
+    created_at = created_at or datetime.utcnow()
+    stats = results.get('overall_stats', {})
+    return {
+        'name': name or f"{symbol} {timeframe} pattern backtest",
+        'configuration': {
+            'symbol': symbol,
+            'timeframe': timeframe,
+            'startDate': _time(times[0]) if len(times) else None,
+            'endDate': _time(times[-1]) if len(times) else None
+        },
+        'results': {
+            'summary': {
+                'totalTrades': _plain(stats.get('total_trades', 0)),
+                'winningTrades': _plain(stats.get('winning_trades', 0)),
+                'losingTrades': _plain(stats.get('losing_trades', 0)),
+                'winRate': _plain(stats.get('win_rate')),
+                'maxDrawdown': _plain(stats.get('max_drawdown')),
+                'sharpeRatio': _plain(stats.get('sharpe_ratio'))
+            },
+            'trades': [
+                {
+                    'pattern': {
+                        'name': trade['pattern_name'],
+                        'type': trade['pattern_type'],
+                        'confidence': _plain(trade['confidence'])
+                    },
+                    'entry': {'price': _plain(trade['entry_price']), 'time': _plain(trade['entry_time'])},
+                    'exit': {
+                        'price': _plain(trade['exit_price']),
+                        'time': _plain(trade['exit_time']),
+                        'type': EXIT_TYPES.get(trade.get('exit_reason'), 'market')
+                    },
+                    'pnlPercentage': _plain(trade['return']) * 100
+                }
+                for trade in results.get('trade_results', [])
+            ],
+            'patternPerformance': [
+                {
+                    'name': pattern_name,
+                    'trades': _plain(pattern_stats['total_trades']),
+                    'winRate': _plain(pattern_stats['win_rate']),
+                    'averageReturn': _plain(pattern_stats['avg_return'])
+                }
+                for pattern_name, pattern_stats in results.get('pattern_stats', {}).items()
+            ]
+        },
+        'status': 'completed',
+        'createdAt': created_at,
+        'completedAt': created_at
+    }
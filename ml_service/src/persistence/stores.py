@@ -0,0 +1,96 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Sequence, Tuple
+import logging
+from ..config import MONGODB_URL, MONGODB_DB_NAME
+
+logger = logging.getLogger(__name__)
+
+# Fields kept from the first write when a document is upserted again
+INSERT_ONLY_FIELDS = ('createdAt',)
+
+# MongoDB duplicate key error code
+DUPLICATE_KEY = 11000
+
+
+class ResultStore(ABC):
+    """
+    Where ResultWriter sends its batches
+
+    Both methods take a whole batch, keep its order, and must be safe to
+    call again with the same batch after a failure.
+    """
+
+    @abstractmethod
+    def insert_many(self, collection: str, documents: List[Dict[str, Any]]):
+        ...
+
+    @abstractmethod
+    def upsert_many(self, collection: str, documents: List[Dict[str, Any]], key_fields: Sequence[str]):
+        ...
+
+
+class InMemoryResultStore(ResultStore):
+    """Documents held in per-collection lists, for tests and local runs"""
+
+    def __init__(self):
+        self.collections: Dict[str, List[Dict[str, Any]]] = {}
+        self.writes: List[Tuple[str, str, int]] = []  # (operation, collection, documents)
+        self._keys: Dict[str, Dict[tuple, int]] = {}
+
+    def insert_many(self, collection: str, documents: List[Dict[str, Any]]):
+        self.collections.setdefault(collection, []).extend(dict(document) for document in documents)
+        self.writes.append(('insert', collection, len(documents)))
+
+    def upsert_many(self, collection: str, documents: List[Dict[str, Any]], key_fields: Sequence[str]):
+        stored = self.collections.setdefault(collection, [])
+        positions = self._keys.setdefault(collection, {})
+        for document in documents:
+            key = tuple(document[field] for field in key_fields)
+            if key in positions:
+                existing = stored[positions[key]]
+                existing.update({k: v for k, v in document.items() if k not in INSERT_ONLY_FIELDS})
+            else:
+                positions[key] = len(stored)
+                stored.append(dict(document))
+        self.writes.append(('upsert', collection, len(documents)))
+
+
+class MongoResultStore(ResultStore):
+    """Collections read by the backend's Pattern and Backtest models"""
+
+    def __init__(self, url: str = MONGODB_URL, database: str = MONGODB_DB_NAME):
+        from pymongo import MongoClient
+
+        self.database = MongoClient(url)[database]
+
+    def insert_many(self, collection: str, documents: List[Dict[str, Any]]):
+        from pymongo.errors import BulkWriteError
+
+        # insert_many assigns every _id up front, so when a batch is retried
+        # the documents that already made it fail as duplicates and are skipped
+        while documents:
+            try:
+                self.database[collection].insert_many(documents, ordered=True)
+                return
+            except BulkWriteError as e:
+                errors = e.details.get('writeErrors', [])
+                if not errors or errors[0].get('code') != DUPLICATE_KEY:
+                    raise
+                documents = documents[errors[0]['index'] + 1:]
+
+    def upsert_many(self, collection: str, documents: List[Dict[str, Any]], key_fields: Sequence[str]):
+        from pymongo import UpdateOne
+
+        requests = [
+            UpdateOne(
+                {field: document[field] for field in key_fields},
+                {
+                    '$set': {k: v for k, v in document.items() if k not in INSERT_ONLY_FIELDS},
+                    '$setOnInsert': {k: document[k] for k in INSERT_ONLY_FIELDS if k in document}
+                },
+                upsert=True
+            )
+            for document in documents
+        ]
+        if requests:
+            self.database[collection].bulk_write(requests, ordered=True)
@@ -0,0 +1,221 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import logging
+import time
+from ..config import RESULT_SINK_SETTINGS
+from ..data.candles import OHLCVData
+from ..monitoring.metrics import REGISTRY
+from .documents import (
+    BACKTESTS_COLLECTION, PATTERNS_COLLECTION, PATTERN_KEY_FIELDS,
+    backtest_document, pattern_documents
+)
+from .stores import ResultStore
+
+logger = logging.getLogger(__name__)
+
+RESULT_DOCUMENTS_WRITTEN = REGISTRY.counter(
+    'result_documents_written',
+    'Documents persisted by the result writer',
+    ['collection']
+)
+RESULT_DOCUMENTS_DROPPED = REGISTRY.counter(
+    'result_documents_dropped',
+    'Documents given up on after all write retries failed',
+    ['collection']
+)
+RESULT_WRITE_RETRIES = REGISTRY.counter(
+    'result_write_retries',
+    'Bulk writes retried after an error',
+    ['collection']
+)
+RESULT_BULK_SIZE = REGISTRY.histogram(
+    'result_bulk_write_documents',
+    'Documents per bulk write',
+    buckets=(1, 10, 50, 100, 250, 500, 1000, 5000)
+)
+RESULT_BUFFERED = REGISTRY.gauge(
+    'result_writer_buffered_documents',
+    'Documents waiting to be written'
+)
+
+# (collection, upsert key fields or None for plain inserts, document)
+_Write = Tuple[str, Optional[Tuple[str, ...]], Dict[str, Any]]
+
+
+class ResultWriter:
+    """
+    Write-behind sink for detected patterns and backtest results
+
+    Callers enqueue documents and return immediately. A background task
+    gathers them into batches of up to batch_size, or whatever arrived
+    within flush_interval_ms of the first, and writes each run of same-kind
+    documents with one ordered bulk call on a dedicated thread. Failed
+    batches are retried with exponential backoff, then dropped and counted.
+    Once max_buffered documents are queued, callers wait for room, so a
+    slow database throttles producers instead of growing memory.
+    """
+
+    def __init__(
+        self,
+        store: ResultStore,
+        batch_size: int = RESULT_SINK_SETTINGS['batch_size'],
+        max_buffered: int = RESULT_SINK_SETTINGS['max_buffered'],
+        flush_interval_ms: float = RESULT_SINK_SETTINGS['flush_interval_ms'],
+        max_retries: int = RESULT_SINK_SETTINGS['max_retries'],
+        retry_backoff_ms: float = RESULT_SINK_SETTINGS['retry_backoff_ms']
+    ):
+        self.store = store
+        self.batch_size = batch_size
+        self.max_buffered = max_buffered
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff_ms / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # One writer thread: batches reach the database in the order they were queued
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='result-writer')
+
+    def start(self):
+        """Start the writing task on the running event loop"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_buffered)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def flush(self):
+        """Wait until everything queued so far has been written or dropped"""
+        if self._queue is not None:
+            self.start()
+            await self._queue.join()
+
+    async def stop(self):
+        """Write out the queued documents, then stop"""
+        await self.flush()
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def _put(self, writes: List[_Write]):
+        self.start()
+        for write in writes:
+            await self._queue.put(write)
+            RESULT_BUFFERED.inc()
+
+    async def insert(self, collection: str, documents: Sequence[Dict[str, Any]]):
+        """Queue documents to be inserted"""
+        await self._put([(collection, None, document) for document in documents])
+
+    async def upsert(self, collection: str, documents: Sequence[Dict[str, Any]], key_fields: Sequence[str]):
+        """Queue documents to be inserted or updated by key_fields"""
+        key_fields = tuple(key_fields)
+        await self._put([(collection, key_fields, document) for document in documents])
+
+    async def write_patterns(
+        self,
+        symbol: str,
+        timeframe: str,
+        patterns: List[Dict[str, Any]],
+        ohlcv_data: OHLCVData,
+        created_at: Optional[datetime] = None
+    ):
+        """
+        Queue detected patterns as Pattern documents
+
+        Upserted by stream, pattern, end time and detection method, so
+        re-scanning overlapping candles does not duplicate patterns.
+        """
+        await self.upsert(
+            PATTERNS_COLLECTION,
+            pattern_documents(symbol, timeframe, patterns, ohlcv_data, created_at),
+            PATTERN_KEY_FIELDS
+        )
+
+    async def write_backtest(
+        self,
+        symbol: str,
+        timeframe: str,
+        results: Dict[str, Any],
+        ohlcv_data: OHLCVData,
+        name: Optional[str] = None
+    ):
+        """Queue PatternBacktester results, trades included, as a Backtest document"""
+        await self.insert(
+            BACKTESTS_COLLECTION,
+            [backtest_document(symbol, timeframe, results, ohlcv_data, name)]
+        )
+
+    async def _collect(self) -> List[_Write]:
+        """Wait for one document, then gather more until full or timed out"""
+        pending = [await self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+
+        while len(pending) < self.batch_size:
+            if not self._queue.empty():
+                item = self._queue.get_nowait()
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            pending.append(item)
+
+        return pending
+
+    @staticmethod
+    def _runs(pending: List[_Write]) -> List[Tuple[str, Optional[Tuple[str, ...]], List[Dict[str, Any]]]]:
+        """Split a batch into consecutive runs bound for the same operation"""
+        runs = []
+        for collection, key_fields, document in pending:
+            if runs and runs[-1][0] == collection and runs[-1][1] == key_fields:
+                runs[-1][2].append(document)
+            else:
+                runs.append((collection, key_fields, [document]))
+        return runs
+
+    def _write(self, collection: str, key_fields: Optional[Tuple[str, ...]], documents: List[Dict[str, Any]]):
+        if key_fields is None:
+            self.store.insert_many(collection, documents)
+        else:
+            self.store.upsert_many(collection, documents, key_fields)
+
+    async def _write_with_retry(
+        self,
+        collection: str,
+        key_fields: Optional[Tuple[str, ...]],
+        documents: List[Dict[str, Any]]
+    ):
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries + 1):
+            try:
+                await loop.run_in_executor(self._executor, self._write, collection, key_fields, documents)
+                RESULT_BULK_SIZE.observe(len(documents))
+                RESULT_DOCUMENTS_WRITTEN.inc(len(documents), collection=collection)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Dropping {len(documents)} {collection} documents after {attempt + 1} attempts: {e}")
+                    RESULT_DOCUMENTS_DROPPED.inc(len(documents), collection=collection)
+                    return
+                logger.warning(f"Error writing {len(documents)} {collection} documents, retrying: {e}")
+                RESULT_WRITE_RETRIES.inc(collection=collection)
+                await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+
+    async def _run(self):
+        while True:
+            pending = await self._collect()
+            try:
+                for collection, key_fields, documents in self._runs(pending):
+                    await self._write_with_retry(collection, key_fields, documents)
+            finally:
+                RESULT_BUFFERED.dec(len(pending))
+                for _ in pending:
+                    self._queue.task_done()
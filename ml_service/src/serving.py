@@ -0,0 +1,247 @@
+import gc
+import os
+import shutil
+import signal
+import socket
+import argparse
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+import torch
+import uvicorn
+from .config import SERVING_SETTINGS
+from .monitoring.metrics import REGISTRY
+from .monitoring.profiling import ProfileStore
+
+logger = logging.getLogger(__name__)
+
+
+def available_cores() -> List[int]:
+    """CPU cores this process may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def plan_worker_cores(
+    workers: int = SERVING_SETTINGS['workers'],
+    threads_per_worker: int = SERVING_SETTINGS['threads_per_worker'],
+    cores: Optional[List[int]] = None
+) -> List[List[int]]:
+    """
+    Assign cores to workers
+
+    Each worker gets threads_per_worker consecutive cores, wrapping around
+    when there are more threads than cores.
+
+    Args:
+        workers: Number of worker processes (0 = as many as the cores allow)
+        threads_per_worker: Torch intra-op threads per worker
+        cores: Cores to spread workers over (default: available cores)
+
+    Returns:
+        Core list for each worker
+    """
+    cores = cores or available_cores()
+    threads_per_worker = max(1, threads_per_worker)
+    workers = workers or max(1, len(cores) // threads_per_worker)
+
+    return [
+        [cores[(worker * threads_per_worker + thread) % len(cores)] for thread in range(threads_per_worker)]
+        for worker in range(workers)
+    ]
+
+
+def configure_worker(cores: Optional[List[int]], threads: int):
+    """Pin a forked worker to its cores and size its inference thread pools"""
+    from . import main
+
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Can only be set before the first inter-op parallel work
+        pass
+
+    if main.detector is not None and main.detector.inference_backend is not None:
+        main.detector.inference_backend.after_fork(threads)
+
+
+def preload():
+    """
+    Load the pattern model in the master process before forking
+
+    Workers inherit the model copy-on-write. Torch is kept single-threaded
+    here so no intra-op thread pool exists at fork time, and gc.freeze moves
+    everything loaded so far out of the collector's reach so collections in
+    the workers do not write to (and so copy) the shared pages.
+    """
+    from . import main
+
+    torch.set_num_threads(1)
+    main.load_transformer_model()
+    gc.collect()
+    gc.freeze()
+
+
+def share_state(state_directory: Path = SERVING_SETTINGS['state_directory']) -> Path:
+    """
+    Make the per-process state the API reports cover every worker
+
+    Run in the master before forking. Request profiles are kept on disk so
+    any worker serves them, and returns the (emptied) directory the workers
+    publish their metrics to for /metrics to merge. Precompute popularity,
+    backtest jobs and forward returns are shared through Redis or their own
+    files already; micro-batches still form within each worker.
+    """
+    from . import main
+
+    metrics_directory = Path(state_directory) / 'metrics'
+    shutil.rmtree(metrics_directory, ignore_errors=True)
+    metrics_directory.mkdir(parents=True)
+    main.profiler.store = ProfileStore(main.profiler.store.max_profiles, Path(state_directory) / 'profiles')
+    return metrics_directory
+
+
+def restart_delay(
+    quick_failures: int,
+    backoff_s: float = SERVING_SETTINGS['restart_backoff_s'],
+    max_backoff_s: float = SERVING_SETTINGS['max_restart_backoff_s']
+) -> float:
+    """Seconds to wait before restarting a worker that failed quickly quick_failures times in a row"""
+    if quick_failures <= 0:
+        return 0.0
+    return min(max_backoff_s, backoff_s * 2 ** (quick_failures - 1))
+
+
+def _listen(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock: socket.socket, cores: List[int], threads: int, pin_cores: bool, metrics_directory: Path):
+    from . import main
+
+    # The master's handlers must not run in workers; uvicorn installs its own
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    configure_worker(cores if pin_cores else None, threads)
+    REGISTRY.share(metrics_directory, SERVING_SETTINGS['metrics_interval_s'])
+
+    server = uvicorn.Server(uvicorn.Config(main.app, log_level='info'))
+    server.run(sockets=[sock])
+    # Counts of the last interval still reach the merged totals
+    REGISTRY.publish()
+
+
+def _spawn(sock: socket.socket, cores: List[int], threads: int, pin_cores: bool, metrics_directory: Path) -> int:
+    pid = os.fork()
+    if pid == 0:
+        exit_code = 0
+        try:
+            _run_worker(sock, cores, threads, pin_cores, metrics_directory)
+        except BaseException as e:
+            logger.error(f"Worker {os.getpid()} failed: {e}")
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+    logger.info(f"Started worker {pid} on cores {cores}")
+    return pid
+
+
+def serve(
+    host: str = SERVING_SETTINGS['host'],
+    port: int = SERVING_SETTINGS['port'],
+    workers: int = SERVING_SETTINGS['workers'],
+    threads_per_worker: int = SERVING_SETTINGS['threads_per_worker'],
+    pin_cores: bool = SERVING_SETTINGS['pin_cores'],
+    state_directory: Path = SERVING_SETTINGS['state_directory']
+):
+    """
+    Serve the API from pre-forked workers sharing one loaded model
+
+    The master binds the listening socket and loads the model once, then
+    forks the workers, which accept from the shared socket. /metrics and
+    the profile endpoints report every worker (see share_state). Workers
+    that exit unexpectedly are replaced, after a delay that doubles with
+    each consecutive quick failure so a worker crashing at startup does not
+    spin the master; SIGTERM or SIGINT shuts all of them down.
+    """
+    sock = _listen(host, port)
+    metrics_directory = share_state(state_directory)
+    preload()
+
+    plan = plan_worker_cores(workers, threads_per_worker)
+    children: Dict[int, int] = {}  # pid -> slot in plan
+    started: Dict[int, float] = {}
+    quick_failures = [0] * len(plan)
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    def spawn(slot: int):
+        pid = _spawn(sock, plan[slot], threads_per_worker, pin_cores, metrics_directory)
+        children[pid] = slot
+        started[pid] = time.monotonic()
+
+    for slot in range(len(plan)):
+        spawn(slot)
+    logger.info(f"Serving on {host}:{port} with {len(children)} workers")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        slot = children.pop(pid, None)
+        if slot is None or stopping:
+            continue
+        lifetime = time.monotonic() - started.pop(pid)
+        quick_failures[slot] = quick_failures[slot] + 1 if lifetime < SERVING_SETTINGS['quick_exit_s'] else 0
+        delay = restart_delay(quick_failures[slot])
+        logger.warning(
+            f"Worker {pid} exited with status {status} after {lifetime:.1f}s, restarting in {delay:.1f}s"
+        )
+        resume_at = time.monotonic() + delay
+        while not stopping and time.monotonic() < resume_at:
+            time.sleep(max(0.0, min(0.1, resume_at - time.monotonic())))
+        if not stopping:
+            spawn(slot)
+
+    sock.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Serve the API from pre-forked, core-pinned workers")
+    parser.add_argument('--host', default=SERVING_SETTINGS['host'])
+    parser.add_argument('--port', type=int, default=SERVING_SETTINGS['port'])
+    parser.add_argument('--workers', type=int, default=SERVING_SETTINGS['workers'],
+                        help="Worker processes (0 = one per available core)")
+    parser.add_argument('--threads-per-worker', type=int, default=SERVING_SETTINGS['threads_per_worker'])
+    parser.add_argument('--no-pin', dest='pin_cores', action='store_false',
+                        default=SERVING_SETTINGS['pin_cores'], help="Do not pin workers to cores")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    serve(args.host, args.port, args.workers, args.threads_per_worker, args.pin_cores)
+
+
+if __name__ == "__main__":
+    main()
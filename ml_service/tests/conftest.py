@@ -0,0 +1,27 @@
+import fakeredis
+import pytest
+
+class CountingRedis(fakeredis.FakeRedis):
+    """In-memory Redis counting the client's round trips (a pipeline counts once)"""
+
+    round_trips = 0
+
+    def execute_command(self, *args, **options):
+        self.round_trips += 1
+        return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        pipeline = super().pipeline(transaction, shard_hint)
+        execute = pipeline.execute
+
+        def counted_execute(raise_on_error=True):
+            self.round_trips += 1
+            return execute(raise_on_error)
+
+        pipeline.execute = counted_execute
+        return pipeline
+
+@pytest.fixture
+def fake_redis():
+    """A Redis client over a fresh in-memory server"""
+    return CountingRedis(server=fakeredis.FakeServer())
@@ -0,0 +1,274 @@
+import asyncio
+import pytest
+import pandas as pd
+import numpy as np
+import talib
+from src.alerts import AlertEngine, AlertMonitor, AlertSource, InMemoryAlertSource
+from src.alerts.engine import ALERTS_EVALUATED
+from src.config import ALERT_SETTINGS
+from src.models import PatternDetector
+
+HISTORY_BARS = 64
+
+@pytest.fixture
+def sample_data():
+    """Create sample OHLCV data for testing"""
+    rng = np.random.default_rng(11)
+    dates = pd.date_range(start='2023-01-01', periods=300, freq='1h')
+    close = 100 + np.cumsum(rng.normal(0, 1, 300))
+    data = pd.DataFrame({
+        'timestamp': dates,
+        'open': close + rng.normal(0, 0.5, 300),
+        'high': close + np.abs(rng.normal(0, 1, 300)),
+        'low': close - np.abs(rng.normal(0, 1, 300)),
+        'close': close,
+        'volume': rng.lognormal(13, 0.5, 300)
+    })
+
+    # Ensure high is highest and low is lowest
+    data['high'] = data[['open', 'high', 'close']].max(axis=1)
+    data['low'] = data[['open', 'low', 'close']].min(axis=1)
+
+    return data
+
+@pytest.fixture(scope='module')
+def pattern_detector():
+    """Create a PatternDetector instance"""
+    return PatternDetector()
+
+def _alert(alert_id, alert_type, conditions, symbol='BTCUSDT', timeframe='1h', frequency='always', **fields):
+    return {
+        '_id': alert_id,
+        'symbol': symbol,
+        'timeframe': timeframe,
+        'alertType': alert_type,
+        'conditions': conditions,
+        'notification': {'message': f'alert {alert_id}', 'frequency': frequency},
+        'status': 'active',
+        **fields
+    }
+
+def _sample_alerts(sample_data):
+    closes = sample_data['close']
+    levels = np.linspace(closes.min(), closes.max(), 6)
+    alerts = []
+    for i, level in enumerate(levels):
+        alerts.append(_alert(f'above-{i}', 'price', {'price': {'above': float(level)}}))
+        alerts.append(_alert(f'below-{i}', 'price', {'price': {'below': float(level)}}))
+        alerts.append(_alert(f'cross-{i}', 'price', {'price': {'crossover': float(level)}}))
+    alerts += [
+        _alert('change', 'price', {'price': {'percentageChange': 1.0}}),
+        _alert('band', 'price', {'price': {'above': float(levels[2]), 'below': float(levels[4])}}),
+        _alert('rsi-high', 'indicator', {'indicators': {'rsi': {'above': 60}}}),
+        _alert('rsi-low', 'indicator', {'indicators': {'rsi': {'below': 40}}}),
+        _alert('macd-up', 'indicator', {'indicators': {'macd': {'crossover': True}}}),
+        _alert('macd-down', 'indicator', {'indicators': {'macd': {'crossunder': True}}}),
+        _alert('ma-cross', 'indicator', {'indicators': {'movingAverages': {'crossover': {'fast': 5, 'slow': 20}}}}),
+        _alert('volume', 'volume', {'volume': {'threshold': float(sample_data['volume'].quantile(0.8))}}),
+        _alert('volume-surge', 'volume', {'volume': {'percentageIncrease': 50}}),
+        _alert('any-pattern', 'pattern', {'patterns': [{'minConfidence': 0.5}]}),
+        _alert('engulfing', 'pattern', {'patterns': [
+            {'name': 'ENGULFING', 'type': 'bullish', 'minConfidence': 0.6},
+            {'name': 'hammer'}
+        ]}),
+        _alert('doji', 'pattern', {'patterns': [{'name': 'DOJI', 'type': 'neutral'}]}),
+        _alert('other-stream', 'price', {'price': {'above': 0.0}}, timeframe='4h')
+    ]
+    return alerts
+
+def _cross(difference):
+    if len(difference) < 2 or np.isnan(difference[-2:]).any():
+        return 0
+    return 1 if difference[-2] <= 0 < difference[-1] else -1 if difference[-2] >= 0 > difference[-1] else 0
+
+def _reference_triggers(alert, history, window, detector):
+    """Check one alert against a candle by recomputing everything from scratch"""
+    close = history['close'].values
+    volume = history['volume'].values
+    conditions = alert['conditions']
+    if alert['timeframe'] != '1h':
+        return False
+
+    if alert['alertType'] == 'price':
+        price = conditions['price']
+        previous = close[-2] if len(close) > 1 else None
+        checks = []
+        if 'above' in price:
+            checks.append(close[-1] > price['above'])
+        if 'below' in price:
+            checks.append(close[-1] < price['below'])
+        if 'crossover' in price:
+            checks.append(previous is not None and min(previous, close[-1]) < price['crossover'] <= max(previous, close[-1]))
+        if 'percentageChange' in price:
+            checks.append(previous is not None and abs(close[-1] / previous - 1) * 100 >= price['percentageChange'])
+        return all(checks)
+
+    if alert['alertType'] == 'indicator':
+        indicators = conditions['indicators']
+        if 'rsi' in indicators:
+            rsi = talib.RSI(close, ALERT_SETTINGS['rsi_period'])[-1]
+            if 'above' in indicators['rsi']:
+                return bool(rsi > indicators['rsi']['above'])
+            return bool(rsi < indicators['rsi']['below'])
+        if 'macd' in indicators:
+            macd, signal, _ = talib.MACD(close, 12, 26, 9)
+            return _cross(macd - signal) == (1 if indicators['macd'].get('crossover') else -1)
+        crossover = indicators['movingAverages']['crossover']
+        return _cross(talib.SMA(close, crossover['fast']) - talib.SMA(close, crossover['slow'])) == 1
+
+    if alert['alertType'] == 'volume':
+        if 'threshold' in conditions['volume']:
+            return volume[-1] >= conditions['volume']['threshold']
+        average = talib.SMA(volume, 20)
+        return len(volume) > 20 and (volume[-1] / average[-2] - 1) * 100 >= conditions['volume']['percentageIncrease']
+
+    # Patterns are detected over the engine's bounded candle history
+    signals = detector.detect_pattern_signals(window[['open', 'high', 'low', 'close', 'volume']])
+    for entry in conditions['patterns']:
+        for name, signal in signals.items():
+            if entry.get('name') and entry['name'].upper() != name:
+                continue
+            value = signal[-1]
+            pattern_type = 'neutral' if name in ('DOJI', 'SPINNING_TOP') else 'bullish' if value > 0 else 'bearish'
+            if value != 0 and abs(value) / 100 >= entry.get('minConfidence', 0.6) \
+                    and entry.get('type') in (None, pattern_type):
+                return True
+    return False
+
+def test_engine_matches_brute_force(sample_data, pattern_detector):
+    """Test indexed evaluation fires exactly the alerts a full re-check would"""
+    alerts = _sample_alerts(sample_data)
+    engine = AlertEngine(pattern_detector, history_bars=HISTORY_BARS)
+    for alert in alerts:
+        assert engine.add_alert(alert)
+
+    fired_types = set()
+    for i, candle in enumerate(sample_data.to_dict(orient='records')):
+        triggers = engine.on_candle('BTCUSDT', '1h', candle)
+        history = sample_data.iloc[:i + 1]
+        window = sample_data.iloc[max(0, i + 1 - HISTORY_BARS):i + 1]
+        expected = sorted(a['_id'] for a in alerts if _reference_triggers(a, history, window, pattern_detector))
+
+        assert sorted(t['alert_id'] for t in triggers) == expected, f"candle {i}"
+        fired_types.update(t['alert_id'].split('-')[0] for t in triggers)
+
+    # The data exercises every kind of condition
+    assert {'above', 'below', 'cross', 'change', 'rsi', 'macd', 'ma', 'volume', 'any'} <= fired_types
+
+def test_only_matching_alerts_are_checked(sample_data):
+    """Test evaluation cost follows the matching alerts, not the total"""
+    engine = AlertEngine(history_bars=HISTORY_BARS)
+    for i in range(5000):
+        engine.add_alert(_alert(f'far-{i}', 'price', {'price': {'above': 1e6 + i}}))
+        engine.add_alert(_alert(f'idle-{i}', 'price', {'price': {'above': 0.0}}, symbol=f'SYM{i}'))
+    engine.add_alert(_alert('near', 'price', {'price': {'above': 0.0}}))
+
+    before = ALERTS_EVALUATED.get()
+    for candle in sample_data.iloc[:10].to_dict(orient='records'):
+        triggers = engine.on_candle('BTCUSDT', '1h', candle)
+        assert [t['alert_id'] for t in triggers] == ['near']
+
+    assert ALERTS_EVALUATED.get() - before == 10
+
+def test_frequency_expiry_and_source(sample_data):
+    """Test once-alerts retire after firing and expired alerts never fire"""
+    start = sample_data['timestamp'].iloc[0]
+    source = InMemoryAlertSource([
+        _alert('once', 'price', {'price': {'above': 0.0}}, frequency='once'),
+        _alert('always', 'price', {'price': {'above': 0.0}}),
+        _alert('expired', 'price', {'price': {'above': 0.0}}, expiresAt=start - pd.Timedelta(hours=1)),
+        _alert('disabled', 'price', {'price': {'above': 0.0}}, status='disabled')
+    ])
+    engine = AlertEngine(source=source)
+    assert engine.load_alerts() == 3
+
+    candles = sample_data.iloc[:3].to_dict(orient='records')
+    assert sorted(t['alert_id'] for t in engine.on_candle('BTCUSDT', '1h', candles[0])) == ['always', 'once']
+    assert [t['alert_id'] for t in engine.on_candle('BTCUSDT', '1h', candles[1])] == ['always']
+    # A replayed candle is ignored
+    assert engine.on_candle('BTCUSDT', '1h', candles[1]) == []
+
+    assert source.alerts['once']['status'] == 'triggered'
+    assert source.alerts['always']['triggerCount'] == 2
+    assert sorted(t['alert_id'] for t in source.triggers) == ['always', 'always', 'once']
+    assert [a['_id'] for a in engine.alerts_for('BTCUSDT', '1h')] == ['always']
+    assert len(engine) == 1
+
+def test_remove_alert(sample_data):
+    """Test removed alerts stop firing"""
+    engine = AlertEngine()
+    engine.add_alert(_alert('a', 'price', {'price': {'above': 0.0}}))
+    engine.add_alert(_alert('b', 'volume', {'volume': {'threshold': 0.0}}))
+    engine.remove_alert('a')
+
+    triggers = engine.on_candle('BTCUSDT', '1h', sample_data.iloc[0].to_dict())
+
+    assert [t['alert_id'] for t in triggers] == ['b']
+    assert triggers[0]['message'] == 'alert b'
+    assert not engine.add_alert(_alert('empty', 'price', {}))
+
+class _StandInFetcher:
+    """Serves the closed candles of a frame within the requested window"""
+
+    def __init__(self, data):
+        self.data = data
+        self.calls = []
+
+    async def fetch_many(self, pairs, start_time=None, end_time=None, source='binance'):
+        pairs = list(pairs)
+        self.calls.append(pairs)
+        window = self.data[(self.data['timestamp'] >= start_time) & (self.data['timestamp'] <= end_time)]
+        return {pair: window.reset_index(drop=True) for pair in pairs}
+
+def test_monitor_feeds_closed_candles(sample_data, tmp_path):
+    """Test the monitor warms up on history, then evaluates each newly closed candle once"""
+    source = InMemoryAlertSource([
+        _alert('always', 'price', {'price': {'above': 0.0}}),
+        _alert('rsi', 'indicator', {'indicators': {'rsi': {'above': 0.0}}}),
+        _alert('eth', 'price', {'price': {'above': 0.0}}, symbol='ETHUSDT')
+    ])
+    clock = type('Clock', (), {'now': 0.0, '__call__': lambda self: self.now})()
+    fetcher = _StandInFetcher(sample_data)
+    monitor = AlertMonitor(
+        AlertEngine(source=source, history_bars=HISTORY_BARS),
+        fetcher=fetcher,
+        lock_path=tmp_path / 'alerts.lock',
+        settle_delay_s=2,
+        reload_interval_s=3600,
+        clock=clock
+    )
+    standby = AlertMonitor(AlertEngine(source=source), fetcher=fetcher, lock_path=tmp_path / 'alerts.lock', clock=clock)
+    # Ten seconds after the close of candle 100
+    clock.now = sample_data['timestamp'].iloc[101].timestamp() + 10
+
+    async def run():
+        first = await monitor.poll()
+        assert await monitor.poll() == []  # Nothing closed since
+        assert await standby.poll() == []  # The lock is held
+        clock.now += 3600
+        source.alerts['eth']['status'] = 'disabled'
+        monitor._next_reload = 0
+        second = await monitor.poll()
+        await monitor.stop()
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    # History only warms the indicators (RSI has a value), just the newest candle fires
+    assert sorted((t['alert_id'], t['close']) for t in first) == [
+        ('always', sample_data['close'].iloc[100]),
+        ('eth', sample_data['close'].iloc[100]),
+        ('rsi', sample_data['close'].iloc[100])
+    ]
+    # Alerts no longer active at the source are dropped on reload
+    assert sorted((t['alert_id'], t['close']) for t in second) == [
+        ('always', sample_data['close'].iloc[101]),
+        ('rsi', sample_data['close'].iloc[101])
+    ]
+    assert len(fetcher.calls) == 2
+    assert len(standby.engine) == 0
+
+def test_alert_source_is_abstract():
+    """Test sources must implement both methods"""
+    with pytest.raises(TypeError):
+        AlertSource()
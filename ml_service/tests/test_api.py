@@ -0,0 +1,120 @@
+import json
+import pytest
+import pandas as pd
+import numpy as np
+import talib
+from fastapi.testclient import TestClient
+from src.main import app, TALIB_PATTERNS
+
+@pytest.fixture
+def client():
+    """Create a test client for the API"""
+    return TestClient(app)
+
+@pytest.fixture
+def sample_data():
+    """Create sample OHLCV data for testing"""
+    rng = np.random.default_rng(3)
+    dates = pd.date_range(start='2023-01-01', periods=300, freq='1h')
+    close = 100 + np.cumsum(rng.normal(0, 1, 300))
+    data = pd.DataFrame({
+        'timestamp': dates,
+        'open': close + rng.normal(0, 0.5, 300),
+        'high': close + np.abs(rng.normal(0, 1, 300)),
+        'low': close - np.abs(rng.normal(0, 1, 300)),
+        'close': close,
+        'volume': rng.normal(1000000, 200000, 300)
+    })
+    data['high'] = data[['open', 'high', 'close']].max(axis=1)
+    data['low'] = data[['open', 'low', 'close']].min(axis=1)
+    return data
+
+@pytest.fixture
+def payload(sample_data):
+    """Create a /detect/ request body"""
+    records = sample_data.assign(timestamp=sample_data['timestamp'].astype(str))
+    return {'data': records.to_dict(orient='records'), 'timeframe': '1h'}
+
+def _expected_patterns(sample_data):
+    expected = []
+    for pattern_name, pattern_func in TALIB_PATTERNS.items():
+        result = pattern_func(
+            sample_data['open'].values, sample_data['high'].values,
+            sample_data['low'].values, sample_data['close'].values
+        )
+        for i, value in enumerate(result):
+            if value != 0:
+                expected.append({
+                    'pattern_name': pattern_name,
+                    'confidence': abs(value) / 100.0,
+                    'start_index': max(0, i - 2),
+                    'end_index': i,
+                    'pattern_type': 'bullish' if value > 0 else 'bearish'
+                })
+    return expected
+
+def test_detect_json(client, payload, sample_data):
+    """Test the default JSON response"""
+    response = client.post('/detect/', json=payload)
+
+    assert response.status_code == 200
+    patterns = response.json()
+    assert patterns == _expected_patterns(sample_data)
+    assert len(patterns) > 0
+
+def test_detect_ndjson(client, payload, sample_data):
+    """Test the streamed NDJSON response matches the JSON response"""
+    response = client.post('/detect/?format=ndjson', json=payload)
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('application/x-ndjson')
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines == _expected_patterns(sample_data)
+
+def test_detect_columnar(client, payload, sample_data):
+    """Test the columnar response decodes to the same patterns"""
+    response = client.post('/detect/?format=columnar', json=payload)
+
+    assert response.status_code == 200
+    columns = response.json()
+    lengths = {len(columns[key]) for key in (
+        'pattern_id', 'start_index', 'end_index', 'confidence', 'direction'
+    )}
+    assert len(lengths) == 1
+
+    decoded = [
+        {
+            'pattern_name': columns['pattern_names'][pattern_id],
+            'confidence': confidence,
+            'start_index': start,
+            'end_index': end,
+            'pattern_type': 'bullish' if direction > 0 else 'bearish'
+        }
+        for pattern_id, start, end, confidence, direction in zip(
+            columns['pattern_id'], columns['start_index'], columns['end_index'],
+            columns['confidence'], columns['direction']
+        )
+    ]
+    assert decoded == _expected_patterns(sample_data)
+
+def test_detect_pattern_filter(client, payload):
+    """Test restricting detection to selected patterns"""
+    payload['patterns_to_detect'] = ['DOJI']
+    response = client.post('/detect/?format=columnar', json=payload)
+
+    assert response.json()['pattern_names'] == ['DOJI']
+
+def test_detect_invalid_format(client, payload):
+    """Test that unknown formats are rejected"""
+    response = client.post('/detect/?format=xml', json=payload)
+    assert response.status_code == 422
+
+def test_detect_tail_only(client, payload, sample_data):
+    """Test since_index/last_n return the full run's patterns ending in the tail"""
+    expected = [p for p in _expected_patterns(sample_data) if p['end_index'] >= 280]
+
+    recent = client.post('/detect/', json={**payload, 'last_n': 20}).json()
+    assert recent == expected and len(recent) > 0
+    assert client.post('/detect/', json={**payload, 'since_index': 280, 'last_n': 290}).json() == expected
+    assert client.post('/detect/', json={**payload, 'since_index': 300}).json() == []
+    assert client.post('/detect/', json={**payload, 'last_n': -1}).status_code == 422
@@ -0,0 +1,194 @@
+import asyncio
+import threading
+import time
+import pytest
+import numpy as np
+from aiohttp import web
+from src.data import Backfiller, CandleStore
+from src.data.backfill import BACKFILL_RETRIES, RateLimiter, closed_end_ms, main, parse_klines, plan_pages
+
+HOUR_MS = 3600 * 1000
+START = 1_600_000_000_000 // HOUR_MS * HOUR_MS
+END = START + 2000 * HOUR_MS
+LISTED_AT = {'BTCUSDT': 0, 'ETHUSDT': START + 700 * HOUR_MS}  # ETHUSDT lists part way through
+
+def close_at(open_ms):
+    return 100 + (open_ms // HOUR_MS) % 100 / 10
+
+class _KlineServer:
+    """Local stand-in for the Binance /api/v3/klines endpoint"""
+
+    def __init__(self):
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.throttle = 0  # Requests answered 429 before serving again
+        self.broken = set()  # Symbols answered 500
+
+    async def klines(self, request):
+        query = request.query
+        symbol = query['symbol']
+        self.requests.append((symbol, query['interval'], int(query['startTime'])))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.005)
+            if self.throttle > 0:
+                self.throttle -= 1
+                return web.json_response({'code': -1003}, status=429, headers={'Retry-After': '0.01'})
+            if symbol in self.broken:
+                return web.json_response({'code': -1000}, status=500)
+            if symbol not in LISTED_AT:
+                return web.json_response({'code': -1121, 'msg': 'Invalid symbol.'}, status=400)
+
+            first = max(int(query['startTime']), LISTED_AT[symbol])
+            first = -(-first // HOUR_MS) * HOUR_MS
+            times = np.arange(first, int(query['endTime']) + 1, HOUR_MS)[:int(query['limit'])]
+            return web.json_response([
+                [int(t), str(close_at(t) - 0.05), str(close_at(t) + 0.1), str(close_at(t) - 0.15),
+                 str(close_at(t)), '12.5', int(t) + HOUR_MS - 1, '0', 7, '0', '0', '0']
+                for t in times
+            ])
+        finally:
+            self.in_flight -= 1
+
+@pytest.fixture
+def server():
+    """Serve the stand-in from its own thread so tests may run their own event loops"""
+    state = _KlineServer()
+    app = web.Application()
+    app.router.add_get('/api/v3/klines', state.klines)
+    runner = web.AppRunner(app)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, '127.0.0.1', 0).start())
+    state.base_url = 'http://127.0.0.1:%d' % runner.addresses[0][1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield state
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+def make_backfiller(server, directory, **overrides):
+    settings = dict(
+        base_url=server.base_url, page_size=300, concurrency=4,
+        requests_per_second=0, flush_bars=1000, max_retries=3, retry_backoff_s=0.01
+    )
+    settings.update(overrides)
+    return Backfiller(directory, **settings)
+
+def assert_complete(candles, symbol):
+    expected = np.arange(max(START, LISTED_AT[symbol]), END, HOUR_MS)
+    np.testing.assert_array_equal(candles.timestamps, expected)
+    np.testing.assert_allclose(candles.close, close_at(expected))
+
+def test_pages_and_rate_limit():
+    """Test pages follow the fixed grid within the range and requests are spaced out"""
+    pages = plan_pages('BTCUSDT', '1h', START + 1, END, 300)
+    assert pages[0].start_ms == START + HOUR_MS
+    assert pages[-1].end_ms == END - HOUR_MS
+    assert all(page.start_ms % (300 * HOUR_MS) == 0 for page in pages[1:])
+    assert all(b.start_ms - a.end_ms == HOUR_MS for a, b in zip(pages, pages[1:]))
+    assert plan_pages('BTCUSDT', '1h', START, START, 300) == []
+
+    # Overlapping ranges share their interior pages
+    wider = plan_pages('BTCUSDT', '1h', START - 1000 * HOUR_MS, END + 1000 * HOUR_MS, 300)
+    assert {page.key for page in pages[1:-1]} <= {page.key for page in wider}
+
+    async def run():
+        limiter = RateLimiter(200)
+        started = time.monotonic()
+        for _ in range(21):
+            await limiter.wait()
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 0.09
+
+def test_backfill_downloads_every_page(server, tmp_path):
+    """Test pages are fetched concurrently, throttling is retried and streams are stored whole"""
+    server.throttle = 3
+    retries = BACKFILL_RETRIES.get()
+    backfiller = make_backfiller(server, tmp_path)
+    streams = [('BTCUSDT', '1h'), ('ETHUSDT', '1h')]
+    summary = asyncio.run(backfiller.run(streams, START, END))
+
+    pages = sum(len(plan_pages(*stream, START, END, 300)) for stream in streams)
+    assert summary == {'pages': pages, 'skipped': 0, 'fetched': pages, 'failed': 0, 'candles': 2000 + 1300}
+    assert len(server.requests) == pages + 3
+    assert BACKFILL_RETRIES.get() - retries == 3
+    assert 1 < server.max_in_flight <= 4
+
+    store = CandleStore(tmp_path)
+    for symbol, timeframe in streams:
+        assert len(store.parts(symbol, timeframe)) == 1  # Compacted once complete
+        assert_complete(store.load(symbol, timeframe), symbol)
+
+def test_interrupted_backfill_resumes(server, tmp_path):
+    """Test failed and cancelled runs keep their completed pages and later runs fetch only the rest"""
+    server.broken.add('ETHUSDT')
+    streams = [('BTCUSDT', '1h'), ('ETHUSDT', '1h')]
+    summary = asyncio.run(make_backfiller(server, tmp_path, max_retries=1).run(streams, START, END))
+    eth_pages = len(plan_pages('ETHUSDT', '1h', START, END, 300))
+    assert summary['failed'] == eth_pages
+    assert_complete(CandleStore(tmp_path).load('BTCUSDT', '1h'), 'BTCUSDT')
+
+    # Cancel a run part way through, as Ctrl-C would
+    server.broken.clear()
+    server.requests.clear()
+
+    async def interrupted():
+        run = asyncio.create_task(make_backfiller(server, tmp_path, concurrency=1).run(streams, START, END))
+        while len(server.requests) < 3:
+            await asyncio.sleep(0.001)
+        run.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run
+
+    asyncio.run(interrupted())
+    recorded = len(make_backfiller(server, tmp_path).checkpoint.completed())
+    assert 0 < len(server.requests) < eth_pages
+
+    server.requests.clear()
+    summary = asyncio.run(make_backfiller(server, tmp_path).run(streams, START, END))
+    assert summary['skipped'] == recorded
+    assert len(server.requests) == summary['fetched'] == summary['pages'] - recorded
+    assert all(symbol == 'ETHUSDT' for symbol, _, _ in server.requests)
+    assert_complete(CandleStore(tmp_path).load('ETHUSDT', '1h'), 'ETHUSDT')
+
+def test_forming_candle_is_never_stored(server, tmp_path):
+    """Test ranges stop before the open candle and overlapping parts resolve to the newest"""
+    now = START + 10 * HOUR_MS + 1
+    assert closed_end_ms('1h', END, now) == START + 10 * HOUR_MS
+    assert closed_end_ms('1h', START + HOUR_MS, now) == START + HOUR_MS
+
+    now_ms = int(time.time() * 1000)
+    asyncio.run(make_backfiller(server, tmp_path).run([('BTCUSDT', '1h')], now_ms - 5 * HOUR_MS, now_ms + 5 * HOUR_MS))
+    stored = CandleStore(tmp_path).load('BTCUSDT', '1h')
+    assert stored.timestamps[-1] == now_ms // HOUR_MS * HOUR_MS - HOUR_MS
+
+    # A partial candle stored by an earlier page is replaced by the later part's close
+    store = CandleStore(tmp_path / 'overlap')
+    row = lambda t, close: [t, '1', '1', '1', str(close), '1']
+    store.write('BTCUSDT', '1h', parse_klines([row(START, 1.0), row(START + HOUR_MS, 2.0)]))
+    store.write('BTCUSDT', '1h', parse_klines([row(START + HOUR_MS, 3.0), row(START + 2 * HOUR_MS, 4.0)]))
+    np.testing.assert_allclose(store.load('BTCUSDT', '1h').close, [1.0, 3.0, 4.0])
+    store.compact('BTCUSDT', '1h')
+    np.testing.assert_allclose(store.load('BTCUSDT', '1h').close, [1.0, 3.0, 4.0])
+
+def test_cli(server, tmp_path):
+    """Test the command line entry point and its exit status"""
+    argv = [
+        '--symbols', 'btcusdt', '--timeframes', '1h', '--start', '2020-09-13 12:00',
+        '--end', '2020-10-13', '--directory', str(tmp_path), '--base-url', server.base_url,
+        '--requests-per-second', '0'
+    ]
+    assert main(argv) == 0
+    fetched = len(server.requests)
+    assert main(argv) == 0
+    assert len(server.requests) == fetched  # Everything was already complete
+
+    candles = CandleStore(tmp_path).load('BTCUSDT', '1h')
+    assert len(candles) == 29 * 24 + 12
+    assert main(argv[:1] + ['UNLISTED'] + argv[2:]) == 1
@@ -0,0 +1,240 @@
+import asyncio
+import threading
+import time
+import pytest
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+import src.main as main
+from src.data import CandleSeries
+from src.jobs import BacktestCheckpoint, BacktestJobManager
+from src.models import PatternBacktester, PatternDetector
+from src.persistence import InMemoryResultStore, ResultWriter
+
+@pytest.fixture(scope='module')
+def detector():
+    return PatternDetector()
+
+@pytest.fixture
+def sample_data():
+    """Create sample OHLCV data for testing"""
+    rng = np.random.default_rng(5)
+    dates = pd.date_range(start='2023-01-01', periods=1500, freq='1h')
+    close = 100 + np.cumsum(rng.normal(0, 1, 1500))
+    data = pd.DataFrame({
+        'timestamp': dates,
+        'open': close + rng.normal(0, 0.5, 1500),
+        'high': close + np.abs(rng.normal(0, 1, 1500)),
+        'low': close - np.abs(rng.normal(0, 1, 1500)),
+        'close': close,
+        'volume': rng.lognormal(13, 0.5, 1500)
+    })
+
+    # Ensure high is highest and low is lowest
+    data['high'] = data[['open', 'high', 'close']].max(axis=1)
+    data['low'] = data[['open', 'low', 'close']].min(axis=1)
+
+    return data
+
+class _GatedDetector:
+    """Detector that waits for a release before detecting"""
+
+    def __init__(self, detector):
+        self.detector = detector
+        self.release = threading.Event()
+
+    def detect_patterns(self, data, use_ml=False):
+        self.release.wait(5)
+        return self.detector.detect_patterns(data, use_ml=use_ml)
+
+def _reference(detector, candles):
+    occurrences = sorted(detector.detect_patterns(candles, use_ml=False), key=lambda p: p['end_index'])
+    return occurrences, PatternBacktester().backtest_pattern(candles, occurrences)
+
+def test_job_matches_backtest(detector, sample_data, tmp_path):
+    """Test a job's trades and statistics match a direct backtest"""
+    candles = CandleSeries.from_dataframe(sample_data)
+    occurrences, expected = _reference(detector, candles)
+    manager = BacktestJobManager(detector, directory=tmp_path, chunk_size=7)
+
+    job_id = manager.submit(sample_data, symbol='BTCUSDT', timeframe='1h')
+    status = manager.wait(job_id, timeout=30)
+    manager.shutdown()
+
+    assert status['status'] == 'completed'
+    assert status['symbol'] == 'BTCUSDT'
+    assert status['progress'] == {
+        'occurrences_processed': len(occurrences),
+        'occurrences_total': len(occurrences),
+        'bars_processed': len(sample_data),
+        'trades': len(expected['trade_results'])
+    }
+    assert status['stats']['overall_stats']['total_trades'] == len(expected['trade_results']) > 0
+    assert status['stats']['overall_stats']['avg_return'] == pytest.approx(expected['overall_stats']['avg_return'])
+    assert isinstance(status['stats']['overall_stats']['avg_return'], float)
+
+    # Paging covers the trades in order
+    pages = []
+    offset = 0
+    while True:
+        page = manager.trades(job_id, offset=offset, limit=10)
+        assert page['total'] == len(expected['trade_results'])
+        if not page['trades']:
+            break
+        pages.extend(page['trades'])
+        offset += len(page['trades'])
+    assert pages == expected['trade_results']
+
+    # A restarted manager serves finished jobs from their checkpoints
+    restarted = BacktestJobManager(detector, directory=tmp_path)
+    assert restarted.resume() == []
+    assert restarted.status(job_id)['stats'] == status['stats']
+    assert restarted.trades(job_id, offset=5, limit=3)['trades'] == expected['trade_results'][5:8]
+    with pytest.raises(KeyError):
+        restarted.status('missing')
+
+def test_completed_job_reaches_result_store(detector, sample_data, tmp_path):
+    """Test a completed job with a symbol is persisted as a Backtest document"""
+    store = InMemoryResultStore()
+
+    async def run():
+        writer = ResultWriter(store, flush_interval_ms=1)
+        manager = BacktestJobManager(
+            detector, directory=tmp_path, result_writer=writer, loop=asyncio.get_running_loop()
+        )
+        loop = asyncio.get_running_loop()
+        job_id = manager.submit(sample_data, symbol='BTCUSDT', timeframe='1h')
+        unnamed = manager.submit(sample_data)
+        await loop.run_in_executor(None, manager.wait, job_id, 30)
+        await loop.run_in_executor(None, manager.wait, unnamed, 30)
+        manager.shutdown()
+        deadline = time.monotonic() + 5
+        while 'backtests' not in store.collections and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        await writer.stop()
+        return job_id, manager.status(job_id)
+
+    job_id, status = asyncio.run(run())
+
+    [document] = store.collections['backtests']
+    assert document['name'] == f'Backtest job {job_id}'
+    assert document['configuration']['symbol'] == 'BTCUSDT'
+    assert document['results']['summary']['totalTrades'] == status['progress']['trades'] > 0
+    assert len(document['results']['trades']) == status['progress']['trades']
+
+def test_cancel(detector, sample_data, tmp_path):
+    """Test cancelling queued and running jobs"""
+    gated = _GatedDetector(detector)
+    manager = BacktestJobManager(gated, directory=tmp_path, workers=1, chunk_size=5)
+
+    running = manager.submit(sample_data)
+    queued = manager.submit(sample_data)
+    assert manager.cancel(queued)
+    assert manager.status(queued)['status'] == 'cancelled'
+
+    assert manager.cancel(running)
+    gated.release.set()
+    status = manager.wait(running, timeout=30)
+    manager.shutdown()
+
+    assert status['status'] == 'cancelled'
+    assert status['progress']['occurrences_processed'] < status['progress']['occurrences_total']
+    assert not manager.cancel(running)
+    assert BacktestCheckpoint(tmp_path / running).load_progress()['status'] == 'cancelled'
+
+def test_resume_after_crash(detector, sample_data, tmp_path):
+    """Test a crashed job continues from its last checkpoint with the same result"""
+    candles = CandleSeries.from_dataframe(sample_data)
+    occurrences, expected = _reference(detector, candles)
+    chunks = list(PatternBacktester().iter_returns(candles, occurrences, chunk_size=20))
+
+    # Crashed after checkpointing two chunks and while appending a third
+    checkpoint = BacktestCheckpoint.create(tmp_path / 'crashed', {
+        'symbol': None, 'timeframe': None, 'patterns': None,
+        'holding_period': 5, 'stop_loss': -0.02, 'take_profit': 0.04
+    }, candles)
+    checkpoint.append_trades(chunks[0][1] + chunks[1][1] + chunks[2][1])
+    checkpoint.save_progress({
+        'status': 'running',
+        'processed': chunks[1][0],
+        'trades': len(chunks[0][1]) + len(chunks[1][1])
+    })
+
+    manager = BacktestJobManager(detector, directory=tmp_path, chunk_size=20)
+    assert manager.resume() == ['crashed']
+    status = manager.wait('crashed', timeout=30)
+    manager.shutdown()
+
+    assert status['status'] == 'completed'
+    assert manager.trades('crashed', limit=len(occurrences))['trades'] == expected['trade_results']
+    assert checkpoint.load_trades(len(occurrences)) == expected['trade_results']
+
+    # Pages are located through the line index, and found by scanning without it
+    trades = len(expected['trade_results'])
+    assert (tmp_path / 'crashed' / 'trades.idx').stat().st_size == 8 * trades
+    assert checkpoint.load_trades(trades, offset=trades - 2, limit=5) == expected['trade_results'][-2:]
+    (tmp_path / 'crashed' / 'trades.idx').unlink()
+    assert checkpoint.load_trades(trades, offset=3, limit=4) == expected['trade_results'][3:7]
+
+def test_workers_sharing_a_directory(detector, sample_data, tmp_path):
+    """Test other workers see a job's latest checkpoint, leave it to its owner and can cancel it"""
+    gated = _GatedDetector(detector)
+    owner = BacktestJobManager(gated, directory=tmp_path, workers=1, chunk_size=5)
+    other = BacktestJobManager(detector, directory=tmp_path)
+
+    running = owner.submit(sample_data)
+    queued = owner.submit(sample_data)
+    assert other.status(running)['status'] == 'queued'
+    assert other.resume() == []  # Both are claimed by the live owner
+
+    assert other.cancel(queued)
+    gated.release.set()
+    status = owner.wait(running, timeout=30)
+    assert owner.wait(queued, timeout=30)['status'] == 'cancelled'
+    assert other.status(running) == status
+    assert other.status(queued)['status'] == 'cancelled'
+    assert other.trades(running, limit=1000)['trades'] == owner.trades(running, limit=1000)['trades']
+    assert not other.cancel(running)
+
+    owner.shutdown()
+
+    # A job whose owner died unfinished is resumed by exactly one worker
+    crashed = BacktestCheckpoint.create(tmp_path / 'crashed', {
+        'symbol': None, 'timeframe': None, 'patterns': None,
+        'holding_period': 5, 'stop_loss': -0.02, 'take_profit': 0.04
+    }, CandleSeries.from_dataframe(sample_data))
+    crashed.save_progress({'status': 'running', 'processed': 0, 'trades': 0})
+    workers = [BacktestJobManager(detector, directory=tmp_path) for _ in range(3)]
+    assert sorted(worker.resume() for worker in workers) == [[], [], ['crashed']]
+    for worker in workers:
+        assert worker.wait('crashed', timeout=30)['status'] == 'completed'
+        worker.shutdown()
+
+def test_backtest_endpoints(detector, sample_data, tmp_path, monkeypatch):
+    """Test submitting, polling and paging a backtest job over HTTP"""
+    manager = BacktestJobManager(detector, directory=tmp_path)
+    monkeypatch.setattr(main, 'backtest_jobs', manager)
+    monkeypatch.setattr(main, 'batcher', None)
+    payload = {
+        'data': sample_data.astype({'timestamp': str}).to_dict(orient='records'),
+        'timeframe': '1h',
+        'patterns': ['DOJI', 'HAMMER', 'ENGULFING']
+    }
+
+    with TestClient(main.app) as client:
+        submitted = client.post('/backtests/', json=payload)
+        assert submitted.status_code == 202
+        job_id = submitted.json()['job_id']
+        manager.wait(job_id, timeout=30)
+
+        status = client.get(f'/backtests/{job_id}').json()
+        page = client.get(f'/backtests/{job_id}/trades', params={'offset': 1, 'limit': 2}).json()
+        assert client.get('/backtests/missing').status_code == 404
+        assert client.get(f'/backtests/{job_id}/trades', params={'limit': 0}).status_code == 422
+        assert client.delete(f'/backtests/{job_id}').json()['status'] == 'completed'
+
+    assert status['status'] == 'completed'
+    assert page['total'] == status['progress']['trades'] > 2
+    assert len(page['trades']) == 2
+    assert {trade['pattern_name'] for trade in page['trades']} <= {'DOJI', 'HAMMER', 'ENGULFING'}
+    assert pd.Timestamp(page['trades'][0]['entry_time']) > pd.Timestamp(sample_data['timestamp'][0])
@@ -0,0 +1,200 @@
+import asyncio
+import threading
+import pytest
+import numpy as np
+import pandas as pd
+import torch
+from fastapi.testclient import TestClient
+import src.main as main
+from src.models import PatternDetector
+from src.models.batching import MicroBatcher
+from src.models.inference import TorchBackend
+from src.models.sequence_classifier import CandleCNN
+from src.config import PATTERN_SETTINGS
+
+class _CountingBackend(TorchBackend):
+    """Torch backend recording the size of every forward pass"""
+
+    def __init__(self, model):
+        super().__init__(model, intra_op_threads=0)
+        self.calls = []
+
+    def predict_proba(self, windows):
+        self.calls.append(len(windows))
+        return super().predict_proba(windows)
+
+@pytest.fixture
+def backend():
+    """Create a counting backend over an untrained classifier"""
+    torch.manual_seed(0)
+    return _CountingBackend(CandleCNN())
+
+@pytest.fixture
+def sample_data():
+    """Create sample OHLCV data for testing"""
+    rng = np.random.default_rng(4)
+    close = 100 + np.cumsum(rng.normal(0, 1, 300))
+    data = pd.DataFrame({
+        'open': close + rng.normal(0, 0.5, 300),
+        'high': close + np.abs(rng.normal(0, 1, 300)),
+        'low': close - np.abs(rng.normal(0, 1, 300)),
+        'close': close,
+        'volume': rng.normal(1000000, 200000, 300)
+    })
+    data['high'] = data[['open', 'high', 'close']].max(axis=1)
+    data['low'] = data[['open', 'low', 'close']].min(axis=1)
+    return data
+
+def _windows(count, seed):
+    return np.random.default_rng(seed).uniform(-0.05, 0.05, (count, 10, 5)).astype(np.float32)
+
+def test_concurrent_requests_share_forward_pass(backend):
+    """Test concurrent submissions are merged and scattered back in order"""
+    requests = [_windows(count, seed) for seed, count in enumerate([5, 1, 40, 12])]
+
+    async def run():
+        batcher = MicroBatcher(backend, max_windows=1000, max_wait_ms=50)
+        try:
+            return await asyncio.gather(*(batcher.predict_proba(w) for w in requests))
+        finally:
+            await batcher.stop()
+
+    results = asyncio.run(run())
+
+    assert backend.calls == [sum(len(w) for w in requests)]
+    for windows, result in zip(requests, results):
+        np.testing.assert_allclose(result, TorchBackend(backend.model).predict_proba(windows), atol=1e-6)
+
+def test_max_windows_bounds_batch(backend):
+    """Test a full batch is run without waiting for the timeout"""
+    async def run():
+        batcher = MicroBatcher(backend, max_windows=10, max_wait_ms=10_000)
+        try:
+            return await asyncio.wait_for(
+                asyncio.gather(*(batcher.predict_proba(_windows(6, seed)) for seed in range(4))),
+                timeout=5
+            )
+        finally:
+            await batcher.stop()
+
+    results = asyncio.run(run())
+
+    assert backend.calls == [12, 12]
+    assert [len(r) for r in results] == [6, 6, 6, 6]
+
+def test_errors_reach_every_request(backend):
+    """Test a failing forward pass fails all requests in the batch"""
+    async def run():
+        batcher = MicroBatcher(backend, max_windows=1000, max_wait_ms=20)
+        try:
+            return await asyncio.gather(
+                batcher.predict_proba(_windows(3, 0)),
+                batcher.predict_proba(np.zeros((2, 10, 7), dtype=np.float32)),
+                return_exceptions=True
+            )
+        finally:
+            await batcher.stop()
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(r, Exception) for r in results)
+
+def test_stop_fails_requests_in_flight(backend):
+    """Test stopping mid-batch fails the requests being served instead of leaving them waiting"""
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_predict(windows):
+        started.set()
+        release.wait(5)
+        return TorchBackend.predict_proba(backend, windows)
+
+    backend.predict_proba = slow_predict
+
+    async def run():
+        batcher = MicroBatcher(backend, max_windows=1000, max_wait_ms=1)
+        request = asyncio.ensure_future(batcher.predict_proba(_windows(3, 0)))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        await batcher.stop()
+        release.set()
+        return await asyncio.wait_for(asyncio.gather(request, return_exceptions=True), timeout=5)
+
+    [result] = asyncio.run(run())
+    assert isinstance(result, RuntimeError)
+
+def test_restart_keeps_queued_requests(backend):
+    """Test requests queued before a restart are still served"""
+    async def run():
+        batcher = MicroBatcher(backend, max_windows=1000, max_wait_ms=1)
+        batcher.start()
+        batcher._worker.cancel()
+        request = asyncio.ensure_future(batcher.predict_proba(_windows(4, 0)))
+        await asyncio.sleep(0)
+        batcher.start()
+        try:
+            return await asyncio.wait_for(request, timeout=5)
+        finally:
+            await batcher.stop()
+
+    assert len(asyncio.run(run())) == 4
+
+def test_detect_patterns_async(backend, sample_data, monkeypatch):
+    """Test micro-batched detection matches direct detection"""
+    monkeypatch.setitem(PATTERN_SETTINGS, 'confidence_threshold', 0.0)
+    detector = PatternDetector()
+    detector.inference_backend = backend
+
+    async def run():
+        batcher = MicroBatcher(backend, max_wait_ms=1)
+        try:
+            return await detector.detect_patterns_async(sample_data, batcher)
+        finally:
+            await batcher.stop()
+
+    patterns = asyncio.run(run())
+    assert any(p['detection_method'] == 'transformer' for p in patterns)
+    assert patterns == detector.detect_patterns(sample_data)
+
+def test_detect_endpoint_use_ml(backend, sample_data, monkeypatch):
+    """Test /detect/ with use_ml returns the sequence model patterns"""
+    monkeypatch.setitem(PATTERN_SETTINGS, 'confidence_threshold', 0.0)
+    detector = PatternDetector()
+    detector.inference_backend = backend
+    monkeypatch.setattr(main, 'load_transformer_model', lambda: None)
+    monkeypatch.setattr(main, 'detector', detector)
+    monkeypatch.setattr(main, 'batcher', MicroBatcher(backend, max_wait_ms=1))
+
+    payload = {
+        'data': sample_data.assign(timestamp='2023-01-01 00:00:00').to_dict(orient='records'),
+        'timeframe': '1h',
+        'patterns_to_detect': ['NONE'],
+        'use_ml': True
+    }
+    with TestClient(main.app) as client:
+        patterns = client.post('/detect/', json=payload).json()
+        columns = client.post('/detect/?format=columnar', json=payload).json()
+        recent = client.post('/detect/', json={**payload, 'last_n': 15}).json()
+
+    expected = [
+        {key: p[key] for key in ('pattern_name', 'start_index', 'end_index', 'pattern_type')}
+        for p in detector._detect_patterns_transformer(sample_data)
+    ]
+    actual = [{key: p[key] for key in expected[0]} for p in patterns]
+    assert len(expected) > 0
+    assert sorted(actual, key=lambda p: p['end_index']) == expected
+    assert len(columns['end_index']) == len(patterns)
+    assert recent == [p for p in patterns if p['end_index'] >= len(sample_data) - 15]
+    assert set(columns['direction']) <= {-1, 0, 1}
+
+def test_detect_endpoint_use_ml_unavailable(sample_data, monkeypatch):
+    """Test use_ml is rejected when no model is loaded"""
+    monkeypatch.setattr(main, 'batcher', None)
+    payload = {
+        'data': sample_data.assign(timestamp='2023-01-01 00:00:00').to_dict(orient='records'),
+        'timeframe': '1h',
+        'use_ml': True
+    }
+
+    response = TestClient(main.app).post('/detect/', json=payload)
+
+    assert response.status_code == 503
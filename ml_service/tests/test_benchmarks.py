@@ -0,0 +1,73 @@
+import json
+import pytest
+import numpy as np
+from benchmarks import generate_ohlcv, generate_pattern_occurrences
+from benchmarks.suite import BENCHMARKS, compare_results, main, run_benchmark
+
+def test_generate_ohlcv():
+    """Test synthetic OHLCV generation"""
+    data = generate_ohlcv(1000, seed=1)
+
+    assert len(data) == 1000
+    assert list(data.columns) == ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+    assert np.all(data['high'] >= data[['open', 'close']].max(axis=1))
+    assert np.all(data['low'] <= data[['open', 'close']].min(axis=1))
+    assert np.all(data['volume'] > 0)
+
+    # Deterministic for a given seed
+    assert generate_ohlcv(1000, seed=1).equals(data)
+    assert generate_ohlcv(10, index_timestamps=True).index.name == 'timestamp'
+
+def test_generate_pattern_occurrences():
+    """Test synthetic pattern occurrences stay inside the series"""
+    occurrences = generate_pattern_occurrences(1000, every=50)
+
+    assert len(occurrences) == 19
+    assert all(0 <= p['start_index'] <= p['end_index'] < 1000 for p in occurrences)
+
+def test_run_benchmark():
+    """Test timing a benchmark at a small size"""
+    result = run_benchmark('cache_codec', 1000, repeat=2)
+
+    assert result['benchmark'] == 'cache_codec'
+    assert result['size'] == 1000
+    assert result['seconds'] > 0
+    assert result['throughput'] > 0
+    assert result['peak_memory_bytes'] > 0
+
+    skipped = run_benchmark('cache_codec', BENCHMARKS['cache_codec'][1] + 1)
+    assert 'skipped' in skipped
+
+def test_compare_results():
+    """Test regression detection between two runs"""
+    base = {'results': [
+        {'benchmark': 'a', 'size': 10, 'seconds': 1.0},
+        {'benchmark': 'b', 'size': 10, 'seconds': 1.0},
+        {'benchmark': 'c', 'size': 10, 'skipped': 'n/a'}
+    ]}
+    head = {'results': [
+        {'benchmark': 'a', 'size': 10, 'seconds': 1.05},
+        {'benchmark': 'b', 'size': 10, 'seconds': 1.5},
+        {'benchmark': 'c', 'size': 10, 'seconds': 1.0}
+    ]}
+
+    rows = {row['benchmark']: row for row in compare_results(base, head, threshold=0.1)}
+
+    assert set(rows) == {'a', 'b'}
+    assert not rows['a']['regression']
+    assert rows['b']['regression']
+    assert rows['b']['ratio'] == pytest.approx(1.5)
+
+def test_cli_round_trip(tmp_path):
+    """Test running the suite from the CLI and comparing its output"""
+    output = tmp_path / 'run.json'
+    assert main([
+        'run', '--sizes', '500', '--only', 'cache_codec', 'pattern_statistics',
+        '--repeat', '1', '--output', str(output)
+    ]) == 0
+
+    suite = json.loads(output.read_text())
+    assert {r['benchmark'] for r in suite['results']} == {'cache_codec', 'pattern_statistics'}
+    assert 'commit' in suite
+
+    assert main(['compare', str(output), str(output)]) == 0
@@ -0,0 +1,128 @@
+import pytest
+import pandas as pd
+import numpy as np
+from src.data import CandleSeries, PatternIndex
+from src.data.market_data import decode_market_data, encode_market_data
+from src.models import PatternDetector, PatternBacktester
+
+@pytest.fixture
+def sample_data():
+    """Create sample OHLCV data for testing"""
+    rng = np.random.default_rng(5)
+    dates = pd.date_range(start='2023-01-01', periods=400, freq='1h')
+    close = 100 + np.cumsum(rng.normal(0, 1, 400))
+    data = pd.DataFrame({
+        'timestamp': dates,
+        'open': close + rng.normal(0, 0.5, 400),
+        'high': close + np.abs(rng.normal(0, 1, 400)),
+        'low': close - np.abs(rng.normal(0, 1, 400)),
+        'close': close,
+        'volume': rng.lognormal(13, 0.5, 400)
+    })
+
+    # Ensure high is highest and low is lowest
+    data['high'] = data[['open', 'high', 'close']].max(axis=1)
+    data['low'] = data[['open', 'low', 'close']].min(axis=1)
+
+    return data
+
+@pytest.fixture(scope='module')
+def pattern_detector():
+    """Create a PatternDetector instance"""
+    return PatternDetector()
+
+def test_round_trip(sample_data):
+    """Test conversion from and back to a DataFrame"""
+    series = CandleSeries.from_dataframe(sample_data)
+
+    assert len(series) == len(sample_data)
+    assert series.timestamps.dtype == np.int64
+    assert series.timestamps[1] - series.timestamps[0] == 3_600_000
+    pd.testing.assert_frame_equal(series.to_dataframe(), sample_data, check_dtype=False)
+
+    # Cached frames carry epoch-millisecond timestamps
+    cached = decode_market_data(encode_market_data(series))
+    np.testing.assert_array_equal(CandleSeries.from_dataframe(cached).timestamps, series.timestamps)
+
+def test_read_only_views(sample_data):
+    """Test columns and slices share memory and cannot be written"""
+    series = CandleSeries.from_dataframe(sample_data)
+    window = series[100:200]
+
+    assert len(window) == 100
+    assert np.shares_memory(window.close, series.close)
+    assert window['timestamp'][0] == series.timestamps[100]
+    with pytest.raises(ValueError):
+        series['close'][0] = 0.0
+    with pytest.raises(ValueError):
+        window.volume[0] = 0.0
+    with pytest.raises(AttributeError):
+        series.close = np.zeros(len(series))
+    with pytest.raises(KeyError):
+        series['vwap']
+    with pytest.raises(TypeError):
+        series[::2]
+
+    # Source arrays stay writeable
+    close = sample_data['close'].to_numpy()
+    CandleSeries(series.timestamps, close, close, close, close, close)
+    assert close.flags.writeable
+
+def test_float32_halves_prices(sample_data):
+    """Test float32 mode stores prices and volumes in half the space"""
+    wide = CandleSeries.from_dataframe(sample_data)
+    compact = wide.astype(np.float32)
+
+    assert compact.dtype == np.float32
+    assert wide.astype(np.float64) is wide
+    assert compact.nbytes - compact.timestamps.nbytes == (wide.nbytes - wide.timestamps.nbytes) // 2
+    np.testing.assert_allclose(compact.close, wide.close, rtol=1e-6)
+    with pytest.raises(ValueError):
+        wide.astype(np.int32)
+    with pytest.raises(ValueError):
+        CandleSeries(wide.timestamps[:-1], *(wide[c] for c in wide.columns))
+
+def test_detector_accepts_series(pattern_detector, sample_data):
+    """Test detection and analysis give the same results for a CandleSeries"""
+    series = CandleSeries.from_dataframe(sample_data)
+
+    expected_signals = pattern_detector.detect_pattern_signals(sample_data)
+    signals = pattern_detector.detect_pattern_signals(series)
+    assert signals.keys() == expected_signals.keys()
+    for name, values in expected_signals.items():
+        np.testing.assert_array_equal(signals[name], values)
+
+    patterns = pattern_detector.detect_patterns(series)
+    assert patterns == pattern_detector.detect_patterns(sample_data)
+    assert pattern_detector.analyze_patterns(patterns, series) == \
+        pattern_detector.analyze_patterns(patterns, sample_data)
+    np.testing.assert_array_equal(
+        pattern_detector._transformer_windows(series),
+        pattern_detector._transformer_windows(sample_data)
+    )
+
+    pattern = {'start_index': 5, 'end_index': 9}
+    assert pattern_detector.analyze_pattern(pattern, series)['analysis'] == pytest.approx(
+        pattern_detector.analyze_pattern(pattern, sample_data)['analysis']
+    )
+
+    # float32 candles are upcast for TA-Lib
+    compact = pattern_detector.detect_pattern_signals(series.astype(np.float32))
+    assert {name: len(values) for name, values in compact.items()} == \
+        {name: len(values) for name, values in signals.items()}
+
+def test_backtester_accepts_series(pattern_detector, sample_data, tmp_path):
+    """Test backtests over a CandleSeries match the DataFrame ones"""
+    series = CandleSeries.from_dataframe(sample_data)
+    backtester = PatternBacktester()
+    patterns = pattern_detector.detect_patterns(sample_data, use_ml=False)
+
+    expected = backtester.backtest_pattern(sample_data.set_index('timestamp'), patterns)
+    result = backtester.backtest_pattern(series, patterns)
+    assert result['trade_results'] == expected['trade_results']
+    assert result['overall_stats'] == expected['overall_stats']
+
+    index = PatternIndex(pattern_detector, directory=tmp_path)
+    index.update('BTCUSDT', '1h', series)
+    indexed = backtester.backtest_index(series, index, 'BTCUSDT', '1h')
+    assert len(indexed['trade_results']) == len(expected['trade_results'])
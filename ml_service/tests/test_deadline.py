@@ -0,0 +1,163 @@
+import asyncio
+import time
+import pytest
+import numpy as np
+import pandas as pd
+import torch
+from fastapi.testclient import TestClient
+import src.main as main
+from src.models import PatternDetector
+from src.models.batching import MicroBatcher
+from src.models.deadline import DEGRADED_DETECTIONS, StageCost, windows_within_deadline
+from src.models.inference import TorchBackend
+from src.models.sequence_classifier import CandleCNN
+from src.config import PATTERN_SETTINGS
+
+WINDOW_COST_S = 0.0005
+
+class _SlowBackend(TorchBackend):
+    """Torch backend taking a fixed time per window, as a loaded server would"""
+
+    def predict_proba(self, windows):
+        time.sleep(WINDOW_COST_S * len(windows))
+        return super().predict_proba(windows)
+
+@pytest.fixture
+def detector(monkeypatch):
+    """Create a detector over an untrained classifier reporting every prediction"""
+    monkeypatch.setitem(PATTERN_SETTINGS, 'confidence_threshold', 0.0)
+    torch.manual_seed(0)
+    detector = PatternDetector()
+    detector.inference_backend = _SlowBackend(CandleCNN(), intra_op_threads=0)
+    return detector
+
+@pytest.fixture
+def sample_data():
+    """Create sample OHLCV data for testing"""
+    rng = np.random.default_rng(7)
+    close = 100 + np.cumsum(rng.normal(0, 1, 400))
+    data = pd.DataFrame({
+        'open': close + rng.normal(0, 0.5, 400),
+        'high': close + np.abs(rng.normal(0, 1, 400)),
+        'low': close - np.abs(rng.normal(0, 1, 400)),
+        'close': close,
+        'volume': rng.normal(1000000, 200000, 400)
+    })
+    data['high'] = data[['open', 'high', 'close']].max(axis=1)
+    data['low'] = data[['open', 'low', 'close']].min(axis=1)
+    return data
+
+def test_cost_estimate_and_window_budget():
+    """Test the estimate follows recent timings and sizes the windows that fit"""
+    cost = StageCost(initial_unit_cost=0.01, smoothing=0.5)
+    cost.observe(1.0, 1000)
+    assert cost.unit_cost == pytest.approx(0.0055)
+    cost.observe(1.0, 0)
+    assert cost.unit_cost == pytest.approx(0.0055)
+    assert cost.units_within(0.055) == 10
+    assert cost.units_within(-1) == 0
+    with pytest.raises(ValueError):
+        StageCost(smoothing=0)
+
+    degraded = DEGRADED_DETECTIONS.get()
+    cost = StageCost(initial_unit_cost=0.001)
+    assert windows_within_deadline(cost, 500, None) == (500, 0)
+    assert windows_within_deadline(cost, 0, time.monotonic()) == (0, 0)
+    assert windows_within_deadline(cost, 500, time.monotonic() - 1) == (0, 500)
+    assert windows_within_deadline(cost, 500, time.monotonic() + 1e-6) == (1, 499)  # Newest always tried
+    fit, skipped = windows_within_deadline(cost, 500, time.monotonic() + 0.1, safety_factor=1.0)
+    assert 90 <= fit <= 100 and fit + skipped == 500
+    assert windows_within_deadline(cost, 50, time.monotonic() + 0.1) == (50, 0)
+    assert DEGRADED_DETECTIONS.get() - degraded == 3
+
+def test_deadline_keeps_talib_and_most_recent_windows(detector, sample_data):
+    """Test a tight deadline returns every TA-Lib pattern and the newest model patterns only"""
+    full = detector.detect_patterns(sample_data)
+    assert not full.partial
+    detector.window_cost.unit_cost = WINDOW_COST_S  # As learnt from the full run
+
+    started = time.monotonic()
+    partial = detector.detect_patterns(sample_data, deadline=started + 0.1)
+    elapsed = time.monotonic() - started
+    assert partial.partial and 0 < partial.skipped_windows < len(sample_data)
+    assert elapsed < 0.15
+
+    talib_patterns = [p for p in full if p['detection_method'] == 'talib']
+    assert [p for p in partial if p['detection_method'] == 'talib'] == talib_patterns
+    ml_patterns = [p for p in partial if p['detection_method'] == 'transformer']
+    first_end = detector.window_size - 1 + partial.skipped_windows
+    assert len(ml_patterns) == len(sample_data) - first_end
+    assert min(p['end_index'] for p in ml_patterns) == first_end
+    assert sorted(ml_patterns, key=lambda p: p['end_index']) == sorted(
+        (p for p in full if p['detection_method'] == 'transformer' and p['end_index'] >= first_end),
+        key=lambda p: p['end_index']
+    )
+
+    # An expired deadline still returns the TA-Lib patterns, and generous ones everything
+    expired = detector.detect_patterns(sample_data, deadline=time.monotonic() - 1)
+    assert expired == talib_patterns and expired.partial
+    assert detector.detect_patterns(sample_data, deadline=time.monotonic() + 60) == full
+
+    async def run():
+        batcher = MicroBatcher(detector.inference_backend, max_wait_ms=1)
+        try:
+            return await detector.detect_patterns_async(
+                sample_data, batcher, deadline=time.monotonic() + 0.1
+            )
+        finally:
+            await batcher.stop()
+
+    batched = asyncio.run(run())
+    assert batched.partial and [p for p in batched if p['detection_method'] == 'talib'] == talib_patterns
+
+def test_failed_inference_counts_windows_skipped(detector, sample_data, monkeypatch):
+    """Test windows whose inference raised are reported as skipped, not silently dropped"""
+    def fail(windows):
+        raise RuntimeError("backend down")
+
+    talib_patterns = [p for p in detector.detect_patterns(sample_data) if p['detection_method'] == 'talib']
+    monkeypatch.setattr(detector.inference_backend, 'predict_proba', fail)
+    failed = detector.detect_patterns(sample_data)
+    assert failed == talib_patterns
+    assert failed.partial and failed.skipped_windows == len(sample_data) - detector.window_size + 1
+    assert detector.detect_patterns(sample_data, last_n=10).skipped_windows == 10
+
+    async def run():
+        batcher = MicroBatcher(detector.inference_backend, max_wait_ms=1)
+        try:
+            return await detector.detect_patterns_async(sample_data, batcher, last_n=10)
+        finally:
+            await batcher.stop()
+
+    batched = asyncio.run(run())
+    assert batched.partial and batched.skipped_windows == 10
+
+def test_detect_endpoint_deadline(detector, sample_data, monkeypatch):
+    """Test /detect/ flags responses whose model windows were cut to meet deadline_ms"""
+    monkeypatch.setattr(main, 'load_transformer_model', lambda: None)
+    monkeypatch.setattr(main, 'detector', detector)
+    monkeypatch.setattr(main, 'batcher', MicroBatcher(detector.inference_backend, max_wait_ms=1))
+    detector.window_cost.unit_cost = WINDOW_COST_S
+
+    payload = {
+        'data': sample_data.assign(timestamp='2023-01-01 00:00:00').to_dict(orient='records'),
+        'timeframe': '1h',
+        'use_ml': True
+    }
+    with TestClient(main.app) as client:
+        full = client.post('/detect/', json=payload)
+        partial = client.post('/detect/', json={**payload, 'deadline_ms': 50})
+        columns = client.post('/detect/?format=columnar', json={**payload, 'deadline_ms': 50})
+        assert client.post('/detect/', json={**payload, 'deadline_ms': 0}).status_code == 422
+
+    assert 'X-Partial-Results' not in full.headers
+    assert partial.headers['X-Partial-Results'] == 'true'
+    skipped = int(partial.headers['X-Skipped-Windows'])
+    assert 0 < skipped < len(sample_data)
+    first_end = detector.window_size - 1 + skipped
+    ml_patterns = [p for p in partial.json() if p['pattern_name'].startswith('AI_PATTERN_')]
+    assert min(p['end_index'] for p in ml_patterns) == first_end
+    assert [p for p in partial.json() if not p['pattern_name'].startswith('AI_PATTERN_')] == [
+        p for p in full.json() if not p['pattern_name'].startswith('AI_PATTERN_')
+    ]
+    assert columns.headers['X-Partial-Results'] == 'true'
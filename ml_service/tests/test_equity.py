@@ -0,0 +1,115 @@
+import pytest
+import numpy as np
+import pandas as pd
+from src.models import PatternBacktester
+from src.models.equity import bars_per_year, equity_statistics, mark_to_market
+
+@pytest.fixture
+def sample_data():
+    """Create sample OHLCV data for testing"""
+    rng = np.random.default_rng(8)
+    dates = pd.date_range(start='2023-01-01', periods=500, freq='1h')
+    close = 100 + np.cumsum(rng.normal(0, 1, 500))
+    data = pd.DataFrame({
+        'open': close + rng.normal(0, 0.5, 500),
+        'high': close + np.abs(rng.normal(0, 1, 500)),
+        'low': close - np.abs(rng.normal(0, 1, 500)),
+        'close': close,
+        'volume': rng.lognormal(13, 0.5, 500)
+    }, index=dates)
+
+    # Ensure high is highest and low is lowest
+    data['high'] = data[['open', 'high', 'close']].max(axis=1)
+    data['low'] = data[['open', 'low', 'close']].min(axis=1)
+
+    return data
+
+@pytest.fixture
+def occurrences():
+    rng = np.random.default_rng(2)
+    return [
+        {
+            'pattern_name': 'ENGULFING',
+            'confidence': 0.8,
+            'start_index': int(end) - 1,
+            'end_index': int(end),
+            'pattern_type': 'bullish' if i % 3 else 'bearish'
+        }
+        for i, end in enumerate(rng.integers(1, 500, 150))
+    ]
+
+def _reference_equity(log, closes, position_size, cost):
+    """Equity marked bar by bar, one trade at a time"""
+    pnl = np.zeros(len(closes))
+    exposure = np.zeros(len(closes))
+    for entry, exit_, entry_price, exit_price, direction in zip(
+        log.columns['entry_index'], log.columns['exit_index'],
+        log.columns['entry_price'], log.columns['exit_price'], log.directions
+    ):
+        units = direction * position_size / entry_price
+        marks = [entry_price] + [closes[t] for t in range(entry, exit_)] + [exit_price]
+        for t, (previous, current) in zip(range(entry, exit_ + 1), zip(marks[:-1], marks[1:])):
+            pnl[t] += units * (current - previous)
+        pnl[entry] -= cost
+        pnl[exit_] -= cost
+        exposure[entry:exit_] += abs(units) * closes[entry:exit_]
+    equity = 1 + np.cumsum(pnl)
+    return equity, exposure / equity
+
+def test_equity_matches_bar_by_bar(sample_data, occurrences):
+    """Test the vectorized curve against marking every trade on every bar"""
+    backtester = PatternBacktester()
+    log = backtester.backtest_log(sample_data, occurrences, holding_period=12)
+    curve = backtester.equity_curve(sample_data, log, position_size=0.05)
+
+    equity, exposure = _reference_equity(
+        log, sample_data['close'].to_numpy(), 0.05, 0.05 * backtester.transaction_cost
+    )
+    np.testing.assert_allclose(curve.equity, equity, rtol=1e-12)
+    np.testing.assert_allclose(curve.exposure, exposure, rtol=1e-9, atol=1e-12)
+    assert curve.equity[-1] - 1 == pytest.approx(0.05 * log.returns.sum())
+    assert curve.open_positions.max() > 1
+    assert (curve.drawdown <= 0).all()
+
+def test_open_position_risk():
+    """Test a losing stretch inside a winning trade shows up as drawdown"""
+    closes = np.array([100, 100, 97, 95, 99, 104, 104, 104], dtype=float)
+    data = pd.DataFrame({
+        'open': closes, 'high': closes, 'low': closes, 'close': closes, 'volume': 1.0
+    }, index=pd.date_range('2023-01-01', periods=8, freq='1D'))
+    pattern = {'pattern_name': 'HAMMER', 'confidence': 0.9, 'start_index': 0, 'end_index': 0, 'pattern_type': 'bullish'}
+
+    backtester = PatternBacktester()
+    backtester.transaction_cost = 0.0
+    log = backtester.backtest_log(data, [pattern], holding_period=5, stop_loss=-0.1, take_profit=0.04)
+    curve = mark_to_market(log, data, position_size=1.0, transaction_cost=0.0)
+    stats = equity_statistics(curve, periods_per_year=365)
+
+    # Entered at 100 on bar 1, took profit on bar 5
+    assert log.rows()[0]['exit_reason'] == 'take_profit'
+    assert log.statistics()['max_drawdown'] == 0
+    np.testing.assert_allclose(curve.equity, [1, 1, 0.97, 0.95, 0.99, 1.04, 1.04, 1.04])
+    np.testing.assert_array_equal(curve.open_positions, [0, 1, 1, 1, 1, 0, 0, 0])
+    assert stats['max_drawdown'] == pytest.approx(-0.05)
+    assert stats['max_drawdown_duration'] == 3
+    assert stats['time_in_market'] == pytest.approx(4 / 8)
+    assert stats['total_return'] == pytest.approx(0.04)
+    assert stats['sharpe_ratio'] > 0
+
+def test_backtest_reports_equity(sample_data, occurrences):
+    """Test backtest results and reports carry mark-to-market statistics"""
+    backtester = PatternBacktester()
+    results = backtester.backtest_pattern(sample_data, occurrences)
+
+    stats = results['equity_stats']
+    assert stats['max_drawdown'] <= 0
+    assert 0 < stats['time_in_market'] <= 1
+    assert stats == backtester.equity_statistics(sample_data, backtester.backtest_log(sample_data, occurrences))
+    assert bars_per_year(sample_data.index) == pytest.approx(365 * 24)
+    assert bars_per_year(pd.RangeIndex(10)) is None
+
+    report = backtester.generate_performance_report(results)
+    assert "Mark-to-Market Risk" in report
+    assert "Mark-to-Market Risk" not in backtester.generate_performance_report(
+        backtester.backtest_log(sample_data, occurrences)
+    )
@@ -0,0 +1,182 @@
+import pytest
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+import src.main as main
+from src.data import ForwardReturnTable, ReturnSketch
+from src.data.backfill import CandleStore
+from src.data.candles import CandleSeries
+from src.models import PatternDetector
+
+@pytest.fixture(scope='module')
+def detector():
+    return PatternDetector()
+
+def make_candles(seed, n_candles=1500):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n_candles)))
+    data = pd.DataFrame({
+        'timestamp': pd.date_range('2023-01-01', periods=n_candles, freq='1h'),
+        'open': close * (1 + rng.normal(0, 0.003, n_candles)),
+        'high': close * (1 + np.abs(rng.normal(0, 0.006, n_candles))),
+        'low': close * (1 - np.abs(rng.normal(0, 0.006, n_candles))),
+        'close': close,
+        'volume': rng.lognormal(10, 1, n_candles)
+    })
+
+    # Ensure high is highest and low is lowest
+    data['high'] = data[['open', 'high', 'close']].max(axis=1)
+    data['low'] = data[['open', 'low', 'close']].min(axis=1)
+    return data
+
+def test_sketch_accuracy_and_merge():
+    """Test quantiles stay within the relative accuracy and merged halves equal the whole"""
+    rng = np.random.default_rng(0)
+    returns = np.concatenate((rng.normal(0.001, 0.02, 5000), np.zeros(50), [np.nan]))
+    whole = ReturnSketch(0.01)
+    whole.add(returns)
+    first, second = ReturnSketch(0.01), ReturnSketch(0.01)
+    first.add(returns[:1234])
+    second.add(returns[1234:])
+    merged = first.merge(second)
+
+    finite = returns[np.isfinite(returns)]
+    assert whole.count == merged.count == len(finite)
+    assert merged.mean == pytest.approx(np.mean(finite))
+    assert merged.variance == pytest.approx(np.var(finite))
+    assert merged.positive_buckets == whole.positive_buckets
+    assert merged.negative_buckets == whole.negative_buckets
+    for q in (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99):
+        exact = np.quantile(finite, q, method='lower')
+        assert abs(merged.quantile(q) - exact) <= 0.01 * abs(exact) + 1e-12
+
+    restored = ReturnSketch.from_dict(whole.to_dict())
+    assert restored.summary() == whole.summary()
+    assert np.isnan(ReturnSketch().quantile(0.5))
+    with pytest.raises(ValueError):
+        whole.merge(ReturnSketch(0.05))
+
+def test_incremental_updates_match_full_history(detector, tmp_path):
+    """Test candles fed a few at a time give the returns computed from the whole history"""
+    data = make_candles(5)
+    table = ForwardReturnTable(detector, tmp_path, horizons=[1, 5, 20])
+    table.update('ETHUSDT', '1h', data.iloc[:1000])
+    for end in range(1000, len(data), 7):
+        # Overlapping windows, as a poller re-reading its lookback would send
+        table.update('ETHUSDT', '1h', data.iloc[end - 100:end + 7])
+    assert table.update('ETHUSDT', '1h', data) == 0
+    assert table.seen_bars('ETHUSDT', '1h') == len(data)
+
+    close = data['close'].to_numpy()
+    signals = detector.detect_pattern_signals(data)
+    checked = 0
+    for name, values in signals.items():
+        stats = table.statistics(name, '1h', ['ETHUSDT'])
+        for direction, sign in (('bullish', 1), ('bearish', -1)):
+            for horizon in (1, 5, 20):
+                bars = np.flatnonzero(np.sign(values) == sign)
+                bars = bars[bars + horizon < len(data)]
+                returns = close[bars + horizon] / close[bars] - 1
+                if len(returns) == 0:
+                    assert horizon not in stats.get(direction, {})
+                    continue
+                summary = stats[direction][horizon]
+                assert summary['count'] == len(returns)
+                assert summary['mean'] == pytest.approx(returns.mean())
+                assert summary['variance'] == pytest.approx(returns.var(), abs=1e-15)
+                median = np.quantile(returns, 0.5, method='lower')
+                assert summary['quantiles']['p50'] == pytest.approx(median, rel=0.01, abs=1e-12)
+                checked += 1
+    assert checked > 20
+
+    # Reloaded tables carry on from the stored state
+    reloaded = ForwardReturnTable(detector, tmp_path, horizons=[1, 5, 20])
+    assert reloaded.statistics('DOJI', '1h', ['ETHUSDT']) == table.statistics('DOJI', '1h', ['ETHUSDT'])
+    more = make_candles(5, 1600)
+    assert reloaded.update('ETHUSDT', '1h', more) > 0
+    assert table.update('ETHUSDT', '1h', more) == 0  # Already added through the other table
+    assert table.seen_bars('ETHUSDT', '1h') == len(more)
+    assert ForwardReturnTable(detector, tmp_path, horizons=[2]).seen_bars('ETHUSDT', '1h') == 0
+
+def test_aggregates_and_endpoint(detector, tmp_path, monkeypatch):
+    """Test statistics merge across symbols and are served by the API"""
+    table = ForwardReturnTable(detector, tmp_path, horizons=[1, 5])
+    table.update('BTCUSDT', '1h', make_candles(1))
+    table.update('ETHUSDT', '1h', make_candles(2))
+    table.update('ETHUSDT', '4h', make_candles(3))
+
+    per_symbol = [table.sketches('DOJI', '1h', [symbol], 'bullish', 5) for symbol in ('BTCUSDT', 'ETHUSDT')]
+    combined = ForwardReturnTable(detector, tmp_path, horizons=[1, 5]).sketches('DOJI', '1h', direction='bullish', horizon=5)
+    assert list(combined) == [('bullish', 5)]
+    assert combined[('bullish', 5)].count == sum(s[('bullish', 5)].count for s in per_symbol) > 0
+
+    monkeypatch.setattr(main, 'return_stats', table)
+    monkeypatch.setattr(main, 'batcher', None)
+    with TestClient(main.app) as client:
+        response = client.get('/patterns/DOJI/returns', params={'timeframe': '1h', 'horizon': 5})
+        single = client.get('/patterns/DOJI/returns', params={'symbols': ['ETHUSDT'], 'direction': 'bullish'})
+        assert client.get('/patterns/NOT_A_PATTERN/returns').status_code == 404
+        assert client.get('/patterns/DOJI/returns', params={'direction': 'up'}).status_code == 422
+
+    statistics = response.json()['statistics']
+    assert statistics['bullish']['5']['count'] == combined[('bullish', 5)].count
+    assert set(statistics['bullish']) == {'5'}
+    assert set(single.json()['statistics']) == {'bullish'}
+    assert single.json()['statistics']['bullish']['5']['count'] == per_symbol[1][('bullish', 5)].count
+
+def test_tables_sharing_a_directory(detector, tmp_path):
+    """Test workers sharing a directory build on and read each other's updates"""
+    data = make_candles(7)
+    first = ForwardReturnTable(detector, tmp_path / 'shared', horizons=[1, 5])
+    second = ForwardReturnTable(detector, tmp_path / 'shared', horizons=[1, 5])
+    alone = ForwardReturnTable(detector, tmp_path / 'alone', horizons=[1, 5])
+    assert second.statistics('DOJI', '1h') == {}
+
+    for i, end in enumerate(range(500, len(data) + 1, 250)):
+        # Alternate the worker that sees each new batch of candles
+        (first, second)[i % 2].update('BTCUSDT', '1h', data.iloc[:end])
+        alone.update('BTCUSDT', '1h', data.iloc[:end])
+        for table in (first, second):
+            assert table.seen_bars('BTCUSDT', '1h') == end
+            assert table.statistics('DOJI', '1h') == alone.statistics('DOJI', '1h')
+    assert first.statistics('DOJI', '1h', ['BTCUSDT'])['bullish'][5]['count'] > 0
+
+def test_rejects_bad_streams_and_files(detector, tmp_path, monkeypatch):
+    """Test paths stay inside the directory, misses aren't cached and bad files are ignored"""
+    table = ForwardReturnTable(detector, tmp_path / 'table', horizons=[1, 5])
+    for symbol, timeframe in (('../../etc', '1h'), ('btcusdt', '1h'), ('BTCUSDT', '../1h')):
+        with pytest.raises(ValueError):
+            table.update(symbol, timeframe, make_candles(1))
+        with pytest.raises(ValueError):
+            table.statistics('DOJI', timeframe, [symbol])
+    assert not (tmp_path / 'table').exists() or not any((tmp_path / 'table').iterdir())
+
+    for i in range(50):
+        assert table.seen_bars(f'MISS{i}', '1h') == 0
+    assert table._entries == {}
+
+    table.update('BTCUSDT', '1h', make_candles(1))
+    (tmp_path / 'table' / 'ETHUSDT_1h.json').write_bytes(b'{"horizons": [1, 5]}')
+    assert table.statistics('DOJI', '1h') == ForwardReturnTable(detector, tmp_path / 'table', horizons=[1, 5]).statistics('DOJI', '1h', ['BTCUSDT'])
+    assert table.seen_bars('ETHUSDT', '1h') == 0
+
+    monkeypatch.setattr(main, 'return_stats', table)
+    monkeypatch.setattr(main, 'batcher', None)
+    with TestClient(main.app) as client:
+        assert client.get('/patterns/DOJI/returns', params={'symbols': ['../x']}).status_code == 422
+        assert client.get('/patterns/DOJI/returns', params={'timeframe': '7m'}).status_code == 422
+        assert client.get('/patterns/DOJI/returns', params={'symbols': ['ETHUSDT']}).status_code == 200
+
+def test_build_from_backfilled_candles(detector, tmp_path):
+    """Test a table built from the candle store matches one fed the same history"""
+    data = make_candles(4)
+    store = CandleStore(tmp_path / 'candles')
+    store.write('BTCUSDT', '1h', CandleSeries.from_dataframe(data.iloc[:800]))
+    store.write('BTCUSDT', '1h', CandleSeries.from_dataframe(data.iloc[800:]))
+
+    built = ForwardReturnTable(detector, tmp_path / 'built', horizons=[1, 5])
+    fed = ForwardReturnTable(detector, tmp_path / 'fed', horizons=[1, 5])
+    assert built.build_from_store(store, 'BTCUSDT', '1h') == fed.update('BTCUSDT', '1h', data) > 0
+    assert built.seen_bars('BTCUSDT', '1h') == len(data)
+    assert built.statistics('DOJI', '1h') == fed.statistics('DOJI', '1h')
+    assert built.build_from_store(store, 'ETHUSDT', '1h') == 0
@@ -0,0 +1,120 @@
+import pytest
+import numpy as np
+import talib
+from src.models.indicators import EMA, MACD, RSI, SMA, MovingAverageCross, VolumeSurge
+
+@pytest.fixture
+def close():
+    """Create a sample close price series"""
+    rng = np.random.default_rng(21)
+    return 100 + np.cumsum(rng.normal(0, 1, 3000))
+
+@pytest.fixture
+def volume():
+    """Create a sample volume series"""
+    return np.random.default_rng(22).lognormal(13, 0.5, 3000)
+
+def _incremental(indicator, values):
+    return np.array([indicator.update(value) for value in values])
+
+def _assert_matches(actual, expected):
+    # Exact on the TA-Lib 0.4 build the service pins; other builds round differently (see Indicator)
+    np.testing.assert_allclose(np.asarray(actual, dtype=np.float64), expected, rtol=1e-9, atol=1e-9)
+
+@pytest.mark.parametrize('period', [1, 2, 5, 20, 200])
+def test_sma_matches_talib(close, period):
+    """Test incremental and batch SMA match TA-Lib"""
+    expected = talib.SMA(close, period)
+
+    _assert_matches(_incremental(SMA(period), close), expected)
+    _assert_matches(SMA(period).batch(close), expected)
+
+@pytest.mark.parametrize('period', [2, 5, 12, 26, 100])
+def test_ema_matches_talib(close, period):
+    """Test incremental and batch EMA match TA-Lib"""
+    expected = talib.EMA(close, period)
+
+    _assert_matches(_incremental(EMA(period), close), expected)
+    _assert_matches(EMA(period).batch(close), expected)
+
+@pytest.mark.parametrize('period', [2, 7, 14, 30])
+def test_rsi_matches_talib(close, period):
+    """Test incremental and batch RSI match TA-Lib"""
+    expected = talib.RSI(close, period)
+
+    _assert_matches(_incremental(RSI(period), close), expected)
+    _assert_matches(RSI(period).batch(close), expected)
+
+@pytest.mark.parametrize('periods', [(12, 26, 9), (5, 35, 5), (26, 12, 9)])
+def test_macd_matches_talib(close, periods):
+    """Test incremental and batch MACD match TA-Lib"""
+    expected = talib.MACD(close, *periods)
+
+    outputs = _incremental(MACD(*periods), close)
+    for i in range(3):
+        _assert_matches(outputs[:, i], expected[i])
+        _assert_matches(MACD(*periods).batch(close)[i], expected[i])
+
+@pytest.mark.parametrize('indicator_factory,talib_output', [
+    (lambda: SMA(20), lambda x: talib.SMA(x, 20)),
+    (lambda: EMA(20), lambda x: talib.EMA(x, 20)),
+    (lambda: RSI(14), lambda x: talib.RSI(x, 14)),
+    (lambda: MACD(), lambda x: talib.MACD(x)[0])
+])
+@pytest.mark.parametrize('split', [0, 5, 30, 1000])
+def test_batch_then_incremental(close, indicator_factory, talib_output, split):
+    """Test that updates after a batch backfill continue where it left off"""
+    indicator = indicator_factory()
+    indicator.batch(close[:split])
+    updates = [indicator.update(value) for value in close[split:]]
+    if isinstance(indicator, MACD):
+        updates = [update[0] for update in updates]
+
+    _assert_matches(updates, talib_output(close)[split:])
+
+def test_moving_average_cross(close):
+    """Test crossover signals agree with TA-Lib SMAs, incrementally and in batch"""
+    difference = talib.SMA(close, 5) - talib.SMA(close, 20)
+    previous = np.concatenate(([np.nan], difference[:-1]))
+    with np.errstate(invalid='ignore'):
+        expected = np.where((previous <= 0) & (difference > 0), 1, np.where((previous >= 0) & (difference < 0), -1, 0))
+
+    np.testing.assert_array_equal(_incremental(MovingAverageCross(5, 20), close), expected)
+    np.testing.assert_array_equal(MovingAverageCross(5, 20).batch(close), expected)
+    assert {-1, 1} <= set(expected.tolist())
+
+def test_macd_cross(close):
+    """Test MACD crossings of the signal line"""
+    _, _, histogram = talib.MACD(close)
+    indicator = MACD()
+    crosses = []
+    for value in close:
+        indicator.update(value)
+        crosses.append(indicator.cross)
+
+    previous = np.concatenate(([np.nan], histogram[:-1]))
+    with np.errstate(invalid='ignore'):
+        expected = np.where((previous <= 0) & (histogram > 0), 1, np.where((previous >= 0) & (histogram < 0), -1, 0))
+    np.testing.assert_array_equal(crosses, expected)
+
+    batched = MACD()
+    batched.batch(close)
+    assert batched.cross == crosses[-1]
+
+def test_volume_surge(volume):
+    """Test volume increase against the TA-Lib SMA of the previous candles"""
+    average = talib.SMA(volume, 20)
+    expected = np.concatenate(([np.nan], (volume[1:] / average[:-1] - 1) * 100))
+
+    _assert_matches(_incremental(VolumeSurge(20), volume), expected)
+    _assert_matches(VolumeSurge(20).batch(volume), expected)
+
+def test_short_series(close):
+    """Test series shorter than the warm-up period"""
+    for indicator in (SMA(20), EMA(20), RSI(14), VolumeSurge(20)):
+        assert np.isnan(indicator.batch(close[:5])).all()
+        assert np.isnan(indicator.value)
+
+    macd = MACD()
+    assert all(np.isnan(output).all() for output in macd.batch(close[:30]))
+    assert macd.cross == 0
@@ -0,0 +1,133 @@
+import pytest
+import numpy as np
+import pandas as pd
+import torch
+from types import SimpleNamespace
+from src.models import PatternDetector
+from src.models.pattern_detector import NO_PATTERN_LABEL
+from src.models.inference import (
+    INFERENCE_CONFIG, OnnxBackend, QuantizedTorchBackend, TorchBackend,
+    check_accuracy_drift, create_backend
+)
+from src.config import PATTERN_SETTINGS
+
+WINDOW_SHAPE = (10, 5)
+
+class _TinyClassifier(torch.nn.Module):
+    """Small stand-in classifier over (batch, 10, 5) windows"""
+
+    def __init__(self, return_object: bool = False):
+        super().__init__()
+        torch.manual_seed(0)
+        self.layers = torch.nn.Sequential(
+            torch.nn.Flatten(),
+            torch.nn.Linear(50, 64),
+            torch.nn.ReLU(),
+            torch.nn.Linear(64, 5)
+        )
+        self.return_object = return_object
+
+    def forward(self, features):
+        logits = self.layers(features) * 10
+        return SimpleNamespace(logits=logits) if self.return_object else logits
+
+@pytest.fixture
+def model():
+    """Create a small classifier"""
+    return _TinyClassifier()
+
+@pytest.fixture
+def windows():
+    """Create sample feature windows"""
+    return np.random.default_rng(0).uniform(-0.05, 0.05, (300, *WINDOW_SHAPE)).astype(np.float32)
+
+@pytest.fixture
+def sample_data():
+    """Create sample OHLCV data for testing"""
+    rng = np.random.default_rng(1)
+    close = 100 + np.cumsum(rng.normal(0, 1, 200))
+    return pd.DataFrame({
+        'open': close + rng.normal(0, 0.5, 200),
+        'high': close + 2,
+        'low': close - 2,
+        'close': close,
+        'volume': rng.normal(1000000, 200000, 200)
+    })
+
+def test_torch_backend(model, windows):
+    """Test batched fp32 inference matches a single forward pass"""
+    backend = TorchBackend(model, batch_size=64)
+    probabilities = backend.predict_proba(windows)
+
+    with torch.no_grad():
+        expected = torch.softmax(model(torch.from_numpy(windows)), dim=1).numpy()
+
+    assert probabilities.shape == (300, 5)
+    np.testing.assert_allclose(probabilities.sum(axis=1), 1, rtol=1e-5)
+    np.testing.assert_allclose(probabilities, expected, atol=1e-5)
+
+def test_logits_output_objects(windows):
+    """Test models returning transformers-style outputs"""
+    expected = TorchBackend(_TinyClassifier()).predict_proba(windows)
+    actual = TorchBackend(_TinyClassifier(return_object=True)).predict_proba(windows)
+    np.testing.assert_allclose(actual, expected)
+
+def test_quantized_backend_drift(model, windows):
+    """Test int8 dynamic quantization stays close to fp32"""
+    drift = check_accuracy_drift(TorchBackend(model), QuantizedTorchBackend(model), windows)
+
+    assert drift['max_abs_diff'] < 0.1
+    assert drift['label_agreement'] > 0.9
+
+def test_onnx_backend(model, windows, tmp_path):
+    """Test ONNX Runtime inference matches fp32"""
+    pytest.importorskip('onnxruntime')
+    pytest.importorskip('onnx')
+    backend = OnnxBackend(
+        model, WINDOW_SHAPE, onnx_path=tmp_path / 'model.onnx', intra_op_threads=1
+    )
+
+    drift = check_accuracy_drift(TorchBackend(model), backend, windows)
+
+    assert [path.name for path in tmp_path.iterdir()] == ['model.onnx']  # No temporary export left behind
+    assert drift['max_abs_diff'] < 1e-4
+    assert drift['label_agreement'] == 1.0
+
+def test_create_backend(model, windows, monkeypatch):
+    """Test backend selection and fallback when drift exceeds the limits"""
+    assert isinstance(create_backend(model, WINDOW_SHAPE, 'torch'), TorchBackend)
+    assert isinstance(
+        create_backend(model, WINDOW_SHAPE, 'quantized', verify_windows=windows),
+        QuantizedTorchBackend
+    )
+
+    monkeypatch.setitem(INFERENCE_CONFIG, 'max_drift', 0.0)
+    backend = create_backend(model, WINDOW_SHAPE, 'quantized', verify_windows=windows)
+    assert type(backend) is TorchBackend
+
+    with pytest.raises(ValueError):
+        create_backend(model, WINDOW_SHAPE, 'tensorrt')
+
+def test_detector_uses_backend(model, sample_data):
+    """Test that transformer detection runs through the inference backend"""
+    detector = PatternDetector()
+    detector.inference_backend = TorchBackend(model, batch_size=32)
+
+    patterns = detector._detect_patterns_transformer(sample_data)
+
+    # Reference: one forward pass per window, as before batching
+    features = detector._prepare_data_for_transformer(sample_data)
+    expected = []
+    with torch.no_grad():
+        for i in range(len(features) - detector.window_size + 1):
+            probabilities = torch.softmax(model(features[i:i + detector.window_size].unsqueeze(0)), dim=1)
+            prediction = int(torch.argmax(probabilities, dim=1))
+            confidence = float(probabilities[0][prediction])
+            if confidence >= PATTERN_SETTINGS['confidence_threshold'] and prediction != NO_PATTERN_LABEL:
+                expected.append((i, detector._get_pattern_type(prediction), confidence))
+
+    assert [(p['start_index'], p['pattern_name'][len('AI_PATTERN_'):]) for p in patterns] == \
+        [(i, pattern_type) for i, pattern_type, _ in expected]
+    for pattern, (_, _, confidence) in zip(patterns, expected):
+        assert pattern['confidence'] == pytest.approx(confidence, abs=1e-5)
+        assert pattern['end_index'] == pattern['start_index'] + detector.window_size - 1
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+import pytest
+import aiohttp
+import uvicorn
+from datetime import datetime, timedelta
+import src.main as main
+from src.data import ForwardReturnTable
+from src.data import market_data
+from src.data.market_data import MarketDataFetcher
+from src.jobs import BacktestJobManager
+from src.models import PatternDetector
+from loadtest import KlineServer, LoadOptions, run_load
+from loadtest.run import main as loadtest_main
+
+class _NoCache:
+    def get(self, key):
+        return None
+
+    def setex(self, key, ttl, value):
+        pass
+
+@pytest.fixture
+def klines():
+    """Serve the Binance stand-in, limited to 5 requests per second"""
+    server = KlineServer(latency_ms=20, requests_per_second=5)
+    server.start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    """Serve the API over HTTP from a background thread"""
+    detector = PatternDetector()
+    monkeypatch.setattr(main, 'detector', detector)
+    monkeypatch.setattr(main, 'batcher', None)
+    monkeypatch.setattr(main, 'precompute', None)
+    monkeypatch.setattr(main, 'backtest_jobs', BacktestJobManager(detector, directory=tmp_path / 'jobs'))
+    monkeypatch.setattr(main, 'return_stats', ForwardReturnTable(detector, tmp_path / 'returns'))
+
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    server = uvicorn.Server(uvicorn.Config(main.app, log_level='warning'))
+    thread = threading.Thread(target=server.run, kwargs={'sockets': [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield 'http://127.0.0.1:%d' % sock.getsockname()[1]
+    server.should_exit = True
+    thread.join()
+    sock.close()
+
+def test_kline_standin(klines, monkeypatch):
+    """Test the stand-in's latency, rate limit and deterministic candles, through the real fetcher"""
+    async def run():
+        async with aiohttp.ClientSession(klines.url) as session:
+            params = {'symbol': 'BTCUSDT', 'interval': '1h', 'startTime': 3_600_000 * 1000 + 1, 'limit': 5}
+            started = time.monotonic()
+            async with session.get('/api/v3/klines', params=params) as response:
+                first = await response.json()
+            latency = time.monotonic() - started
+            async with session.get('/api/v3/klines', params={**params, 'limit': 3}) as response:
+                again = await response.json()
+            async with session.get('/api/v3/klines', params={**params, 'interval': '2h'}) as response:
+                invalid = response.status
+            statuses = []
+            for _ in range(3):
+                async with session.get('/api/v3/ping') as response:
+                    statuses.append((response.status, response.headers.get('Retry-After')))
+            return first, again, invalid, latency, statuses
+
+    first, again, invalid, latency, statuses = asyncio.run(run())
+    assert [row[0] for row in first] == [3_600_000 * t for t in range(1001, 1006)]
+    assert again == first[:3]
+    assert all(float(row[3]) <= min(float(row[1]), float(row[4])) <= float(row[2]) for row in first)
+    assert invalid == 400 and latency >= 0.02
+    assert statuses == [(200, None), (200, None), (429, '1')]  # The sixth request within a second
+    assert klines.throttled == 1
+
+    # The service's Binance client pages through the stand-in like the exchange
+    monkeypatch.setattr(market_data._BinanceClient, 'API_URL', klines.url + '/api')
+    klines.requests_per_second = 0
+    fetcher = MarketDataFetcher(_NoCache())
+    end = datetime(2024, 1, 1)
+    data = fetcher._fetch_binance_data('ETHUSDT', '1h', end - timedelta(days=60), end)
+    assert len(data) == 60 * 24 + 1
+    assert data['timestamp'].is_monotonic_increasing and data['timestamp'].iloc[-1] == end
+
+def test_load_run_reports_throughput_latency_and_errors(service, tmp_path):
+    """Test scenarios are driven concurrently and summarized, errors included"""
+    options = LoadOptions(candles=200, payloads=2, poll_interval_s=0.01)
+    detect = asyncio.run(run_load(service, 'detect', 3, 1.0, options, warmup_s=0.2))
+    backtest = asyncio.run(run_load(service, 'backtest', 2, 1.0, options))
+    unavailable = asyncio.run(run_load(service, 'detect_symbol', 2, 0.3, options))
+    stuck = asyncio.run(run_load(service, 'backtest', 1, 0.1, options._replace(job_timeout_s=0)))
+
+    for summary in (detect, backtest):
+        assert summary['requests'] > 2 and summary['errors'] == 0
+        assert summary['throughput_rps'] == pytest.approx(summary['requests'] / summary['seconds'])
+        latency = summary['latency_ms']
+        assert 0 < latency['p50'] <= latency['p90'] <= latency['p99'] <= latency['max']
+    assert detect['concurrency'] == 3 and detect['scenario'] == 'detect'
+
+    # Precomputation is disabled here, so every symbol request fails
+    assert unavailable['errors'] == unavailable['requests'] > 0
+    assert unavailable['error_breakdown'] == {'HTTP 503': unavailable['requests']}
+    assert unavailable['latency_ms'] == {}
+    assert stuck['error_breakdown'] == {'Backtest timeout': stuck['requests']}
+
+    output = tmp_path / 'results.json'
+    argv = ['--target', service, '--scenarios', 'detect', '--concurrency', '1', '2',
+            '--duration', '0.3', '--warmup', '0', '--candles', '100', '--output', str(output)]
+    assert loadtest_main(argv) == 0
+    results = json.loads(output.read_text())['results']
+    assert [(r['scenario'], r['concurrency'], r['workers']) for r in results] == [('detect', 1, None), ('detect', 2, None)]
@@ -1,9 +1,11 @@
+import asyncio
 import pytest
 import pandas as pd
 import redis
 from datetime import datetime, timedelta
 from src.data import MarketDataFetcher
-from src.config import MARKET_DATA
+from src.data.market_data import create_redis_client
+from src.config import CACHE_SETTINGS, MARKET_DATA
 
 @pytest.fixture
 def redis_client():
@@ -174,4 +176,70 @@ def test_data_validation(market_data_fetcher):
             "1h",
             datetime.now(),
             invalid_df
-        ) 
\ No newline at end of file
+        ) 
+
+
+@pytest.fixture
+def offline_fetcher(fake_redis, monkeypatch):
+    """Create a fetcher over an in-memory Redis with a synthetic upstream"""
+    monkeypatch.setattr(MarketDataFetcher, '_initialize_clients', lambda self: None)
+    fetcher = MarketDataFetcher(fake_redis)
+    fetcher.upstream_calls = []
+
+    def fetch_upstream(symbol, timeframe, start_time, end_time, source):
+        fetcher.upstream_calls.append((symbol, timeframe))
+        if symbol == 'BROKEN':
+            raise ValueError("unknown symbol")
+        return pd.DataFrame({
+            'timestamp': pd.date_range('2023-01-01', periods=3, freq='1h'),
+            'open': [1.0, 2.0, 3.0],
+            'high': [2.0, 3.0, 4.0],
+            'low': [0.5, 1.5, 2.5],
+            'close': [1.5, 2.5, 3.5],
+            'volume': [10.0, 20.0, 30.0]
+        }).assign(close=float(len(symbol)))
+
+    monkeypatch.setattr(fetcher, '_fetch_upstream', fetch_upstream)
+    return fetcher
+
+def test_fetch_many_pipelines_cache_access(offline_fetcher):
+    """Test a bulk fetch costs one cache read and one write whatever its size"""
+    start_time = datetime(2023, 1, 1)
+    symbols = [f"SYM{i}" for i in range(200)]
+    pairs = [(symbol, timeframe) for symbol in symbols for timeframe in ['1h', '4h']]
+    offline_fetcher._cache_data('SYM0', '1h', start_time, pd.DataFrame({
+        'timestamp': [datetime(2023, 1, 1)], 'open': [9.0], 'high': [9.0],
+        'low': [9.0], 'close': [9.0], 'volume': [9.0]
+    }))
+    redis_client = offline_fetcher.redis_client
+    redis_client.round_trips = 0
+
+    results = asyncio.run(offline_fetcher.fetch_many(pairs + [('BROKEN', '1h')], start_time=start_time))
+
+    # One MGET plus one pipeline of SETEX
+    assert redis_client.round_trips == 2
+    assert list(results) == pairs
+    assert results[('SYM0', '1h')]['close'].tolist() == [9.0]
+    assert results[('SYM12', '4h')]['close'].tolist() == [5.0] * 3
+    assert len(offline_fetcher.upstream_calls) == len(pairs)
+    assert ('SYM0', '1h') not in offline_fetcher.upstream_calls
+    assert redis_client.dbsize() == len(pairs)
+    ttl_ms = CACHE_SETTINGS['market_data_cache_ttl'] * 1000
+    assert all(ttl_ms - 5000 < redis_client.pttl(key) <= ttl_ms for key in redis_client.keys())
+
+    # Everything is cached now; a second warmup never goes upstream
+    offline_fetcher.upstream_calls.clear()
+    redis_client.round_trips = 0
+    again = asyncio.run(offline_fetcher.fetch_many(pairs, start_time=start_time))
+    assert offline_fetcher.upstream_calls == []
+    assert redis_client.round_trips == 1
+    assert list(again) == pairs
+    assert again[('SYM12', '4h')]['close'].tolist() == [5.0] * 3
+
+def test_pooled_redis_client():
+    """Test the default client shares a bounded blocking connection pool"""
+    client = create_redis_client('localhost', 6390, 0, 8)
+
+    assert isinstance(client.connection_pool, redis.BlockingConnectionPool)
+    assert client.connection_pool.max_connections == 8
+    assert create_redis_client('localhost', 6390, 0, 8) is client
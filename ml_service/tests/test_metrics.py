@@ -0,0 +1,158 @@
+import os
+import subprocess
+import sys
+import pytest
+import pandas as pd
+import numpy as np
+from fastapi.testclient import TestClient
+from src.monitoring.metrics import MetricsRegistry, STAGE_DURATION, time_stage
+from src.main import app
+
+@pytest.fixture
+def registry():
+    """Create an empty MetricsRegistry"""
+    return MetricsRegistry()
+
+@pytest.fixture
+def client():
+    """Create a test client for the API"""
+    return TestClient(app)
+
+@pytest.fixture
+def candles():
+    """Create a sample /detect/ payload"""
+    dates = pd.date_range(start='2023-01-01', periods=100, freq='1h')
+    rng = np.random.default_rng(0)
+    close = 100 + np.cumsum(rng.normal(0, 1, 100))
+    return [
+        {
+            'timestamp': timestamp.isoformat(),
+            'open': float(c + rng.normal(0, 0.5)),
+            'high': float(c + 1.5),
+            'low': float(c - 1.5),
+            'close': float(c),
+            'volume': 1000000.0
+        }
+        for timestamp, c in zip(dates, close)
+    ]
+
+def test_histogram_buckets(registry):
+    """Test histogram bucket counts, sum and text rendering"""
+    histogram = registry.histogram(
+        'test_latency_seconds', 'Test latency', ('stage',), buckets=(0.1, 1.0)
+    )
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value, stage='parse')
+
+    assert histogram.count(stage='parse') == 4
+    assert histogram.sum(stage='parse') == pytest.approx(2.65)
+
+    text = registry.render()
+    assert '# TYPE test_latency_seconds histogram' in text
+    assert 'test_latency_seconds_bucket{stage="parse",le="0.1"} 2' in text
+    assert 'test_latency_seconds_bucket{stage="parse",le="1.0"} 3' in text
+    assert 'test_latency_seconds_bucket{stage="parse",le="+Inf"} 4' in text
+    assert 'test_latency_seconds_count{stage="parse"} 4' in text
+
+def test_counter_and_gauge(registry):
+    """Test counter and gauge updates"""
+    counter = registry.counter('test_cache_requests', 'Test cache', ('result',))
+    counter.inc(result='hit')
+    counter.inc(2, result='miss')
+    gauge = registry.gauge('test_queue_depth', 'Test queue')
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+
+    assert counter.get(result='hit') == 1
+    assert counter.get(result='miss') == 2
+    assert gauge.get() == 1
+
+    text = registry.render()
+    assert 'test_cache_requests_total{result="miss"} 2.0' in text
+    assert '# HELP test_cache_requests_total Test cache' in text
+    assert '# TYPE test_cache_requests_total counter' in text
+    assert '# TYPE test_queue_depth gauge' in text
+    assert 'test_queue_depth 1.0' in text
+
+    with pytest.raises(ValueError):
+        counter.inc(stage='unknown')
+    with pytest.raises(ValueError):
+        registry.counter('test_cache_requests', 'Duplicate')
+
+def test_label_escaping(registry):
+    """Test that label values are escaped in the text format"""
+    counter = registry.counter('test_escaping', 'Escaping', ('path',))
+    counter.inc(path='a"b\\c')
+    assert 'test_escaping_total{path="a\\"b\\\\c"} 1.0' in registry.render()
+
+def _worker_registry():
+    """The metrics of a second process, registered like in the first"""
+    registry = MetricsRegistry()
+    counter = registry.counter('test_requests', 'Requests', ('path',))
+    gauge = registry.gauge('test_in_flight', 'In flight')
+    peak = registry.gauge('test_hot', 'Hot streams', multiprocess_mode='max')
+    histogram = registry.histogram('test_latency_seconds', 'Latency', buckets=(0.1, 1.0))
+    return registry, counter, gauge, peak, histogram
+
+def test_registries_shared_between_processes(tmp_path):
+    """Test renders merge every process's published values, dropping exited processes' gauges"""
+    other, counter, gauge, peak, histogram = _worker_registry()
+    counter.inc(2, path='/a')
+    gauge.inc(3)
+    peak.set(5)
+    histogram.observe(0.5)
+    other.directory = tmp_path
+    other.publish()
+    published = tmp_path / f'{os.getpid()}.json'
+    exited = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+    (tmp_path / f'{exited.stdout.strip()}.json').write_text(published.read_text())
+    published.rename(tmp_path / f'{os.getppid()}.json')  # A live process
+
+    registry, counter, gauge, peak, histogram = _worker_registry()
+    counter.inc(path='/a')
+    counter.inc(path='/b')
+    gauge.inc()
+    peak.set(4)
+    histogram.observe(2.0)
+    registry.share(tmp_path, interval_s=60)
+    try:
+        text = registry.render()
+        registry.publish()
+        assert (tmp_path / f'{os.getpid()}.json').exists()
+    finally:
+        registry.unshare()
+
+    assert 'test_requests_total{path="/a"} 5.0' in text  # 1 + 2 live + 2 exited
+    assert 'test_requests_total{path="/b"} 1.0' in text
+    assert 'test_in_flight 4.0' in text  # The exited process's 3 no longer count
+    assert 'test_hot 5.0' in text
+    assert 'test_latency_seconds_bucket{le="1.0"} 2' in text
+    assert 'test_latency_seconds_count 3' in text
+    assert 'test_latency_seconds_sum 3.0' in text
+    assert 'test_requests_total{path="/a"} 1.0' in registry.render()  # Unshared: this process only
+
+def test_time_stage():
+    """Test that time_stage records even when the stage raises"""
+    before = STAGE_DURATION.count(stage='test_stage')
+    with time_stage('test_stage'):
+        pass
+    with pytest.raises(RuntimeError):
+        with time_stage('test_stage'):
+            raise RuntimeError("boom")
+    assert STAGE_DURATION.count(stage='test_stage') == before + 2
+
+def test_metrics_endpoint(client, candles):
+    """Test that /detect/ is instrumented and exposed on /metrics"""
+    response = client.post('/detect/', json={'data': candles, 'timeframe': '1h'})
+    assert response.status_code == 200
+    assert isinstance(response.json(), list)
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain')
+    text = response.text
+    assert 'http_request_duration_seconds_count{method="POST",path="/detect/",status="200"}' in text
+    for stage in ('parse', 'talib', 'serialize'):
+        assert f'stage_duration_seconds_count{{stage="{stage}"}}' in text
+    assert 'http_requests_in_flight' in text
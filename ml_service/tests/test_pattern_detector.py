@@ -2,8 +2,11 @@ import pytest
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+import torch
 from src.models import PatternDetector
 from src.config import PATTERN_SETTINGS
+from src.models.inference import TorchBackend
+from src.models.sequence_classifier import CandleCNN
 
 @pytest.fixture
 def sample_data():
@@ -88,6 +91,31 @@ def test_pattern_analysis(pattern_detector, sample_data):
     assert 'price_range' in analysis['analysis']
     assert 'volume_intensity' in analysis['analysis']
 
+def test_analyze_patterns_matches_analyze_pattern(pattern_detector, sample_data):
+    """Test batch analysis against per-pattern analysis"""
+    patterns = [
+        {
+            'pattern_name': 'TEST_PATTERN',
+            'confidence': 0.8,
+            'start_index': start,
+            'end_index': start + length - 1,
+            'pattern_type': 'bullish'
+        }
+        for start in range(0, 90, 7)
+        for length in (1, 2, 3, 5, 10)
+    ]
+    
+    batch = pattern_detector.analyze_patterns(patterns, sample_data)
+    
+    assert len(batch) == len(patterns)
+    for pattern, result in zip(patterns, batch):
+        expected = pattern_detector.analyze_pattern(pattern, sample_data)['analysis']
+        assert result['pattern_name'] == pattern['pattern_name']
+        for key, value in expected.items():
+            assert result['analysis'][key] == pytest.approx(value)
+    
+    assert pattern_detector.analyze_patterns([], sample_data) == []
+
 def test_detect_patterns_integration(pattern_detector, sample_data):
     """Test the complete pattern detection pipeline"""
     patterns = pattern_detector.detect_patterns(sample_data)
@@ -136,4 +164,78 @@ def test_edge_cases(pattern_detector):
         'volume': ['invalid']
     })
     with pytest.raises(Exception):
-        pattern_detector.detect_patterns(invalid_df) 
\ No newline at end of file
+        pattern_detector.detect_patterns(invalid_df) 
+
+
+def _universe(n_symbols, n_bars, seed=3):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, (n_symbols, n_bars)), axis=1)
+    open_ = close + rng.normal(0, 0.5, close.shape)
+    high = np.maximum(open_, close) + np.abs(rng.normal(0, 1, close.shape))
+    low = np.minimum(open_, close) - np.abs(rng.normal(0, 1, close.shape))
+    return open_, high, low, close
+
+def test_scan_universe_matches_per_symbol(pattern_detector):
+    """Test the universe scan finds exactly the per-symbol TA-Lib hits"""
+    matrices = _universe(40, 300)
+    # A symbol listed mid-window and one with a gap
+    for prices in matrices:
+        prices[3, :120] = np.nan
+        prices[7, 150] = np.nan
+
+    hits = pattern_detector.scan_universe(*matrices)
+
+    expected = set()
+    for row in range(40):
+        frame = pd.DataFrame({name: prices[row] for name, prices in zip(['open', 'high', 'low', 'close'], matrices)})
+        for name, signal in pattern_detector.detect_pattern_signals(frame).items():
+            pattern_id = hits.pattern_names.index(name)
+            expected.update((row, int(bar), pattern_id, int(signal[bar])) for bar in np.flatnonzero(signal))
+
+    assert hits.shape == (40, 300)
+    assert hits.strength.dtype == np.int32
+    assert set(zip(*(a.tolist() for a in hits[:4]))) == expected
+    assert len(hits) == len(expected)
+    assert np.all(np.diff(hits.symbol) >= 0)
+
+def test_scan_universe_options(pattern_detector):
+    """Test pattern subsets, strength filtering and shape checks"""
+    matrices = _universe(5, 100)
+
+    hits = pattern_detector.scan_universe(*matrices, patterns=['ENGULFING', 'DOJI'], min_strength=100)
+    assert hits.pattern_names == ['DOJI', 'ENGULFING']
+    assert np.all(np.abs(hits.strength) >= 100)
+
+    empty = pattern_detector.scan_universe(*(m[:, :0] for m in matrices))
+    assert len(empty) == 0 and empty.shape == (5, 0)
+
+    with pytest.raises(ValueError):
+        pattern_detector.scan_universe(matrices[0], matrices[1][:4], matrices[2], matrices[3])
+
+def test_tail_only_detection(pattern_detector, monkeypatch):
+    """Test since_index/last_n find exactly the full run's patterns ending in the tail"""
+    open_, high, low, close = (prices[0] for prices in _universe(1, 3000, seed=8))
+    data = pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close, 'volume': np.full(3000, 1e6)})
+    full = pattern_detector.detect_pattern_signals(data)
+    for since in (1, 9, 12, 60, 2990, 3000):
+        tail = pattern_detector.detect_pattern_signals(data, since_index=since)
+        assert all(np.array_equal(tail[name], full[name][since:]) for name in full)
+
+    # A small ML model, with every window reported
+    torch.manual_seed(0)
+    monkeypatch.setitem(PATTERN_SETTINGS, 'confidence_threshold', 0.0)
+    pattern_detector.inference_backend = TorchBackend(CandleCNN(), intra_op_threads=0)
+
+    def key(pattern):
+        return pattern['end_index'], pattern['pattern_name'], pattern['start_index']
+
+    everything = pattern_detector.detect_patterns(data)
+    for kwargs, since in (({'last_n': 40}, 2960), ({'since_index': 2900, 'last_n': 500}, 2900), ({'since_index': 5}, 5)):
+        recent = pattern_detector.detect_patterns(data, **kwargs)
+        expected = [p for p in everything if p['end_index'] >= since]
+        assert sorted(recent, key=key) == sorted(expected, key=key)
+        assert any(p['detection_method'] == 'transformer' for p in recent)
+    assert pattern_detector.detect_patterns(data, last_n=0) == []
+
+    with pytest.raises(ValueError):
+        pattern_detector.detect_patterns(data, since_index=-1)
@@ -0,0 +1,160 @@
+import pytest
+import pandas as pd
+import numpy as np
+from src.data import PatternIndex
+from src.models import PatternDetector, PatternBacktester
+
+@pytest.fixture
+def sample_data():
+    """Create sample OHLCV data for testing"""
+    rng = np.random.default_rng(7)
+    dates = pd.date_range(start='2023-01-01', periods=500, freq='1h')
+    close = 100 + np.cumsum(rng.normal(0, 1, 500))
+    data = pd.DataFrame({
+        'timestamp': dates,
+        'open': close + rng.normal(0, 0.5, 500),
+        'high': close + np.abs(rng.normal(0, 1, 500)),
+        'low': close - np.abs(rng.normal(0, 1, 500)),
+        'close': close,
+        'volume': rng.normal(1000000, 200000, 500)
+    })
+
+    # Ensure high is highest and low is lowest
+    data['high'] = data[['open', 'high', 'close']].max(axis=1)
+    data['low'] = data[['open', 'low', 'close']].min(axis=1)
+
+    return data
+
+@pytest.fixture(scope='module')
+def pattern_detector():
+    """Create a PatternDetector instance"""
+    return PatternDetector()
+
+@pytest.fixture
+def pattern_index(pattern_detector, tmp_path):
+    """Create a PatternIndex stored in a temporary directory"""
+    return PatternIndex(pattern_detector, directory=tmp_path)
+
+def test_update_indexes_all_signals(pattern_index, pattern_detector, sample_data):
+    """Test that a full update records every non-zero TA-Lib output"""
+    added = pattern_index.update('BTCUSDT', '1h', sample_data)
+    signals = pattern_detector.detect_pattern_signals(sample_data)
+
+    assert added == sum(int(np.count_nonzero(v)) for v in signals.values())
+    assert pattern_index.indexed_bars('BTCUSDT', '1h') == len(sample_data)
+
+    hits = pattern_index.query('BTCUSDT', '1h')
+    assert hits['bar_index'].dtype == np.int32
+    assert hits['pattern_id'].dtype == np.int32
+    assert hits['strength'].dtype == np.int32
+    for bar, pattern_id, strength in zip(hits['bar_index'], hits['pattern_id'], hits['strength']):
+        name = pattern_index.pattern_names[pattern_id]
+        assert signals[name][bar] == strength
+
+def test_incremental_update_matches_full_update(pattern_detector, sample_data, tmp_path):
+    """Test that appending candles in chunks matches indexing all at once"""
+    full = PatternIndex(pattern_detector, directory=tmp_path / 'full')
+    full.update('BTCUSDT', '1h', sample_data)
+
+    incremental = PatternIndex(pattern_detector, directory=tmp_path / 'incremental')
+    incremental.update('BTCUSDT', '1h', sample_data.iloc[:200])
+    for end in range(210, 501, 10):
+        # Overlapping windows, as a live feed would deliver them
+        incremental.update('BTCUSDT', '1h', sample_data.iloc[max(0, end - 60):end])
+    assert incremental.update('BTCUSDT', '1h', sample_data) == 0
+
+    expected = full.query('BTCUSDT', '1h')
+    actual = incremental.query('BTCUSDT', '1h')
+    for key in expected:
+        np.testing.assert_array_equal(actual[key], expected[key])
+
+def test_query_filters(pattern_index, sample_data):
+    """Test filtering by pattern, direction and time range"""
+    pattern_index.update('BTCUSDT', '1h', sample_data)
+    all_hits = pattern_index.query('BTCUSDT', '1h')
+
+    doji_id = pattern_index.pattern_names.index('DOJI')
+    doji = pattern_index.query('BTCUSDT', '1h', patterns=['DOJI'])
+    assert np.all(doji['pattern_id'] == doji_id)
+    assert len(doji['bar_index']) == np.count_nonzero(all_hits['pattern_id'] == doji_id)
+
+    bullish = pattern_index.query('BTCUSDT', '1h', direction='bullish')
+    bearish = pattern_index.query('BTCUSDT', '1h', direction='bearish')
+    assert np.all(bullish['strength'] > 0)
+    assert np.all(bearish['strength'] < 0)
+    assert len(bullish['bar_index']) + len(bearish['bar_index']) == len(all_hits['bar_index'])
+
+    start = sample_data['timestamp'].iloc[100]
+    end = sample_data['timestamp'].iloc[199]
+    window = pattern_index.query('BTCUSDT', '1h', start_time=start, end_time=end)
+    assert np.all((window['bar_index'] >= 100) & (window['bar_index'] <= 199))
+
+    with pytest.raises(ValueError):
+        pattern_index.query('BTCUSDT', '1h', direction='sideways')
+
+def test_index_persists(pattern_detector, pattern_index, sample_data, tmp_path):
+    """Test that a new index instance reads what was written to disk"""
+    pattern_index.update('BTCUSDT', '1h', sample_data)
+    reloaded = PatternIndex(pattern_detector, directory=tmp_path)
+
+    assert reloaded.indexed_bars('BTCUSDT', '1h') == len(sample_data)
+    expected = pattern_index.query('BTCUSDT', '1h')
+    actual = reloaded.query('BTCUSDT', '1h')
+    for key in expected:
+        np.testing.assert_array_equal(actual[key], expected[key])
+
+    assert reloaded.indexed_bars('ETHUSDT', '1h') == 0
+
+def test_update_requires_context(pattern_index, sample_data):
+    """Test frames that do not repeat the last context bars are rejected"""
+    pattern_index.update('BTCUSDT', '1h', sample_data.iloc[:200])
+    before = pattern_index.query('BTCUSDT', '1h')
+
+    with pytest.raises(ValueError):
+        # Only 5 bars of overlap
+        pattern_index.update('BTCUSDT', '1h', sample_data.iloc[195:260])
+    with pytest.raises(ValueError):
+        # Leaves a gap after the last indexed bar
+        pattern_index.update('BTCUSDT', '1h', pd.concat((sample_data.iloc[150:199], sample_data.iloc[201:260])))
+
+    assert pattern_index.indexed_bars('BTCUSDT', '1h') == 200
+    np.testing.assert_array_equal(pattern_index.query('BTCUSDT', '1h')['bar_index'], before['bar_index'])
+    assert pattern_index.update('BTCUSDT', '1h', sample_data.iloc[200 - pattern_index.context_bars:260]) > 0
+
+def test_indexes_shared_between_processes(pattern_detector, sample_data, tmp_path):
+    """Test an index sees updates another instance (worker) saved to the same directory"""
+    first = PatternIndex(pattern_detector, directory=tmp_path)
+    second = PatternIndex(pattern_detector, directory=tmp_path)
+    first.update('BTCUSDT', '1h', sample_data.iloc[:200])
+    assert second.indexed_bars('BTCUSDT', '1h') == 200
+
+    second.update('BTCUSDT', '1h', sample_data.iloc[150:300])
+    assert first.update('BTCUSDT', '1h', sample_data.iloc[150:300]) == 0
+    assert first.indexed_bars('BTCUSDT', '1h') == 300
+
+def test_backtest_index_matches_detection(pattern_detector, pattern_index, sample_data):
+    """Test that backtesting from the index matches backtesting detected patterns"""
+    pattern_index.update('BTCUSDT', '1h', sample_data)
+    backtester = PatternBacktester()
+    data = sample_data.set_index('timestamp')
+
+    detected = pattern_detector._detect_patterns_talib(sample_data)
+    expected = backtester.backtest_pattern(data, detected)
+    actual = backtester.backtest_index(data, pattern_index, 'BTCUSDT', '1h')
+
+    def trade_key(trade):
+        return (trade['entry_time'], trade['pattern_name'])
+
+    expected_trades = sorted(expected['trade_results'], key=trade_key)
+    actual_trades = sorted(actual['trade_results'], key=trade_key)
+    assert len(actual_trades) == len(expected_trades) > 0
+    for a, e in zip(actual_trades, expected_trades):
+        assert a['exit_time'] == e['exit_time']
+        assert a['return'] == pytest.approx(e['return'])
+
+    # A sub-range of the data only sees occurrences inside it
+    partial = backtester.backtest_index(data.iloc[250:], pattern_index, 'BTCUSDT', '1h')
+    assert all(
+        trade['entry_time'] > data.index[250]
+        for trade in partial['trade_results']
+    )
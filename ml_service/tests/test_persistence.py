@@ -0,0 +1,198 @@
+import asyncio
+import threading
+import pytest
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from fastapi.testclient import TestClient
+import src.main as main
+from src.models import PatternBacktester, PatternDetector
+from src.persistence import InMemoryResultStore, ResultStore, ResultWriter
+from src.persistence.documents import backtest_document
+from src.persistence.writer import RESULT_DOCUMENTS_DROPPED, RESULT_WRITE_RETRIES
+
+@pytest.fixture
+def sample_data():
+    """Create sample OHLCV data for testing"""
+    rng = np.random.default_rng(9)
+    dates = pd.date_range(start='2023-01-01', periods=400, freq='1h')
+    close = 100 + np.cumsum(rng.normal(0, 1, 400))
+    data = pd.DataFrame({
+        'timestamp': dates,
+        'open': close + rng.normal(0, 0.5, 400),
+        'high': close + np.abs(rng.normal(0, 1, 400)),
+        'low': close - np.abs(rng.normal(0, 1, 400)),
+        'close': close,
+        'volume': rng.lognormal(13, 0.5, 400)
+    })
+
+    # Ensure high is highest and low is lowest
+    data['high'] = data[['open', 'high', 'close']].max(axis=1)
+    data['low'] = data[['open', 'low', 'close']].min(axis=1)
+
+    return data
+
+def _patterns(count, n_candles=400):
+    return [
+        {
+            'pattern_name': f"PATTERN_{i % 7}",
+            'confidence': 0.8,
+            'start_index': max(0, i % n_candles - 2),
+            'end_index': i % n_candles,
+            'pattern_type': 'bullish' if i % 2 else 'bearish'
+        }
+        for i in range(count)
+    ]
+
+class _FlakyStore(InMemoryResultStore):
+    """In-memory store whose first writes raise"""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def upsert_many(self, collection, documents, key_fields):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("connection reset")
+        super().upsert_many(collection, documents, key_fields)
+
+class _BlockingStore(InMemoryResultStore):
+    """In-memory store whose writes wait until released"""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def insert_many(self, collection, documents):
+        self.release.wait(5)
+        super().insert_many(collection, documents)
+
+def test_patterns_are_bulk_written(sample_data):
+    """Test many patterns cost one round trip per batch and re-detection does not duplicate"""
+    store = InMemoryResultStore()
+
+    async def run():
+        writer = ResultWriter(store, batch_size=1000, flush_interval_ms=50)
+        created_at = datetime(2024, 1, 1)
+        await writer.write_patterns('BTCUSDT', '1h', _patterns(400 * 7), sample_data, created_at)
+        await writer.flush()
+        assert store.writes == [('upsert', 'patterns', 1000)] * 2 + [('upsert', 'patterns', 800)]
+
+        # Re-detected patterns update in place and keep their creation time
+        await writer.write_patterns('BTCUSDT', '1h', _patterns(400 * 7), sample_data)
+        await writer.stop()
+
+    asyncio.run(run())
+
+    documents = store.collections['patterns']
+    assert len(documents) == 400 * 7
+    assert all(document['createdAt'] == datetime(2024, 1, 1) for document in documents)
+    first = documents[1]
+    assert first['symbol'] == 'BTCUSDT'
+    assert first['patternType'] == 'bullish'
+    assert first['endTime'] == sample_data['timestamp'][1].to_pydatetime()
+    assert first['startTime'] == sample_data['timestamp'][0].to_pydatetime()
+    assert first['detectionMethod'] == 'talib'
+
+def test_writes_keep_order_across_collections():
+    """Test interleaved kinds of writes reach the store in queue order"""
+    store = InMemoryResultStore()
+
+    async def run():
+        writer = ResultWriter(store, batch_size=100, flush_interval_ms=50)
+        await writer.insert('backtests', [{'n': 0}, {'n': 1}])
+        await writer.upsert('patterns', [{'k': 1, 'n': 2}], ['k'])
+        await writer.insert('backtests', [{'n': 3}])
+        await writer.stop()
+
+    asyncio.run(run())
+
+    assert store.writes == [('insert', 'backtests', 2), ('upsert', 'patterns', 1), ('insert', 'backtests', 1)]
+    assert [d['n'] for d in store.collections['backtests']] == [0, 1, 3]
+
+    class InsertOnly(ResultStore):
+        def insert_many(self, collection, documents):
+            pass
+
+    with pytest.raises(TypeError):
+        InsertOnly()  # A store must implement both batch writes
+
+def test_failed_writes_are_retried_then_dropped():
+    """Test transient errors are retried and persistent ones drop the batch"""
+    documents = [{'k': i} for i in range(10)]
+
+    async def run(store, max_retries):
+        writer = ResultWriter(store, flush_interval_ms=1, max_retries=max_retries, retry_backoff_ms=1)
+        await writer.upsert('patterns', documents, ['k'])
+        await writer.stop()
+
+    retries = RESULT_WRITE_RETRIES.get(collection='patterns')
+    flaky = _FlakyStore(failures=2)
+    asyncio.run(run(flaky, max_retries=3))
+    assert len(flaky.collections['patterns']) == 10
+    assert RESULT_WRITE_RETRIES.get(collection='patterns') - retries == 2
+
+    dropped = RESULT_DOCUMENTS_DROPPED.get(collection='patterns')
+    broken = _FlakyStore(failures=100)
+    asyncio.run(run(broken, max_retries=2))
+    assert 'patterns' not in broken.collections
+    assert RESULT_DOCUMENTS_DROPPED.get(collection='patterns') - dropped == 10
+
+def test_backpressure_when_buffer_full():
+    """Test producers wait once the buffer is full instead of queuing without bound"""
+    store = _BlockingStore()
+
+    async def run():
+        writer = ResultWriter(store, batch_size=5, max_buffered=10, flush_interval_ms=1)
+        producer = asyncio.create_task(writer.insert('backtests', [{'n': i} for i in range(100)]))
+        await asyncio.sleep(0.2)
+        assert not producer.done()
+        assert writer._queue.qsize() <= 10
+
+        store.release.set()
+        await asyncio.wait_for(producer, 5)
+        await writer.stop()
+
+    asyncio.run(run())
+
+    assert [d['n'] for d in store.collections['backtests']] == list(range(100))
+    assert all(count <= 5 for _, _, count in store.writes)
+
+def test_backtest_document(sample_data):
+    """Test backtest results convert to plain Backtest documents"""
+    detector = PatternDetector()
+    data = sample_data.set_index('timestamp', drop=False)
+    results = PatternBacktester().backtest_pattern(data, detector.detect_patterns(data, use_ml=False))
+
+    document = backtest_document('BTCUSDT', '1h', results, data)
+
+    trades = document['results']['trades']
+    assert len(trades) == len(results['trade_results']) > 0
+    assert document['results']['summary']['totalTrades'] == len(trades)
+    assert isinstance(document['results']['summary']['winRate'], float)
+    assert isinstance(trades[0]['entry']['time'], datetime)
+    assert {trade['exit']['type'] for trade in trades} <= {'sl', 'tp', 'market'}
+    assert document['configuration']['startDate'] == sample_data['timestamp'][0].to_pydatetime()
+
+def test_detect_endpoint_persists_patterns(sample_data, monkeypatch):
+    """Test /detect/ with a symbol queues its patterns for persistence"""
+    store = InMemoryResultStore()
+    monkeypatch.setattr(main, 'result_writer', ResultWriter(store, flush_interval_ms=1))
+    monkeypatch.setattr(main, 'batcher', None)
+    payload = {
+        'data': sample_data.astype({'timestamp': str}).to_dict(orient='records'),
+        'timeframe': '1h',
+        'symbol': 'ETHUSDT'
+    }
+
+    with TestClient(main.app) as client:
+        patterns = client.post('/detect/', json=payload).json()
+        unnamed = client.post('/detect/', json={**payload, 'symbol': None})
+    assert unnamed.status_code == 200
+
+    documents = store.collections['patterns']
+    assert len(documents) == len(patterns) > 0
+    assert {d['symbol'] for d in documents} == {'ETHUSDT'}
+    assert sorted((d['patternName'], d['endIndex']) for d in documents) == \
+        sorted((p['pattern_name'], p['end_index']) for p in patterns)
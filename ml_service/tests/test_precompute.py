@@ -0,0 +1,259 @@
+import asyncio
+import pytest
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+import src.main as main
+from src.data import ForwardReturnTable, PatternIndex
+from src.jobs import DetectionCache, PopularityTracker, PrecomputeScheduler, RedisPopularityTracker
+from src.jobs.precompute import candle_boundary
+from src.models import PatternDetector
+
+HOUR = 3600
+NOW = 1_700_000_000 // HOUR * HOUR + 10  # Ten seconds after an hourly close
+
+class _StandInFetcher:
+    """Serves generated candles for any symbol and records each fetch"""
+
+    def __init__(self, n_candles=300):
+        self.n_candles = n_candles
+        self.calls = []
+
+    def candles(self, symbol, end_time):
+        rng = np.random.default_rng(sum(map(ord, symbol)))
+        close = 100 + np.cumsum(rng.normal(0, 1, self.n_candles))
+        data = pd.DataFrame({
+            'timestamp': pd.date_range(end=end_time, periods=self.n_candles, freq='1h').floor('h'),
+            'open': close + rng.normal(0, 0.5, self.n_candles),
+            'high': close + np.abs(rng.normal(0, 1, self.n_candles)),
+            'low': close - np.abs(rng.normal(0, 1, self.n_candles)),
+            'close': close,
+            'volume': rng.lognormal(13, 0.5, self.n_candles)
+        })
+        data['high'] = data[['open', 'high', 'close']].max(axis=1)
+        data['low'] = data[['open', 'low', 'close']].min(axis=1)
+        return data
+
+    async def fetch_many(self, pairs, start_time=None, end_time=None, source='binance'):
+        pairs = list(pairs)
+        self.calls.append((pairs, start_time, end_time))
+        await asyncio.sleep(0.01)
+        return {pair: self.candles(pair[0], end_time) for pair in pairs if pair[0] != 'MISSING'}
+
+@pytest.fixture(scope='module')
+def detector():
+    return PatternDetector()
+
+@pytest.fixture
+def clock():
+    return type('Clock', (), {'now': NOW, '__call__': lambda self: self.now})()
+
+@pytest.fixture
+def scheduler(detector, clock, fake_redis):
+    return PrecomputeScheduler(
+        detector,
+        fetcher=_StandInFetcher(),
+        cache=DetectionCache(fake_redis),
+        min_popularity=2,
+        settle_delay_s=2,
+        clock=clock
+    )
+
+def test_popularity_tracker(clock):
+    """Test scores decay with time and the least popular streams are forgotten"""
+    tracker = PopularityTracker(half_life_s=60, max_tracked=4, clock=clock)
+    for _ in range(4):
+        tracker.record('BTCUSDT', '1h')
+    tracker.record('ETHUSDT', '1h', count=3)
+    tracker.record('SOLUSDT', '4h')
+
+    assert tracker.hot(limit=5, min_score=1) == [('BTCUSDT', '1h'), ('ETHUSDT', '1h'), ('SOLUSDT', '4h')]
+    assert tracker.hot(limit=1, min_score=1) == [('BTCUSDT', '1h')]
+
+    clock.now += 60
+    assert tracker.score('BTCUSDT', '1h') == pytest.approx(2)
+    assert tracker.hot(limit=5, min_score=1) == [('BTCUSDT', '1h'), ('ETHUSDT', '1h')]
+
+    for symbol in ('A', 'B', 'C'):
+        tracker.record(symbol, '1h')
+    assert len(tracker) <= 4
+    assert tracker.score('BTCUSDT', '1h') > 0
+
+def test_redis_popularity_tracker(clock, fake_redis):
+    """Test workers share decayed scores in Redis, across epochs, and the least popular are forgotten"""
+    first = RedisPopularityTracker(fake_redis, half_life_s=60, max_tracked=4, clock=clock)
+    second = RedisPopularityTracker(fake_redis, half_life_s=60, max_tracked=4, clock=clock)
+    for _ in range(2):
+        first.record('BTCUSDT', '1h')
+        second.record('BTCUSDT', '1h')
+    second.record('ETHUSDT', '1h', count=3)
+    first.record('SOLUSDT', '4h')
+
+    assert first.score('BTCUSDT', '1h') == pytest.approx(4)
+    assert second.hot(limit=5, min_score=1) == [('BTCUSDT', '1h'), ('ETHUSDT', '1h'), ('SOLUSDT', '4h')]
+
+    # Scores halve every half-life, also when the next epoch has started
+    clock.now = (NOW // first.epoch_s + 1) * first.epoch_s + 30
+    elapsed = clock.now - NOW
+    assert first.score('BTCUSDT', '1h') == pytest.approx(4 * 0.5 ** (elapsed / 60))
+    first.record('BTCUSDT', '1h')
+    assert second.score('BTCUSDT', '1h') == pytest.approx(1 + 4 * 0.5 ** (elapsed / 60))
+    assert second.hot(limit=5, min_score=0.5) == [('BTCUSDT', '1h')]
+
+    for symbol in ('A', 'B', 'C', 'D', 'E'):
+        second.record(symbol, '1h')
+    assert len(first) <= 4 + 3  # This epoch's set is trimmed; the last one's three remain
+    assert first.score('BTCUSDT', '1h') > 0
+
+def test_refresh_publishes_hot_streams(scheduler, clock, detector):
+    """Test a round fetches the hot streams together and caches their patterns"""
+    for _ in range(3):
+        scheduler.record('BTCUSDT', '1h')
+        scheduler.record('ETHUSDT', '1h')
+    scheduler.record('DOGEUSDT', '1h')  # Not popular enough
+
+    async def run():
+        assert await scheduler.refresh() == 2
+        assert await scheduler.refresh() == 0  # Nothing new has closed
+        clock.now += HOUR  # Popularity halves, and the next dashboards arrive
+        scheduler.record('BTCUSDT', '1h')
+        scheduler.record('ETHUSDT', '1h')
+        assert await scheduler.refresh() == 2
+
+    asyncio.run(run())
+
+    fetcher = scheduler.fetcher
+    assert len(fetcher.calls) == 2
+    pairs, start_time, end_time = fetcher.calls[0]
+    assert sorted(pairs) == [('BTCUSDT', '1h'), ('ETHUSDT', '1h')]
+    close_time = candle_boundary('1h', NOW)
+    assert pd.Timestamp(end_time).value // 1_000_000 == close_time - 1
+    assert pd.Timestamp(start_time).value // 1_000_000 == close_time - 500 * HOUR * 1000
+
+    entry = scheduler.cache.get('BTCUSDT', '1h')
+    assert entry['close_time'] == close_time + HOUR * 1000
+    expected = detector.detect_patterns(fetcher.candles('BTCUSDT', end_time), use_ml=False)
+    assert len(entry['patterns']) == len(expected) > 0
+    assert [p['pattern_name'] for p in entry['patterns']] == [p['pattern_name'] for p in expected]
+    assert all(p['end_time'] < entry['close_time'] for p in entry['patterns'])
+    assert scheduler.cache.get('DOGEUSDT', '1h') is None
+
+def test_concurrent_misses_share_one_detection(scheduler):
+    """Test a burst of requests for a cold stream computes it once"""
+
+    async def run():
+        results = await asyncio.gather(*(scheduler.detect('SOLUSDT', '1h') for _ in range(20)))
+        again = await scheduler.detect('SOLUSDT', '1h')
+        return results, again
+
+    results, (entry, hit) = asyncio.run(run())
+
+    assert len(scheduler.fetcher.calls) == 1
+    assert not any(hit for _, hit in results)
+    assert hit and entry['patterns'] == results[0][0]['patterns']
+    assert scheduler.tracker.score('SOLUSDT', '1h') == pytest.approx(21)
+
+def test_scheduled_rounds(scheduler, clock):
+    """Test the scheduler wakes after each settled close and skips streams claimed elsewhere"""
+    for _ in range(3):
+        scheduler.record('BTCUSDT', '1h')
+        scheduler.record('ETHUSDT', '1h')
+    assert scheduler._next_wake(NOW) == scheduler.poll_interval_s
+    assert scheduler._next_wake(NOW - 10 + HOUR - 1) == pytest.approx(3)
+
+    # Another worker already took ETHUSDT for this close
+    scheduler.cache.claim('ETHUSDT', '1h', candle_boundary('1h', NOW))
+    scheduler.poll_interval_s = 0.01
+
+    async def run():
+        scheduler.start()
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if scheduler.cache.get('BTCUSDT', '1h'):
+                break
+        await scheduler.stop()
+
+    asyncio.run(run())
+
+    assert scheduler.cache.get('BTCUSDT', '1h') is not None
+    assert scheduler.cache.get('ETHUSDT', '1h') is None
+    assert [call[0] for call in scheduler.fetcher.calls] == [[('BTCUSDT', '1h')]]
+
+def test_failed_streams_are_retried_with_backoff(scheduler, clock):
+    """Test a stream whose round failed is retried after a doubling backoff, not skipped until the next close"""
+    fetcher = scheduler.fetcher
+    fetch_many = fetcher.fetch_many
+    failures = {'left': 2}
+
+    async def flaky_fetch_many(pairs, **kwargs):
+        if failures['left']:
+            failures['left'] -= 1
+            raise ConnectionError("exchange unavailable")
+        return await fetch_many(pairs, **kwargs)
+
+    fetcher.fetch_many = flaky_fetch_many
+    for _ in range(3):
+        scheduler.record('BTCUSDT', '1h')
+        scheduler.record('MISSING', '1h')
+
+    async def run():
+        assert await scheduler.refresh() == 0
+        assert scheduler._next_wake(clock.now) == pytest.approx(5)
+        assert await scheduler.refresh() == 0  # Still backing off
+        clock.now += 5
+        assert await scheduler.refresh() == 0
+        assert scheduler._next_wake(clock.now) == pytest.approx(10)
+        clock.now += 10
+        assert await scheduler.refresh() == 1
+        assert scheduler._retries[('MISSING', '1h')][1] == 3
+        clock.now += 20
+        assert await scheduler.refresh() == 0  # Only the stream without data is tried again
+
+    asyncio.run(run())
+
+    close_time = candle_boundary('1h', NOW)
+    assert scheduler.cache.get('BTCUSDT', '1h')['close_time'] == close_time
+    assert [sorted(call[0]) for call in fetcher.calls] == [
+        [('BTCUSDT', '1h'), ('MISSING', '1h')],
+        [('MISSING', '1h')]
+    ]
+    assert ('BTCUSDT', '1h') not in scheduler._retries
+
+def test_symbol_endpoint(scheduler, monkeypatch):
+    """Test GET /detect/{symbol} serves cache hits and counts popularity"""
+    monkeypatch.setattr(main, 'precompute', scheduler)
+    monkeypatch.setattr(main, 'batcher', None)
+
+    with TestClient(main.app) as client:
+        first = client.get('/detect/BTCUSDT', params={'timeframe': '1h'})
+        second = client.get('/detect/BTCUSDT', params={'timeframe': '1h'})
+        assert client.get('/detect/BTCUSDT', params={'timeframe': '2h'}).status_code == 422
+        assert client.get('/detect/MISSING', params={'timeframe': '1h'}).status_code == 502
+
+    assert first.headers['X-Cache'] == 'miss'
+    assert second.headers['X-Cache'] == 'hit'
+    assert second.json() == first.json()
+    assert second.json()['symbol'] == 'BTCUSDT'
+    assert scheduler.tracker.score('BTCUSDT', '1h') == pytest.approx(2)
+
+def test_refresh_feeds_return_table(scheduler, detector, tmp_path):
+    """Test computed streams pass their closed candles to the forward-return table"""
+    scheduler.return_table = ForwardReturnTable(detector, tmp_path, horizons=[1, 5])
+    for _ in range(3):
+        scheduler.record('BTCUSDT', '1h')
+
+    asyncio.run(scheduler.refresh())
+
+    assert scheduler.return_table.seen_bars('BTCUSDT', '1h') == scheduler.fetcher.n_candles
+    assert scheduler.return_table.sketches('DOJI', '1h', ['BTCUSDT'])
+
+def test_refresh_extends_pattern_index(scheduler, detector, tmp_path):
+    """Test computed streams append their closed candles to the pattern index"""
+    scheduler.pattern_index = PatternIndex(detector, tmp_path)
+    for _ in range(3):
+        scheduler.record('BTCUSDT', '1h')
+
+    asyncio.run(scheduler.refresh())
+
+    assert scheduler.pattern_index.indexed_bars('BTCUSDT', '1h') == scheduler.fetcher.n_candles
+    assert len(scheduler.pattern_index.query('BTCUSDT', '1h')['bar_index']) > 0
@@ -0,0 +1,191 @@
+import asyncio
+import json
+import marshal
+import pytest
+import pandas as pd
+import numpy as np
+from fastapi.testclient import TestClient
+from src.monitoring.profiling import (
+    ProfileStore, RequestProfiler, annotate_request, profile_to_pstats, profile_to_text, profiled
+)
+from src.main import app, profiler
+
+@pytest.fixture
+def client():
+    """Create a test client with an empty profile store"""
+    profiler.store.clear()
+    return TestClient(app)
+
+@pytest.fixture
+def candles():
+    """Create a sample /detect/ payload"""
+    dates = pd.date_range(start='2023-01-01', periods=50, freq='1h')
+    close = 100 + np.cumsum(np.random.default_rng(0).normal(0, 1, 50))
+    return [
+        {
+            'timestamp': timestamp.isoformat(),
+            'open': float(c),
+            'high': float(c + 1),
+            'low': float(c - 1),
+            'close': float(c),
+            'volume': 1000.0
+        }
+        for timestamp, c in zip(dates, close)
+    ]
+
+def _work():
+    return sum(i * i for i in range(1000))
+
+def test_profile_store_is_bounded():
+    """Test that the store keeps only the most recent profiles"""
+    store = ProfileStore(max_profiles=2)
+    for i in range(3):
+        store.add({'id': str(i), 'stats': {}})
+
+    assert store.get('0') is None
+    assert [p['id'] for p in store.list()] == ['2', '1']
+    assert 'stats' not in store.list()[0]
+
+def test_profile_store_on_disk(tmp_path):
+    """Test a directory-backed store serves every worker's profiles, bounded and newest first"""
+    first, second = ProfileStore(max_profiles=2, directory=tmp_path), ProfileStore(max_profiles=2, directory=tmp_path)
+    profiler = RequestProfiler(first)
+    capture = profiler.start('header', {'path': '/detect/'})
+    _work()
+    profile_id = profiler.finish(capture, elapsed_ms=5, status=200)
+
+    profile = second.get(profile_id)
+    assert profile['params'] == {'path': '/detect/'}
+    assert '_work' in profile_to_text(profile)
+    assert marshal.loads((tmp_path / f'{profile_id}.prof').read_bytes()) == profile['stats']
+
+    second.add({'id': 'b', 'stats': {}})
+    first.add({'id': 'c', 'stats': {}})
+    assert [p['id'] for p in second.list()] == ['c', 'b']
+    assert first.get(profile_id) is None
+    assert first.get('../b') is None
+    first.clear()
+    assert second.list() == []
+
+def test_sampled_profiles_respect_threshold():
+    """Test that sampled requests are kept only above the latency threshold"""
+    request_profiler = RequestProfiler(
+        ProfileStore(), sample_rate=1.0, latency_threshold_ms=100
+    )
+    assert request_profiler.should_profile({}) == 'sampled'
+
+    capture = request_profiler.start('sampled', {'path': '/fast'})
+    _work()
+    assert request_profiler.finish(capture, elapsed_ms=5, status=200) is None
+
+    capture = request_profiler.start('sampled', {'path': '/slow'})
+    annotate_request(candles=10)
+    _work()
+    profile_id = request_profiler.finish(capture, elapsed_ms=500, status=200)
+
+    profile = request_profiler.store.get(profile_id)
+    assert profile['params'] == {'path': '/slow', 'candles': 10}
+    assert '_work' in profile_to_text(profile)
+    assert isinstance(marshal.loads(profile_to_pstats(profile)), dict)
+
+def test_header_and_concurrency():
+    """Test header opt-in and that only one request is profiled at a time"""
+    request_profiler = RequestProfiler(ProfileStore(), sample_rate=0.0)
+    assert request_profiler.should_profile({}) is None
+    assert request_profiler.should_profile({'x-profile': '1'}) == 'header'
+
+    capture = request_profiler.start('header', {})
+    assert request_profiler.start('header', {}) is None
+    assert request_profiler.finish(capture, elapsed_ms=1, status=200) is not None
+    assert request_profiler.start('header', {}) is not None
+
+def test_profiled_request_runs_alone():
+    """Test a profiled request waits for requests in flight, holds new ones and includes its executor work"""
+    request_profiler = RequestProfiler(ProfileStore(), sample_rate=0.0)
+    order = []
+
+    async def request(name, delay):
+        async with request_profiler.admitted():
+            order.append(f'{name} start')
+            await asyncio.sleep(delay)
+            order.append(f'{name} end')
+
+    async def profiled_request():
+        capture = await request_profiler.start_exclusive('header', {})
+        order.append('profiled start')
+        await asyncio.get_running_loop().run_in_executor(None, profiled(_work))
+        await asyncio.sleep(0.01)
+        order.append('profiled end')
+        return request_profiler.finish(capture, elapsed_ms=10, status=200)
+
+    async def run():
+        first = asyncio.create_task(request('first', 0.02))
+        await asyncio.sleep(0)
+        profile_id = asyncio.create_task(profiled_request())
+        await asyncio.sleep(0)
+        second = asyncio.create_task(request('second', 0))
+        await asyncio.gather(first, second)
+        return await profile_id
+
+    profile_id = asyncio.run(run())
+    assert order == [
+        'first start', 'first end', 'profiled start', 'profiled end', 'second start', 'second end'
+    ]
+    assert '_work' in profile_to_text(request_profiler.store.get(profile_id))
+    # Outside a profiled request the wrapper just calls through
+    assert profiled(_work)() == _work()
+
+def test_profiled_request_gives_up_waiting():
+    """Test a request is not profiled when the requests in flight outlast the drain timeout"""
+    request_profiler = RequestProfiler(ProfileStore(), sample_rate=0.0, drain_timeout_ms=10)
+
+    async def slow_request():
+        async with request_profiler.admitted():
+            await asyncio.sleep(0.1)
+
+    async def run():
+        slow = asyncio.create_task(slow_request())
+        await asyncio.sleep(0)
+        capture = await request_profiler.start_exclusive('header', {})
+        # Requests are admitted again once profiling is abandoned
+        async with request_profiler.admitted():
+            pass
+        await slow
+        return capture
+
+    assert asyncio.run(run()) is None
+    assert request_profiler.start('header', {}) is not None
+
+def test_annotate_without_profile():
+    """Test that annotating an unprofiled request is a no-op"""
+    annotate_request(candles=10)
+
+def test_profile_endpoints(client, candles):
+    """Test capturing a /detect/ profile and fetching it from the admin endpoints"""
+    response = client.post(
+        '/detect/',
+        json={'data': candles, 'timeframe': '1h'},
+        headers={'X-Profile': '1'}
+    )
+    assert response.status_code == 200
+    profile_id = response.headers['X-Profile-Id']
+
+    listed = client.get('/admin/profiles/').json()
+    assert listed[0]['id'] == profile_id
+    assert listed[0]['params']['candles'] == 50
+    assert listed[0]['params']['timeframe'] == '1h'
+    assert listed[0]['params']['path'] == '/detect/'
+
+    detail = client.get(f'/admin/profiles/{profile_id}').json()
+    assert 'detect_patterns' in detail['report']
+
+    download = client.get(f'/admin/profiles/{profile_id}/download')
+    assert download.status_code == 200
+    assert isinstance(marshal.loads(download.content), dict)
+    assert json.loads(download.headers['X-Profile-Params'])['candles'] == 50
+
+    assert client.get('/admin/profiles/missing').status_code == 404
+
+    # Requests without the header are not profiled by default
+    response = client.post('/detect/', json={'data': candles, 'timeframe': '1h'})
+    assert 'X-Profile-Id' not in response.headers
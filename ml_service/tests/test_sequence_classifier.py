@@ -0,0 +1,127 @@
+import pytest
+import numpy as np
+import pandas as pd
+import torch
+from src.models import PatternDetector
+from src.models.sequence_classifier import (
+    PATTERN_LABELS, CandleCNN, build_training_set, label_windows, load_classifier,
+    main, prepare_features, save_classifier, train_classifier
+)
+from src.config import MODEL_CONFIG
+
+@pytest.fixture
+def sample_data():
+    """Create sample OHLCV data for testing"""
+    rng = np.random.default_rng(5)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, 2000)))
+    data = pd.DataFrame({
+        'open': close * (1 + rng.normal(0, 0.002, 2000)),
+        'high': close * 1.01,
+        'low': close * 0.99,
+        'close': close,
+        'volume': rng.lognormal(13, 0.5, 2000)
+    })
+    return data
+
+@pytest.fixture
+def trained_model(sample_data):
+    """Train a small classifier on the sample data"""
+    windows, labels = build_training_set([sample_data])
+    model, _ = train_classifier(windows, labels, epochs=3)
+    return model
+
+def test_model_is_compact():
+    """Test the classifier output shape and size"""
+    model = CandleCNN()
+    logits = model(torch.zeros(7, 10, 5))
+
+    assert logits.shape == (7, len(PATTERN_LABELS))
+    assert sum(p.numel() for p in model.parameters()) < 10_000
+
+def test_prepare_features(sample_data):
+    """Test feature preparation matches pandas percentage changes"""
+    features = prepare_features(sample_data)
+
+    assert features.shape == (len(sample_data), 5)
+    assert features.dtype == np.float32
+    np.testing.assert_array_equal(features[0], 0)
+    expected = np.clip(sample_data['close'].pct_change().fillna(0).values, -1, 1)
+    np.testing.assert_allclose(features[:, 3], expected, rtol=1e-6)
+
+def test_label_windows():
+    """Test labelling of crafted price paths"""
+    def labels_for(trend_end, forward_end):
+        close = np.concatenate([
+            np.linspace(100, trend_end, 10),
+            np.linspace(trend_end, forward_end, 6)[1:]
+        ])
+        return PATTERN_LABELS[label_windows(close, window_size=10, horizon=5)[0]]
+
+    assert labels_for(90, 100) == "BULLISH_REVERSAL"
+    assert labels_for(110, 100) == "BEARISH_REVERSAL"
+    assert labels_for(110, 120) == "CONTINUATION"
+    assert labels_for(110, 110.05) == "INDECISION"
+    assert labels_for(100.1, 105) == "NO_PATTERN"
+
+    assert len(label_windows(np.ones(12), window_size=10, horizon=5)) == 0
+
+def test_build_training_set(sample_data):
+    """Test windows line up with the features and labels"""
+    windows, labels = build_training_set([sample_data, sample_data.iloc[:5]])
+    features = prepare_features(sample_data)
+
+    assert windows.shape == (len(sample_data) - 10 - 5 + 1, 10, 5)
+    assert len(labels) == len(windows)
+    np.testing.assert_array_equal(windows[3], features[3:13])
+    assert set(np.unique(labels)) <= set(range(len(PATTERN_LABELS)))
+
+def test_training_learns_separable_classes():
+    """Test training on windows whose class is encoded in the features"""
+    rng = np.random.default_rng(0)
+    labels = rng.integers(0, len(PATTERN_LABELS), 2000)
+    windows = rng.normal(0, 0.01, (2000, 10, 5)).astype(np.float32)
+    windows[:, :, 3] += (labels[:, None] - 2) * 0.2
+
+    model, history = train_classifier(windows, labels, epochs=20, learning_rate=5e-3)
+
+    assert history['loss'][-1] < history['loss'][0]
+    with torch.no_grad():
+        predictions = model(torch.from_numpy(windows)).argmax(dim=1).numpy()
+    assert np.mean(predictions == labels) > 0.9
+
+def test_save_and_load(trained_model, tmp_path):
+    """Test checkpoint round trip"""
+    path = save_classifier(trained_model, tmp_path / 'model.pt', window_size=10)
+    model, window_size = load_classifier(path)
+
+    windows = torch.randn(4, 10, 5)
+    with torch.no_grad():
+        torch.testing.assert_close(model(windows), trained_model(windows))
+    assert window_size == 10
+
+def test_detector_loads_checkpoint(trained_model, sample_data, tmp_path, monkeypatch):
+    """Test PatternDetector uses a trained checkpoint for ML detection"""
+    path = save_classifier(trained_model, tmp_path / 'model.pt')
+    monkeypatch.setitem(MODEL_CONFIG, 'model_type', 'cnn')
+    monkeypatch.setitem(MODEL_CONFIG['sequence'], 'checkpoint', path)
+
+    detector = PatternDetector()
+    assert isinstance(detector.model, CandleCNN)
+    assert detector.inference_backend is not None
+
+    patterns = detector._detect_patterns_transformer(sample_data)
+    assert all(p['pattern_name'][len('AI_PATTERN_'):] in set(PATTERN_LABELS) - {'NO_PATTERN'} for p in patterns)
+
+    monkeypatch.setitem(MODEL_CONFIG['sequence'], 'checkpoint', tmp_path / 'missing.pt')
+    assert PatternDetector().inference_backend is None
+
+def test_training_cli(sample_data, tmp_path):
+    """Test the training entry point writes a loadable checkpoint"""
+    csv_path = tmp_path / 'candles.csv'
+    sample_data.to_csv(csv_path, index=False)
+    output = tmp_path / 'cli_model.pt'
+
+    main([str(csv_path), '--epochs', '1', '--output', str(output)])
+
+    model, window_size = load_classifier(output)
+    assert isinstance(model, CandleCNN)
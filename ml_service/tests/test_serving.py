@@ -0,0 +1,91 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+import pytest
+import torch
+import src.main as main
+from src.config import SERVING_SETTINGS
+from src.serving import available_cores, configure_worker, plan_worker_cores, restart_delay
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def test_plan_worker_cores():
+    """Test workers get disjoint cores while the cores last"""
+    assert plan_worker_cores(0, 1, cores=[0, 1, 2, 3]) == [[0], [1], [2], [3]]
+    assert plan_worker_cores(0, 2, cores=[0, 1, 2, 3]) == [[0, 1], [2, 3]]
+    assert plan_worker_cores(3, 1, cores=[4, 5]) == [[4], [5], [4]]
+    assert plan_worker_cores(0, 4, cores=[0, 1]) == [[0, 1, 0, 1]]
+    assert len(plan_worker_cores(0, 1)) == len(available_cores())
+
+def test_restart_delay():
+    """Test restarts back off exponentially with consecutive quick failures, up to a cap"""
+    assert restart_delay(0, 0.5, 30) == 0
+    assert [restart_delay(n, 0.5, 30) for n in (1, 2, 3)] == [0.5, 1.0, 2.0]
+    assert restart_delay(20, 0.5, 30) == 30
+
+def test_configure_worker(monkeypatch):
+    """Test worker threads and backend are re-tuned after fork"""
+    calls = []
+    backend = type('Backend', (), {'after_fork': lambda self, threads: calls.append(threads)})()
+    monkeypatch.setattr(main, 'detector', type('Detector', (), {'inference_backend': backend})())
+    threads = torch.get_num_threads()
+
+    try:
+        configure_worker(available_cores(), 2)
+        assert torch.get_num_threads() == 2
+        assert calls == [2]
+    finally:
+        torch.set_num_threads(threads)
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="pre-fork serving needs os.fork")
+def test_serve_prefork_workers(tmp_path):
+    """Test the master forks workers that serve from the shared socket and report metrics together"""
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'src.serving', '--host', '127.0.0.1', '--port', str(port),
+         '--workers', '2'],
+        cwd=SERVICE_DIR,
+        env={**os.environ, 'DATA_DIR': str(tmp_path)},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.monotonic() + 120
+        while True:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=5) as response:
+                    assert response.status == 200
+                    break
+            except OSError:
+                assert process.poll() is None, "server exited"
+                assert time.monotonic() < deadline, "server did not start"
+                time.sleep(0.5)
+
+        children = Path(f'/proc/{process.pid}/task/{process.pid}/children')
+        if children.exists():
+            assert len(children.read_text().split()) == 2
+
+        # Whichever worker answers the scrape counts the requests every worker served
+        for _ in range(20):
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=5):
+                pass
+        time.sleep(2 * SERVING_SETTINGS['metrics_interval_s'])
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics', timeout=5) as response:
+            text = response.read().decode()
+        assert 'http_request_duration_seconds_count{method="GET",path="/",status="200"} 21' in text
+
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(timeout=30) == 0
+    finally:
+        if process.poll() is None:
+            process.kill()
@@ -0,0 +1,94 @@
+import pickle
+import pytest
+import numpy as np
+import pandas as pd
+from src.data import CandleSeries
+from src.models import PatternBacktester, TradeLog
+
+@pytest.fixture
+def sample_data():
+    """Create sample OHLCV data for testing"""
+    rng = np.random.default_rng(3)
+    dates = pd.date_range(start='2023-01-01', periods=2000, freq='1h', tz='UTC')
+    close = 100 + np.cumsum(rng.normal(0, 1, 2000))
+    data = pd.DataFrame({
+        'open': close + rng.normal(0, 0.5, 2000),
+        'high': close + np.abs(rng.normal(0, 1, 2000)),
+        'low': close - np.abs(rng.normal(0, 1, 2000)),
+        'close': close,
+        'volume': rng.lognormal(13, 0.5, 2000)
+    }, index=dates)
+
+    # Ensure high is highest and low is lowest
+    data['high'] = data[['open', 'high', 'close']].max(axis=1)
+    data['low'] = data[['open', 'low', 'close']].min(axis=1)
+
+    return data
+
+@pytest.fixture
+def occurrences():
+    rng = np.random.default_rng(4)
+    return [
+        {
+            'pattern_name': ['DOJI', 'HAMMER', 'ENGULFING'][i % 3],
+            'confidence': float(rng.uniform(0.6, 1.0)),
+            'start_index': int(end) - 1,
+            'end_index': int(end),
+            'pattern_type': 'bullish' if i % 2 else 'bearish'
+        }
+        for i, end in enumerate(rng.integers(1, 2002, 600))
+    ]
+
+def test_log_matches_backtest(sample_data, occurrences):
+    """Test the log holds the same trades and statistics as backtest_pattern"""
+    backtester = PatternBacktester()
+    expected = backtester.backtest_pattern(sample_data, occurrences)
+    log = backtester.backtest_log(sample_data, occurrences)
+
+    assert len(log) == len(expected['trade_results']) > 0
+    assert log.rows() == expected['trade_results']
+    assert log.rows()[0]['entry_time'].tz is not None
+    assert log.statistics() == expected['overall_stats']
+    assert log.pattern_statistics() == expected['pattern_stats']
+    assert log.confidence_statistics() == expected['confidence_stats']
+    assert log.pattern_statistics(min_trades=10 ** 6) == {}
+
+    # Pattern names are stored once, trades hold small integer codes
+    assert sorted(log.pattern_names) == ['DOJI', 'ENGULFING', 'HAMMER']
+    assert log.columns['pattern_id'].dtype == np.int32
+    assert sum(log.pattern_counts().values()) == len(log)
+
+def test_pages_and_storage(sample_data, occurrences, tmp_path):
+    """Test paged rows, .npz round trips and compact pickles"""
+    backtester = PatternBacktester()
+    trades = backtester.backtest_pattern(sample_data, occurrences)['trade_results']
+    log = backtester.backtest_log(sample_data, occurrences)
+
+    assert log.page(offset=10, limit=25) == trades[10:35]
+    assert log.page(offset=len(trades)) == []
+
+    log.save(tmp_path / 'trades.npz')
+    loaded = TradeLog.load(tmp_path / 'trades.npz')
+    assert loaded.rows() == trades
+    assert loaded.statistics() == log.statistics()
+
+    assert len(pickle.dumps(log)) < len(pickle.dumps(trades)) * 0.75
+
+    # Frames indexed by position keep their bar labels
+    positional = backtester.backtest_log(sample_data.reset_index(drop=True), occurrences)
+    first = positional.rows(0, 1)[0]
+    assert first['entry_time'] == sample_data.index.get_loc(trades[0]['entry_time'])
+    assert first['return'] == trades[0]['return']
+
+def test_report_from_log(sample_data, occurrences):
+    """Test reports computed lazily from a log match reports from results"""
+    backtester = PatternBacktester()
+    backtester.min_trades = 150
+    candles = CandleSeries.from_dataframe(sample_data.reset_index(names='timestamp'))
+    expected = backtester.generate_performance_report(backtester.backtest_pattern(candles, occurrences))
+    report = backtester.generate_performance_report(backtester.backtest_log(candles, occurrences), candles)
+
+    assert sorted(report.split('\n')) == sorted(expected.split('\n'))
+    assert 'HAMMER:' in report
+    assert backtester.generate_performance_report(TradeLog.empty()) == "No backtest results available."
+    assert len(backtester.backtest_log(candles, [])) == 0